@@ -0,0 +1,105 @@
+"""Recall@k versus QPS benchmark for the ANN index.
+
+Builds an exact retriever and an IVF-PQ index over the same synthetic,
+clustered unit vectors, then sweeps the ANN search parameters (nprobe and
+refine_factor) and reports recall@k against the exact results together with
+single-query throughput. Use it to pick operating points for a corpus size.
+
+Usage:
+    uv run python scripts/benchmark_ann.py
+    uv run python scripts/benchmark_ann.py --count 1000000 --dim 384 --k 10
+
+Output:
+    Build/load times and one table row per parameter combination.
+
+No API calls are made.
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Add src to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.rag.retriever import IVFPQIndex, build_vector_index
+
+
+def synthetic_vectors(count: int, dim: int, clusters: int, seed: int) -> np.ndarray:
+    """Unit vectors drawn around random cluster centres (like topical chunks)."""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dim)).astype(np.float32)
+    vectors = centres[rng.integers(0, clusters, count)]
+    vectors += 0.6 * rng.standard_normal((count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def main():
+    """Run the sweep and print the recall/QPS table."""
+    parser = argparse.ArgumentParser(description="Benchmark ANN recall vs QPS")
+    parser.add_argument("--count", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--clusters", type=int, default=500)
+    args = parser.parse_args()
+
+    vectors = synthetic_vectors(args.count, args.dim, args.clusters, seed=0)
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.choice(args.count, args.queries, replace=False)]
+    queries = queries + 0.2 * rng.standard_normal(queries.shape).astype(np.float32)
+    ids = [str(i) for i in range(args.count)]
+
+    print("=" * 70)
+    print(f"ANN benchmark: {args.count} x {args.dim} vectors, k={args.k}")
+    print("=" * 70)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        exact = build_vector_index(Path(tmp) / "exact", ids, vectors)
+        start = time.perf_counter()
+        truth = [set(row.tolist()) for row in exact.rank_batch(queries, args.k)[0]]
+        exact_batch_qps = args.queries / (time.perf_counter() - start)
+        start = time.perf_counter()
+        for query in queries[:20]:
+            exact.rank_batch(query[None, :], args.k)
+        exact_qps = 20 / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        ann = IVFPQIndex.build(ids, vectors)
+        build_seconds = time.perf_counter() - start
+        ann_path = Path(tmp) / "ann.idx"
+        ann.save(ann_path)
+        start = time.perf_counter()
+        ann = IVFPQIndex.load(ann_path)
+        load_ms = (time.perf_counter() - start) * 1000
+        size_mb = ann_path.stat().st_size / (1024 * 1024)
+
+        print(f"Exact (float16):   {exact_qps:8.1f} QPS single, ", end="")
+        print(f"{exact_batch_qps:.1f} QPS batched")
+        print(f"IVF-PQ build:      {build_seconds:.1f}s (nlist={ann.nlist}, m={ann.m})")
+        print(f"IVF-PQ file:       {size_mb:.1f} MB, loaded in {load_ms:.0f} ms")
+        print()
+        print(f"{'nprobe':>8} {'refine':>8} {'recall@k':>10} {'QPS':>10}")
+        print("-" * 40)
+        for nprobe in (1, 4, 8, 16, 32, 64):
+            for refine in (0, 4, 10):
+                ann.nprobe, ann.refine_factor = nprobe, refine
+                ann.rank(queries[0], args.k)  # Warm up lazily built lists
+                start = time.perf_counter()
+                found = [ann.rank(query, args.k)[0] for query in queries]
+                qps = args.queries / (time.perf_counter() - start)
+                recall = np.mean(
+                    [
+                        len(truth[i] & set(f.tolist())) / args.k
+                        for i, f in enumerate(found)
+                    ]
+                )
+                print(f"{nprobe:>8} {refine:>8} {recall:>10.3f} {qps:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
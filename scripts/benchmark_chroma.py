@@ -0,0 +1,116 @@
+"""ChromaDB versus NumPy vector store benchmark.
+
+Embeds the same synthetic chunk corpus once, loads it into the built-in
+exact NumPy store (ExactRetriever) and into a persistent ChromaDB collection
+(ChromaRetriever), then compares write time, single-query and batched query
+throughput, filtered queries and recall@k against the exact results.
+
+Usage:
+    uv run python scripts/benchmark_chroma.py
+    uv run python scripts/benchmark_chroma.py --chunks 100000 --batch-size 2048
+
+Output:
+    One table row per store and operation.
+
+No API calls are made.
+"""
+
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Add src to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.rag.chroma_store import ChromaRetriever
+from src.rag.embeddings import EmbeddingService, HashingBackend
+from src.rag.retriever import build_vector_index
+
+
+def synthetic_chunks(count: int, seed: int) -> list[str]:
+    """Chunk-sized texts drawn from topical vocabularies."""
+    rng = random.Random(seed)
+    topics = [[f"t{t}w{w}" for w in range(200)] for t in range(50)]
+    common = [f"c{w}" for w in range(2000)]
+    return [
+        " ".join(rng.choices(topics[i % 50], k=60) + rng.choices(common, k=140))
+        for i in range(count)
+    ]
+
+
+def timed(label: str, seconds: float, operations: int, unit: str) -> None:
+    """Print one result row."""
+    rate = operations / seconds if seconds else float("inf")
+    print(f"{label:<34} {seconds * 1000:>10.1f} ms {rate:>12.1f} {unit}/s")
+
+
+def main():
+    """Run the comparison and print the table."""
+    parser = argparse.ArgumentParser(description="Benchmark ChromaDB vs NumPy store")
+    parser.add_argument("--chunks", type=int, default=20_000)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=4096)
+    args = parser.parse_args()
+
+    texts = synthetic_chunks(args.chunks, seed=0)
+    embedder = EmbeddingService(HashingBackend())
+    vectors = embedder.embed(texts)
+    ids = [f"chunk-{i}" for i in range(args.chunks)]
+    metadatas = [{"topic": i % 50} for i in range(args.chunks)]
+    queries = embedder.embed(synthetic_chunks(args.queries, seed=1))
+
+    print("=" * 70)
+    print(f"Vector store benchmark: {args.chunks} x {vectors.shape[1]}, k={args.k}")
+    print("=" * 70)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        exact = build_vector_index(Path(tmp) / "exact", ids, vectors)
+        timed("numpy: build", time.perf_counter() - start, args.chunks, "vectors")
+
+        start = time.perf_counter()
+        chroma = ChromaRetriever.build(
+            Path(tmp) / "chroma", ids, vectors, metadatas, batch_size=args.batch_size
+        )
+        timed("chroma: upsert", time.perf_counter() - start, args.chunks, "vectors")
+
+        start = time.perf_counter()
+        truth = exact.search_batch(queries, args.k)
+        timed("numpy: batched query", time.perf_counter() - start, len(queries), "q")
+        start = time.perf_counter()
+        for query in queries:
+            exact.search(query, args.k)
+        timed("numpy: single queries", time.perf_counter() - start, len(queries), "q")
+
+        start = time.perf_counter()
+        found = chroma.search_batch(queries, args.k)
+        timed("chroma: batched query", time.perf_counter() - start, len(queries), "q")
+        start = time.perf_counter()
+        for query in queries:
+            chroma.search(query, args.k)
+        timed("chroma: single queries", time.perf_counter() - start, len(queries), "q")
+
+        start = time.perf_counter()
+        chroma.search_batch(queries, args.k, where={"topic": 7})
+        timed(
+            "chroma: batched, filtered", time.perf_counter() - start, len(queries), "q"
+        )
+
+        recall = np.mean(
+            [
+                len({c for c, _ in f} & {c for c, _ in t}) / args.k
+                for f, t in zip(found, truth)
+            ]
+        )
+        print()
+        print(f"Chroma recall@{args.k} vs exact: {recall:.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Chunking throughput benchmark.
+
+Generates a synthetic Markdown corpus file (headings, paragraphs, code fences)
+and measures how fast src/rag/chunking.py streams it into chunks.
+
+Usage:
+    uv run python scripts/benchmark_chunking.py
+    uv run python scripts/benchmark_chunking.py --size-mb 1024 --target-tokens 512
+
+Output:
+    Throughput in MB/s, chunk count, and peak resident memory. Peak memory
+    should stay flat as --size-mb grows, since files are memory-mapped and
+    chunked lazily.
+
+No API calls are made.
+"""
+
+import argparse
+import random
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add src to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.rag.chunking import chunk_file
+
+WORDS = (
+    "agent retrieval vector index chunk token embedding query latency "
+    "memory stream python async search note corpus document heading"
+).split()
+
+
+def write_synthetic_markdown(path: Path, size_mb: int, seed: int = 0) -> None:
+    """Write a Markdown file of roughly size_mb megabytes."""
+    rng = random.Random(seed)
+    target = size_mb * 1024 * 1024
+    written = 0
+    section = 0
+    with open(path, "w", encoding="utf-8") as f:
+        while written < target:
+            parts = [f"## Section {section}\n\n"]
+            for _ in range(rng.randint(3, 8)):
+                sentence_count = rng.randint(2, 6)
+                sentences = (
+                    " ".join(rng.choices(WORDS, k=rng.randint(6, 18))).capitalize()
+                    + "."
+                    for _ in range(sentence_count)
+                )
+                parts.append(" ".join(sentences) + "\n\n")
+            if rng.random() < 0.3:
+                parts.append(
+                    "```python\ndef handler(event):\n    return event\n```\n\n"
+                )
+            block = "".join(parts)
+            f.write(block)
+            written += len(block)
+            section += 1
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in megabytes."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return peak / 1024 / (1024 if sys.platform == "darwin" else 1)
+
+
+def main():
+    """Generate a corpus file and report chunking throughput."""
+    parser = argparse.ArgumentParser(description="Benchmark streaming chunking")
+    parser.add_argument("--size-mb", type=int, default=64, help="Corpus size in MB")
+    parser.add_argument("--target-tokens", type=int, default=256)
+    parser.add_argument("--overlap-tokens", type=int, default=32)
+    parser.add_argument("--runs", type=int, default=3, help="Timed runs (best wins)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "corpus.md"
+        print(f"Generating {args.size_mb} MB synthetic Markdown file...")
+        write_synthetic_markdown(path, args.size_mb)
+        size_mb = path.stat().st_size / (1024 * 1024)
+        baseline_rss = peak_rss_mb()
+
+        best = float("inf")
+        chunks = 0
+        for run in range(args.runs):
+            start = time.perf_counter()
+            chunks = sum(
+                1 for _ in chunk_file(path, args.target_tokens, args.overlap_tokens)
+            )
+            elapsed = time.perf_counter() - start
+            best = min(best, elapsed)
+            print(f"  run {run + 1}: {size_mb / elapsed:.1f} MB/s")
+
+    print()
+    print(f"File size:      {size_mb:.1f} MB")
+    print(f"Chunks:         {chunks} (target {args.target_tokens} tokens)")
+    print(f"Throughput:     {size_mb / best:.1f} MB/s (best of {args.runs})")
+    print(
+        f"Peak RSS:       {peak_rss_mb():.0f} MB (before chunking: {baseline_rss:.0f})"
+    )
+
+
+if __name__ == "__main__":
+    main()
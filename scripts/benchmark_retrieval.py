@@ -0,0 +1,340 @@
+"""Retrieval benchmark suite: ingestion, index size, latency, QPS and recall.
+
+Generates a synthetic Markdown corpus per requested size, ingests it with the
+parallel pipeline (src/rag/ingest.py), builds an IVF-PQ index over the same
+vectors, and measures every retriever on queries drawn from the corpus:
+
+- **exact**: ExactRetriever over the ingested vectors (the ground truth)
+- **ann**: IVFPQIndex built from the same vectors
+- **hybrid**: BM25 + exact vectors, fused
+- **hybrid+rerank**: hybrid with the local Reranker
+
+For each it records p50/p99 single-query latency, QPS with 1..N concurrent
+client threads and recall@k against exact search. Results are written as
+JSON and compared with the newest earlier result in the output directory, so
+regressions show up from one run to the next.
+
+Usage:
+    uv run python scripts/benchmark_retrieval.py
+    uv run python scripts/benchmark_retrieval.py --docs 1000 10000 --dim 256
+    uv run python scripts/benchmark_retrieval.py --baseline old.json --tolerance 0.3
+
+Output:
+    One table per corpus size, the comparison with the baseline, and
+    docs/benchmarks/retrieval-<timestamp>.json. Exits with status 1 when a
+    metric regressed by more than --tolerance.
+
+No API calls are made.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable
+
+import numpy as np
+
+# Add src to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.rag.embeddings import EmbeddingCache, EmbeddingService, HashingBackend
+from src.rag.ingest import ingest_corpus
+from src.rag.retriever import HybridRetriever, IVFPQIndex, Reranker
+
+RESULTS_DIR = Path(__file__).parent.parent / "docs" / "benchmarks"
+
+# Sign of a change that makes a speed metric worse (+1: higher is worse)
+DIRECTIONS = {"p50_ms": 1, "p99_ms": 1, "qps": -1}
+RECALL_TOLERANCE = 0.01  # Absolute recall@k drop reported as a regression
+
+
+def write_corpus(root: Path, docs: int, seed: int) -> list[str]:
+    """Write topical Markdown documents and return queries drawn from them.
+
+    Each document has a heading and a few paragraphs mixing words of its
+    topic with common words; queries are short runs of words from a random
+    paragraph, so every query has relevant documents.
+    """
+    rng = random.Random(seed)
+    topics = [[f"t{t}w{w}" for w in range(150)] for t in range(max(docs // 20, 10))]
+    common = [f"c{w}" for w in range(3000)]
+    paragraphs = []
+    root.mkdir(parents=True)
+    for i in range(docs):
+        topic = topics[i % len(topics)]
+        body = [
+            " ".join(rng.choices(topic, k=40) + rng.choices(common, k=80))
+            for _ in range(rng.randint(2, 6))
+        ]
+        paragraphs.extend(body)
+        heading = " ".join(rng.choices(topic, k=4))
+        (root / f"doc{i:06d}.md").write_text(
+            f"# {heading}\n\n" + "\n\n".join(body) + "\n", encoding="utf-8"
+        )
+    queries = []
+    for _ in range(docs):
+        words = rng.choice(paragraphs).split()
+        start = rng.randrange(len(words) - 6)
+        queries.append(" ".join(words[start : start + rng.randint(2, 6)]))
+    return queries
+
+
+def directory_bytes(path: Path) -> int:
+    """Total size of the files under a directory (or of one file)."""
+    if path.is_file():
+        return path.stat().st_size
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+
+
+def measure(
+    search: Callable[[int], list[tuple[str, float]]],
+    count: int,
+    truth: list[set[str]],
+    k: int,
+    concurrency: list[int],
+    reset: Callable[[], None] | None = None,
+) -> dict[str, Any]:
+    """Latency percentiles, QPS per client count and recall@k of one retriever.
+
+    Args:
+        search: Runs query number i and returns its (chunk_id, score) results
+        count: Number of queries
+        truth: Exact top-k chunk IDs per query
+        k: Results per query
+        concurrency: Client thread counts to measure QPS with
+        reset: Drops per-query caches, so every timed pass starts cold
+    """
+    search(0)  # Warm up lazily built state
+    if reset is not None:
+        reset()
+    latencies, recalls = [], []
+    for i in range(count):
+        start = time.perf_counter()
+        found = search(i)
+        latencies.append((time.perf_counter() - start) * 1000)
+        recalls.append(len(truth[i] & {c for c, _ in found}) / max(len(truth[i]), 1))
+    qps = {}
+    for clients in concurrency:
+        if reset is not None:
+            reset()
+        with ThreadPoolExecutor(max_workers=clients) as pool:
+            start = time.perf_counter()
+            list(pool.map(search, range(count)))
+            qps[str(clients)] = count / (time.perf_counter() - start)
+    return {
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "qps": qps,
+        "recall_at_k": float(np.mean(recalls)),
+    }
+
+
+def run_size(docs: int, args: argparse.Namespace, tmp: Path) -> dict[str, Any]:
+    """Ingest one synthetic corpus and measure every retriever on it."""
+    queries = write_corpus(tmp / "corpus", docs, seed=docs)[: args.queries]
+    # Cached like the shared service, so reranking looks chunk vectors up
+    backend = HashingBackend(dim=args.dim)
+    embedder = EmbeddingService(
+        backend, EmbeddingCache(tmp / "embeddings", backend.model_id, backend.dim)
+    )
+    retriever, report = ingest_corpus(
+        [tmp / "corpus"], tmp / "index", embedder, workers=args.workers, cache=None
+    )
+    exact = retriever.dense
+    ids = [exact.chunk_id(row) for row in range(len(exact))]
+    vectors = exact.vectors(np.arange(len(exact)))
+    start = time.perf_counter()
+    ann = IVFPQIndex.build(ids, vectors)
+    ann_build = time.perf_counter() - start
+    ann.save(tmp / "ann.idx")
+    query_vectors = np.stack([embedder.embed_query(query) for query in queries])
+    truth = [{c for c, _ in r} for r in exact.search_batch(query_vectors, args.k)]
+    reranker = Reranker(embedder)
+    reranked = HybridRetriever(
+        retriever.sparse,
+        exact,
+        embedder,
+        retriever.chunks,
+        cache=None,
+        reranker=reranker,
+    )
+
+    searches: dict[str, Callable[[int], list[tuple[str, float]]]] = {
+        "exact": lambda i: exact.search(query_vectors[i], args.k),
+        "ann": lambda i: ann.search(query_vectors[i], args.k),
+        "hybrid": lambda i: retriever.search(queries[i], args.k),
+        "hybrid+rerank": lambda i: reranked.search(queries[i], args.k),
+    }
+    resets: dict[str, Callable[[], None]] = {"hybrid+rerank": reranker.clear}
+    result = {
+        "docs": docs,
+        "chunks": report.chunks,
+        "indexed_chunks": report.embedded,
+        "ingest": {
+            "seconds": report.seconds,
+            "docs_per_second": report.docs_per_second,
+            "chunks_per_second": report.chunks / report.seconds,
+            "ann_build_seconds": ann_build,
+        },
+        "index_bytes": {
+            "dense": directory_bytes(tmp / "index" / "dense"),
+            "sparse": directory_bytes(tmp / "index" / "sparse.json"),
+            "chunks": directory_bytes(tmp / "index" / "chunks.json"),
+            "ann": directory_bytes(tmp / "ann.idx"),
+        },
+        "retrievers": {
+            name: measure(
+                search,
+                len(queries),
+                truth,
+                args.k,
+                args.concurrency,
+                resets.get(name),
+            )
+            for name, search in searches.items()
+        },
+    }
+    retriever.close()
+    reranked.close()
+    return result
+
+
+def print_run(run: dict[str, Any]) -> None:
+    """Print the table of one corpus size."""
+    ingest = run["ingest"]
+    sizes = ", ".join(f"{n} {b / 2**20:.1f} MB" for n, b in run["index_bytes"].items())
+    print(f"\n{run['docs']} docs -> {run['chunks']} chunks", end=" ")
+    print(f"({run['indexed_chunks']} indexed)")
+    print(
+        f"  ingest {ingest['docs_per_second']:.0f} docs/s, "
+        f"{ingest['chunks_per_second']:.0f} chunks/s; "
+        f"ANN build {ingest['ann_build_seconds']:.1f}s"
+    )
+    print(f"  index  {sizes}")
+    clients = list(next(iter(run["retrievers"].values()))["qps"])
+    header = "".join(f"{'QPS@' + c:>10}" for c in clients)
+    print(f"  {'retriever':<15}{'p50 ms':>9}{'p99 ms':>9}{header}{'recall':>9}")
+    for name, m in run["retrievers"].items():
+        qps = "".join(f"{m['qps'][c]:>10.0f}" for c in clients)
+        print(
+            f"  {name:<15}{m['p50_ms']:>9.2f}{m['p99_ms']:>9.2f}{qps}"
+            f"{m['recall_at_k']:>9.3f}"
+        )
+
+
+def compare(
+    current: dict[str, Any], baseline: dict[str, Any], tolerance: float
+) -> list[str]:
+    """Describe the metrics that got worse than the baseline.
+
+    Runs are matched by corpus size and retriever name. Latency and QPS
+    regress when they worsen by more than ``tolerance`` relative to the
+    baseline, recall when it drops by more than RECALL_TOLERANCE.
+    """
+    regressions = []
+    old_runs = {run["docs"]: run for run in baseline.get("runs", [])}
+    for run in current["runs"]:
+        old_run = old_runs.get(run["docs"])
+        if old_run is None:
+            continue
+        for name, metrics in run["retrievers"].items():
+            old = old_run["retrievers"].get(name)
+            if old is None:
+                continue
+            pairs = [
+                (m, metrics[m], old[m]) for m in ("p50_ms", "p99_ms", "recall_at_k")
+            ]
+            pairs += [
+                (f"qps@{c}", metrics["qps"][c], old["qps"][c])
+                for c in metrics["qps"]
+                if c in old["qps"]
+            ]
+            for metric, new_value, old_value in pairs:
+                if metric == "recall_at_k":
+                    worse = old_value - new_value > RECALL_TOLERANCE
+                else:
+                    change = (new_value - old_value) / old_value if old_value else 0.0
+                    worse = change * DIRECTIONS[metric.split("@")[0]] > tolerance
+                if worse:
+                    regressions.append(
+                        f"{run['docs']} docs, {name}: {metric} "
+                        f"{old_value:.3f} -> {new_value:.3f}"
+                    )
+    return regressions
+
+
+def main():
+    """Run the suite, save the JSON results and report regressions."""
+    parser = argparse.ArgumentParser(description="Benchmark retrieval end to end")
+    parser.add_argument("--docs", type=int, nargs="+", default=[2000])
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--output", type=Path, default=None)
+    parser.add_argument("--baseline", type=Path, default=None)
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    stamp = datetime.now().strftime("%Y-%m-%dT%H%M%S")
+    output = args.output or RESULTS_DIR / f"retrieval-{stamp}.json"
+    baseline_path = args.baseline
+    if baseline_path is None and output.parent.is_dir():
+        earlier = sorted(output.parent.glob("retrieval-*.json"))
+        baseline_path = earlier[-1] if earlier else None
+
+    print("=" * 70)
+    print(f"Retrieval benchmark: docs={args.docs}, dim={args.dim}, k={args.k}")
+    print("=" * 70)
+    runs = []
+    for docs in args.docs:
+        with tempfile.TemporaryDirectory() as tmp:
+            runs.append(run_size(docs, args, Path(tmp)))
+        print_run(runs[-1])
+
+    results = {
+        "created": stamp,
+        "machine": {
+            "cpus": os.cpu_count(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+        },
+        "config": {
+            "dim": args.dim,
+            "queries": args.queries,
+            "k": args.k,
+            "concurrency": args.concurrency,
+            "workers": args.workers,
+        },
+        "runs": runs,
+    }
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2) + "\n", encoding="utf-8")
+    print(f"\nResults saved to {output}")
+
+    if baseline_path is None:
+        return
+    baseline = json.loads(baseline_path.read_text(encoding="utf-8"))
+    if baseline.get("config") != results["config"]:
+        print(f"Baseline {baseline_path} used other settings; not compared")
+        return
+    regressions = compare(results, baseline, args.tolerance)
+    print(f"Compared with {baseline_path}: {len(regressions)} regressions")
+    for regression in regressions:
+        print(f"  {regression}")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
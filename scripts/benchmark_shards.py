@@ -0,0 +1,108 @@
+"""Sharded versus single-process vector search benchmark.
+
+Builds one exact vector index and sharded copies of the same vectors, then
+compares batched and single-query throughput of the single index with
+scatter-gather search over 1, 2 and 4 shard worker processes, with shard
+matrices memory-mapped from disk or held in shared memory. Every sharded
+result is checked against the single index.
+
+Usage:
+    uv run python scripts/benchmark_shards.py
+    uv run python scripts/benchmark_shards.py --vectors 500000 --shards 2 4 8
+
+Output:
+    One table row per layout and operation. Worker processes only add
+    throughput when the machine has a free core per shard.
+
+No API calls are made.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Add src to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.rag.retriever import build_vector_index
+from src.rag.sharding import ShardedRetriever, build_sharded_index
+
+
+def timed(label: str, seconds: float, operations: int, unit: str) -> None:
+    """Print one result row."""
+    rate = operations / seconds if seconds else float("inf")
+    print(f"{label:<34} {seconds * 1000:>10.1f} ms {rate:>12.1f} {unit}/s")
+
+
+def main():
+    """Run the comparison and print the table."""
+    parser = argparse.ArgumentParser(description="Benchmark sharded vector search")
+    parser.add_argument("--vectors", type=int, default=200_000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=64)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((args.vectors, args.dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    ids = [f"chunk-{i}" for i in range(args.vectors)]
+    queries = vectors[rng.integers(0, args.vectors, args.queries)] + 0.05
+
+    print("=" * 70)
+    print(
+        f"Shard benchmark: {args.vectors} x {args.dim}, k={args.k}, "
+        f"{os.cpu_count()} CPUs"
+    )
+    print("=" * 70)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        single = build_vector_index(Path(tmp) / "single", ids, vectors)
+        start = time.perf_counter()
+        truth = single.search_batch(queries, args.k)
+        timed("single: batched query", time.perf_counter() - start, len(queries), "q")
+        start = time.perf_counter()
+        for query in queries:
+            single.search(query, args.k)
+        timed("single: single queries", time.perf_counter() - start, len(queries), "q")
+
+        for shards in args.shards:
+            build_sharded_index(Path(tmp) / f"shards{shards}", ids, vectors, shards)
+            for shared in (False, True):
+                label = f"{shards} shards{' (shm)' if shared else ''}"
+                sharded = ShardedRetriever(
+                    Path(tmp) / f"shards{shards}", timeout=60, shared_memory=shared
+                )
+                try:
+                    sharded.search(queries[0], args.k)  # Warm the workers
+                    start = time.perf_counter()
+                    found = sharded.search_batch(queries, args.k)
+                    timed(
+                        f"{label}: batched query",
+                        time.perf_counter() - start,
+                        len(queries),
+                        "q",
+                    )
+                    start = time.perf_counter()
+                    for query in queries:
+                        sharded.search(query, args.k)
+                    timed(
+                        f"{label}: single queries",
+                        time.perf_counter() - start,
+                        len(queries),
+                        "q",
+                    )
+                    if found != truth:
+                        print(f"{label}: results differ from the single index")
+                finally:
+                    sharded.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,8 @@
 
 from typing import Any
 
+from src.agents.observations import compress_observation
+from src.agents.sandbox import run_tool
 from src.agents.tools import Tool, get_all_tools
 from src.config import DEFAULT_MAX_TOKENS, MODEL_NAME
 
@@ -98,10 +100,10 @@ repeat Thought/Action as needed until you can provide a final Answer.
         Raises:
             ValueError: If tool_name is not found
         """
-        # Find the tool by name
+        # Find the tool by name (isolated tools run in the sandbox)
         for tool in self.tools:
             if tool.name == tool_name:
-                return tool.function(tool_input)
+                return run_tool(tool, tool_input)
 
         # Tool not found
         raise ValueError(f"Unknown tool: {tool_name}")
@@ -117,6 +119,24 @@ repeat Thought/Action as needed until you can provide a final Answer.
         """
         return f"Observation: {result}"
 
+    def _compress_result(self, tool_name: str, tool_input: str, result: str) -> str:
+        """Shrink a tool result for the prompt using the tool's observation policy.
+
+        Args:
+            tool_name: Name of the tool that produced the result
+            tool_input: Input the tool was called with (focuses summaries)
+            result: Full tool result
+
+        Returns:
+            Result compressed to fit the tool's observation budget
+        """
+        for tool in self.tools:
+            if tool.name == tool_name:
+                return compress_observation(
+                    result, tool.observation_policy, query=tool_input
+                )
+        return result
+
     def run(self, query: str) -> str:
         """Run the agent on a query using ReAct loop.
 
@@ -160,12 +180,15 @@ repeat Thought/Action as needed until you can provide a final Answer.
             tool_name, tool_input = action
             tool_result = self._execute_tool(tool_name, tool_input)
 
-            # Format observation
+            # Format observation (the transcript keeps the full result)
             observation = self._format_observation(tool_result)
             conversation += f"{observation}\n\n"
 
-            # Add to conversation for next iteration
+            # Add to conversation for next iteration, compressed to fit the prompt
+            prompt_observation = self._format_observation(
+                self._compress_result(tool_name, tool_input, tool_result)
+            )
             messages.append({"role": "assistant", "content": llm_response})
-            messages.append({"role": "user", "content": observation})
+            messages.append({"role": "user", "content": prompt_observation})
 
         return conversation.strip()
@@ -0,0 +1,235 @@
+"""Semantic cache of agent answers for near-duplicate queries.
+
+Users often ask the same question in different words, and every one of them
+reruns the full ReAct loop (several LLM calls plus tool calls). The cache
+sits in front of ``AsyncAgent.run``/``run_streaming``:
+
+- **Lookup**: an identical normalized query is found without embedding at
+  all. With a ``similarity`` threshold, other queries are embedded with the
+  embedding service and compared with the queries of all live entries in one
+  matrix-vector product; the most similar entry at or above it is a hit.
+  Without one (the default, see ANSWER_CACHE_SIMILARITY) only exact
+  normalized queries hit.
+- **Expiry**: entries older than ``ttl`` seconds are misses and are dropped,
+  and beyond ``max_entries`` the least recently used entry is evicted.
+- **Invalidation**: the cache remembers the corpus fingerprint (see
+  corpus_fingerprint) its entries were stored under. When documents are
+  re-indexed or notes saved the fingerprint changes and the whole cache is
+  cleared, since any answer may have depended on the changed data.
+
+Only runs that end in an ``Answer:`` and whose tools are all ``cacheable``
+are stored, so a cache hit never skips a side effect such as saving a note.
+Runs that ran out of iterations or observed an ``Error:`` result are not
+stored either, so a failure is never replayed.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from typing import Callable, Hashable, Literal
+
+import numpy as np
+
+from src.config import (
+    ANSWER_CACHE_MAX_ENTRIES,
+    ANSWER_CACHE_SIMILARITY,
+    ANSWER_CACHE_TTL_SECONDS,
+    CORPUS_INDEX_DIR,
+    NOTES_DIR,
+    RAG_INDEX_DIR,
+)
+from src.rag.embeddings import EmbeddingService, get_embedding_service
+from src.rag.retriever import normalize_query
+from src.tui.events import AgentEvent
+
+
+def corpus_fingerprint() -> tuple:
+    """Cheap signature of the data the agent's tools read.
+
+    Stats the search_web index, the published RAG index generation, the note
+    directory and the note write-ahead log, so it changes whenever documents
+    are re-indexed or a note is saved (by this or another process).
+
+    Returns:
+        Hashable tuple of (mtime_ns, size) per watched path (None if missing)
+    """
+    signature = []
+    for path in (
+        CORPUS_INDEX_DIR / "meta.json",
+        RAG_INDEX_DIR / "CURRENT",
+        NOTES_DIR,
+        NOTES_DIR / ".wal" / "active.log",
+    ):
+        try:
+            stat = Path(path).stat()
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            signature.append(None)
+    return tuple(signature)
+
+
+@dataclass
+class CachedAnswer:
+    """A stored agent result.
+
+    Attributes:
+        query: The query that produced the answer
+        transcript: Result of AsyncAgent.run (None if only streamed)
+        events: Events of AsyncAgent.run_streaming (None if only run)
+        created: time.monotonic() when the entry was first stored
+        similarity: Similarity to the query of the lookup that returned it
+    """
+
+    query: str
+    transcript: str | None = None
+    events: list[AgentEvent] | None = None
+    created: float = field(default_factory=time.monotonic)
+    similarity: float = 1.0
+
+
+class SemanticAnswerCache:
+    """LRU + TTL cache of agent answers keyed by query embedding similarity."""
+
+    similarity: float | None
+    ttl: float
+    max_entries: int
+
+    def __init__(
+        self,
+        embedder: EmbeddingService | None = None,
+        similarity: float | None = ANSWER_CACHE_SIMILARITY,
+        ttl: float = ANSWER_CACHE_TTL_SECONDS,
+        max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+        corpus_version: Callable[[], Hashable] = corpus_fingerprint,
+    ) -> None:
+        """Create an empty cache.
+
+        Args:
+            embedder: Embeds queries (default: the shared embedding service)
+            similarity: Minimum cosine similarity for a hit (None = only
+                identical normalized queries hit)
+            ttl: Seconds an entry stays valid
+            max_entries: Entries kept before LRU eviction
+            corpus_version: Returns a value that changes when the data the
+                answers depend on changes
+        """
+        self.embedder = embedder or get_embedding_service()
+        self.similarity = similarity
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self.corpus_version = corpus_version
+        self.hits = 0
+        self.misses = 0
+        # Slot -> entry, least recently used first; each entry's query vector
+        # is row `slot` of _vectors so lookups score all entries at once
+        self._entries: OrderedDict[int, CachedAnswer] = OrderedDict()
+        self._by_text: dict[str, int] = {}
+        self._vectors = np.zeros((self.max_entries, self.embedder.dim), np.float32)
+        self._free = list(range(self.max_entries - 1, -1, -1))
+        self._version: Hashable = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Number of cached answers (including expired ones not yet dropped)."""
+        return len(self._entries)
+
+    def clear(self) -> None:
+        """Drop every entry."""
+        with self._lock:
+            self._entries.clear()
+            self._by_text.clear()
+            self._free = list(range(self.max_entries - 1, -1, -1))
+
+    def _check_version(self) -> None:
+        """Clear the cache if the corpus changed since the last call."""
+        version = self.corpus_version()
+        if version != self._version:
+            self._entries.clear()
+            self._by_text.clear()
+            self._free = list(range(self.max_entries - 1, -1, -1))
+            self._version = version
+
+    def _drop(self, slot: int) -> None:
+        """Remove one entry and free its vector row."""
+        entry = self._entries.pop(slot)
+        self._by_text.pop(normalize_query(entry.query), None)
+        self._free.append(slot)
+
+    def lookup(
+        self, query: str, require: Literal["transcript", "events"] | None = None
+    ) -> CachedAnswer | None:
+        """Find a live answer to the same or a similar enough query.
+
+        Args:
+            query: Incoming user query
+            require: Only consider entries that have this field set
+
+        Returns:
+            A copy of the cached answer with ``similarity`` set, or None
+        """
+        with self._lock:
+            self._check_version()
+            now = time.monotonic()
+            for slot in [
+                s for s, e in self._entries.items() if now - e.created > self.ttl
+            ]:
+                self._drop(slot)
+
+            usable = [
+                s
+                for s, e in self._entries.items()
+                if require is None or getattr(e, require) is not None
+            ]
+            slot = self._by_text.get(normalize_query(query))
+            if slot not in usable:
+                slot = None
+            score = 1.0
+            if slot is None and usable and self.similarity is not None:
+                slots = np.array(usable, dtype=np.intp)
+                scores = self._vectors[slots] @ self.embedder.embed_query(query)
+                best = int(np.argmax(scores))
+                if scores[best] >= self.similarity:
+                    slot, score = int(slots[best]), float(scores[best])
+            if slot is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(slot)
+            return replace(self._entries[slot], similarity=score)
+
+    def store(
+        self,
+        query: str,
+        transcript: str | None = None,
+        events: list[AgentEvent] | None = None,
+    ) -> None:
+        """Remember the result of a run, merging with an entry for the same query.
+
+        Args:
+            query: The query that was answered
+            transcript: Result of AsyncAgent.run
+            events: Events yielded by AsyncAgent.run_streaming
+        """
+        key = normalize_query(query)
+        vector = (
+            self.embedder.embed_query(query) if self.similarity is not None else None
+        )
+        with self._lock:
+            self._check_version()
+            slot = self._by_text.get(key)
+            if slot is None:
+                if not self._free:
+                    self._drop(next(iter(self._entries)))
+                slot = self._free.pop()
+                if vector is not None:
+                    self._vectors[slot] = vector
+                self._entries[slot] = CachedAnswer(query)
+                self._by_text[key] = slot
+            entry = self._entries[slot]
+            self._entries.move_to_end(slot)
+            if transcript is not None:
+                entry.transcript = transcript
+            if events is not None:
+                entry.events = list(events)
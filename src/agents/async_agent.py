@@ -2,6 +2,9 @@
 
 from typing import Any, AsyncGenerator
 
+from src.agents.answer_cache import SemanticAnswerCache
+from src.agents.observations import compress_observation
+from src.agents.sandbox import run_tool, run_tool_async
 from src.agents.tools import Tool, get_all_tools
 from src.config import DEFAULT_MAX_TOKENS, MODEL_NAME
 from src.tui.events import AgentEvent
@@ -13,17 +16,25 @@ class AsyncAgent:
     client: Any
     max_iterations: int
     tools: list[Tool]
-
-    def __init__(self, client: Any, max_iterations: int) -> None:
+    answer_cache: SemanticAnswerCache | None
+
+    def __init__(
+        self,
+        client: Any,
+        max_iterations: int,
+        answer_cache: SemanticAnswerCache | None = None,
+    ) -> None:
         """Initialize the async agent.
 
         Args:
             client: OpenAI client for LLM calls
             max_iterations: Maximum number of reasoning iterations
+            answer_cache: Reuse answers to near-duplicate queries (None disables)
         """
         self.client = client
         self.max_iterations = max_iterations
         self.tools = get_all_tools()
+        self.answer_cache = answer_cache
 
     def _build_system_prompt(self) -> str:
         """Build the system prompt with ReAct instructions and tool descriptions.
@@ -99,10 +110,30 @@ repeat Thought/Action as needed until you can provide a final Answer.
         Raises:
             ValueError: If tool_name is not found
         """
-        # Find the tool by name
+        # Find the tool by name (isolated tools run in the sandbox)
         for tool in self.tools:
             if tool.name == tool_name:
-                return tool.function(tool_input)
+                return run_tool(tool, tool_input)
+
+        # Tool not found
+        raise ValueError(f"Unknown tool: {tool_name}")
+
+    async def _execute_tool_async(self, tool_name: str, tool_input: str) -> str:
+        """Execute a tool without blocking the event loop on isolated tools.
+
+        Args:
+            tool_name: Name of the tool to execute
+            tool_input: Input string to pass to the tool
+
+        Returns:
+            Result string from the tool execution
+
+        Raises:
+            ValueError: If tool_name is not found
+        """
+        for tool in self.tools:
+            if tool.name == tool_name:
+                return await run_tool_async(tool, tool_input)
 
         # Tool not found
         raise ValueError(f"Unknown tool: {tool_name}")
@@ -118,6 +149,39 @@ repeat Thought/Action as needed until you can provide a final Answer.
         """
         return f"Observation: {result}"
 
+    def _compress_result(self, tool_name: str, tool_input: str, result: str) -> str:
+        """Shrink a tool result for the prompt using the tool's observation policy.
+
+        Args:
+            tool_name: Name of the tool that produced the result
+            tool_input: Input the tool was called with (focuses summaries)
+            result: Full tool result
+
+        Returns:
+            Result compressed to fit the tool's observation budget
+        """
+        for tool in self.tools:
+            if tool.name == tool_name:
+                return compress_observation(
+                    result, tool.observation_policy, query=tool_input
+                )
+        return result
+
+    def _is_cacheable(self, tool_name: str, result: str) -> bool:
+        """Whether a run that called this tool may be stored in the answer cache.
+
+        Args:
+            tool_name: Name of a called tool
+            result: What the call returned
+
+        Returns:
+            The tool's cacheable flag (False for unknown tools), or False if
+            the call failed, so a failure is never replayed
+        """
+        if result.startswith("Error:"):
+            return False
+        return any(tool.name == tool_name and tool.cacheable for tool in self.tools)
+
     async def run(self, query: str) -> str:
         """Run the agent on a query using ReAct loop (async version).
 
@@ -127,6 +191,11 @@ repeat Thought/Action as needed until you can provide a final Answer.
         Returns:
             String containing the conversation history with all reasoning steps
         """
+        if self.answer_cache is not None:
+            cached = self.answer_cache.lookup(query, require="transcript")
+            if cached is not None and cached.transcript is not None:
+                return cached.transcript
+
         # Build system prompt
         system_prompt = self._build_system_prompt()
 
@@ -137,6 +206,8 @@ repeat Thought/Action as needed until you can provide a final Answer.
         ]
 
         conversation = f"User: {query}\n\n"
+        cacheable = True
+        answered = False
 
         # ReAct loop
         for iteration in range(self.max_iterations):
@@ -155,21 +226,29 @@ repeat Thought/Action as needed until you can provide a final Answer.
 
             # If no action, agent has provided final answer
             if action is None:
+                answered = "Answer:" in llm_response
                 break
 
             # Execute tool
             tool_name, tool_input = action
-            tool_result = self._execute_tool(tool_name, tool_input)
+            tool_result = await self._execute_tool_async(tool_name, tool_input)
+            cacheable = cacheable and self._is_cacheable(tool_name, tool_result)
 
-            # Format observation
+            # Format observation (the transcript keeps the full result)
             observation = self._format_observation(tool_result)
             conversation += f"{observation}\n\n"
 
-            # Add to conversation for next iteration
+            # Add to conversation for next iteration, compressed to fit the prompt
+            prompt_observation = self._format_observation(
+                self._compress_result(tool_name, tool_input, tool_result)
+            )
             messages.append({"role": "assistant", "content": llm_response})
-            messages.append({"role": "user", "content": observation})
+            messages.append({"role": "user", "content": prompt_observation})
 
-        return conversation.strip()
+        transcript = conversation.strip()
+        if self.answer_cache is not None and cacheable and answered:
+            self.answer_cache.store(query, transcript=transcript)
+        return transcript
 
     async def run_streaming(self, query: str) -> AsyncGenerator[AgentEvent, None]:
         """Run the agent on a query with streaming token events.
@@ -178,8 +257,29 @@ repeat Thought/Action as needed until you can provide a final Answer.
             query: User's question or request
 
         Yields:
-            AgentEvent objects for each token and ReAct step
+            AgentEvent objects for each token and ReAct step. Answers served
+            from the answer cache are re-streamed with ``cached`` and
+            ``similarity`` in each event's metadata.
         """
+        if self.answer_cache is not None:
+            cached = self.answer_cache.lookup(query, require="events")
+            if cached is not None and cached.events is not None:
+                for event in cached.events:
+                    yield AgentEvent(
+                        type=event.type,
+                        content=event.content,
+                        metadata={
+                            **event.metadata,
+                            "cached": True,
+                            "similarity": cached.similarity,
+                        },
+                    )
+                return
+
+        recorded: list[AgentEvent] = []
+        cacheable = True
+        answered = False
+
         # Build system prompt
         system_prompt = self._build_system_prompt()
 
@@ -209,47 +309,62 @@ repeat Thought/Action as needed until you can provide a final Answer.
                     llm_response += token
 
                     # Yield token event
-                    yield AgentEvent(
+                    event = AgentEvent(
                         type="token",
                         content=token,
                         metadata={"iteration": iteration},
                     )
+                    recorded.append(event)
+                    yield event
 
             # Parse action
             action = self._parse_action(llm_response)
 
             # If no action, agent has provided final answer
             if action is None:
+                answered = "Answer:" in llm_response
                 break
 
             # Execute tool
             tool_name, tool_input = action
-            tool_result = self._execute_tool(tool_name, tool_input)
+            tool_result = await self._execute_tool_async(tool_name, tool_input)
+            cacheable = cacheable and self._is_cacheable(tool_name, tool_result)
 
-            # Format observation
+            # Format observation (the TUI shows the full result)
             observation = self._format_observation(tool_result)
-
-            # Yield newline before observation for proper formatting
-            yield AgentEvent(
-                type="token",
-                content="\n",
-                metadata={"iteration": iteration},
+            prompt_observation = self._format_observation(
+                self._compress_result(tool_name, tool_input, tool_result)
             )
 
-            # Yield observation event
-            yield AgentEvent(
-                type="observation",
-                content=observation,
-                metadata={"iteration": iteration, "tool": tool_name},
-            )
-
-            # Yield newline after observation for proper formatting
-            yield AgentEvent(
-                type="token",
-                content="\n",
-                metadata={"iteration": iteration},
-            )
-
-            # Add to conversation for next iteration
+            # Newlines around the observation event for proper formatting
+            for event in (
+                AgentEvent(
+                    type="token",
+                    content="\n",
+                    metadata={"iteration": iteration},
+                ),
+                AgentEvent(
+                    type="observation",
+                    content=observation,
+                    metadata={
+                        "iteration": iteration,
+                        "tool": tool_name,
+                        "compressed": prompt_observation != observation,
+                    },
+                ),
+                AgentEvent(
+                    type="token",
+                    content="\n",
+                    metadata={"iteration": iteration},
+                ),
+            ):
+                recorded.append(event)
+                yield event
+
+            # Add to conversation for next iteration, compressed to fit the prompt
             messages.append({"role": "assistant", "content": llm_response})
-            messages.append({"role": "user", "content": observation})
+            messages.append({"role": "user", "content": prompt_observation})
+
+        # Only a run that finished (not one the consumer stopped) is stored
+        if self.answer_cache is not None and cacheable and answered:
+            self.answer_cache.store(query, events=recorded)
@@ -0,0 +1,141 @@
+"""Observation size limiting before tool results re-enter the prompt.
+
+Every observation is appended to ``messages`` and re-sent on each later
+iteration, so one large search result or file read can crowd out the rest of
+the context window. Each tool can declare an ObservationPolicy that decides
+how its result is shrunk for the prompt:
+
+- ``full``: send the result unchanged.
+- ``head_tail``: keep the beginning and end, drop the middle.
+- ``digest``: collapse duplicate lines (with a repeat count), then head/tail.
+- ``summary``: keep the sentences that best match the query, in order.
+
+Results that already fit within ``max_chars`` are never changed. The agents
+keep the full result in the transcript (and TUI observation events); only
+the copy sent back to the LLM is compressed.
+"""
+
+from dataclasses import dataclass
+from typing import Literal
+
+from src.config import OBSERVATION_MAX_CHARS
+from src.rag.sparse import tokenize
+
+ObservationMode = Literal["full", "head_tail", "digest", "summary"]
+
+
+@dataclass(frozen=True)
+class ObservationPolicy:
+    """How a tool's result is shrunk before it is added to the prompt.
+
+    Attributes:
+        mode: Compression strategy (see module docstring)
+        max_chars: Character budget for the compressed observation
+    """
+
+    mode: ObservationMode = "head_tail"
+    max_chars: int = OBSERVATION_MAX_CHARS
+
+
+def _head_tail(text: str, max_chars: int) -> str:
+    """Keep roughly two thirds of the budget from the start, one third from the end."""
+    omitted = len(text) - max_chars
+    while True:
+        # The marker's own length comes out of the budget, so it hides more
+        marker = f"\n[... {omitted} characters omitted ...]\n"
+        budget = max(max_chars - len(marker), 0)
+        if len(text) - budget == omitted:
+            break
+        omitted = len(text) - budget
+    head = budget * 2 // 3
+    tail = budget - head
+    return text[:head] + marker + (text[-tail:] if tail else "")
+
+
+def _digest(text: str) -> str:
+    """Collapse repeated lines, keeping the first occurrence and a count."""
+    counts: dict[str, int] = {}
+    order: list[str] = []
+    for line in text.splitlines():
+        key = " ".join(line.split())
+        if not key:
+            continue
+        if key not in counts:
+            order.append(key)
+            counts[key] = 0
+        counts[key] += 1
+    return "\n".join(
+        f"{line} [x{counts[line]}]" if counts[line] > 1 else line for line in order
+    )
+
+
+def _split_sentences(text: str) -> list[str]:
+    """Split text into lines, then lines into sentences."""
+    sentences = []
+    for line in text.splitlines():
+        start = 0
+        for i, char in enumerate(line):
+            if char in ".!?" and (i + 1 == len(line) or line[i + 1] == " "):
+                sentences.append(line[start : i + 1].strip())
+                start = i + 1
+        if line[start:].strip():
+            sentences.append(line[start:].strip())
+    return [s for s in sentences if s]
+
+
+def _summary(text: str, query: str, max_chars: int) -> str:
+    """Pick the sentences with the most query-term overlap until the budget is full.
+
+    Earlier sentences win ties, since tools usually put the most relevant
+    content (titles, top results) first. Falls back to head/tail when no
+    sentence fits the budget on its own.
+    """
+    sentences = _split_sentences(text)
+    terms = set(tokenize(query))
+    scored = []
+    for position, sentence in enumerate(sentences):
+        overlap = len(terms & set(tokenize(sentence)))
+        scored.append((-overlap, position, sentence))
+    scored.sort()
+
+    chosen: list[tuple[int, str]] = []
+    used = 0
+    for _, position, sentence in scored:
+        cost = len(sentence) + 1
+        if used + cost > max_chars:
+            continue
+        chosen.append((position, sentence))
+        used += cost
+    if not chosen:
+        return _head_tail(text, max_chars)
+    chosen.sort()
+
+    omitted = len(sentences) - len(chosen)
+    summary = "\n".join(sentence for _, sentence in chosen)
+    if omitted:
+        summary += f"\n[... {omitted} less relevant sentences omitted ...]"
+    return summary
+
+
+def compress_observation(result: str, policy: ObservationPolicy, query: str) -> str:
+    """Shrink a tool result to fit its observation policy.
+
+    Args:
+        result: Full tool result
+        policy: Policy of the tool that produced the result
+        query: Tool input, used to focus extractive summaries
+
+    Returns:
+        The result unchanged if it fits, otherwise a compressed version
+        of at most roughly ``policy.max_chars`` characters
+    """
+    if policy.mode == "full" or len(result) <= policy.max_chars:
+        return result
+    if policy.mode == "digest":
+        digested = _digest(result)
+        if len(digested) <= policy.max_chars:
+            return digested
+        return _head_tail(digested, policy.max_chars)
+    if policy.mode == "summary":
+        return _summary(result, query, policy.max_chars)
+    return _head_tail(result, policy.max_chars)
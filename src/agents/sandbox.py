@@ -0,0 +1,333 @@
+"""Process-pool sandbox for CPU-heavy or untrusted tools.
+
+Tools marked ``isolated=True`` do not run inside the agent process. Instead
+they are sent to a warm pool of worker processes, so a tool that holds the
+GIL, loops forever or allocates without bound cannot stall the ReAct loop or
+the TUI. Each call is guarded by:
+
+- **Timeout**: the worker is killed and replaced if it does not answer in time.
+- **Memory cap**: workers run under ``RLIMIT_AS`` (where the OS supports it).
+- **Size limits**: oversized inputs are rejected before they are sent and
+  oversized outputs are rejected inside the worker before they are returned.
+- **Recycling**: workers are replaced after a fixed number of calls, which
+  bounds slow leaks in tool code.
+
+Isolated tool functions must be importable module-level functions, because
+they are pickled by reference into the worker processes.
+"""
+
+import asyncio
+import multiprocessing
+import pickle
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from multiprocessing.connection import Connection
+from multiprocessing.process import BaseProcess
+from typing import Callable
+
+from src.agents.tools import Tool
+from src.config import (
+    TOOL_MAX_INPUT_BYTES,
+    TOOL_MAX_OUTPUT_BYTES,
+    TOOL_MAX_TASKS_PER_WORKER,
+    TOOL_MEMORY_LIMIT_MB,
+    TOOL_SANDBOX_WORKERS,
+    TOOL_TIMEOUT_SECONDS,
+)
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - Windows has no resource module
+    resource = None
+
+
+class ToolSandboxError(Exception):
+    """Raised when an isolated tool call fails inside the sandbox."""
+
+
+class ToolTimeoutError(ToolSandboxError):
+    """Raised when an isolated tool call exceeds its timeout."""
+
+
+def _worker_main(conn: Connection, memory_limit_bytes: int) -> None:
+    """Serve tool calls from the parent until told to stop.
+
+    Messages are ``(function, argument, max_output_bytes)`` tuples; replies are
+    ``("ok", result)``, ``("error", message)``, or ``("fatal", message)`` when
+    the worker is about to exit. ``None`` shuts the worker down.
+    """
+    if resource is not None and memory_limit_bytes > 0:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit_bytes, memory_limit_bytes))
+
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            return
+        if message is None:
+            return
+
+        function, argument, max_output_bytes = message
+        try:
+            result = str(function(argument))
+        except MemoryError:
+            # Heap state is suspect after a MemoryError: ask to be replaced
+            conn.send(("fatal", "MemoryError: tool exceeded the worker memory limit"))
+            return
+        except Exception as exc:
+            conn.send(("error", f"{type(exc).__name__}: {exc}"))
+            continue
+
+        size = len(result.encode("utf-8"))
+        if size > max_output_bytes:
+            conn.send(
+                (
+                    "error",
+                    f"Tool output of {size} bytes exceeds the "
+                    f"{max_output_bytes}-byte limit",
+                )
+            )
+        else:
+            conn.send(("ok", result))
+
+
+@dataclass(eq=False)
+class _Worker:
+    """A worker process and the parent's end of its pipe."""
+
+    process: BaseProcess
+    conn: Connection
+    tasks: int = 0
+
+
+class ToolSandbox:
+    """Warm pool of worker processes that run isolated tools with limits."""
+
+    workers: int
+    timeout: float
+    memory_limit_mb: int
+    max_tasks_per_worker: int
+    max_input_bytes: int
+    max_output_bytes: int
+
+    def __init__(
+        self,
+        workers: int = TOOL_SANDBOX_WORKERS,
+        timeout: float = TOOL_TIMEOUT_SECONDS,
+        memory_limit_mb: int = TOOL_MEMORY_LIMIT_MB,
+        max_tasks_per_worker: int = TOOL_MAX_TASKS_PER_WORKER,
+        max_input_bytes: int = TOOL_MAX_INPUT_BYTES,
+        max_output_bytes: int = TOOL_MAX_OUTPUT_BYTES,
+    ) -> None:
+        """Start the worker pool.
+
+        Args:
+            workers: Number of worker processes kept warm
+            timeout: Default per-call timeout in seconds
+            memory_limit_mb: Address-space cap per worker (0 disables it)
+            max_tasks_per_worker: Calls served before a worker is recycled
+            max_input_bytes: Largest accepted tool input
+            max_output_bytes: Largest accepted tool output
+        """
+        self.workers = workers
+        self.timeout = timeout
+        self.memory_limit_mb = memory_limit_mb
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self.max_input_bytes = max_input_bytes
+        self.max_output_bytes = max_output_bytes
+        # spawn, not fork: the TUI runs threads, and forking those is unsafe
+        self._ctx = multiprocessing.get_context("spawn")
+        self._idle: queue.Queue[_Worker] = queue.Queue()
+        self._all: set[_Worker] = set()
+        self._lock = threading.Lock()
+        self._closed = False
+        for _ in range(workers):
+            self._idle.put(self._spawn())
+
+    def _spawn(self) -> _Worker:
+        """Start a new worker process."""
+        parent_conn, child_conn = self._ctx.Pipe()
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(child_conn, self.memory_limit_mb * 1024 * 1024),
+            daemon=True,
+        )
+        process.start()
+        child_conn.close()
+        worker = _Worker(process=process, conn=parent_conn)
+        with self._lock:
+            self._all.add(worker)
+        return worker
+
+    def _retire(self, worker: _Worker) -> None:
+        """Stop a worker, forcefully if it does not exit promptly."""
+        with self._lock:
+            self._all.discard(worker)
+        if worker.process.is_alive():
+            worker.process.terminate()
+            worker.process.join(timeout=1)
+            if worker.process.is_alive():
+                worker.process.kill()
+                worker.process.join()
+        worker.conn.close()
+
+    def run(
+        self,
+        function: Callable[[str], str],
+        argument: str,
+        timeout: float | None = None,
+    ) -> str:
+        """Run a function in a worker process.
+
+        Args:
+            function: Module-level function taking and returning a string
+            argument: Tool input
+            timeout: Seconds to wait for a free worker and its answer together
+                (defaults to the sandbox timeout)
+
+        Returns:
+            The function's result
+
+        Raises:
+            ToolTimeoutError: If no worker is free or the call takes too long
+            ToolSandboxError: If the input/output is too large, the function
+                raises, or the worker crashes
+        """
+        timeout = self.timeout if timeout is None else timeout
+        size = len(argument.encode("utf-8"))
+        if size > self.max_input_bytes:
+            raise ToolSandboxError(
+                f"Tool input of {size} bytes exceeds the "
+                f"{self.max_input_bytes}-byte limit"
+            )
+        if self._closed:
+            raise ToolSandboxError("Tool sandbox is closed")
+
+        deadline = time.monotonic() + timeout
+        try:
+            worker = self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise ToolTimeoutError(
+                f"No sandbox worker became free within {timeout:g}s"
+            ) from None
+        replacement_needed = True
+        try:
+            if not worker.process.is_alive():
+                self._retire(worker)
+                worker = self._spawn()
+            try:
+                worker.conn.send((function, argument, self.max_output_bytes))
+            except (pickle.PicklingError, AttributeError, TypeError) as exc:
+                replacement_needed = False
+                raise ToolSandboxError(
+                    f"Cannot send {getattr(function, '__name__', function)!r} to "
+                    f"the sandbox; isolated tools must be module-level functions"
+                ) from exc
+
+            if not worker.conn.poll(max(0.0, deadline - time.monotonic())):
+                raise ToolTimeoutError(f"Tool call timed out after {timeout:g}s")
+            try:
+                status, payload = worker.conn.recv()
+            except (EOFError, OSError):
+                worker.process.join(timeout=1)
+                raise ToolSandboxError(
+                    f"Sandbox worker exited unexpectedly "
+                    f"(exit code {worker.process.exitcode})"
+                ) from None
+
+            worker.tasks += 1
+            replacement_needed = (
+                status == "fatal" or worker.tasks >= self.max_tasks_per_worker
+            )
+            if status != "ok":
+                raise ToolSandboxError(payload)
+            return payload
+        finally:
+            if replacement_needed or self._closed:
+                self._retire(worker)
+                if not self._closed:
+                    self._idle.put(self._spawn())
+            else:
+                self._idle.put(worker)
+
+    async def run_async(
+        self,
+        function: Callable[[str], str],
+        argument: str,
+        timeout: float | None = None,
+    ) -> str:
+        """Run a function in a worker without blocking the event loop.
+
+        Args:
+            function: Module-level function taking and returning a string
+            argument: Tool input
+            timeout: Seconds to wait for a free worker and its answer together
+                (defaults to the sandbox timeout)
+
+        Returns:
+            The function's result
+        """
+        return await asyncio.to_thread(self.run, function, argument, timeout)
+
+    def close(self) -> None:
+        """Stop all worker processes."""
+        self._closed = True
+        with self._lock:
+            workers = list(self._all)
+        for worker in workers:
+            self._retire(worker)
+
+
+_default_sandbox: ToolSandbox | None = None
+_default_sandbox_lock = threading.Lock()
+
+
+def get_tool_sandbox() -> ToolSandbox:
+    """Return the process-wide sandbox, starting its workers on first use.
+
+    Returns:
+        Shared ToolSandbox instance
+    """
+    global _default_sandbox
+    with _default_sandbox_lock:
+        if _default_sandbox is None:
+            _default_sandbox = ToolSandbox()
+        return _default_sandbox
+
+
+def run_tool(tool: Tool, tool_input: str) -> str:
+    """Run a tool in-process, or in the sandbox if it is marked isolated.
+
+    Sandbox failures (timeouts, crashes, limit violations, tool exceptions) are
+    returned as an error message so the agent can observe them and carry on.
+
+    Args:
+        tool: Tool to run
+        tool_input: Input string for the tool
+
+    Returns:
+        Tool result, or an "Error: ..." message for sandbox failures
+    """
+    if not tool.isolated:
+        return tool.function(tool_input)
+    try:
+        return get_tool_sandbox().run(tool.function, tool_input, timeout=tool.timeout)
+    except ToolSandboxError as exc:
+        return f"Error: {tool.name} failed in sandbox: {exc}"
+
+
+async def run_tool_async(tool: Tool, tool_input: str) -> str:
+    """Async variant of run_tool that keeps isolated calls off the event loop.
+
+    Args:
+        tool: Tool to run
+        tool_input: Input string for the tool
+
+    Returns:
+        Tool result, or an "Error: ..." message for sandbox failures
+    """
+    if not tool.isolated:
+        return tool.function(tool_input)
+    return await asyncio.to_thread(run_tool, tool, tool_input)
@@ -1,62 +1,97 @@
-"""Tool interface and placeholder implementations for Phase 1."""
+"""Tool interface and implementations available to the agents."""
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Callable
 
+from src.agents.observations import ObservationPolicy
+from src.config import CORPUS_INDEX_WAIT_SECONDS, NOTE_SEARCH_TOP_K, SEARCH_WEB_TOP_K
+from src.notes.index import get_note_index
+from src.notes.store import get_note_store
+from src.rag.corpus import get_corpus_index
+
 
 @dataclass
 class Tool:
-    """Represents a tool the agent can use."""
+    """Represents a tool the agent can use.
+
+    Attributes:
+        name: Tool name the LLM uses in "Action: <name>: <input>"
+        description: One-line description shown in the system prompt
+        function: Implementation taking and returning a string
+        isolated: Run in the process-pool sandbox instead of in-process
+            (for CPU-heavy tools; function must be a module-level function)
+        timeout: Per-call timeout in seconds for isolated tools (None = default)
+        observation_policy: How results are shrunk before re-entering the
+            prompt (see src/agents/observations.py)
+        cacheable: Whether answers of runs calling this tool may be reused by
+            the answer cache (False for tools with side effects)
+    """
 
     name: str
     description: str
     function: Callable[[str], str]
+    isolated: bool = False
+    timeout: float | None = None
+    observation_policy: ObservationPolicy = field(default_factory=ObservationPolicy)
+    cacheable: bool = True
 
 
 def _search_web_impl(query: str) -> str:
-    """Placeholder implementation of web search."""
-    return (
-        f"MOCK SEARCH RESULTS for '{query}':\n"
-        f"1. Example result about {query}\n"
-        f"2. Another result for {query}"
-    )
+    """Search the offline document corpus in data/.
+
+    Args:
+        query: Free-text search query
+
+    Returns:
+        Numbered list of ranked documents with highlighted snippets
+    """
+    index = get_corpus_index(timeout=CORPUS_INDEX_WAIT_SECONDS)
+    lines = [f"SEARCH RESULTS for '{query}':"]
+    if index is None:
+        lines.append("The local corpus is still being indexed; try again shortly.")
+        return "\n".join(lines)
+    results = index.search(query, k=SEARCH_WEB_TOP_K)
+    if not results:
+        lines.append("No matching documents in the local corpus.")
+    for rank, result in enumerate(results, start=1):
+        lines.append(f"{rank}. {result.title} (data/{result.path})")
+        lines.append(f"   {result.snippet}")
+    return "\n".join(lines)
 
 
 def get_search_web_tool() -> Tool:
-    """Returns the search_web tool."""
+    """Returns the search_web tool (and starts indexing data/ if needed)."""
+    get_corpus_index()
     return Tool(
         name="search_web",
-        description="Search the web for information about a query",
+        description="Search the offline document corpus in data/ for a query",
         function=_search_web_impl,
+        observation_policy=ObservationPolicy(mode="summary"),
     )
 
 
 def _save_note_impl(content: str) -> str:
-    """Mock implementation of save_note tool (Phase 1 placeholder).
+    """Persist a note to the note store.
 
     Extracts the title from the first line of content (expected format: "title: <name>")
-    and returns a mock success message. Does not actually save files yet.
+    and saves the remaining lines as the note body.
 
     Args:
         content: Note content where first line should be "title: <note name>"
 
     Returns:
-        Mock success message indicating the note was "saved"
+        Confirmation message with the note title and file it will be compacted to
 
     Example:
-        >>> _save_note_impl(r"title: Python Basics\nPython is a programming language")
-        "MOCK SAVE: Note 'Python Basics' saved successfully"
-        >>> _save_note_impl("Python is a programming language")
-        "MOCK SAVE: Note 'Python is a programming language' saved successfully"
-        >>> _save_note_impl("")
-        "MOCK SAVE: Note '' saved successfully"
+        >>> _save_note_impl("title: Python Basics\nPython is a programming language")
+        "Note 'Python Basics' saved to notes/python-basics.md"
     """
     # Split into first line (title) and rest (max 2 parts)
     lines = content.split("\n", 1)
-    # Note: split() always returns at least [''], so 'else "untitled"' is unreachable
-    # Kept as defensive programming for potential future changes
-    title = lines[0].replace("title:", "").strip() if lines else "untitled"
-    return f"MOCK SAVE: Note '{title}' saved successfully"
+    title = lines[0].replace("title:", "").strip()
+    body = lines[1].strip() if len(lines) > 1 else ""
+    note = get_note_store().save(title, body)
+    return f"Note '{title}' saved to notes/{note.slug}.md"
 
 
 def get_save_note_tool() -> Tool:
@@ -65,12 +100,55 @@ def get_save_note_tool() -> Tool:
         name="save_note",
         description="Save a note with title and content",
         function=_save_note_impl,
+        observation_policy=ObservationPolicy(mode="full"),
+        cacheable=False,
+    )
+
+
+def _search_notes_impl(query: str) -> str:
+    """Search saved notes with BM25 keyword ranking.
+
+    Args:
+        query: Free-text search query
+
+    Returns:
+        Numbered list of matching notes with a short preview of each
+    """
+    store = get_note_store()
+    hits = get_note_index().search(query, k=NOTE_SEARCH_TOP_K)
+    if not hits:
+        return f"No notes found for '{query}'"
+
+    lines = [f"NOTES matching '{query}':"]
+    for rank, (slug, score) in enumerate(hits, start=1):
+        note = store.get(slug)
+        if note is None:
+            continue
+        preview = " ".join(note.content.split())[:200]
+        lines.append(f"{rank}. {note.title} (notes/{slug}.md, score {score:.2f})")
+        lines.append(f"   {preview}")
+    return "\n".join(lines)
+
+
+def get_search_notes_tool() -> Tool:
+    """Returns the search_notes tool."""
+    return Tool(
+        name="search_notes",
+        description="Search previously saved notes by keywords",
+        function=_search_notes_impl,
     )
 
 
 def get_all_tools() -> list[Tool]:
     """Returns all available tools."""
+    # None of these are isolated: each one works on process-wide state (the
+    # corpus index and its background builds, the note store's WAL and the
+    # note index listening to it) that sandbox workers would open separately.
+    # The untrusted documents in data/ are parsed in separate parser
+    # processes when the corpus is indexed (see src/rag/corpus.py); a search
+    # only re-reads its top SEARCH_WEB_TOP_K results to cut their snippets.
     return [
         get_search_web_tool(),
         get_save_note_tool(),
+        get_search_notes_tool(),
     ]
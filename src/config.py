@@ -25,6 +25,8 @@ Examples:
 """
 
 import os
+from pathlib import Path
+from typing import Literal
 
 # Model configuration
 MODEL_NAME: str = "gpt-5.1"
@@ -42,6 +44,240 @@ CRITICAL for POE API: Always set max_tokens to prevent runaway generation
 
 See docs/reference/poe-api-troubleshooting.md for details."""
 
+# Storage configuration
+PROJECT_ROOT: Path = Path(__file__).resolve().parent.parent
+"""Repository root, used to anchor the data/ and notes/ directories."""
+
+NOTES_DIR: Path = PROJECT_ROOT / "notes"
+"""Directory where save_note persists notes (one Markdown file per note)."""
+
+NOTE_WAL_COMPACT_BYTES: int = 4 * 1024 * 1024
+"""Size at which the note write-ahead log is sealed and compacted into note files.
+
+This also bounds crash recovery: at most one sealed and one active log of
+roughly this size are replayed when the note store is opened."""
+
+NOTE_INDEX_FLUSH_EVERY: int = 100
+"""Note index updates buffered in memory before they are written to disk as a
+new segment (on a background thread, off the save path)."""
+
+NOTE_INDEX_MAX_SEGMENTS: int = 8
+"""On-disk note index segments kept before they are merged into one."""
+
+NOTE_SEARCH_TOP_K: int = 5
+"""Maximum number of notes returned by the search_notes tool."""
+
+CORPUS_DIR: Path = PROJECT_ROOT / "data"
+"""Local document corpus (HTML, Markdown, text) searched by search_web."""
+
+CORPUS_INDEX_DIR: Path = CORPUS_DIR / ".index"
+"""Directory holding the on-disk inverted index over CORPUS_DIR."""
+
+CORPUS_BLOCK_POSTINGS: int = 2_000_000
+"""Postings buffered in memory while indexing before spilling a sorted segment.
+
+Bounds indexing memory (~10 bytes per posting) independently of corpus size."""
+
+CORPUS_SNIPPET_CHARS: int = 240
+"""Approximate length of the highlighted snippet shown for each search result."""
+
+SEARCH_WEB_TOP_K: int = 5
+"""Maximum number of documents returned by the search_web tool."""
+
+CORPUS_INDEX_WAIT_SECONDS: float = 10.0
+"""How long search_web waits for a background corpus index build before replying."""
+
+OBSERVATION_MAX_CHARS: int = 4000
+"""Default character budget for a tool observation sent back to the LLM.
+
+Larger results are compressed according to the tool's ObservationPolicy;
+the full result is still kept in the transcript."""
+
+# RAG configuration
+CHUNK_TARGET_TOKENS: int = 256
+"""Target chunk size in (approximate) tokens for RAG chunking."""
+
+CHUNK_OVERLAP_TOKENS: int = 32
+"""Maximum tokens repeated at the start of the next chunk for context."""
+
+NEAR_DUPLICATE_THRESHOLD: float = 0.8
+"""Word 3-gram Jaccard similarity at which bulk ingestion merges a chunk into
+an already stored one instead of embedding it."""
+
+MINHASH_PERMUTATIONS: int = 128
+"""MinHash functions per near-duplicate signature (estimate error ~1/sqrt(n))."""
+
+EMBEDDING_DIM: int = 384
+"""Vector dimension of the local hashing embedding backend."""
+
+EMBEDDING_BATCH_SIZE: int = 64
+"""Maximum number of texts sent to the embedding backend in one call."""
+
+EMBEDDING_BATCH_TOKENS: int = 8192
+"""Maximum approximate tokens sent to the embedding backend in one call."""
+
+EMBEDDING_CACHE_DIR: Path = PROJECT_ROOT / ".cache" / "embeddings"
+"""On-disk embedding cache, keyed by content hash and model ID."""
+
+QUERY_EMBEDDING_CACHE_ENTRIES: int = 4096
+"""Query vectors kept in memory by the embedding service (queries are not
+written to the on-disk cache); the least recently used go first."""
+
+VECTOR_DTYPE: Literal["float16", "int8"] = "float16"
+"""Storage type of vector index matrices: "float16" (exact to ~3 digits) or "int8"."""
+
+RETRIEVER_BLOCK_ROWS: int = 65536
+"""Vectors scored per matrix multiply; bounds the float32 working set of a search."""
+
+SHARD_TIMEOUT_SECONDS: float = 2.0
+"""Time a sharded search waits for the slowest shard before answering without it."""
+
+ANN_NPROBE: int = 16
+"""Inverted-file cells scanned per query by the ANN index (higher = better recall)."""
+
+ANN_REFINE_FACTOR: int = 10
+"""ANN candidates re-scored exactly, as a multiple of k (0 = PQ scores only)."""
+
+HYBRID_FUSION: Literal["rrf", "weighted"] = "rrf"
+"""How hybrid retrieval merges BM25 and vector rankings: "rrf" or "weighted"."""
+
+HYBRID_DENSE_WEIGHT: float = 0.5
+"""Weight of the vector ranking in hybrid fusion; BM25 gets the remainder."""
+
+HYBRID_CANDIDATES: int = 50
+"""Chunks ranked by each side of hybrid retrieval before fusion."""
+
+RRF_K: int = 60
+"""Reciprocal-rank fusion damping constant (the usual value from the RRF paper)."""
+
+RERANK_CANDIDATES: int = 20
+"""Fused candidates rescored by the optional rerank stage of hybrid retrieval."""
+
+RERANK_WEIGHTS: dict[str, float] = {
+    "similarity": 1.0,
+    "coverage": 0.5,
+    "proximity": 0.5,
+    "field": 0.25,
+}
+"""Weight of each rerank feature (all in [0, 1]) in the rerank score."""
+
+RERANK_CACHE_ENTRIES: int = 100_000
+"""(query, chunk) scores kept by a Reranker; least recently used go first."""
+
+RETRIEVAL_CACHE_BYTES: int = 32 * 1024 * 1024
+"""Approximate memory bound of the process-wide retrieval result cache."""
+
+CONTEXT_TOKEN_BUDGET: int = 1500
+"""Approximate tokens of retrieved context packed into the prompt."""
+
+CONTEXT_CANDIDATES: int = 30
+"""Chunks retrieved before MMR selection trims them to the token budget."""
+
+CONTEXT_MMR_LAMBDA: float = 0.7
+"""MMR relevance/diversity trade-off: 1.0 ranks by relevance alone."""
+
+CONTEXT_DUPLICATE_SIMILARITY: float = 0.95
+"""Chunks at least this similar to an already packed chunk are dropped."""
+
+RAG_INDEX_DIR: Path = PROJECT_ROOT / ".cache" / "rag-index"
+"""Generations of the hybrid index kept up to date by the index watcher."""
+
+RAG_KEEP_GENERATIONS: int = 2
+"""Published index generations kept on disk so readers can finish on old ones."""
+
+RAG_MERGE_DELTAS: int = 8
+"""Delta generations the index watcher stacks on one base before merging them.
+
+Each sync pass publishes only what changed, on top of the last full base.
+Readers replay every delta when they open a generation, so once this many
+have piled up the watcher folds them into a new base in the background."""
+
+RAG_SNAPSHOT_PATH: Path = PROJECT_ROOT / ".cache" / "rag-index.snapshot"
+"""Single-file, memory-mapped snapshot of the hybrid index for fast cold starts."""
+
+WATCH_INTERVAL_SECONDS: float = 2.0
+"""Seconds between stat scans of notes/ and data/ by the index watcher."""
+
+CHROMA_DIR: Path = PROJECT_ROOT / ".cache" / "chroma"
+"""Directory of the persistent ChromaDB client used by ChromaRetriever."""
+
+CHROMA_COLLECTION: str = "chunks"
+"""ChromaDB collection holding chunk embeddings."""
+
+CHROMA_UPSERT_BATCH: int = 4096
+"""Vectors per ChromaDB upsert call (capped by the client's maximum batch size)."""
+
+INGEST_QUEUE_BATCHES: int = 8
+"""Batches buffered between ingestion pipeline stages before the producer blocks."""
+
+INGEST_WRITE_CHUNKS: int = 4096
+"""Chunks applied to the indexes per bulk write during ingestion."""
+
+# Answer cache configuration
+ANSWER_CACHE_SIMILARITY: float | None = None
+"""Query embedding similarity at which a past answer is reused.
+
+None only reuses answers to the same normalized query. The default hashing
+embeddings measure word overlap, so queries that differ in one deciding word
+("... for CPU bound work" / "... for IO bound work") score above 0.93; set a
+threshold only with a semantic embedding model."""
+
+ANSWER_CACHE_TTL_SECONDS: float = 3600.0
+"""Seconds a cached answer stays valid."""
+
+ANSWER_CACHE_MAX_ENTRIES: int = 256
+"""Cached answers kept; the least recently used one is evicted beyond this."""
+
+# Tool sandbox configuration (tools marked isolated=True)
+TOOL_SANDBOX_WORKERS: int = 2
+"""Number of warm worker processes that run isolated tools."""
+
+TOOL_TIMEOUT_SECONDS: float = 30.0
+"""Default per-call timeout for isolated tools; the worker is killed on expiry."""
+
+TOOL_MEMORY_LIMIT_MB: int = 1024
+"""Address-space cap for each sandbox worker (RLIMIT_AS, 0 disables it)."""
+
+TOOL_MAX_TASKS_PER_WORKER: int = 100
+"""Calls a sandbox worker serves before it is recycled."""
+
+TOOL_MAX_INPUT_BYTES: int = 1024 * 1024
+"""Largest tool input accepted by the sandbox."""
+
+TOOL_MAX_OUTPUT_BYTES: int = 1024 * 1024
+"""Largest tool output returned from the sandbox."""
+
+# Filesystem MCP server configuration
+FS_ROOT: Path = PROJECT_ROOT
+"""Directory the filesystem MCP server exposes; paths outside it are refused."""
+
+FS_MAX_READ_BYTES: int = 64 * 1024
+"""Largest piece of a file returned by one read; larger ranges continue via a cursor."""
+
+FS_LIST_PAGE_SIZE: int = 200
+"""Directory entries returned per list_directory page."""
+
+FS_LISTING_CACHE_ENTRIES: int = 1024
+"""Directory listings cached by the filesystem server (checked against mtime)."""
+
+FS_LINE_INDEX_EVERY: int = 1024
+"""Lines between the byte offsets remembered for line-range reads of a file."""
+
+FS_SEARCH_MAX_RESULTS: int = 100
+"""Matches returned per page of a filesystem search."""
+
+FS_SEARCH_SCAN_LIMIT: int = 2000
+"""Matches after which a filesystem search stops reading files; ranking and
+pagination cover the matches found up to then."""
+
+FS_TRIGRAM_INDEX: bool = False
+"""Keep a trigram index of searched files so repeated searches only read the
+files that can contain the pattern's literal text (~4 bytes per distinct
+trigram per file of memory)."""
+
+FS_TRIGRAM_MAX_FILE_BYTES: int = 1024 * 1024
+"""Largest file kept in the trigram index; bigger files are always read."""
+
 # API configuration
 API_BASE_URL: str = "https://api.poe.com/v1"
 """Base URL for the POE API."""
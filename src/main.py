@@ -53,8 +53,9 @@ def run_repl() -> None:
     print("\nThis agent uses ReAct-style reasoning to answer questions.")
     print("You'll see the agent's Thoughts, Actions, and Observations.")
     print("\nAvailable tools:")
-    print("  - search_web: Search for information (placeholder)")
-    print("  - save_note: Save notes (placeholder)")
+    print("  - search_web: Search the local document corpus in data/")
+    print("  - save_note: Save notes to the notes/ directory")
+    print("  - search_notes: Search saved notes by keywords")
     print("\nType 'quit' or 'exit' to stop.\n")
 
     # Create client and agent
@@ -0,0 +1,951 @@
+"""Filesystem MCP server: bounded reads, listings and search over one tree.
+
+Agents explore large trees through small, explicit requests instead of
+moving whole files over the MCP transport:
+
+- **read_file** returns a byte range of a file and **read_lines** a line
+  range. Both slice a memory map, so only the pages of the requested range
+  are read, and both return at most ``FS_MAX_READ_BYTES``. A larger request
+  comes back in pieces, each with the cursor (``next_offset`` or
+  ``next_line``) of the next one, so a large file is streamed chunk by chunk
+  rather than built into one response.
+- Line ranges seek through a sparse line index (the byte offset of every
+  ``FS_LINE_INDEX_EVERY``-th line) built once per file version with numpy,
+  so reading lines near the end of a huge log does not rescan it.
+- **list_directory** pages through a directory. Sorted listings are cached
+  and reused while the directory's mtime is unchanged (adding, removing or
+  renaming an entry changes it). Sizes and mtimes on each page are always
+  fresh.
+- **stat** describes one path.
+- **search** is a parallel grep: batches of files are searched by a pool of
+  worker processes (regex matching holds the GIL, so threads would not
+  help), and no further files are read once ``FS_SEARCH_SCAN_LIMIT``
+  matches are found. Binary files and .gitignore'd paths are skipped. The
+  matches are ranked by file and returned a page at a time. With
+  ``FS_TRIGRAM_INDEX`` on, the trigrams of every searched file are kept, so
+  later searches skip, unread, the files lacking the pattern's literal text.
+
+Every path is relative to the server root (``FS_ROOT``) and refused if it
+resolves outside it, symlinks included.
+
+Run ``just mcp-filesystem`` to serve FS_ROOT over stdio.
+"""
+
+import argparse
+import base64
+import fnmatch
+import math
+import mmap
+import multiprocessing
+import os
+import re
+import stat as stat_module
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Generator, Iterator
+
+import numpy as np
+from fastmcp import FastMCP
+
+from src.config import (
+    FS_LINE_INDEX_EVERY,
+    FS_LIST_PAGE_SIZE,
+    FS_LISTING_CACHE_ENTRIES,
+    FS_MAX_READ_BYTES,
+    FS_ROOT,
+    FS_SEARCH_MAX_RESULTS,
+    FS_SEARCH_SCAN_LIMIT,
+    FS_TRIGRAM_INDEX,
+    FS_TRIGRAM_MAX_FILE_BYTES,
+)
+
+_SCAN_BYTES = 16 * 1024 * 1024  # Bytes scanned per numpy pass over a mapped file
+_RACY_NS = 2_000_000_000  # Listings of directories changed this recently aren't kept
+_SNIPPET_CHARS = 300  # Longest line text returned by search
+_SEARCH_BATCH = 32  # Files per search task sent to a worker process
+_BINARY_SNIFF_BYTES = 8000  # Leading bytes checked for NUL, as git does
+_NAME_BONUS = 2.0  # Rank bonus of files whose name matches the pattern
+_DEPTH_PENALTY = 0.05  # Rank penalty per directory level below the search root
+_ALWAYS_IGNORED = frozenset({".git"})
+
+# (directory of the .gitignore, pattern, negated, directories only, anchored)
+_IgnoreRule = tuple[str, str, bool, bool, bool]
+
+
+@contextmanager
+def _mapped(path: str | Path) -> Iterator[bytes | mmap.mmap]:
+    """Map a file read-only (empty files, which cannot be mapped, give b"")."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield b""
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield mm
+
+
+def _newlines(data: bytes | mmap.mmap, start: int, end: int) -> np.ndarray:
+    """Offsets of the newline bytes in data[start:end], scanned in segments."""
+    found = []
+    for begin in range(start, end, _SCAN_BYTES):
+        count = min(_SCAN_BYTES, end - begin)
+        segment = np.frombuffer(data, dtype=np.uint8, count=count, offset=begin)
+        found.append(np.flatnonzero(segment == 0x0A) + begin)
+    return np.concatenate(found) if found else np.empty(0, dtype=np.int64)
+
+
+def _decode(data: bytes) -> tuple[str, str]:
+    """Return (content, encoding): UTF-8 text, or base64 for binary data."""
+    try:
+        return data.decode("utf-8"), "utf-8"
+    except UnicodeDecodeError:
+        return base64.b64encode(data).decode("ascii"), "base64"
+
+
+def _kind(mode: int) -> str:
+    """Entry type name for a stat mode."""
+    if stat_module.S_ISDIR(mode):
+        return "directory"
+    if stat_module.S_ISREG(mode):
+        return "file"
+    if stat_module.S_ISLNK(mode):
+        return "symlink"
+    return "other"
+
+
+def _ignore_rules(directory: str) -> list[_IgnoreRule]:
+    """Parse a directory's .gitignore (the common subset of its syntax).
+
+    Supported: comments, ``!`` negation, a trailing ``/`` for directories
+    only, and a leading or inner ``/`` anchoring the pattern to the
+    directory. Other patterns match file names at any depth below it.
+    """
+    try:
+        with open(os.path.join(directory, ".gitignore"), errors="replace") as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return []
+    rules = []
+    for line in lines:
+        line = line.rstrip()
+        if not line or line.startswith("#"):
+            continue
+        negated = line.startswith("!")
+        pattern = line[1:] if negated else line
+        directories_only = pattern.endswith("/")
+        pattern = pattern.rstrip("/")
+        anchored = "/" in pattern
+        pattern = pattern.lstrip("/")
+        if pattern.startswith("**/"):
+            pattern = pattern[3:]
+            anchored = "/" in pattern
+        if pattern:
+            rules.append((directory, pattern, negated, directories_only, anchored))
+    return rules
+
+
+def _ignored(path: str, name: str, is_dir: bool, rules: list[_IgnoreRule]) -> bool:
+    """Whether ignore rules exclude a path (the last matching rule wins)."""
+    ignored = False
+    for base, pattern, negated, directories_only, anchored in rules:
+        if directories_only and not is_dir:
+            continue
+        subject = path[len(base) + 1 :].replace(os.sep, "/") if anchored else name
+        if fnmatch.fnmatchcase(subject, pattern):
+            ignored = not negated
+    return ignored
+
+
+def _literal_runs(pattern: str) -> list[str]:
+    """Literal substrings that every match of a regular expression contains.
+
+    Conservative: only text outside groups and character classes counts,
+    characters made optional by a quantifier are dropped, and a top-level
+    alternation or an escape that may stand for other text gives nothing.
+    """
+    if pattern.startswith("(?"):
+        return []  # Global inline flags (verbose mode) change what is literal
+    runs: list[str] = []
+    run: list[str] = []
+    depth, in_class, i = 0, False, 0
+    while i < len(pattern):
+        char, escaped = pattern[i], pattern[i] == "\\"
+        if escaped:
+            i += 1
+            char = pattern[i : i + 1]
+        i += 1
+        if in_class:
+            in_class = escaped or char != "]"
+            continue
+        special = not escaped and char in "^$.*+?{}[]|()"
+        if depth and not (special and char in "()"):
+            continue
+        if escaped and char in "xuUN0123456789":
+            return []  # Character codes and backreferences
+        if not special and not (escaped and (not char or char.isalnum())):
+            run.append(char)
+            continue
+        if char in "?*{" and not escaped and run:
+            run.pop()  # The character before may be absent
+        if run:
+            runs.append("".join(run))
+            run = []
+        if special and char == "|":
+            return []
+        if special and char == "[":
+            in_class = True
+            i += pattern[i : i + 1] == "^"
+            i += pattern[i : i + 1] == "]"  # A leading "]" is a class member
+        elif special and char == "{":
+            i = pattern.find("}", i) + 1 or len(pattern)
+        elif special and char in "()":
+            depth += 1 if char == "(" else -1
+    if run:
+        runs.append("".join(run))
+    return runs
+
+
+def _trigrams(data: bytes | mmap.mmap) -> np.ndarray:
+    """Distinct byte trigrams of ASCII-lower-cased data, as sorted uint32."""
+    if len(data) < 3:
+        return np.empty(0, dtype=np.uint32)
+    raw = np.frombuffer(data, dtype=np.uint8)
+    lowered = (raw | ((raw >= 0x41) & (raw <= 0x5A)).astype(np.uint8) << 5).astype(
+        np.uint32
+    )
+    return np.unique(lowered[:-2] << 16 | lowered[1:-1] << 8 | lowered[2:])
+
+
+def _query_trigrams(pattern: str) -> np.ndarray:
+    """Trigrams a file must contain for the pattern to match, as sorted uint32."""
+    grams = set()
+    for run in _literal_runs(pattern):
+        text = run.encode("utf-8").lower()
+        grams.update(
+            text[i] << 16 | text[i + 1] << 8 | text[i + 2] for i in range(len(text) - 2)
+        )
+    return np.array(sorted(grams), dtype=np.uint32)
+
+
+def _contains_all(trigrams: np.ndarray, required: np.ndarray) -> bool:
+    """Whether sorted trigrams include every one of the sorted required ones."""
+    if not len(required):
+        return True
+    found = trigrams.searchsorted(required)
+    return bool(found[-1] < len(trigrams) and (trigrams.take(found) == required).all())
+
+
+def _grep(
+    data: bytes | mmap.mmap, regex: re.Pattern, limit: int
+) -> list[tuple[int, str]]:
+    """Up to limit (line number, line text) pairs of the lines a regex matches."""
+    matches: list[tuple[int, str]] = []
+    line, counted, position = 1, 0, 0
+    while len(matches) < limit and (found := regex.search(data, position)):
+        line_start = data.rfind(b"\n", 0, found.start()) + 1
+        line_end = data.find(b"\n", found.start())
+        line_end = len(data) if line_end < 0 else line_end
+        line += len(_newlines(data, counted, line_start))
+        counted = line_start
+        text = bytes(data[line_start:line_end]).decode("utf-8", errors="replace")
+        matches.append((line, text[:_SNIPPET_CHARS]))
+        if line_end >= len(data):
+            break
+        position = max(line_end + 1, found.end())
+    return matches
+
+
+def _grep_batch(
+    paths: list[str],
+    pattern: bytes,
+    flags: int,
+    limit: int,
+    index: list[bool],
+    index_max_bytes: int,
+) -> list[tuple[list[tuple[int, str]], bool, np.ndarray | None]]:
+    """Search a batch of files (runs in a worker process).
+
+    Files are searched in order until limit matches are found; the files
+    after that are left out of the result.
+
+    Args:
+        paths: Files to search
+        pattern: Compiled into a bytes regex with flags
+        flags: re flags
+        limit: Matches after which the batch stops
+        index: Per file, whether to also return its trigrams
+        index_max_bytes: Largest file whose trigrams are returned
+
+    Returns:
+        Per searched file: (matches, whether it is binary, its trigrams or
+        None if not requested, binary or too large)
+    """
+    regex = re.compile(pattern, flags)
+    results = []
+    found = 0
+    for path, want_trigrams in zip(paths, index):
+        if found >= limit:
+            break
+        try:
+            with _mapped(Path(path)) as data:
+                binary = b"\0" in data[:_BINARY_SNIFF_BYTES]
+                matches = [] if binary else _grep(data, regex, limit - found)
+                trigrams = None
+                if want_trigrams and not binary and len(data) <= index_max_bytes:
+                    trigrams = _trigrams(data)
+        except (OSError, ValueError):
+            matches, binary, trigrams = [], False, None  # Removed or unreadable
+        found += len(matches)
+        results.append((matches, binary, trigrams))
+    return results
+
+
+class Filesystem:
+    """Read-only access to the files under one root directory.
+
+    Attributes:
+        root: Resolved root directory
+        listing_hits: Directory listings served from the cache
+        listing_misses: Directory listings read from disk
+    """
+
+    def __init__(
+        self,
+        root: Path = FS_ROOT,
+        max_read_bytes: int = FS_MAX_READ_BYTES,
+        page_size: int = FS_LIST_PAGE_SIZE,
+        cache_entries: int = FS_LISTING_CACHE_ENTRIES,
+        line_index_every: int = FS_LINE_INDEX_EVERY,
+        search_workers: int | None = None,
+        trigram_index: bool = FS_TRIGRAM_INDEX,
+        trigram_max_file_bytes: int = FS_TRIGRAM_MAX_FILE_BYTES,
+    ) -> None:
+        """Serve a directory tree.
+
+        Args:
+            root: Directory to expose
+            max_read_bytes: Largest piece of a file returned by one read
+            page_size: Default directory entries per page
+            cache_entries: Directory listings (and line indexes) cached
+            line_index_every: Lines between remembered line offsets
+            search_workers: Processes searching files (default: one per
+                CPU; 1 searches in the calling thread)
+            trigram_index: Keep a trigram index of searched files
+            trigram_max_file_bytes: Largest file kept in the trigram index
+
+        Raises:
+            NotADirectoryError: If root is not a directory
+        """
+        self.root = Path(root).resolve()
+        if not self.root.is_dir():
+            raise NotADirectoryError(f"Not a directory: {root}")
+        self.max_read_bytes = max_read_bytes
+        self.page_size = page_size
+        self.cache_entries = cache_entries
+        self.line_index_every = line_index_every
+        self.search_workers = search_workers or os.cpu_count() or 1
+        self.trigram_index = trigram_index
+        self.trigram_max_file_bytes = trigram_max_file_bytes
+        self.listing_hits = 0
+        self.listing_misses = 0
+        # directory -> (mtime_ns, sorted (name, is_dir) entries)
+        self._listings: OrderedDict[str, tuple[int, list[tuple[str, bool]]]] = (
+            OrderedDict()
+        )
+        # file -> ((mtime_ns, size), line checkpoints, line count)
+        self._line_indexes: OrderedDict[
+            Path, tuple[tuple[int, int], np.ndarray, int]
+        ] = OrderedDict()
+        # file -> ((mtime_ns, size), binary, trigrams or None if too large)
+        self._trigrams: dict[str, tuple[tuple[int, int], bool, np.ndarray | None]] = {}
+        self._pool: ProcessPoolExecutor | None = None
+        self._lock = threading.Lock()
+
+    def close(self) -> None:
+        """Stop the search worker processes (they restart on the next search)."""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    def resolve(self, path: str) -> Path:
+        """Resolve a root-relative path, refusing anything outside the root.
+
+        Raises:
+            PermissionError: If the path resolves outside the root
+        """
+        target = (self.root / path).resolve()
+        if not target.is_relative_to(self.root):
+            raise PermissionError(f"Path is outside the served directory: {path}")
+        return target
+
+    def relative(self, target: Path) -> str:
+        """Root-relative POSIX path of a resolved path ("." for the root)."""
+        return target.relative_to(self.root).as_posix() or "."
+
+    def _file(self, path: str) -> Path:
+        """Resolve a path that must be a regular file."""
+        target = self.resolve(path)
+        if not target.is_file():
+            if target.exists():
+                raise IsADirectoryError(f"Not a regular file: {path}")
+            raise FileNotFoundError(f"No such file: {path}")
+        return target
+
+    def stat(self, path: str) -> dict[str, Any]:
+        """Describe a file or directory.
+
+        Returns:
+            Dict with path, type, size, mtime (seconds) and octal mode
+        """
+        target = self.resolve(path)
+        info = target.stat()
+        return {
+            "path": self.relative(target),
+            "type": _kind(info.st_mode),
+            "size": info.st_size,
+            "mtime": info.st_mtime,
+            "mode": oct(stat_module.S_IMODE(info.st_mode)),
+        }
+
+    def _listing(self, directory: str | Path) -> list[tuple[str, bool]]:
+        """Sorted (name, is_dir) entries of a directory, cached by its mtime.
+
+        A listing taken within _RACY_NS of the directory's last change is not
+        kept: a second change in the same timestamp tick would leave the
+        mtime equal and the cached listing stale.
+        """
+        directory = os.fspath(directory)
+        mtime_ns = os.stat(directory).st_mtime_ns
+        with self._lock:
+            cached = self._listings.get(directory)
+            if cached is not None and cached[0] == mtime_ns:
+                self._listings.move_to_end(directory)
+                self.listing_hits += 1
+                return cached[1]
+            self.listing_misses += 1
+        with os.scandir(directory) as scan:
+            entries = sorted(
+                (entry.name, entry.is_dir(follow_symlinks=False)) for entry in scan
+            )
+        if time.time_ns() - mtime_ns > _RACY_NS:
+            with self._lock:
+                self._listings[directory] = (mtime_ns, entries)
+                while len(self._listings) > self.cache_entries:
+                    self._listings.popitem(last=False)
+        return entries
+
+    def list_directory(
+        self, path: str = ".", offset: int = 0, limit: int | None = None
+    ) -> dict[str, Any]:
+        """Return one page of a directory's entries, sorted by name.
+
+        Args:
+            path: Root-relative directory
+            offset: Index of the first entry to return
+            limit: Entries per page (default page_size)
+
+        Returns:
+            Dict with path, total entry count, entries (name, type, size,
+            mtime) and next_offset (None on the last page)
+
+        Raises:
+            NotADirectoryError: If the path is not a directory
+        """
+        target = self.resolve(path)
+        if not target.is_dir():
+            raise NotADirectoryError(f"Not a directory: {path}")
+        names = self._listing(target)
+        limit = self.page_size if limit is None else max(limit, 0)
+        offset = max(offset, 0)
+        entries = []
+        for name, _ in names[offset : offset + limit]:
+            try:
+                info = os.stat(target / name, follow_symlinks=False)
+            except FileNotFoundError:
+                continue  # Removed since the listing was taken
+            entries.append(
+                {
+                    "name": name,
+                    "type": _kind(info.st_mode),
+                    "size": info.st_size,
+                    "mtime": info.st_mtime,
+                }
+            )
+        end = offset + limit
+        return {
+            "path": self.relative(target),
+            "total": len(names),
+            "entries": entries,
+            "next_offset": end if end < len(names) else None,
+        }
+
+    def read_file(
+        self, path: str, offset: int = 0, length: int | None = None
+    ) -> dict[str, Any]:
+        """Read a byte range of a file, at most max_read_bytes at a time.
+
+        Args:
+            path: Root-relative file
+            offset: First byte to read
+            length: Bytes wanted (default: to the end of the file)
+
+        Returns:
+            Dict with path, size, offset, length (bytes returned), encoding
+            ("utf-8", or "base64" for bytes that are not valid UTF-8),
+            content and next_offset (where the rest of the requested range
+            starts, or None when it was returned completely)
+
+        Raises:
+            ValueError: If offset or length is negative
+        """
+        if offset < 0 or (length is not None and length < 0):
+            raise ValueError("offset and length must not be negative")
+        target = self._file(path)
+        with _mapped(target) as data:
+            size = len(data)
+            start = min(offset, size)
+            wanted = size if length is None else min(size, start + length)
+            end = min(wanted, start + self.max_read_bytes)
+            if end < wanted:
+                # Cut before a UTF-8 continuation byte so each piece decodes
+                cut = end
+                while cut > start + 1 and cut > end - 3 and data[cut] & 0xC0 == 0x80:
+                    cut -= 1
+                if data[cut] & 0xC0 == 0x80:
+                    cut = end  # Not UTF-8 text: keep the full piece
+                end = cut
+            chunk = bytes(data[start:end])
+        content, encoding = _decode(chunk)
+        return {
+            "path": self.relative(target),
+            "size": size,
+            "offset": start,
+            "length": len(chunk),
+            "encoding": encoding,
+            "content": content,
+            "next_offset": end if end < wanted else None,
+        }
+
+    def _line_index(
+        self, target: Path, data: bytes | mmap.mmap
+    ) -> tuple[np.ndarray, int]:
+        """Line checkpoints and line count of a mapped file (cached per version).
+
+        Returns:
+            Tuple of (byte offset of every line_index_every-th line starting
+            with line 0, number of lines)
+        """
+        info = target.stat()
+        version = (info.st_mtime_ns, info.st_size)
+        with self._lock:
+            cached = self._line_indexes.get(target)
+            if cached is not None and cached[0] == version:
+                self._line_indexes.move_to_end(target)
+                return cached[1], cached[2]
+        newlines = _newlines(data, 0, len(data))
+        # Line i (0-based, i >= 1) starts just after newline i - 1
+        starts = newlines[self.line_index_every - 1 :: self.line_index_every] + 1
+        checkpoints = np.concatenate([[0], starts]).astype(np.int64)
+        count = len(newlines) + (1 if len(data) and data[-1] != 0x0A else 0)
+        with self._lock:
+            self._line_indexes[target] = (version, checkpoints, count)
+            while len(self._line_indexes) > self.cache_entries:
+                self._line_indexes.popitem(last=False)
+        return checkpoints, count
+
+    def read_lines(
+        self, path: str, start_line: int = 1, end_line: int | None = None
+    ) -> dict[str, Any]:
+        """Read a range of lines, at most max_read_bytes at a time.
+
+        Args:
+            path: Root-relative file
+            start_line: First line to read (1-based)
+            end_line: Last line to read, inclusive (default: the last line)
+
+        Returns:
+            Dict with path, total_lines, start_line, end_line (last line
+            returned), offset (byte offset of start_line), content (UTF-8,
+            undecodable bytes replaced), truncated (True if a single line
+            longer than max_read_bytes was cut) and next_line (first line
+            not returned, or None when the range is complete)
+
+        Raises:
+            ValueError: If start_line is below 1
+        """
+        if start_line < 1:
+            raise ValueError("start_line must be at least 1")
+        target = self._file(path)
+        with _mapped(target) as data:
+            checkpoints, total = self._line_index(target, data)
+            last = total if end_line is None else min(end_line, total)
+            result = {
+                "path": self.relative(target),
+                "total_lines": total,
+                "start_line": start_line,
+                "end_line": start_line - 1,
+                "offset": len(data),
+                "content": "",
+                "truncated": False,
+                "next_line": None,
+            }
+            if start_line > last:
+                return result
+            first = start_line - 1
+            position = int(checkpoints[first // self.line_index_every])
+            for _ in range(first % self.line_index_every):
+                position = data.find(b"\n", position) + 1
+            end, line = position, first
+            while line < last:
+                newline = data.find(b"\n", end)
+                line_end = len(data) if newline < 0 else newline + 1
+                if line_end - position > self.max_read_bytes:
+                    if line == first:  # One line over the limit: return its start
+                        end, line = position + self.max_read_bytes, line + 1
+                        result["truncated"] = True
+                    break
+                end, line = line_end, line + 1
+            content = bytes(data[position:end])
+        result.update(
+            end_line=line,
+            offset=position,
+            content=content.decode("utf-8", errors="replace"),
+            next_line=line + 1 if line < last else None,
+        )
+        return result
+
+    def _search_files(
+        self, target: Path, glob: str
+    ) -> list[tuple[str, tuple[int, int]]]:
+        """Files to search under a directory, in a stable depth-first order.
+
+        Skips .git, paths excluded by the .gitignore files from the root
+        down, symlinks (which could lead outside the root or loop) and empty
+        files. Paths are plain strings: pathlib would dominate the walk.
+
+        Returns:
+            List of (path, (mtime_ns, size)) for regular files matching glob
+        """
+        rules: list[_IgnoreRule] = []
+        for parent in reversed(target.relative_to(self.root).parents):
+            rules += _ignore_rules(str(self.root / parent))
+        files = []
+        stack = [(str(target), rules)]
+        while stack:
+            current, rules = stack.pop()
+            try:
+                entries = self._listing(current)
+            except (FileNotFoundError, PermissionError, NotADirectoryError):
+                continue
+            if (".gitignore", False) in entries:
+                rules = rules + _ignore_rules(current)
+            subdirectories = []
+            for name, is_dir in entries:
+                path = os.path.join(current, name)
+                if is_dir:
+                    if name not in _ALWAYS_IGNORED and not (
+                        rules and _ignored(path, name, True, rules)
+                    ):
+                        subdirectories.append((path, rules))
+                    continue
+                if not fnmatch.fnmatch(name, glob) or (
+                    rules and _ignored(path, name, False, rules)
+                ):
+                    continue
+                try:
+                    info = os.stat(path, follow_symlinks=False)
+                except FileNotFoundError:
+                    continue
+                if stat_module.S_ISREG(info.st_mode) and info.st_size:
+                    files.append((path, (info.st_mtime_ns, info.st_size)))
+            stack.extend(reversed(subdirectories))
+        return files
+
+    def _pool_executor(self) -> ProcessPoolExecutor:
+        """The search worker pool, started on first use."""
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.search_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._pool
+
+    def _scan(
+        self,
+        batches: list[list[tuple[str, bool]]],
+        regex: re.Pattern,
+        limit: int,
+    ) -> Generator[tuple[list[tuple[str, bool]], list], None, None]:
+        """Search batches of files, yielding (batch, results) in batch order.
+
+        With several workers, at most ``search_workers * 2`` batches are in
+        flight; batches still queued when the caller stops are cancelled.
+        Each batch is told the matches still wanted when it is submitted.
+        """
+        found = 0
+
+        def arguments(batch: list[tuple[str, bool]]) -> tuple:
+            return (
+                [path for path, _ in batch],
+                regex.pattern,
+                regex.flags,
+                limit - found,
+                [want for _, want in batch],
+                self.trigram_max_file_bytes,
+            )
+
+        if self.search_workers <= 1 or len(batches) <= 1:
+            for batch in batches:
+                results = _grep_batch(*arguments(batch))
+                found += sum(len(matches) for matches, _, _ in results)
+                yield batch, results
+            return
+
+        executor = self._pool_executor()
+        in_flight: deque[tuple[list[tuple[str, bool]], Future]] = deque()
+        pending = iter(batches)
+        try:
+            for batch in pending:
+                in_flight.append(
+                    (batch, executor.submit(_grep_batch, *arguments(batch)))
+                )
+                if len(in_flight) >= self.search_workers * 2:
+                    break
+            while in_flight:
+                batch, future = in_flight.popleft()
+                results = future.result()
+                found += sum(len(matches) for matches, _, _ in results)
+                yield batch, results
+                if found < limit and (batch := next(pending, None)) is not None:
+                    in_flight.append(
+                        (batch, executor.submit(_grep_batch, *arguments(batch)))
+                    )
+        finally:
+            for _, future in in_flight:
+                future.cancel()
+
+    def search(
+        self,
+        pattern: str,
+        path: str = ".",
+        glob: str = "*",
+        ignore_case: bool = False,
+        offset: int = 0,
+        limit: int = FS_SEARCH_MAX_RESULTS,
+        scan_limit: int = FS_SEARCH_SCAN_LIMIT,
+    ) -> dict[str, Any]:
+        """Find lines matching a regular expression in files under a directory.
+
+        Files are read in parallel by the worker processes, in batches, and
+        reading stops once scan_limit matches are found. Binary files (a NUL
+        byte near the start) and files excluded by .gitignore are skipped.
+        With the trigram index on, files known not to contain the pattern's
+        literal text are skipped without being read.
+
+        Matches are grouped by file and files ranked by score: log(1 +
+        matching lines), plus a bonus if the file name matches, minus a small
+        penalty per directory level. Pages are cut from that ranking; as the
+        walk order is stable, asking for the next page repeats the search
+        and gets consistent pages while the tree is unchanged.
+
+        Args:
+            pattern: Python regular expression, matched against each line
+            path: Root-relative directory (or file) to search
+            glob: File name pattern, e.g. "*.py"
+            ignore_case: Match case-insensitively (ASCII letters)
+            offset: Ranked matches to skip
+            limit: Matches returned
+            scan_limit: Matches after which no further files are read
+
+        Returns:
+            Dict with matches (path, line, text, score), total (matches
+            found), next_offset (None on the last page), truncated (True if
+            the scan stopped at scan_limit, so more matches may exist),
+            files_searched and files_skipped (binary, or excluded by the
+            trigram index)
+
+        Raises:
+            ValueError: If the pattern is not a valid regular expression
+        """
+        flags = re.MULTILINE | (re.IGNORECASE if ignore_case else 0)
+        try:
+            regex = re.compile(pattern.encode("utf-8"), flags)
+        except re.error as error:
+            raise ValueError(f"Invalid pattern {pattern!r}: {error}") from error
+        target = self.resolve(path)
+        if target.is_file():
+            info = target.stat()
+            candidates = [(str(target), (info.st_mtime_ns, info.st_size))]
+        else:
+            candidates = self._search_files(target, glob)
+
+        required = _query_trigrams(pattern)
+        to_scan: list[tuple[str, bool]] = []
+        versions = {}
+        skipped = 0
+        with self._lock:
+            for file, version in candidates:
+                entry = self._trigrams.get(file) if self.trigram_index else None
+                if entry is None or entry[0] != version:
+                    to_scan.append((file, self.trigram_index))
+                    versions[file] = version
+                elif entry[1] or (
+                    entry[2] is not None and not _contains_all(entry[2], required)
+                ):
+                    skipped += 1
+                else:
+                    to_scan.append((file, False))
+            if self.trigram_index and glob == "*" and target.is_dir():
+                walked = {file for file, _ in candidates}
+                prefix = os.path.join(target, "")
+                for file in [f for f in self._trigrams if f.startswith(prefix)]:
+                    if file not in walked:
+                        del self._trigrams[file]  # Removed, or now ignored
+
+        found: list[tuple[str, list[tuple[int, str]]]] = []
+        total = searched = 0
+        batches = [
+            to_scan[i : i + _SEARCH_BATCH]
+            for i in range(0, len(to_scan), _SEARCH_BATCH)
+        ]
+        scan = self._scan(batches, regex, scan_limit)
+        for batch, results in scan:
+            searched += len(results)
+            for (file, want_trigrams), (matches, binary, trigrams) in zip(
+                batch, results
+            ):
+                skipped += binary
+                if want_trigrams:
+                    with self._lock:
+                        self._trigrams[file] = (versions[file], binary, trigrams)
+                if matches and total < scan_limit:
+                    found.append((file, matches[: scan_limit - total]))
+                    total += len(found[-1][1])
+            if total >= scan_limit:
+                scan.close()
+                break
+
+        base = os.path.join(target if target.is_dir() else target.parent, "")
+        root = os.path.join(self.root, "")
+        ranked = []
+        for file, matches in found:
+            depth = file.count(os.sep, len(base))
+            score = math.log1p(len(matches)) - _DEPTH_PENALTY * depth
+            if regex.search(os.path.basename(file).encode("utf-8")):
+                score += _NAME_BONUS
+            relative = file[len(root) :].replace(os.sep, "/")
+            ranked.append((round(score, 3), relative, matches))
+        ranked.sort(key=lambda item: -item[0])  # Stable: walk order breaks ties
+        results = [
+            {"path": relative, "line": line, "text": text, "score": score}
+            for score, relative, matches in ranked
+            for line, text in matches
+        ]
+        offset = max(offset, 0)
+        end = offset + max(limit, 0)
+        return {
+            "matches": results[offset:end],
+            "total": total,
+            "next_offset": end if end < total else None,
+            "truncated": total >= scan_limit,
+            "files_searched": searched,
+            "files_skipped": skipped,
+        }
+
+
+def create_server(filesystem: Filesystem | None = None) -> FastMCP:
+    """Build the MCP server exposing a Filesystem as read-only tools.
+
+    Args:
+        filesystem: Tree to serve (default: FS_ROOT)
+
+    Returns:
+        FastMCP server with read_file, read_lines, list_directory, stat and
+        search tools
+    """
+    fs = filesystem or Filesystem()
+    server = FastMCP(
+        "filesystem",
+        instructions=(
+            "Read-only access to a directory tree. Paths are relative to its "
+            "root. Reads return at most "
+            f"{fs.max_read_bytes} bytes; continue from next_offset/next_line."
+        ),
+    )
+    read_only = {"readOnlyHint": True}
+
+    @server.tool(annotations=read_only)
+    def read_file(path: str, offset: int = 0, length: int | None = None) -> dict:
+        """Read a byte range of a file; continue from next_offset if set."""
+        return fs.read_file(path, offset, length)
+
+    @server.tool(annotations=read_only)
+    def read_lines(path: str, start_line: int = 1, end_line: int | None = None) -> dict:
+        """Read lines start_line..end_line (1-based); continue from next_line."""
+        return fs.read_lines(path, start_line, end_line)
+
+    @server.tool(annotations=read_only)
+    def list_directory(
+        path: str = ".", offset: int = 0, limit: int | None = None
+    ) -> dict:
+        """List a directory page by page; continue from next_offset if set."""
+        return fs.list_directory(path, offset, limit)
+
+    @server.tool(annotations=read_only)
+    def stat(path: str) -> dict:
+        """Type, size, mtime and mode of a file or directory."""
+        return fs.stat(path)
+
+    @server.tool(annotations=read_only)
+    def search(
+        pattern: str,
+        path: str = ".",
+        glob: str = "*",
+        ignore_case: bool = False,
+        offset: int = 0,
+        limit: int = FS_SEARCH_MAX_RESULTS,
+    ) -> dict:
+        """Find lines matching a regular expression in the files under a path.
+
+        Binary and .gitignore'd files are skipped. Matches are ranked by file
+        (most matching lines, name matches and shallow paths first); continue
+        from next_offset for more.
+        """
+        return fs.search(pattern, path, glob, ignore_case, offset, limit)
+
+    return server
+
+
+mcp = create_server()
+
+
+def main() -> None:
+    """Serve a directory over stdio (FS_ROOT unless --root is given)."""
+    parser = argparse.ArgumentParser(description="Filesystem MCP server")
+    parser.add_argument("--root", type=Path, default=FS_ROOT)
+    parser.add_argument(
+        "--workers", type=int, default=None, help="Search processes (default: CPUs)"
+    )
+    parser.add_argument(
+        "--trigram-index",
+        action="store_true",
+        default=FS_TRIGRAM_INDEX,
+        help="Index searched files by trigram to speed up repeated searches",
+    )
+    args = parser.parse_args()
+    filesystem = Filesystem(
+        args.root, search_workers=args.workers, trigram_index=args.trigram_index
+    )
+    try:
+        create_server(filesystem).run()
+    finally:
+        filesystem.close()
+
+
+if __name__ == "__main__":
+    main()
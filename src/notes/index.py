@@ -0,0 +1,449 @@
+"""Incremental BM25 search index over saved notes.
+
+The index is kept current in two ways:
+
+- **Live**: it listens to the NoteStore and re-indexes each note as it is saved.
+- **Catch-up**: on startup, ``sync`` compares every note's mtime against the
+  one last indexed using only a stat, reads the notes whose mtime moved, and
+  re-indexes those whose content hash changed, dropping notes that no longer
+  exist.
+
+On disk the index is a list of immutable segments in the memory-mapped
+layout of the corpus index (see src/rag/corpus.py), with note slugs as
+document paths::
+
+    notes/.index/
+    ├── manifest.json      segment names and the deleted docs of each
+    └── seg-000001/        corpus index files, plus per doc:
+        ├── mtimes.npy     float64 note mtime
+        └── hashes.npy     (n, 32) uint8 SHA-256 of the indexed text
+
+Saved notes are tokenized into an in-memory buffer, which keeps the save
+path O(note). Every ``NOTE_INDEX_FLUSH_EVERY`` updates the buffer is written
+as a new segment on a background thread; replaced and removed notes are
+only marked deleted in their old segment. Once there are more than
+``NOTE_INDEX_MAX_SEGMENTS`` segments they are merged into one, which also
+drops the deleted docs. Losing unflushed updates is harmless: the next
+``sync`` picks them up from the mtime comparison.
+"""
+
+import hashlib
+import json
+import math
+import os
+import shutil
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+from src.config import NOTE_INDEX_FLUSH_EVERY, NOTE_INDEX_MAX_SEGMENTS
+from src.notes.store import Note, NoteStore, get_note_store
+from src.rag.corpus import CorpusIndex, merge_indexes, term_counts, write_index
+from src.rag.sparse import tokenize
+
+_SEGMENT_PREFIX = "seg-"
+
+
+def _content_hash(note: Note) -> bytes:
+    """Hash the indexed fields of a note."""
+    return hashlib.sha256(f"{note.title}\n{note.content}".encode("utf-8")).digest()
+
+
+@dataclass
+class _Pending:
+    """A tokenized note that is not in any segment yet."""
+
+    mtime: float
+    hash: bytes
+    length: int
+    counts: dict[str, int]
+
+
+@dataclass
+class _Segment:
+    """An immutable on-disk segment and the docs deleted from it since."""
+
+    name: str
+    index: CorpusIndex
+    mtimes: np.ndarray
+    hashes: np.ndarray
+    deleted: np.ndarray
+
+    @classmethod
+    def open(cls, path: Path, deleted: list[int]) -> "_Segment":
+        """Map a segment directory, marking the given docs deleted."""
+        index = CorpusIndex(path)
+        mask = np.zeros(index.n_docs, dtype=bool)
+        mask[deleted] = True
+        return cls(
+            name=path.name,
+            index=index,
+            mtimes=np.load(path / "mtimes.npy", mmap_mode="r"),
+            hashes=np.load(path / "hashes.npy", mmap_mode="r"),
+            deleted=mask,
+        )
+
+
+class NoteIndex:
+    """BM25 index over notes, updated incrementally by mtime and content hash."""
+
+    index_dir: Path
+
+    def __init__(
+        self,
+        index_dir: Path,
+        k1: float = 1.2,
+        b: float = 0.75,
+        flush_every: int = NOTE_INDEX_FLUSH_EVERY,
+        max_segments: int = NOTE_INDEX_MAX_SEGMENTS,
+    ) -> None:
+        """Open the index's segments, or start empty if none exist.
+
+        Args:
+            index_dir: Directory the segments and manifest are kept in
+            k1: BM25 term-frequency saturation
+            b: BM25 length normalization
+            flush_every: Updates buffered before a segment is written
+            max_segments: Segments kept before they are merged into one
+        """
+        self.index_dir = Path(index_dir)
+        self.k1 = k1
+        self.b = b
+        self.flush_every = flush_every
+        self.max_segments = max_segments
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flusher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="notes")
+        self._pending_flush: Future | None = None
+        self._segments: list[_Segment] = []
+        self._located: dict[str, tuple[_Segment, int]] = {}
+        self._buffer: dict[str, _Pending] = {}
+        self._flushing: dict[str, _Pending] = {}
+        self._total_length = 0
+        self._dirty = 0
+        self._next_segment = 1
+
+        manifest_path = self.index_dir / "manifest.json"
+        if manifest_path.exists():
+            manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+            for name, deleted in manifest["segments"]:
+                segment = _Segment.open(self.index_dir / name, deleted)
+                self._segments.append(segment)
+                for doc in np.flatnonzero(~segment.deleted):
+                    doc = int(doc)
+                    self._located[segment.index.doc_path(doc)] = (segment, doc)
+                    self._total_length += int(segment.index.doc_lengths[doc])
+            self._next_segment = manifest["next_segment"]
+        self._remove_orphans()
+
+    def __len__(self) -> int:
+        """Number of indexed notes."""
+        with self._lock:
+            return len(self._located) + len(self._flushing) + len(self._buffer)
+
+    def _seen(self, slug: str) -> tuple[float, bytes] | None:
+        """Return the (mtime, content hash) a note was last indexed with."""
+        pending = self._buffer.get(slug) or self._flushing.get(slug)
+        if pending is not None:
+            return pending.mtime, pending.hash
+        located = self._located.get(slug)
+        if located is None:
+            return None
+        segment, doc = located
+        return float(segment.mtimes[doc]), segment.hashes[doc].tobytes()
+
+    def _drop(self, slug: str) -> None:
+        """Forget the indexed version of a note (caller holds _lock)."""
+        pending = self._buffer.pop(slug, None) or self._flushing.pop(slug, None)
+        if pending is not None:
+            self._total_length -= pending.length
+            return
+        located = self._located.pop(slug, None)
+        if located is not None:
+            segment, doc = located
+            segment.deleted[doc] = True
+            self._total_length -= int(segment.index.doc_lengths[doc])
+
+    def update(self, note: Note) -> bool:
+        """Index a note if it changed since it was last seen.
+
+        The cheap mtime check runs first; the content hash is only computed
+        when the mtime differs, so touched-but-unchanged notes are skipped too.
+        Only the note itself is tokenized here; writing it to disk is left to
+        a background flush.
+
+        Args:
+            note: Note to index
+
+        Returns:
+            True if the note was (re-)indexed
+        """
+        with self._lock:
+            seen = self._seen(note.slug)
+        if seen is not None and seen[0] == note.mtime:
+            return False
+        digest = _content_hash(note)
+        length, counts = term_counts(f"{note.title}\n{note.content}")
+        with self._lock:
+            self._drop(note.slug)
+            self._buffer[note.slug] = _Pending(note.mtime, digest, length, counts)
+            self._total_length += length
+            # A touched-but-unchanged note still needs its new mtime recorded,
+            # but it is not a change worth reporting or flushing for
+            changed = seen is None or seen[1] != digest
+            self._dirty += changed
+            if self._dirty >= self.flush_every:
+                self._schedule_flush()
+        return changed
+
+    def remove(self, slug: str) -> bool:
+        """Drop a note from the index.
+
+        Args:
+            slug: Note to drop
+
+        Returns:
+            True if the note was indexed
+        """
+        with self._lock:
+            if self._seen(slug) is None:
+                return False
+            self._drop(slug)
+            self._dirty += 1
+            return True
+
+    def sync(self, store: NoteStore) -> int:
+        """Bring the index up to date with a note store and write it to disk.
+
+        Args:
+            store: Note store to compare against
+
+        Returns:
+            Number of notes added, re-indexed or removed
+        """
+        changed = 0
+        mtimes = store.note_mtimes()
+        for slug, mtime in mtimes.items():
+            with self._lock:
+                seen = self._seen(slug)
+            if seen is not None and seen[0] == mtime:
+                continue  # Skip reading notes whose mtime did not move
+            note = store.get(slug)
+            if note is not None:
+                changed += self.update(note)
+        with self._lock:
+            indexed = [*self._located, *self._flushing, *self._buffer]
+        for slug in set(indexed) - set(mtimes):
+            changed += self.remove(slug)
+        self.flush()
+        return changed
+
+    def search(self, query: str, k: int) -> list[tuple[str, float]]:
+        """Rank notes against a query.
+
+        Scores are exact BM25 over all live notes: document frequencies and
+        the average length are summed across segments and the buffer.
+
+        Args:
+            query: Free-text query
+            k: Maximum number of results
+
+        Returns:
+            List of (slug, score) tuples, best first
+        """
+        with self._lock:
+            pending = {**self._flushing, **self._buffer}
+            n_docs = len(self._located) + len(pending)
+            if n_docs == 0 or k <= 0:
+                return []
+            avg_length = self._total_length / n_docs
+            scores: dict[str, float] = {}
+            for term in set(tokenize(query)):
+                matches = []
+                for segment in self._segments:
+                    postings = segment.index.postings(term)
+                    if postings is None:
+                        continue
+                    docs, tfs = postings
+                    live = ~segment.deleted[docs]
+                    if live.any():
+                        matches.append((segment, docs[live], tfs[live]))
+                buffered = [
+                    (slug, entry.counts[term], entry.length)
+                    for slug, entry in pending.items()
+                    if term in entry.counts
+                ]
+                df = sum(len(docs) for _, docs, _ in matches) + len(buffered)
+                if df == 0:
+                    continue
+                idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                for segment, docs, tfs in matches:
+                    tf = tfs.astype(np.float32)
+                    lengths = segment.index.doc_lengths[docs].astype(np.float32)
+                    norm = self.k1 * (1 - self.b + self.b * lengths / avg_length)
+                    term_scores = idf * tf * (self.k1 + 1) / (tf + norm)
+                    for doc, score in zip(docs, term_scores):
+                        slug = segment.index.doc_path(int(doc))
+                        scores[slug] = scores.get(slug, 0.0) + float(score)
+                for slug, tf, length in buffered:
+                    norm = self.k1 * (1 - self.b + self.b * length / avg_length)
+                    scores[slug] = scores.get(slug, 0.0) + idf * tf * (self.k1 + 1) / (
+                        tf + norm
+                    )
+        return sorted(scores.items(), key=lambda item: -item[1])[:k]
+
+    def _schedule_flush(self) -> None:
+        """Start a background flush unless one is already queued (holds _lock)."""
+        if self._pending_flush is None or self._pending_flush.done():
+            self._pending_flush = self._flusher.submit(self._flush)
+
+    def flush(self) -> None:
+        """Write buffered changes to disk and wait until they are persisted."""
+        self._flush()
+
+    def _flush(self) -> None:
+        """Write the buffer as a new segment, then the manifest."""
+        with self._flush_lock:
+            with self._lock:
+                if not self._dirty and not self._buffer:
+                    return
+                self._flushing = self._buffer
+                self._buffer = {}
+                self._dirty = 0
+                slugs = list(self._flushing)
+                entries = list(self._flushing.values())
+                name = f"{_SEGMENT_PREFIX}{self._next_segment:06d}"
+                if entries:
+                    self._next_segment += 1
+
+            segment = None
+            if entries:
+                segment = self._write_segment(name, slugs, entries)
+            with self._lock:
+                if segment is not None:
+                    self._segments.append(segment)
+                    for doc, (slug, entry) in enumerate(zip(slugs, entries)):
+                        # Notes replaced or removed during the write stay dead
+                        if self._flushing.get(slug) is entry:
+                            self._located[slug] = (segment, doc)
+                        else:
+                            segment.deleted[doc] = True
+                self._flushing = {}
+            if len(self._segments) > self.max_segments:
+                self._merge()
+            self._write_manifest()
+            self._remove_orphans()
+
+    def _write_segment(
+        self, name: str, slugs: list[str], entries: list[_Pending]
+    ) -> _Segment:
+        """Write buffered notes as a segment directory."""
+        path = self.index_dir / name
+        index = write_index(
+            path,
+            self.index_dir,
+            ((slug, e.length, e.counts) for slug, e in zip(slugs, entries)),
+        )
+        np.save(path / "mtimes.npy", np.array([e.mtime for e in entries]))
+        np.save(
+            path / "hashes.npy",
+            np.frombuffer(b"".join(e.hash for e in entries), np.uint8).reshape(-1, 32),
+        )
+        return _Segment.open(index.index_dir, [])
+
+    def _merge(self) -> None:
+        """Merge all segments into one, dropping deleted docs (holds _flush_lock).
+
+        Notes saved meanwhile only touch the buffer, so the segments cannot
+        change except for docs being marked deleted, which are carried over.
+        """
+        with self._lock:
+            segments = list(self._segments)
+            snapshots = [segment.deleted.copy() for segment in segments]
+            name = f"{_SEGMENT_PREFIX}{self._next_segment:06d}"
+            self._next_segment += 1
+
+        path = self.index_dir / name
+        merge_indexes(
+            path,
+            self.index_dir,
+            [(s.index, deleted) for s, deleted in zip(segments, snapshots)],
+        )
+        live = [~deleted for deleted in snapshots]
+        np.save(
+            path / "mtimes.npy",
+            np.concatenate([s.mtimes[mask] for s, mask in zip(segments, live)]),
+        )
+        np.save(
+            path / "hashes.npy",
+            np.concatenate([s.hashes[mask] for s, mask in zip(segments, live)]),
+        )
+        merged = _Segment.open(path, [])
+
+        with self._lock:
+            offset = 0
+            remaps = {}
+            for segment, mask in zip(segments, live):
+                remap = np.cumsum(mask) - 1 + offset
+                merged.deleted[remap[segment.deleted & mask]] = True
+                remaps[segment.name] = remap
+                offset += int(mask.sum())
+            for slug, (segment, doc) in self._located.items():
+                self._located[slug] = (merged, int(remaps[segment.name][doc]))
+            self._segments = [merged]
+
+    def _write_manifest(self) -> None:
+        """Atomically record the live segments and their deleted docs."""
+        with self._lock:
+            manifest = {
+                "next_segment": self._next_segment,
+                "segments": [
+                    [s.name, np.flatnonzero(s.deleted).tolist()] for s in self._segments
+                ],
+            }
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        tmp = self.index_dir / ".manifest.json.tmp"
+        tmp.write_text(json.dumps(manifest), encoding="utf-8")
+        os.replace(tmp, self.index_dir / "manifest.json")
+
+    def _remove_orphans(self) -> None:
+        """Delete segment directories the manifest no longer lists."""
+        if not self.index_dir.is_dir():
+            return
+        with self._lock:
+            live = {segment.name for segment in self._segments}
+        for path in self.index_dir.iterdir():
+            if path.name.startswith(_SEGMENT_PREFIX) and path.name not in live:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def close(self) -> None:
+        """Wait for a background flush to finish."""
+        self._flusher.shutdown(wait=True)
+
+
+_default_index: NoteIndex | None = None
+_default_index_store: NoteStore | None = None
+_default_index_lock = threading.Lock()
+
+
+def get_note_index() -> NoteIndex:
+    """Return the index for the process-wide note store.
+
+    On first use the index is loaded, caught up with the store, and
+    subscribed to future saves.
+
+    Returns:
+        Shared NoteIndex instance
+    """
+    global _default_index, _default_index_store
+    store = get_note_store()
+    with _default_index_lock:
+        if _default_index is None or _default_index_store is not store:
+            index = NoteIndex(store.root / ".index")
+            index.sync(store)
+            store.add_listener(index.update)
+            _default_index, _default_index_store = index, store
+        return _default_index
@@ -0,0 +1,434 @@
+"""Persistent note store backed by a write-ahead log.
+
+Notes are written in two steps:
+
+1. **Append**: every save becomes a checksummed record in ``.wal/active.log``.
+   Concurrent writers are grouped so one ``fsync`` makes a whole batch durable
+   (group commit), which keeps throughput high when many agents save at once.
+2. **Compact**: once the active log reaches ``NOTE_WAL_COMPACT_BYTES`` it is
+   sealed (renamed) and a fresh log is opened, so writers never wait on
+   compaction. The sealed log is then folded into one ``<slug>.md`` file per
+   note using write-to-temp + ``fsync`` + atomic rename.
+
+Crash recovery replays at most one sealed log and the active log, so startup
+time is bounded by the compaction threshold rather than by the number of notes.
+A torn record at the end of the active log (crash mid-write) is truncated away.
+
+Layout on disk::
+
+    notes/
+    ├── python-basics.md
+    ├── ai-agents-summary.md
+    └── .wal/
+        ├── active.log
+        └── sealed-000001.log   (only while a compaction is in flight)
+"""
+
+import json
+import os
+import re
+import struct
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Iterator
+
+from src.config import NOTE_WAL_COMPACT_BYTES, NOTES_DIR
+
+_HEADER = struct.Struct("<II")  # payload length, crc32 of payload
+_ACTIVE_LOG = "active.log"
+_SEALED_PREFIX = "sealed-"
+
+
+class NoteStoreError(Exception):
+    """Raised when the note store can no longer guarantee durability."""
+
+
+@dataclass(frozen=True)
+class Note:
+    """A single saved note.
+
+    Attributes:
+        slug: Filesystem-safe identifier derived from the title
+        title: Human-readable note title
+        content: Note body (without the title line)
+        mtime: Unix timestamp of the last write
+    """
+
+    slug: str
+    title: str
+    content: str
+    mtime: float
+
+    @property
+    def markdown(self) -> str:
+        """The note as written to its .md file: a title heading, then the body."""
+        return f"# {self.title}\n\n{self.content}"
+
+
+def slugify(title: str) -> str:
+    """Convert a note title into a filesystem-safe slug.
+
+    Args:
+        title: Note title
+
+    Returns:
+        Lowercase slug of letters, digits and dashes ("untitled" if empty)
+
+    Example:
+        >>> slugify("Python Basics: Part 1")
+        'python-basics-part-1'
+    """
+    slug = re.sub(r"[^a-z0-9]+", "-", title.lower()).strip("-")[:80].strip("-")
+    return slug or "untitled"
+
+
+def _encode_record(note: Note) -> bytes:
+    """Serialize a note as a length-prefixed, checksummed WAL record."""
+    payload = json.dumps(
+        {
+            "slug": note.slug,
+            "title": note.title,
+            "content": note.content,
+            "mtime": note.mtime,
+        },
+        ensure_ascii=False,
+    ).encode("utf-8")
+    return _HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def _read_records(path: Path) -> tuple[list[Note], int]:
+    """Read all intact records from a WAL file.
+
+    Args:
+        path: WAL file to read
+
+    Returns:
+        Tuple of (notes in write order, byte offset just past the last good record)
+    """
+    data = path.read_bytes()
+    notes: list[Note] = []
+    offset = 0
+    while offset + _HEADER.size <= len(data):
+        length, crc = _HEADER.unpack_from(data, offset)
+        start = offset + _HEADER.size
+        payload = data[start : start + length]
+        # A short or corrupt payload means the writer crashed mid-record
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            break
+        record = json.loads(payload)
+        notes.append(Note(**record))
+        offset = start + length
+    return notes, offset
+
+
+def read_wal_notes(root: Path) -> dict[str, Note]:
+    """Read the notes a store has logged but not compacted, without opening it.
+
+    Meant for other processes (such as the index watcher) that must see saved
+    notes before their .md files are written. Nothing is recovered, truncated
+    or locked; a record still being appended is simply not read yet.
+
+    Args:
+        root: Directory of the note store
+
+    Returns:
+        Slug -> latest logged version of each note (empty without a WAL)
+    """
+    wal_dir = Path(root) / ".wal"
+    # Read the active log before listing sealed ones: a compaction renames it
+    # to a sealed log, which is only deleted once its notes are in .md files
+    try:
+        active, _ = _read_records(wal_dir / _ACTIVE_LOG)
+    except FileNotFoundError:
+        active = []
+    sealed: list[Note] = []
+    for path in sorted(wal_dir.glob(f"{_SEALED_PREFIX}*.log")):
+        try:
+            sealed.extend(_read_records(path)[0])
+        except FileNotFoundError:
+            continue  # Compacted meanwhile
+    return {note.slug: note for note in [*sealed, *active]}
+
+
+def _fsync_dir(path: Path) -> None:
+    """Flush a directory entry so renames inside it survive a crash."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _atomic_write(path: Path, data: bytes) -> None:
+    """Write a file so readers see either the old or the new content, never both."""
+    tmp = path.with_name(f".{path.name}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class NoteStore:
+    """Thread-safe, crash-safe note store with an append-only log."""
+
+    root: Path
+    compact_threshold: int
+
+    def __init__(
+        self, root: Path, compact_threshold: int = NOTE_WAL_COMPACT_BYTES
+    ) -> None:
+        """Open (or create) a note store and recover any unflushed writes.
+
+        Args:
+            root: Directory holding the note files
+            compact_threshold: WAL size in bytes that triggers compaction
+        """
+        self.root = Path(root)
+        self.compact_threshold = compact_threshold
+        self._wal_dir = self.root / ".wal"
+        self._wal_dir.mkdir(parents=True, exist_ok=True)
+
+        # Notes that live only in the WAL (newer than their .md file, if any)
+        self._wal_notes: dict[str, Note] = {}
+        self._listeners: list[Callable[[Note], object]] = []
+
+        # Group commit state, all guarded by _cond
+        self._cond = threading.Condition()
+        self._pending: list[bytes] = []
+        self._next_seq = 1
+        self._durable_seq = 0
+        self._flushing = False
+        self._error: BaseException | None = None
+
+        self._compact_lock = threading.Lock()
+        self._recover()
+        self._fd = os.open(
+            self._wal_dir / _ACTIVE_LOG, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644
+        )
+        self._wal_size = os.fstat(self._fd).st_size
+
+    def _recover(self) -> None:
+        """Replay sealed and active logs left behind by a previous process."""
+        for sealed in sorted(self._wal_dir.glob(f"{_SEALED_PREFIX}*.log")):
+            notes, _ = _read_records(sealed)
+            self._write_note_files(notes)
+            sealed.unlink()
+        _fsync_dir(self._wal_dir)
+
+        active = self._wal_dir / _ACTIVE_LOG
+        if active.exists():
+            notes, good_bytes = _read_records(active)
+            if good_bytes < active.stat().st_size:
+                # Drop the torn tail so new appends start on a record boundary
+                with open(active, "r+b") as f:
+                    f.truncate(good_bytes)
+                    os.fsync(f.fileno())
+            for note in notes:
+                self._wal_notes[note.slug] = note
+
+    def add_listener(self, listener: Callable[[Note], object]) -> None:
+        """Register a callback invoked after each note becomes durable.
+
+        Args:
+            listener: Function called with the saved Note
+        """
+        self._listeners.append(listener)
+
+    def save(self, title: str, content: str) -> Note:
+        """Durably save a note, replacing any previous note with the same slug.
+
+        Args:
+            title: Note title
+            content: Note body
+
+        Returns:
+            The saved Note
+
+        Raises:
+            NoteStoreError: If an earlier WAL write or fsync failed
+        """
+        note = Note(
+            slug=slugify(title), title=title, content=content, mtime=time.time()
+        )
+        self._append(_encode_record(note), note)
+
+        for listener in self._listeners:
+            listener(note)
+
+        if self._wal_size >= self.compact_threshold:
+            self.compact()
+        return note
+
+    def _append(self, record: bytes, note: Note) -> None:
+        """Append a record, sharing one fsync with any concurrent writers."""
+        with self._cond:
+            if self._error is not None:
+                raise NoteStoreError("Note store is unavailable") from self._error
+            self._pending.append(record)
+            self._wal_notes[note.slug] = note
+            seq = self._next_seq
+            self._next_seq += 1
+
+            while self._durable_seq < seq:
+                if self._error is not None:
+                    raise NoteStoreError("Note store is unavailable") from self._error
+                if self._flushing:
+                    # Another thread is the leader; our record joins the next batch
+                    self._cond.wait()
+                    continue
+
+                # Become the leader: flush everything queued so far in one write
+                batch, self._pending = self._pending, []
+                batch_seq = self._next_seq - 1
+                self._flushing = True
+                self._cond.release()
+                try:
+                    data = b"".join(batch)
+                    os.write(self._fd, data)
+                    os.fsync(self._fd)
+                except BaseException as exc:
+                    self._cond.acquire()
+                    # After a failed fsync the page cache state is unknown
+                    self._error = exc
+                    self._flushing = False
+                    self._cond.notify_all()
+                    raise NoteStoreError("Failed to write note log") from exc
+                self._cond.acquire()
+                self._wal_size += len(data)
+                self._durable_seq = batch_seq
+                self._flushing = False
+                self._cond.notify_all()
+
+    def compact(self) -> int:
+        """Fold the current WAL into per-note files.
+
+        Writers are only blocked while the active log is rotated; rewriting
+        note files happens outside the lock.
+
+        Returns:
+            Number of note files written
+        """
+        if not self._compact_lock.acquire(blocking=False):
+            return 0  # Another thread is already compacting
+        try:
+            with self._cond:
+                while self._flushing:
+                    self._cond.wait()
+                if self._wal_size == 0:
+                    return 0
+                sealed = self._wal_dir / f"{_SEALED_PREFIX}{time.time_ns():020d}.log"
+                os.close(self._fd)
+                os.replace(self._wal_dir / _ACTIVE_LOG, sealed)
+                self._fd = os.open(
+                    self._wal_dir / _ACTIVE_LOG,
+                    os.O_WRONLY | os.O_APPEND | os.O_CREAT,
+                    0o644,
+                )
+                _fsync_dir(self._wal_dir)
+                self._wal_size = 0
+
+            notes, _ = _read_records(sealed)
+            written = self._write_note_files(notes)
+            sealed.unlink()
+            _fsync_dir(self._wal_dir)
+
+            sealed_notes = {note.slug: note for note in notes}
+            with self._cond:
+                for slug, note in sealed_notes.items():
+                    # Keep entries that were overwritten or still queued for the
+                    # new log: only what the sealed log held is now on disk
+                    if self._wal_notes.get(slug) == note:
+                        del self._wal_notes[slug]
+            return written
+        finally:
+            self._compact_lock.release()
+
+    def _write_note_files(self, notes: list[Note]) -> int:
+        """Atomically write the latest version of each note to its .md file."""
+        latest: dict[str, Note] = {}
+        for note in notes:
+            latest[note.slug] = note
+        for note in latest.values():
+            path = self.root / f"{note.slug}.md"
+            _atomic_write(path, note.markdown.encode("utf-8"))
+            os.utime(path, (note.mtime, note.mtime))
+        if latest:
+            _fsync_dir(self.root)
+        return len(latest)
+
+    def _read_note_file(self, path: Path) -> Note:
+        """Parse a compacted note file back into a Note."""
+        text = path.read_text(encoding="utf-8")
+        header, _, body = text.partition("\n\n")
+        title = header[2:] if header.startswith("# ") else path.stem
+        return Note(
+            slug=path.stem, title=title, content=body, mtime=path.stat().st_mtime
+        )
+
+    def get(self, title: str) -> Note | None:
+        """Look up the latest version of a note by title (or slug).
+
+        Args:
+            title: Note title
+
+        Returns:
+            The Note, or None if it does not exist
+        """
+        slug = slugify(title)
+        with self._cond:
+            note = self._wal_notes.get(slug)
+        if note is not None:
+            return note
+        path = self.root / f"{slug}.md"
+        return self._read_note_file(path) if path.exists() else None
+
+    def iter_notes(self) -> Iterator[Note]:
+        """Iterate over the latest version of every note.
+
+        Yields:
+            Notes from the WAL first, then compacted note files
+        """
+        with self._cond:
+            wal_notes = dict(self._wal_notes)
+        yield from wal_notes.values()
+        for path in sorted(self.root.glob("*.md")):
+            if path.stem not in wal_notes:
+                yield self._read_note_file(path)
+
+    def note_mtimes(self) -> dict[str, float]:
+        """Map every note's slug to its mtime without reading any note file.
+
+        Returns:
+            Dictionary of slug to the mtime its Note would carry
+        """
+        with self._cond:
+            mtimes = {slug: note.mtime for slug, note in self._wal_notes.items()}
+        for path in self.root.glob("*.md"):
+            mtimes.setdefault(path.stem, path.stat().st_mtime)
+        return mtimes
+
+    def close(self) -> None:
+        """Compact outstanding writes and release the WAL file descriptor."""
+        self.compact()
+        os.close(self._fd)
+
+
+_default_store: NoteStore | None = None
+_default_store_lock = threading.Lock()
+
+
+def get_note_store() -> NoteStore:
+    """Return the process-wide note store rooted at NOTES_DIR.
+
+    Returns:
+        Shared NoteStore instance (created on first use)
+    """
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = NoteStore(NOTES_DIR)
+        return _default_store
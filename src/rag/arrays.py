@@ -0,0 +1,179 @@
+"""Memory-mappable containers shared by the on-disk index formats.
+
+- **Array files** hold a JSON header and any number of raw NumPy arrays at
+  64-byte aligned offsets in one file, each with a CRC-32. Opening one reads
+  only the header; arrays are memory-mapped, so their pages are loaded when
+  first touched and shared between processes through the page cache.
+- **String tables** store many strings as one UTF-8 blob plus offsets and
+  decode them one at a time, so ID lists and texts need no parsing at open.
+
+Layout of an array file::
+
+    magic "RAGARR01" | uint64 header length | JSON header | padding
+    array 0 (64-byte aligned) | array 1 | ...
+"""
+
+import bisect
+import json
+import os
+import zlib
+from pathlib import Path
+from typing import Iterable, Sequence, overload
+
+import numpy as np
+
+_ARRAY_FILE_MAGIC = b"RAGARR01"
+_ARRAY_ALIGN = 64
+
+
+def write_array_file(path: Path, header: dict, arrays: dict[str, np.ndarray]) -> None:
+    """Write a JSON header and raw, aligned arrays to one file atomically.
+
+    Layout: magic, uint64 header length, JSON header (including each array's
+    dtype, shape, offset and CRC-32), then the arrays at 64-byte aligned
+    offsets. The file is written under a temporary name, fsynced and renamed
+    over ``path``, so readers see either the old or the new file.
+    """
+    layout = {}
+    offset = 0
+    contiguous = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+    for name, array in contiguous.items():
+        layout[name] = {
+            "dtype": array.dtype.str,
+            "shape": list(array.shape),
+            "offset": offset,
+            "crc32": zlib.crc32(array.reshape(-1).view(np.uint8)) if array.size else 0,
+        }
+        offset += -(-array.nbytes // _ARRAY_ALIGN) * _ARRAY_ALIGN
+    encoded = json.dumps({**header, "arrays": layout}).encode("utf-8")
+    data_start = -(-(16 + len(encoded)) // _ARRAY_ALIGN) * _ARRAY_ALIGN
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.tmp-{os.getpid()}")
+    with open(tmp, "wb") as f:
+        f.write(_ARRAY_FILE_MAGIC)
+        f.write(len(encoded).to_bytes(8, "little"))
+        f.write(encoded)
+        for name, array in contiguous.items():
+            f.seek(data_start + layout[name]["offset"])
+            f.write(array.tobytes())
+        f.truncate(data_start + offset)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def read_array_file(
+    path: Path, verify: bool = False
+) -> tuple[dict, dict[str, np.ndarray]]:
+    """Read the header of a file written by write_array_file and map its arrays.
+
+    Only the header is read; array pages are loaded when first touched.
+
+    Args:
+        path: File written by write_array_file
+        verify: Also check every array against its CRC-32 (reads the file)
+
+    Returns:
+        Tuple of (header without the array layout, name -> memory-mapped array)
+
+    Raises:
+        ValueError: If the file is not an array file, is truncated, or (with
+            verify) an array does not match its checksum
+    """
+    with open(path, "rb") as f:
+        if f.read(8) != _ARRAY_FILE_MAGIC:
+            raise ValueError(f"{path} is not an index file")
+        length = int.from_bytes(f.read(8), "little")
+        header = json.loads(f.read(length))
+        size = os.fstat(f.fileno()).st_size
+    data_start = -(-(16 + length) // _ARRAY_ALIGN) * _ARRAY_ALIGN
+    arrays = {}
+    for name, spec in header.pop("arrays").items():
+        shape = tuple(spec["shape"])
+        dtype = np.dtype(spec["dtype"])
+        if 0 in shape:
+            arrays[name] = np.empty(shape, dtype=dtype)
+            continue
+        end = data_start + spec["offset"] + dtype.itemsize * int(np.prod(shape))
+        if end > size:
+            raise ValueError(f"{path} is truncated (array {name!r} is incomplete)")
+        arrays[name] = np.memmap(
+            path, dtype=dtype, mode="r", offset=data_start + spec["offset"], shape=shape
+        )
+        if (
+            verify
+            and "crc32" in spec
+            and zlib.crc32(arrays[name].reshape(-1).view(np.uint8)) != spec["crc32"]
+        ):
+            raise ValueError(f"{path}: checksum mismatch in array {name!r}")
+    return header, arrays
+
+
+def encode_strings(strings: Iterable[str]) -> tuple[np.ndarray, np.ndarray]:
+    """Pack strings into a UTF-8 blob and uint64 offsets (count + 1 entries)."""
+    encoded = [text.encode("utf-8") for text in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.uint64)
+    np.cumsum([len(e) for e in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+class StringTable(Sequence[str]):
+    """Read-only strings stored as one UTF-8 blob plus offsets.
+
+    Items are decoded on access, so a memory-mapped table opens in constant
+    time and only touches the pages of the strings actually read. With
+    ``order`` (row numbers sorted by string; ``range(len)`` for a table that
+    is sorted already) ``find`` is a binary search.
+    """
+
+    def __init__(
+        self,
+        blob: np.ndarray,
+        offsets: np.ndarray,
+        order: np.ndarray | range | None = None,
+    ) -> None:
+        """Wrap the arrays of encode_strings (plus an optional sort order)."""
+        self._blob = blob
+        self._offsets = offsets
+        self._order = order
+
+    @property
+    def arrays(self) -> tuple[np.ndarray, np.ndarray]:
+        """The (blob, offsets) arrays, e.g. to store the table elsewhere."""
+        return self._blob, self._offsets
+
+    def __len__(self) -> int:
+        """Number of strings."""
+        return max(len(self._offsets) - 1, 0)
+
+    @overload
+    def __getitem__(self, index: int) -> str: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> list[str]: ...
+
+    def __getitem__(self, index: int | slice) -> str | list[str]:
+        """Decode one string (or a slice of them)."""
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        start, end = int(self._offsets[index]), int(self._offsets[index + 1])
+        return self._blob[start:end].tobytes().decode("utf-8")
+
+    def find(self, text: str) -> int | None:
+        """Return the row of a string, or None (requires ``order``).
+
+        Raises:
+            ValueError: If the table has no sort order
+        """
+        if self._order is None:
+            raise ValueError("StringTable was created without a sort order")
+        order = self._order
+        i = bisect.bisect_left(order, text, key=lambda row: self[int(row)])
+        if i < len(order) and self[int(order[i])] == text:
+            return int(order[i])
+        return None
@@ -0,0 +1,257 @@
+"""ChromaDB-backed vector store behind the Retriever interface.
+
+ChromaRetriever keeps chunk embeddings in a persistent Chroma collection and
+ranks them with Chroma's HNSW index, so it can stand in for ExactRetriever or
+IVFPQIndex as the dense side of a HybridRetriever. It differs from the NumPy
+stores in three ways that matter for throughput:
+
+- **One client per directory**: opening a PersistentClient loads the
+  collection's segments, so clients are cached per path and shared by every
+  retriever in the process (see get_chroma_client).
+- **Batched writes**: upserts and deletes are split into batches of
+  ``CHROMA_UPSERT_BATCH`` vectors (never more than the client accepts), and
+  embeddings are passed as one float32 array per batch.
+- **Batched reads**: search_batch sends all queries in a single ``query``
+  call, and metadata filters (Chroma ``where`` clauses such as
+  ``{"source": "notes/kafka.md"}``) are evaluated inside Chroma rather than
+  by over-fetching and filtering afterwards.
+
+The collection uses cosine distance; scores are returned as ``1 - distance``
+so they compare directly with the dot products of the NumPy stores.
+
+Like the NumPy stores, every vector has a row number: its position in the
+``ids`` given to build (vectors upserted later get the next numbers). Rows
+are kept in a ``_row`` metadata field, so they survive reopening and line up
+with the MetadataIndex of a hybrid index built from the same ``ids``. A
+``rows`` restriction is sent to Chroma as an ID filter.
+"""
+
+import threading
+from pathlib import Path
+from typing import Any
+
+import chromadb
+import numpy as np
+
+from src.config import CHROMA_COLLECTION, CHROMA_DIR, CHROMA_UPSERT_BATCH
+
+_ROW_FIELD = "_row"  # Metadata field holding each vector's row number
+
+_clients: dict[Path, Any] = {}
+_clients_lock = threading.Lock()
+
+
+def get_chroma_client(path: Path = CHROMA_DIR) -> Any:
+    """Return the process-wide persistent Chroma client for a directory.
+
+    Args:
+        path: Directory holding the Chroma database
+
+    Returns:
+        Shared chromadb PersistentClient
+    """
+    path = Path(path).resolve()
+    with _clients_lock:
+        client = _clients.get(path)
+        if client is None:
+            path.mkdir(parents=True, exist_ok=True)
+            client = _clients[path] = chromadb.PersistentClient(path=str(path))
+        return client
+
+
+class ChromaRetriever:
+    """Chunk vectors stored and searched in a persistent Chroma collection."""
+
+    batch_size: int
+
+    def __init__(
+        self,
+        path: Path = CHROMA_DIR,
+        collection: str = CHROMA_COLLECTION,
+        batch_size: int = CHROMA_UPSERT_BATCH,
+    ) -> None:
+        """Open (or create) a collection through the shared client.
+
+        Args:
+            path: Directory holding the Chroma database
+            collection: Collection name (3-512 characters of [a-zA-Z0-9._-])
+            batch_size: Vectors per upsert or delete call
+        """
+        self.client = get_chroma_client(path)
+        self.collection = self.client.get_or_create_collection(
+            collection,
+            embedding_function=None,
+            configuration={"hnsw": {"space": "cosine"}},
+        )
+        self.batch_size = max(1, min(batch_size, self.client.get_max_batch_size()))
+        # Chunk ID of each row and row of each chunk ID (loaded on first use)
+        self._row_ids: list[str] | None = None
+        self._rows: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build(
+        cls,
+        path: Path,
+        ids: list[str],
+        vectors: np.ndarray,
+        metadatas: list[dict[str, Any]] | None = None,
+        collection: str = CHROMA_COLLECTION,
+        **options: Any,
+    ) -> "ChromaRetriever":
+        """Replace a collection's contents with the given vectors.
+
+        Args:
+            path: Directory holding the Chroma database
+            ids: Chunk ID of each vector row
+            vectors: (len(ids), dim) float array
+            metadatas: Optional filterable attributes per row (e.g. source)
+            collection: Collection name
+            **options: Passed on to ChromaRetriever()
+
+        Returns:
+            The populated retriever
+        """
+        client = get_chroma_client(path)
+        if collection in [c.name for c in client.list_collections()]:
+            client.delete_collection(collection)
+        retriever = cls(path, collection, **options)
+        retriever.upsert(ids, vectors, metadatas)
+        return retriever
+
+    def __len__(self) -> int:
+        """Number of stored vectors."""
+        return self.collection.count()
+
+    def _row_map(self) -> list[str]:
+        """Chunk ID of every row, read from the collection on first use."""
+        if self._row_ids is None:
+            stored = self.collection.get(include=["metadatas"])
+            rows = {
+                int(metadata[_ROW_FIELD]): chunk_id
+                for chunk_id, metadata in zip(stored["ids"], stored["metadatas"] or [])
+                if metadata and _ROW_FIELD in metadata
+            }
+            self._row_ids = [
+                rows.get(row, "") for row in range(max(rows, default=-1) + 1)
+            ]
+            self._rows = {chunk_id: row for row, chunk_id in rows.items()}
+        return self._row_ids
+
+    def chunk_id(self, row: int) -> str:
+        """Return the chunk ID stored at a row."""
+        with self._lock:
+            return self._row_map()[row]
+
+    def upsert(
+        self,
+        ids: list[str],
+        vectors: np.ndarray,
+        metadatas: list[dict[str, Any]] | None = None,
+    ) -> None:
+        """Insert or replace vectors in batches.
+
+        New chunk IDs get the next row numbers; replaced ones keep theirs.
+
+        Args:
+            ids: Chunk IDs
+            vectors: (len(ids), dim) float array
+            metadatas: Optional attributes per row, usable in ``where`` filters
+        """
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        with self._lock:
+            row_ids = self._row_map()
+            rows = []
+            for chunk_id in ids:
+                if chunk_id not in self._rows:
+                    self._rows[chunk_id] = len(row_ids)
+                    row_ids.append(chunk_id)
+                row = self._rows[chunk_id]
+                row_ids[row] = chunk_id  # Restores a deleted row
+                rows.append(row)
+        metadatas = [
+            {**(metadatas[i] if metadatas else {}), _ROW_FIELD: row}
+            for i, row in enumerate(rows)
+        ]
+        for start in range(0, len(ids), self.batch_size):
+            end = start + self.batch_size
+            self.collection.upsert(
+                ids=ids[start:end],
+                embeddings=vectors[start:end],
+                metadatas=metadatas[start:end],
+            )
+
+    def delete(self, ids: list[str]) -> None:
+        """Remove vectors by chunk ID (unknown IDs are ignored).
+
+        The rows stay reserved: re-inserting a chunk ID gives it its old row.
+        """
+        with self._lock:
+            row_ids = self._row_map()
+            for chunk_id in ids:
+                if chunk_id in self._rows:
+                    row_ids[self._rows[chunk_id]] = ""
+        for start in range(0, len(ids), self.batch_size):
+            self.collection.delete(ids=ids[start : start + self.batch_size])
+
+    def search(
+        self,
+        query: np.ndarray,
+        k: int,
+        rows: np.ndarray | None = None,
+        where: dict[str, Any] | None = None,
+    ) -> list[tuple[str, float]]:
+        """Rank stored vectors against one query.
+
+        Args:
+            query: (dim,) float vector
+            k: Maximum number of results
+            rows: Only rank these rows (e.g. from a MetadataIndex)
+            where: Chroma metadata filter applied before ranking
+
+        Returns:
+            List of (chunk_id, cosine similarity) tuples, best first
+        """
+        return self.search_batch(np.asarray(query)[None, :], k, rows, where)[0]
+
+    def search_batch(
+        self,
+        queries: np.ndarray,
+        k: int,
+        rows: np.ndarray | None = None,
+        where: dict[str, Any] | None = None,
+    ) -> list[list[tuple[str, float]]]:
+        """Rank stored vectors against many queries in one Chroma call.
+
+        Args:
+            queries: (n_queries, dim) float array
+            k: Maximum number of results per query
+            rows: Only rank these rows (sent to Chroma as an ID filter)
+            where: Chroma metadata filter applied before ranking
+
+        Returns:
+            One list of (chunk_id, cosine similarity) tuples per query
+        """
+        queries = np.ascontiguousarray(queries, dtype=np.float32)
+        ids = None
+        if rows is not None:
+            with self._lock:
+                row_ids = self._row_map()
+                ids = [row_ids[row] for row in np.asarray(rows).tolist()]
+            ids = [chunk_id for chunk_id in ids if chunk_id]
+        if len(queries) == 0 or k <= 0 or ids == []:
+            return [[] for _ in range(len(queries))]
+        result = self.collection.query(
+            query_embeddings=queries,
+            ids=ids,
+            n_results=k,
+            where=where,
+            include=["distances"],
+        )
+        return [
+            [
+                (chunk_id, 1.0 - float(distance))
+                for chunk_id, distance in zip(ids, distances)
+            ]
+            for ids, distances in zip(result["ids"], result["distances"] or [])
+        ]
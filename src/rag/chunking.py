@@ -0,0 +1,683 @@
+"""Streaming, structure-aware document chunking.
+
+Files are read through a memory map and chunked as a generator, so a
+multi-gigabyte text dump is never materialized in memory: only the current
+chunk (and its overlap) is decoded at any time.
+
+Chunking happens in two passes over the mapped bytes, both lazy:
+
+1. **Blocks**: the file is split into structural units — headings, paragraphs
+   (runs of non-blank lines) and fenced code blocks. Code fences are never
+   split at a blank line. Blocks are capped at ``max_block_bytes`` so a file
+   without any blank lines (or one giant line) still streams.
+2. **Chunks**: blocks are packed into chunks of about ``target_tokens``
+   tokens. A heading starts a new chunk once the current one is half full,
+   and up to ``overlap_tokens`` of trailing blocks are repeated at the start
+   of the next chunk so context is not lost at the boundary.
+
+Token counts are approximated by counting words and punctuation marks, which
+tracks BPE token counts closely enough for sizing without a tokenizer
+dependency.
+
+For incremental re-indexing there is also **content-defined chunking**
+(``content_defined=True``): boundaries are placed where a rolling gear hash
+of the preceding 64 bytes matches a bit mask, so they depend only on nearby
+content. Editing one paragraph changes the chunks around the edit, while all
+other chunks keep their exact text and therefore their ``chunk_id`` (a hash
+of the text). ChunkStore uses those IDs to store identical chunks once and to
+report which chunks of a re-ingested document actually need embedding.
+With ``near_duplicates`` set, ChunkStore also merges chunks that are merely
+similar (MinHash/LSH, see src/rag/dedup.py) into the stored copy.
+"""
+
+import hashlib
+import math
+import mmap
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Iterable, Iterator
+
+import numpy as np
+
+from src.config import CHUNK_OVERLAP_TOKENS, CHUNK_TARGET_TOKENS
+from src.rag.dedup import NearDuplicateIndex
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+_HEADING_RE = re.compile(rb"#{1,6}\s")
+_FENCES = (b"```", b"~~~")
+_BYTES_PER_TOKEN = 4  # Rough UTF-8 bytes per token for English prose
+_PEEK_BYTES = 256  # Only this much of a line is inspected; longer is never blank
+
+# Gear table for content-defined chunking, derived from a hash so boundaries
+# never change across numpy versions or platforms
+_GEAR = np.array(
+    [
+        int.from_bytes(hashlib.blake2b(bytes([i]), digest_size=8).digest(), "little")
+        for i in range(256)
+    ],
+    dtype=np.uint64,
+)
+_GEAR_WINDOW = 64  # Bytes that influence each gear hash (one per bit)
+_CDC_SEGMENT_BYTES = 1024 * 1024  # Bytes hashed per numpy pass
+_SNAP_BYTES = 64  # How far a boundary may move forward to land after whitespace
+_WHITESPACE_RE = re.compile(rb"\s")
+
+
+def count_tokens(text: str) -> int:
+    """Approximate the number of LLM tokens in a text.
+
+    Args:
+        text: Text to measure
+
+    Returns:
+        Number of words plus punctuation marks
+
+    Example:
+        >>> count_tokens("Hello, world!")
+        4
+    """
+    return len(_TOKEN_RE.findall(text))
+
+
+def content_hash(text: str) -> str:
+    """Stable identifier for a piece of text.
+
+    Args:
+        text: Text to hash
+
+    Returns:
+        32-character hex BLAKE2b digest of the UTF-8 encoded text
+    """
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+@dataclass(frozen=True)
+class Chunk:
+    """A contiguous piece of a document, sized for embedding.
+
+    Attributes:
+        text: Chunk text
+        source: Document path or identifier
+        index: Position of the chunk within its document
+        start: Byte offset of the chunk start in the document
+        end: Byte offset just past the chunk end
+        tokens: Approximate token count
+        heading: Closest Markdown heading above the chunk ("" if none)
+    """
+
+    text: str
+    source: str
+    index: int
+    start: int
+    end: int
+    tokens: int
+    heading: str = ""
+
+    @property
+    def chunk_id(self) -> str:
+        """Content hash of the chunk text; identical text means identical ID."""
+        return content_hash(self.text)
+
+
+@dataclass
+class _Block:
+    """A structural unit of a document (heading, paragraph or code fence)."""
+
+    kind: str
+    start: int
+    end: int
+    text: str
+    tokens: int
+
+
+def _utf8_boundary(buf: bytes | mmap.mmap, pos: int, floor: int) -> int:
+    """Move pos back to the start of a UTF-8 character (but not below floor)."""
+    while pos > floor and (buf[pos] & 0xC0) == 0x80:
+        pos -= 1
+    return pos
+
+
+def _make_block(buf: bytes | mmap.mmap, kind: str, start: int, end: int) -> _Block:
+    text = buf[start:end].decode("utf-8", errors="replace")
+    return _Block(kind, start, end, text, count_tokens(text))
+
+
+def iter_blocks(buf: bytes | mmap.mmap, max_block_bytes: int) -> Iterator[_Block]:
+    """Split a byte buffer into headings, paragraphs and code fences.
+
+    Args:
+        buf: Document bytes (a bytes object or a memory map)
+        max_block_bytes: Largest block emitted; longer runs are cut at a line
+            (or, for a single huge line, a UTF-8 character) boundary
+
+    Yields:
+        Blocks in document order; blank lines between blocks are skipped
+    """
+    n = len(buf)
+    pos = 0
+    block_start: int | None = None
+    block_kind = "paragraph"
+
+    while pos < n:
+        newline = buf.find(b"\n", pos)
+        line_end = n if newline == -1 else newline + 1
+
+        if line_end - pos > max_block_bytes:
+            # One enormous line: flush what we have, then slice the line itself
+            if block_start is not None:
+                yield _make_block(buf, block_kind, block_start, pos)
+                block_start = None
+            while line_end - pos > max_block_bytes:
+                cut = _utf8_boundary(buf, pos + max_block_bytes, pos + 1)
+                yield _make_block(buf, block_kind, pos, cut)
+                pos = cut
+            if block_kind == "code":
+                block_start = pos
+            else:
+                yield _make_block(buf, "paragraph", pos, line_end)
+            pos = line_end
+            continue
+
+        peek = buf[pos : min(line_end, pos + _PEEK_BYTES)].lstrip()
+        is_blank = line_end - pos <= _PEEK_BYTES and not peek.strip()
+        is_fence = peek.startswith(_FENCES)
+
+        if block_kind == "code":
+            if is_fence:
+                start = pos if block_start is None else block_start
+                yield _make_block(buf, "code", start, line_end)
+                block_start, block_kind = None, "paragraph"
+            elif block_start is not None and line_end - block_start > max_block_bytes:
+                # Oversized fence: emit what fits and keep going inside the fence
+                yield _make_block(buf, "code", block_start, pos)
+                block_start = pos
+            pos = line_end
+            continue
+
+        if is_fence or is_blank or _HEADING_RE.match(peek):
+            if block_start is not None:
+                yield _make_block(buf, "paragraph", block_start, pos)
+                block_start = None
+            if is_fence:
+                block_start, block_kind = pos, "code"
+            elif not is_blank:
+                yield _make_block(buf, "heading", pos, line_end)
+        else:
+            if block_start is None:
+                block_start = pos
+            elif line_end - block_start > max_block_bytes:
+                yield _make_block(buf, "paragraph", block_start, pos)
+                block_start = pos
+        pos = line_end
+
+    if block_start is not None:
+        yield _make_block(buf, block_kind, block_start, n)
+
+
+def chunk_buffer(
+    buf: bytes | mmap.mmap,
+    source: str,
+    target_tokens: int = CHUNK_TARGET_TOKENS,
+    overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+) -> Iterator[Chunk]:
+    """Pack the blocks of a byte buffer into overlapping, token-sized chunks.
+
+    Args:
+        buf: Document bytes (a bytes object or a memory map)
+        source: Document path or identifier recorded on each chunk
+        target_tokens: Desired chunk size in tokens
+        overlap_tokens: Maximum tokens repeated from the previous chunk
+
+    Yields:
+        Chunks in document order
+    """
+    current: list[_Block] = []
+    current_tokens = 0
+    heading = ""
+    chunk_heading = ""
+    index = 0
+
+    def emit() -> Chunk:
+        # Decode the exact source span so blank lines between blocks survive
+        start, end = current[0].start, current[-1].end
+        return Chunk(
+            text=buf[start:end].decode("utf-8", errors="replace"),
+            source=source,
+            index=index,
+            start=start,
+            end=end,
+            tokens=current_tokens,
+            heading=chunk_heading,
+        )
+
+    for block in iter_blocks(buf, max_block_bytes=target_tokens * _BYTES_PER_TOKEN):
+        starts_section = (
+            block.kind == "heading" and current_tokens >= target_tokens // 2
+        )
+        overflows = current_tokens + block.tokens > target_tokens
+        if current and (starts_section or overflows):
+            yield emit()
+            index += 1
+            # Carry trailing blocks into the next chunk, unless a new section starts
+            carried: list[_Block] = []
+            carried_tokens = 0
+            if not starts_section:
+                for previous in reversed(current[1:]):
+                    if carried_tokens + previous.tokens > overlap_tokens:
+                        break
+                    carried.insert(0, previous)
+                    carried_tokens += previous.tokens
+                if carried_tokens + block.tokens > target_tokens:
+                    carried, carried_tokens = [], 0
+            current, current_tokens = carried, carried_tokens
+            chunk_heading = heading
+
+        if block.kind == "heading":
+            heading = block.text.strip().lstrip("#").strip()
+            if not current:
+                chunk_heading = heading
+        current.append(block)
+        current_tokens += block.tokens
+
+    if current:
+        yield emit()
+
+
+def _gear_hashes(data: np.ndarray) -> np.ndarray:
+    """Gear hash of the 64-byte window ending at every position of data.
+
+    The streaming gear hash ``h = (h << 1) + GEAR[byte]`` equals
+    ``sum(GEAR[data[i - j]] << j for j < 64)`` modulo 2**64, because older
+    bytes are shifted out of the word. That sum is built by doubling the
+    window six times, which vectorizes instead of looping per byte.
+    """
+    hashes = _GEAR[data]
+    span = 1
+    while span < _GEAR_WINDOW:
+        shifted = np.zeros_like(hashes)
+        shifted[span:] = hashes[:-span] << np.uint64(span)
+        hashes += shifted
+        span *= 2
+    return hashes
+
+
+def _snap_forward(buf: bytes | mmap.mmap, pos: int) -> int:
+    """Move a boundary just past the next whitespace so words stay whole."""
+    n = len(buf)
+    match = _WHITESPACE_RE.search(buf, pos, min(pos + _SNAP_BYTES, n))
+    if match is not None:
+        return match.end()
+    while pos < n and (buf[pos] & 0xC0) == 0x80:
+        pos += 1
+    return pos
+
+
+def iter_cdc_boundaries(
+    buf: bytes | mmap.mmap, min_bytes: int, avg_bytes: int, max_bytes: int
+) -> Iterator[int]:
+    """Find content-defined chunk boundaries in a byte buffer.
+
+    A boundary follows every byte whose gear hash has its top bits clear,
+    subject to the size limits; the buffer is hashed a segment at a time so
+    memory does not grow with its size.
+
+    Args:
+        buf: Document bytes (a bytes object or a memory map)
+        min_bytes: Boundaries closer than this to the previous one are skipped
+        avg_bytes: Expected spacing of hash boundaries beyond min_bytes
+        max_bytes: A boundary is forced once a chunk grows this large
+
+    Yields:
+        Increasing end offsets of each chunk; the last one is len(buf)
+    """
+    n = len(buf)
+    bits = max(round(math.log2(max(avg_bytes, 2))), 1)
+    mask = np.uint64(((1 << bits) - 1) << (64 - bits))
+    last = 0
+
+    for seg_start in range(0, n, _CDC_SEGMENT_BYTES):
+        seg_end = min(seg_start + _CDC_SEGMENT_BYTES, n)
+        lookback = max(seg_start - (_GEAR_WINDOW - 1), 0)
+        # Copy the segment out of the buffer so no numpy view pins the mmap open
+        data = np.frombuffer(buf[lookback:seg_end], dtype=np.uint8)
+        hashes = _gear_hashes(data)[seg_start - lookback :]
+        hits = np.flatnonzero((hashes & mask) == 0) + (seg_start + 1)
+
+        for cut in hits.tolist():
+            if cut - last < min_bytes:
+                continue
+            while cut - last > max_bytes:
+                last = _utf8_boundary(buf, last + max_bytes, last + 1)
+                yield last
+            if cut - last < min_bytes:
+                continue
+            snapped = _snap_forward(buf, cut)
+            last = snapped if snapped - last <= max_bytes else cut
+            yield last
+            if last >= n:
+                return
+
+        while seg_end - last > max_bytes:
+            last = _utf8_boundary(buf, last + max_bytes, last + 1)
+            yield last
+
+    if last < n:
+        yield n
+
+
+def chunk_buffer_cdc(
+    buf: bytes | mmap.mmap,
+    source: str,
+    target_tokens: int = CHUNK_TARGET_TOKENS,
+) -> Iterator[Chunk]:
+    """Split a byte buffer into content-defined chunks.
+
+    Chunks average about ``target_tokens`` tokens and range from a quarter to
+    four times that. They do not overlap and carry no heading, because either
+    would make a chunk's text depend on content outside its own span.
+
+    Args:
+        buf: Document bytes (a bytes object or a memory map)
+        source: Document path or identifier recorded on each chunk
+        target_tokens: Desired average chunk size in tokens
+
+    Yields:
+        Chunks in document order
+    """
+    avg_bytes = target_tokens * _BYTES_PER_TOKEN
+    min_bytes = avg_bytes // 4
+    start = 0
+    for index, end in enumerate(
+        iter_cdc_boundaries(buf, min_bytes, avg_bytes - min_bytes, avg_bytes * 4)
+    ):
+        text = buf[start:end].decode("utf-8", errors="replace")
+        yield Chunk(
+            text=text,
+            source=source,
+            index=index,
+            start=start,
+            end=end,
+            tokens=count_tokens(text),
+        )
+        start = end
+
+
+def chunk_text(
+    text: str,
+    source: str = "",
+    target_tokens: int = CHUNK_TARGET_TOKENS,
+    overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+    content_defined: bool = False,
+) -> Iterator[Chunk]:
+    """Chunk an in-memory string (e.g. a note). See chunk_buffer.
+
+    Args:
+        text: Document text
+        source: Document identifier recorded on each chunk
+        target_tokens: Desired chunk size in tokens
+        overlap_tokens: Maximum tokens repeated from the previous chunk
+        content_defined: Use content-defined boundaries (see chunk_buffer_cdc);
+            overlap_tokens is then ignored
+
+    Yields:
+        Chunks in document order (offsets are UTF-8 byte offsets)
+    """
+    buf = text.encode("utf-8")
+    if content_defined:
+        yield from chunk_buffer_cdc(buf, source, target_tokens)
+    else:
+        yield from chunk_buffer(buf, source, target_tokens, overlap_tokens)
+
+
+def chunk_file(
+    path: Path,
+    target_tokens: int = CHUNK_TARGET_TOKENS,
+    overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+    content_defined: bool = False,
+) -> Iterator[Chunk]:
+    """Chunk a file through a read-only memory map.
+
+    The OS pages the file in on demand, so memory use stays proportional to
+    the chunk size, not the file size.
+
+    Args:
+        path: Text or Markdown file
+        target_tokens: Desired chunk size in tokens
+        overlap_tokens: Maximum tokens repeated from the previous chunk
+        content_defined: Use content-defined boundaries (see chunk_buffer_cdc);
+            overlap_tokens is then ignored
+
+    Yields:
+        Chunks in document order
+    """
+    with open(path, "rb") as f:
+        if f.seek(0, 2) == 0:
+            return  # Empty files cannot be memory-mapped
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if hasattr(mm, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+                mm.madvise(mmap.MADV_SEQUENTIAL)
+            if content_defined:
+                yield from chunk_buffer_cdc(mm, str(path), target_tokens)
+            else:
+                yield from chunk_buffer(mm, str(path), target_tokens, overlap_tokens)
+
+
+@dataclass
+class IngestResult:
+    """Outcome of ingesting one document into a ChunkStore.
+
+    Attributes:
+        new: Chunks whose text was not stored before (these need embedding)
+        reused: Number of chunks already stored (from this or another document)
+        merged: How many of the reused chunks were near duplicates of a
+            stored chunk rather than exact copies
+        removed: IDs of chunks no longer referenced by any document
+    """
+
+    new: list[Chunk] = field(default_factory=list)
+    reused: int = 0
+    merged: int = 0
+    removed: list[str] = field(default_factory=list)
+
+
+class ChunkStore:
+    """Deduplicated chunk storage keyed by content hash.
+
+    Each distinct chunk text is stored once with a reference count, and each
+    document keeps the ordered list of its chunk IDs. Re-ingesting a document
+    reports only the chunks that were not stored before, so callers embed just
+    those, and releases chunks that no document references any more.
+
+    With near-duplicate merging, a new chunk whose estimated Jaccard
+    similarity (over word 3-grams) to a stored chunk reaches
+    ``near_duplicates`` is recorded as another reference to that chunk: the
+    document lists the stored chunk's ID and its own text is dropped. This suits bulk
+    ingestion of scraped corpora. It does not suit live editing, where a
+    lightly edited chunk would be merged into its own previous version.
+    """
+
+    def __init__(self, near_duplicates: float | None = None) -> None:
+        """Initialize an empty store.
+
+        Args:
+            near_duplicates: Similarity threshold for merging near-duplicate
+                chunks (None merges exact duplicates only)
+        """
+        self._texts: dict[str, str] = {}
+        self._refs: dict[str, int] = {}
+        self._docs: dict[str, list[str]] = {}
+        self._near = (
+            NearDuplicateIndex(near_duplicates) if near_duplicates is not None else None
+        )
+        # chunk ID -> (source, position) pairs, built on demand by locations()
+        self._locations: dict[str, list[tuple[str, int]]] | None = None
+
+    def __len__(self) -> int:
+        """Number of distinct chunks stored."""
+        return len(self._texts)
+
+    def __contains__(self, chunk_id: object) -> bool:
+        """Whether a chunk with this ID is stored."""
+        return chunk_id in self._texts
+
+    @property
+    def dedup_ratio(self) -> float:
+        """Fraction of chunk references served by an already stored chunk."""
+        total = sum(self._refs.values())
+        return 1 - len(self._texts) / total if total else 0.0
+
+    def get(self, chunk_id: str) -> str | None:
+        """Return the text of a stored chunk, or None if it is unknown."""
+        return self._texts.get(chunk_id)
+
+    def chunk_ids(self, source: str) -> list[str]:
+        """Return the chunk IDs of a document in order (empty if unknown)."""
+        return list(self._docs.get(source, []))
+
+    def sources(self) -> list[str]:
+        """Return the identifiers of all ingested documents."""
+        return list(self._docs)
+
+    def locations(self, chunk_id: str) -> list[tuple[str, int]]:
+        """Return every (source, position) where a chunk occurs.
+
+        Args:
+            chunk_id: Chunk ID
+
+        Returns:
+            Document identifiers and positions in their chunk lists, in
+            ingestion order (empty if the chunk is unknown)
+        """
+        if self._locations is None:
+            self._locations = {}
+            for source, ids in self._docs.items():
+                for position, doc_chunk_id in enumerate(ids):
+                    self._locations.setdefault(doc_chunk_id, []).append(
+                        (source, position)
+                    )
+        return list(self._locations.get(chunk_id, []))
+
+    def ingest(self, source: str, chunks: Iterable[Chunk]) -> IngestResult:
+        """Store a document's chunks, replacing its previous version.
+
+        Args:
+            source: Document identifier
+            chunks: The document's chunks in order
+
+        Returns:
+            Which chunks are new, how many were reused, and which IDs were freed
+        """
+        result = IngestResult()
+        ids = []
+        chunks = list(chunks)
+        signatures: dict[int, np.ndarray] = {}
+        if self._near is not None:
+            fresh = [i for i, c in enumerate(chunks) if c.chunk_id not in self._texts]
+            signatures = dict(
+                zip(fresh, self._near.signatures([chunks[i].text for i in fresh]))
+            )
+        for i, chunk in enumerate(chunks):
+            chunk_id = chunk.chunk_id
+            if self._near is not None and chunk_id not in self._texts:
+                # Fresh before the loop too (nothing is removed until the end),
+                # so its signature was computed in the batch above
+                signature = signatures[i]
+                duplicate = self._near.find(signature)
+                if duplicate is None:
+                    self._near.add(chunk_id, signature)
+                else:
+                    chunk_id = duplicate
+                    result.merged += 1
+            ids.append(chunk_id)
+            if chunk_id in self._texts:
+                result.reused += 1
+            else:
+                self._texts[chunk_id] = chunk.text
+                self._refs[chunk_id] = 0
+                result.new.append(chunk)
+            self._refs[chunk_id] += 1
+        # Release the old version only after adding the new one, so unchanged
+        # chunks never drop to zero references in between
+        old = self._docs.get(source, [])
+        result.removed = self._release(old)
+        self._docs[source] = ids
+        self._relocate(source, old, ids)
+        return result
+
+    def remove(self, source: str) -> list[str]:
+        """Forget a document.
+
+        Args:
+            source: Document identifier
+
+        Returns:
+            IDs of chunks no longer referenced by any document
+        """
+        old = self._docs.pop(source, [])
+        self._relocate(source, old, [])
+        return self._release(old)
+
+    def _relocate(self, source: str, old: list[str], new: list[str]) -> None:
+        """Update the locations map (once built) for a document's new chunk list.
+
+        Only the chunks of that document are touched, so editing one document
+        of a large store does not rebuild the map.
+        """
+        if self._locations is None:
+            return
+        for chunk_id in set(old):
+            kept = [loc for loc in self._locations[chunk_id] if loc[0] != source]
+            if kept:
+                self._locations[chunk_id] = kept
+            else:
+                del self._locations[chunk_id]
+        for position, chunk_id in enumerate(new):
+            self._locations.setdefault(chunk_id, []).append((source, position))
+
+    def _release(self, ids: list[str]) -> list[str]:
+        """Drop one reference per ID and delete chunks that reach zero."""
+        freed = []
+        for chunk_id in ids:
+            self._refs[chunk_id] -= 1
+            if self._refs[chunk_id] == 0:
+                del self._refs[chunk_id]
+                del self._texts[chunk_id]
+                if self._near is not None:
+                    self._near.remove(chunk_id)
+                freed.append(chunk_id)
+        return freed
+
+    def to_dict(self) -> dict[str, Any]:
+        """Serialize the store to a JSON-compatible dict.
+
+        Reference counts are not stored; they are rebuilt from the documents.
+        """
+        return {"chunks": self._texts, "docs": self._docs}
+
+    @classmethod
+    def from_dict(
+        cls, data: dict[str, Any], near_duplicates: float | None = None
+    ) -> "ChunkStore":
+        """Rebuild a store serialized with to_dict.
+
+        Args:
+            data: Dict produced by to_dict
+            near_duplicates: Similarity threshold for merging near-duplicate
+                chunks from now on (signatures are recomputed from the texts)
+
+        Returns:
+            Restored ChunkStore
+        """
+        store = cls(near_duplicates)
+        store._texts = dict(data["chunks"])
+        if store._near is not None:
+            ids = list(store._texts)
+            texts = [store._texts[chunk_id] for chunk_id in ids]
+            for chunk_id, signature in zip(ids, store._near.signatures(texts)):
+                store._near.add(chunk_id, signature)
+        store._docs = {source: list(ids) for source, ids in data["docs"].items()}
+        for ids in store._docs.values():
+            for chunk_id in ids:
+                store._refs[chunk_id] = store._refs.get(chunk_id, 0) + 1
+        return store
@@ -0,0 +1,213 @@
+"""Token-budgeted context packing between the retriever and the agent.
+
+Retrieved chunks are pasted into the ReAct prompt and re-sent on every
+iteration, so each token should carry new information. Packing works in
+three steps:
+
+1. **Candidates**: the retriever returns more chunks than will fit.
+2. **Selection**: chunks are picked greedily by maximal marginal relevance
+   (MMR): ``lambda * sim(query, chunk) - (1 - lambda) * max sim(chunk,
+   selected)``. Near-duplicates of an already selected chunk score low, and
+   ones above ``duplicate_similarity`` are dropped outright. Chunks that do
+   not fit the remaining token budget are skipped. Chunk vectors come from
+   the embedding service, whose cache already holds them from indexing.
+3. **Merging**: selected chunks that are neighbours in the same document are
+   joined into one passage (removing any overlap between them), so the
+   prompt does not repeat the source header or overlapping text.
+
+This is a library stage: none of the agent's tools return retrieved chunks
+yet (search_web ranks corpus documents and search_notes ranks notes). Code
+that puts HybridRetriever or LiveIndex results into a prompt should go
+through pack_context and format_context.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+
+from src.config import (
+    CONTEXT_CANDIDATES,
+    CONTEXT_DUPLICATE_SIMILARITY,
+    CONTEXT_MMR_LAMBDA,
+    CONTEXT_TOKEN_BUDGET,
+)
+from src.rag.chunking import count_tokens
+from src.rag.embeddings import EmbeddingService
+from src.rag.retriever import ChunkSource, HybridRetriever
+
+_MAX_OVERLAP_CHARS = 2000  # Longest chunk overlap looked for when merging
+
+
+@dataclass
+class ContextPassage:
+    """One or more adjacent chunks of a document, ready for the prompt.
+
+    Attributes:
+        source: Document path or identifier
+        text: Passage text
+        chunk_ids: IDs of the merged chunks in document order
+        tokens: Approximate token count of text
+        relevance: Best query similarity among the merged chunks
+    """
+
+    source: str
+    text: str
+    chunk_ids: list[str]
+    tokens: int
+    relevance: float
+
+
+def mmr_select(
+    query_vector: np.ndarray,
+    vectors: np.ndarray,
+    costs: list[int],
+    budget: int,
+    mmr_lambda: float = CONTEXT_MMR_LAMBDA,
+    duplicate_similarity: float = CONTEXT_DUPLICATE_SIMILARITY,
+) -> list[int]:
+    """Pick candidates by maximal marginal relevance within a cost budget.
+
+    Args:
+        query_vector: (dim,) normalized query embedding
+        vectors: (n, dim) normalized candidate embeddings
+        costs: Token cost of each candidate
+        budget: Total tokens available
+        mmr_lambda: 1.0 ranks by relevance only; lower values favour diversity
+        duplicate_similarity: Candidates at least this similar to a selected
+            one are never picked
+
+    Returns:
+        Indices of the selected candidates, in selection order
+    """
+    n = len(vectors)
+    if n == 0:
+        return []
+    relevance = vectors @ query_vector
+    pairwise = vectors @ vectors.T
+    redundancy = np.full(n, -np.inf)  # Max similarity to anything selected
+    cost_array = np.asarray(costs)
+    available = cost_array <= budget
+    selected: list[int] = []
+    remaining = budget
+
+    while available.any():
+        penalty = np.where(np.isfinite(redundancy), redundancy, 0.0)
+        scores = mmr_lambda * relevance - (1 - mmr_lambda) * penalty
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        remaining -= costs[best]
+        redundancy = np.maximum(redundancy, pairwise[best])
+        available[best] = False
+        available &= redundancy < duplicate_similarity
+        available &= cost_array <= remaining
+    return selected
+
+
+def _join(first: str, second: str) -> str:
+    """Concatenate two neighbouring chunks, dropping text they share."""
+    longest = min(len(first), len(second), _MAX_OVERLAP_CHARS)
+    for size in range(longest, 0, -1):
+        if first.endswith(second[:size]):
+            if size >= 20 or second[:size].endswith(("\n", " ")):
+                return first + second[size:]
+            break  # Too short to be real overlap rather than a coincidence
+    if first.endswith((" ", "\t")):
+        return first + second  # Cut mid-line (content-defined chunks)
+    return first.rstrip("\n") + "\n\n" + second
+
+
+def merge_adjacent(
+    chunk_ids: list[str], relevance: list[float], chunks: ChunkSource
+) -> list[ContextPassage]:
+    """Group selected chunks into passages of consecutive document chunks.
+
+    Passages keep the order in which their most relevant chunk was selected.
+
+    Args:
+        chunk_ids: Selected chunk IDs, in selection order
+        relevance: Query similarity of each selected chunk
+        chunks: Store that knows each chunk's document and position
+
+    Returns:
+        Passages, one per run of adjacent chunks
+    """
+    placed: list[tuple[int, str, int, str, float]] = []
+    for order, (chunk_id, score) in enumerate(zip(chunk_ids, relevance)):
+        locations = chunks.locations(chunk_id)
+        source, position = locations[0] if locations else ("", order)
+        placed.append((order, source, position, chunk_id, score))
+
+    passages: list[tuple[int, ContextPassage]] = []
+    last: tuple[str, int] | None = None
+    for order, source, position, chunk_id, score in sorted(
+        placed, key=lambda item: (item[1], item[2])
+    ):
+        text = chunks.get(chunk_id) or ""
+        if last == (source, position - 1) and source:
+            first_order, passage = passages[-1]
+            passage.text = _join(passage.text, text)
+            passage.chunk_ids.append(chunk_id)
+            passage.relevance = max(passage.relevance, score)
+            passages[-1] = (min(first_order, order), passage)
+        else:
+            passage = ContextPassage(source, text, [chunk_id], 0, score)
+            passages.append((order, passage))
+        last = (source, position)
+
+    for _, passage in passages:
+        passage.tokens = count_tokens(passage.text)
+    return [passage for _, passage in sorted(passages, key=lambda item: item[0])]
+
+
+def pack_context(
+    query: str,
+    retriever: HybridRetriever,
+    embedder: EmbeddingService,
+    token_budget: int = CONTEXT_TOKEN_BUDGET,
+    candidates: int = CONTEXT_CANDIDATES,
+    mmr_lambda: float = CONTEXT_MMR_LAMBDA,
+) -> list[ContextPassage]:
+    """Retrieve, de-duplicate and merge chunks for a query within a token budget.
+
+    Args:
+        query: Free-text query
+        retriever: Retriever over the chunks
+        embedder: Embedding service used to index the chunks
+        token_budget: Maximum approximate tokens of all passages together
+        candidates: Chunks retrieved before selection
+        mmr_lambda: Relevance/diversity trade-off (see mmr_select)
+
+    Returns:
+        Passages to put in the prompt, most relevant first
+    """
+    found = [
+        chunk_id
+        for chunk_id, _ in retriever.search(query, candidates)
+        if chunk_id in retriever.chunks
+    ]
+    if not found:
+        return []
+    texts = [retriever.chunks.get(chunk_id) or "" for chunk_id in found]
+    vectors = embedder.embed(texts)
+    query_vector = embedder.embed_query(query)
+    costs = [count_tokens(text) for text in texts]
+
+    picked = mmr_select(query_vector, vectors, costs, token_budget, mmr_lambda)
+    relevance = (vectors[picked] @ query_vector).tolist() if picked else []
+    return merge_adjacent([found[i] for i in picked], relevance, retriever.chunks)
+
+
+def format_context(passages: list[ContextPassage]) -> str:
+    """Render passages as a numbered block for the prompt.
+
+    Args:
+        passages: Output of pack_context
+
+    Returns:
+        Text with one "[n] source" header per passage
+    """
+    return "\n\n".join(
+        f"[{i}] {passage.source or 'unknown source'}\n{passage.text.strip()}"
+        for i, passage in enumerate(passages, start=1)
+    )
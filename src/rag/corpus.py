@@ -0,0 +1,806 @@
+"""Offline full-text search engine over the local document corpus in data/.
+
+This backs the ``search_web`` tool in air-gapped deployments. Documents
+(HTML, Markdown, plain text) are indexed once into a compact on-disk inverted
+index and queried with BM25, returning ranked snippets with the query terms
+highlighted.
+
+Building the index (SPIMI-style, so memory stays bounded):
+
+1. Files are parsed and tokenized in parallel worker processes.
+2. The main process collects postings into an in-memory block and spills it to
+   a sorted segment file whenever it exceeds ``block_postings`` entries.
+3. Segments are merged with a streaming k-way merge into the final index.
+
+Index layout (all read through memory maps, nothing is loaded eagerly)::
+
+    data/.index/
+    ├── meta.json          document count, total length, format version,
+    │                      corpus root and manifest (file count, newest mtime)
+    ├── terms.bin          sorted vocabulary, concatenated UTF-8
+    ├── lexicon.bin        per term: term offset/len, postings offset, doc freq
+    ├── postings.bin       per term: uint32 doc IDs followed by uint16 tfs
+    ├── doc_lengths.npy    uint32 token count per document
+    ├── paths.bin          concatenated document paths (relative to the corpus)
+    └── path_offsets.npy   uint64 start offset of each path (n_docs + 1 entries)
+
+Rebuild with ``just index-corpus``. If no index exists when search_web is
+first set up, it is built on a background thread and searches answer without
+it until the build finishes. An existing index whose manifest no longer
+matches the corpus keeps answering while it is rebuilt the same way.
+"""
+
+import heapq
+import itertools
+import json
+import mmap
+import multiprocessing
+import os
+import re
+import shutil
+import struct
+import threading
+import time
+from array import array
+from collections import Counter, deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from dataclasses import dataclass
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator
+
+import numpy as np
+
+from src.config import (
+    CORPUS_BLOCK_POSTINGS,
+    CORPUS_DIR,
+    CORPUS_INDEX_DIR,
+    CORPUS_SNIPPET_CHARS,
+)
+from src.rag.sparse import tokenize
+
+INDEX_FORMAT_VERSION = 1
+SUPPORTED_SUFFIXES = {".html", ".htm", ".md", ".markdown", ".txt"}
+
+_LEXICON_ENTRY = struct.Struct("<QQII")  # term offset, postings offset, len, df
+_SEGMENT_HEADER = struct.Struct("<HI")  # term length, number of postings
+_MAX_TF = 0xFFFF
+_MAX_TERM_CHARS = 100  # Longer "words" are blobs (base64, hashes), not search terms
+_PARSE_BATCH_SIZE = 64
+
+
+class _HTMLTextExtractor(HTMLParser):
+    """Collect visible text and the <title> of an HTML document."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.parts: list[str] = []
+        self.title = ""
+        self._skip_depth = 0
+        self._in_title = False
+
+    def handle_starttag(self, tag: str, attrs: list) -> None:
+        if tag in ("script", "style"):
+            self._skip_depth += 1
+        elif tag == "title":
+            self._in_title = True
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag in ("script", "style") and self._skip_depth:
+            self._skip_depth -= 1
+        elif tag == "title":
+            self._in_title = False
+
+    def handle_data(self, data: str) -> None:
+        if self._in_title:
+            self.title += data
+        elif not self._skip_depth:
+            self.parts.append(data)
+
+
+def extract_text(path: Path) -> tuple[str, str]:
+    """Read a corpus document and return its title and plain text.
+
+    Args:
+        path: HTML, Markdown or text file
+
+    Returns:
+        Tuple of (title, text). The title falls back to the first Markdown
+        heading, then to the file name.
+    """
+    raw = path.read_text(encoding="utf-8", errors="replace")
+    if path.suffix.lower() in (".html", ".htm"):
+        parser = _HTMLTextExtractor()
+        parser.feed(raw)
+        text = " ".join(" ".join(parser.parts).split())
+        return (parser.title.strip() or path.stem, text)
+
+    for line in raw.splitlines():
+        if line.startswith("#"):
+            return (line.lstrip("#").strip() or path.stem, raw)
+        if line.strip():
+            break
+    return (path.stem, raw)
+
+
+def term_counts(text: str) -> tuple[int, dict[str, int]]:
+    """Tokenize a document for indexing.
+
+    Args:
+        text: Document text (including its title)
+
+    Returns:
+        Tuple of (token count, term -> count); blob-like "words" longer than
+        _MAX_TERM_CHARS count towards the length but are not indexed
+    """
+    tokens = tokenize(text)
+    return len(tokens), dict(Counter(t for t in tokens if len(t) <= _MAX_TERM_CHARS))
+
+
+def _parse_batch(paths: list[str]) -> list[tuple[int, dict[str, int]]]:
+    """Tokenize a batch of documents (runs in a worker process).
+
+    Returns:
+        One (document length, term counts) tuple per path, in order
+    """
+    results = []
+    for path in paths:
+        try:
+            title, text = extract_text(Path(path))
+        except OSError:
+            results.append((0, {}))
+            continue
+        results.append(term_counts(f"{title}\n{text}"))
+    return results
+
+
+def iter_corpus_files(root: Path, exclude: Path | None = None) -> Iterator[Path]:
+    """Walk a corpus directory in a stable order.
+
+    Args:
+        root: Corpus directory
+        exclude: Directory to skip (typically the index itself)
+
+    Yields:
+        Paths of supported documents, skipping hidden files and directories
+    """
+    for dirpath, dirnames, filenames in os.walk(root):
+        current = Path(dirpath)
+        dirnames[:] = sorted(
+            d
+            for d in dirnames
+            if not d.startswith(".") and (exclude is None or current / d != exclude)
+        )
+        for name in sorted(filenames):
+            path = current / name
+            if not name.startswith(".") and path.suffix.lower() in SUPPORTED_SUFFIXES:
+                yield path
+
+
+def corpus_manifest(root: Path, exclude: Path | None = None) -> dict[str, int]:
+    """Summarize a corpus cheaply enough to check on every open.
+
+    Args:
+        root: Corpus directory
+        exclude: Directory to skip (typically the index itself)
+
+    Returns:
+        Number of supported documents and the newest mtime (ns) among them;
+        adding, deleting or editing a document changes one or the other
+    """
+    files = max_mtime_ns = 0
+    for path in iter_corpus_files(root, exclude):
+        files += 1
+        max_mtime_ns = max(max_mtime_ns, path.stat().st_mtime_ns)
+    return {"files": files, "max_mtime_ns": max_mtime_ns}
+
+
+def _iter_parsed(
+    paths: Iterator[Path], workers: int
+) -> Iterator[tuple[Path, int, dict[str, int]]]:
+    """Parse documents in a process pool, preserving input order.
+
+    Only ``workers * 2`` batches are in flight at once, so the path iterator
+    is consumed lazily and memory does not grow with corpus size.
+    """
+
+    def batches() -> Iterator[list[Path]]:
+        batch: list[Path] = []
+        for path in paths:
+            batch.append(path)
+            if len(batch) == _PARSE_BATCH_SIZE:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    if workers <= 1:
+        for batch in batches():
+            for path, (length, counts) in zip(
+                batch, _parse_batch([str(p) for p in batch])
+            ):
+                yield path, length, counts
+        return
+
+    # Spawn rather than fork: builds may run on a background thread
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        in_flight: deque[tuple[list[Path], Future]] = deque()
+        for batch in batches():
+            in_flight.append(
+                (batch, executor.submit(_parse_batch, [str(p) for p in batch]))
+            )
+            if len(in_flight) >= workers * 2:
+                done_batch, future = in_flight.popleft()
+                for path, (length, counts) in zip(done_batch, future.result()):
+                    yield path, length, counts
+        while in_flight:
+            done_batch, future = in_flight.popleft()
+            for path, (length, counts) in zip(done_batch, future.result()):
+                yield path, length, counts
+
+
+def _write_segment(block: dict[str, tuple[array, array]], path: Path) -> None:
+    """Spill an in-memory postings block to a term-sorted segment file."""
+    with open(path, "wb") as f:
+        for term in sorted(block):
+            docs, tfs = block[term]
+            encoded = term.encode("utf-8")
+            f.write(_SEGMENT_HEADER.pack(len(encoded), len(docs)))
+            f.write(encoded)
+            f.write(docs.tobytes())
+            f.write(tfs.tobytes())
+
+
+def _read_segment(
+    f: BinaryIO, segment_no: int
+) -> Iterator[tuple[str, int, bytes, bytes]]:
+    """Stream (term, segment number, doc bytes, tf bytes) from a segment file."""
+    while header := f.read(_SEGMENT_HEADER.size):
+        term_len, n = _SEGMENT_HEADER.unpack(header)
+        term = f.read(term_len).decode("utf-8")
+        yield term, segment_no, f.read(4 * n), f.read(2 * n)
+
+
+def _write_lexicon(
+    build_dir: Path, postings: Iterable[tuple[str, bytes, bytes]]
+) -> int:
+    """Write terms.bin, lexicon.bin and postings.bin from term-sorted postings.
+
+    Args:
+        build_dir: Directory of the index being written
+        postings: (term, uint32 doc ID bytes, uint16 tf bytes) in term order
+
+    Returns:
+        Number of terms written
+    """
+    n_terms = 0
+    with (
+        open(build_dir / "terms.bin", "wb") as terms_file,
+        open(build_dir / "lexicon.bin", "wb") as lexicon_file,
+        open(build_dir / "postings.bin", "wb") as postings_file,
+    ):
+        term_offset = postings_offset = 0
+        for term, docs, tfs in postings:
+            encoded = term.encode("utf-8")
+            df = len(docs) // 4
+            lexicon_file.write(
+                _LEXICON_ENTRY.pack(term_offset, postings_offset, len(encoded), df)
+            )
+            terms_file.write(encoded)
+            postings_file.write(docs)
+            postings_file.write(tfs)
+            term_offset += len(encoded)
+            postings_offset += len(docs) + len(tfs)
+            n_terms += 1
+    return n_terms
+
+
+def _finish_index(
+    build_dir: Path,
+    index_dir: Path,
+    root: Path,
+    n_terms: int,
+    total_length: int,
+    corpus: dict[str, int] | None = None,
+) -> "CorpusIndex":
+    """Write meta.json and swap a finished build directory into place.
+
+    The root is stored relative to the index directory, so a corpus can be
+    moved or mounted elsewhere together with its index.
+    """
+    n_docs = len(np.load(build_dir / "doc_lengths.npy", mmap_mode="r"))
+    meta = {
+        "version": INDEX_FORMAT_VERSION,
+        "n_docs": n_docs,
+        "n_terms": n_terms,
+        "total_length": total_length,
+        "root": os.path.relpath(root, index_dir),
+        "corpus": corpus,
+    }
+    (build_dir / "meta.json").write_text(json.dumps(meta), encoding="utf-8")
+
+    old_dir = index_dir.with_name(f"{index_dir.name}.old-{os.getpid()}")
+    if index_dir.exists():
+        os.replace(index_dir, old_dir)
+    os.replace(build_dir, index_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    return CorpusIndex(index_dir)
+
+
+def write_index(
+    index_dir: Path,
+    root: Path,
+    docs: Iterable[tuple[str, int, dict[str, int]]],
+    block_postings: int = CORPUS_BLOCK_POSTINGS,
+    corpus: dict[str, int] | None = None,
+) -> "CorpusIndex":
+    """Index tokenized documents, spilling sorted segments to bound memory.
+
+    The index is built in a temporary directory and swapped into place, so
+    readers of an existing index never see a half-written one.
+
+    Args:
+        index_dir: Destination directory for the index
+        root: Directory the document paths are relative to
+        docs: (path, token count, term counts) per document, in doc ID order
+        block_postings: Postings held in memory before spilling a segment
+        corpus: corpus_manifest of the documents, checked when the index is
+            opened to tell whether it is stale
+
+    Returns:
+        The freshly written CorpusIndex
+    """
+    build_dir = index_dir.with_name(f"{index_dir.name}.build-{os.getpid()}")
+    shutil.rmtree(build_dir, ignore_errors=True)
+    build_dir.mkdir(parents=True)
+
+    doc_lengths = array("I")
+    path_offsets = array("Q", [0])
+    segments: list[Path] = []
+    block: dict[str, tuple[array, array]] = {}
+    block_size = 0
+
+    with open(build_dir / "paths.bin", "wb") as paths_file:
+        for doc_id, (path, length, counts) in enumerate(docs):
+            encoded = path.encode("utf-8")
+            paths_file.write(encoded)
+            path_offsets.append(path_offsets[-1] + len(encoded))
+            doc_lengths.append(length)
+            for term, tf in counts.items():
+                entry = block.get(term)
+                if entry is None:
+                    entry = block[term] = (array("I"), array("H"))
+                entry[0].append(doc_id)
+                entry[1].append(min(tf, _MAX_TF))
+            block_size += len(counts)
+            if block_size >= block_postings:
+                segments.append(build_dir / f"segment-{len(segments)}.tmp")
+                _write_segment(block, segments[-1])
+                block, block_size = {}, 0
+    if block:
+        segments.append(build_dir / f"segment-{len(segments)}.tmp")
+        _write_segment(block, segments[-1])
+        block = {}
+
+    np.save(build_dir / "doc_lengths.npy", np.frombuffer(doc_lengths, np.uint32))
+    np.save(build_dir / "path_offsets.npy", np.frombuffer(path_offsets, np.uint64))
+
+    # Merge segments: doc IDs grow with segment number, so concatenating a
+    # term's postings in segment order keeps them sorted.
+    handles = [open(path, "rb") for path in segments]
+    try:
+        merged = heapq.merge(*(_read_segment(f, i) for i, f in enumerate(handles)))
+        n_terms = _write_lexicon(
+            build_dir,
+            (
+                (
+                    term,
+                    b"".join(part[2] for part in parts),
+                    b"".join(part[3] for part in parts),
+                )
+                for term, group in itertools.groupby(merged, key=lambda item: item[0])
+                for parts in [list(group)]
+            ),
+        )
+    finally:
+        for f in handles:
+            f.close()
+        for path in segments:
+            path.unlink()
+    return _finish_index(build_dir, index_dir, root, n_terms, sum(doc_lengths), corpus)
+
+
+def _tagged_postings(
+    index: "CorpusIndex", part: int
+) -> Iterator[tuple[str, int, np.ndarray, np.ndarray]]:
+    """Yield (term, part, doc IDs, tfs) for every term of one merged index."""
+    for term, docs, tfs in index.iter_postings():
+        yield term, part, docs, tfs
+
+
+def merge_indexes(
+    index_dir: Path, root: Path, parts: list[tuple["CorpusIndex", np.ndarray]]
+) -> "CorpusIndex":
+    """Merge indexes into one, dropping deleted documents.
+
+    Documents are renumbered in order, part after part; each term's postings
+    are streamed from the parts' lexicons in one k-way merge, so memory stays
+    bounded by the postings of one term.
+
+    Args:
+        index_dir: Destination directory for the merged index
+        root: Directory the document paths are relative to
+        parts: (index, boolean mask of its deleted documents) pairs
+
+    Returns:
+        The merged CorpusIndex
+    """
+    build_dir = index_dir.with_name(f"{index_dir.name}.build-{os.getpid()}")
+    shutil.rmtree(build_dir, ignore_errors=True)
+    build_dir.mkdir(parents=True)
+
+    remaps = []
+    lengths = []
+    path_offsets = array("Q", [0])
+    next_id = 0
+    with open(build_dir / "paths.bin", "wb") as paths_file:
+        for index, deleted in parts:
+            live = np.flatnonzero(~deleted)
+            remap = np.full(index.n_docs, -1, dtype=np.int64)
+            remap[live] = np.arange(next_id, next_id + len(live))
+            next_id += len(live)
+            remaps.append(remap)
+            lengths.append(np.asarray(index.doc_lengths[live], dtype=np.uint32))
+            for doc_id in live:
+                encoded = index.doc_path(int(doc_id)).encode("utf-8")
+                paths_file.write(encoded)
+                path_offsets.append(path_offsets[-1] + len(encoded))
+    doc_lengths = np.concatenate(lengths) if lengths else np.empty(0, np.uint32)
+    np.save(build_dir / "doc_lengths.npy", doc_lengths)
+    np.save(build_dir / "path_offsets.npy", np.frombuffer(path_offsets, np.uint64))
+
+    def postings() -> Iterator[tuple[str, bytes, bytes]]:
+        streams = [
+            _tagged_postings(index, part) for part, (index, _) in enumerate(parts)
+        ]
+        merged = heapq.merge(*streams, key=lambda item: (item[0], item[1]))
+        for term, group in itertools.groupby(merged, key=lambda item: item[0]):
+            doc_parts, tf_parts = [], []
+            for _, part, docs, tfs in group:
+                new_ids = remaps[part][docs]
+                live = new_ids >= 0
+                doc_parts.append(new_ids[live].astype(np.uint32))
+                tf_parts.append(tfs[live])
+            docs = np.concatenate(doc_parts)
+            if len(docs):  # Terms only deleted documents had are dropped
+                yield term, docs.tobytes(), np.concatenate(tf_parts).tobytes()
+
+    n_terms = _write_lexicon(build_dir, postings())
+    return _finish_index(
+        build_dir, index_dir, root, n_terms, int(doc_lengths.sum(dtype=np.int64))
+    )
+
+
+def build_corpus_index(
+    root: Path,
+    index_dir: Path,
+    workers: int | None = None,
+    block_postings: int = CORPUS_BLOCK_POSTINGS,
+) -> "CorpusIndex":
+    """Index every supported document under a corpus directory.
+
+    Args:
+        root: Corpus directory
+        index_dir: Destination directory for the index (replaced atomically)
+        workers: Parser processes (defaults to the CPU count)
+        block_postings: Postings held in memory before spilling a segment
+
+    Returns:
+        The freshly built CorpusIndex
+    """
+    workers = workers or os.cpu_count() or 1
+    # Taken before parsing, so documents edited mid-build make the index stale
+    manifest = corpus_manifest(root, exclude=index_dir)
+    files = iter_corpus_files(root, exclude=index_dir)
+    docs = (
+        (str(path.relative_to(root)), length, counts)
+        for path, length, counts in _iter_parsed(files, workers)
+    )
+    return write_index(index_dir, root, docs, block_postings, manifest)
+
+
+@dataclass(frozen=True)
+class SearchResult:
+    """A ranked document from the corpus.
+
+    Attributes:
+        path: Document path relative to the corpus root
+        title: Document title
+        score: BM25 score
+        snippet: Best-matching excerpt with query terms in **bold**
+    """
+
+    path: str
+    title: str
+    score: float
+    snippet: str
+
+
+def _map_file(path: Path) -> mmap.mmap | bytes:
+    """Memory-map a file read-only (empty files cannot be mapped)."""
+    if path.stat().st_size == 0:
+        return b""
+    with open(path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def make_snippet(text: str, terms: set[str], width: int) -> str:
+    """Pick the excerpt with the most distinct query terms and highlight them.
+
+    Args:
+        text: Document text
+        terms: Lowercase query terms
+        width: Approximate snippet length in characters
+
+    Returns:
+        Excerpt with matched terms wrapped in ``**``
+    """
+    if not terms:
+        return " ".join(text[:width].split())
+    pattern = re.compile(
+        r"\b(" + "|".join(re.escape(t) for t in sorted(terms)) + r")\b", re.IGNORECASE
+    )
+    # Cap the candidates so very long documents stay cheap to snippet
+    matches = list(itertools.islice(pattern.finditer(text), 200))
+    start = 0
+    if matches:
+        best = -1
+        for i, match in enumerate(matches):
+            window = {
+                m.group(1).lower()
+                for m in matches[i:]
+                if m.start() < match.start() + width
+            }
+            if len(window) > best:
+                best, start = len(window), max(0, match.start() - width // 4)
+    excerpt = " ".join(text[start : start + width].split())
+    highlighted = pattern.sub(r"**\1**", excerpt)
+    prefix = "..." if start > 0 else ""
+    suffix = "..." if start + width < len(text) else ""
+    return f"{prefix}{highlighted}{suffix}"
+
+
+class CorpusIndex:
+    """Read-only, memory-mapped view of a corpus index built by build_corpus_index."""
+
+    index_dir: Path
+    root: Path
+    n_docs: int
+    corpus: dict[str, int] | None
+
+    def __init__(self, index_dir: Path, k1: float = 1.2, b: float = 0.75) -> None:
+        """Open an index. Only metadata is read; everything else is mapped lazily.
+
+        Args:
+            index_dir: Directory written by build_corpus_index
+            k1: BM25 term-frequency saturation
+            b: BM25 length normalization
+
+        Raises:
+            ValueError: If the index was written by an incompatible version
+        """
+        self.index_dir = Path(index_dir)
+        meta = json.loads((self.index_dir / "meta.json").read_text(encoding="utf-8"))
+        if meta["version"] != INDEX_FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported corpus index version {meta['version']} "
+                f"(expected {INDEX_FORMAT_VERSION}). Rebuild with `just index-corpus`."
+            )
+        self.root = Path(os.path.normpath(self.index_dir / meta["root"]))
+        self.corpus = meta.get("corpus")
+        self.n_docs = meta["n_docs"]
+        self.n_terms = meta["n_terms"]
+        self.total_length = meta["total_length"]
+        self.k1 = k1
+        self.b = b
+        self._avg_length = self.total_length / self.n_docs if self.n_docs else 0.0
+        self._terms = _map_file(self.index_dir / "terms.bin")
+        self._lexicon = _map_file(self.index_dir / "lexicon.bin")
+        self._postings = _map_file(self.index_dir / "postings.bin")
+        self._paths = _map_file(self.index_dir / "paths.bin")
+        self.doc_lengths = np.load(self.index_dir / "doc_lengths.npy", mmap_mode="r")
+        self._path_offsets = np.load(self.index_dir / "path_offsets.npy", mmap_mode="r")
+
+    def _term_at(self, i: int) -> tuple[bytes, int, int]:
+        """Return (term bytes, postings offset, doc freq) of lexicon entry i."""
+        term_off, post_off, term_len, df = _LEXICON_ENTRY.unpack_from(
+            self._lexicon, i * _LEXICON_ENTRY.size
+        )
+        return self._terms[term_off : term_off + term_len], post_off, df
+
+    def postings(self, term: str) -> tuple[np.ndarray, np.ndarray] | None:
+        """Binary-search the lexicon and return (doc IDs, tfs) for a term."""
+        target = term.encode("utf-8")
+        lo, hi = 0, self.n_terms
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._term_at(mid)[0] < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == self.n_terms:
+            return None
+        found, post_off, df = self._term_at(lo)
+        if found != target:
+            return None
+        docs = np.frombuffer(self._postings, np.uint32, df, post_off)
+        tfs = np.frombuffer(self._postings, np.uint16, df, post_off + 4 * df)
+        return docs, tfs
+
+    def iter_postings(self) -> Iterator[tuple[str, np.ndarray, np.ndarray]]:
+        """Yield (term, doc IDs, tfs) for every term, in term order."""
+        for i in range(self.n_terms):
+            term, post_off, df = self._term_at(i)
+            yield (
+                bytes(term).decode("utf-8"),
+                np.frombuffer(self._postings, np.uint32, df, post_off),
+                np.frombuffer(self._postings, np.uint16, df, post_off + 4 * df),
+            )
+
+    def doc_path(self, doc_id: int) -> str:
+        """Return the corpus-relative path of a document."""
+        start, end = (
+            int(self._path_offsets[doc_id]),
+            int(self._path_offsets[doc_id + 1]),
+        )
+        return bytes(self._paths[start:end]).decode("utf-8")
+
+    def rank(self, query: str, k: int) -> list[tuple[int, float]]:
+        """Score documents with BM25 without reading any document text.
+
+        Args:
+            query: Free-text query
+            k: Maximum number of results
+
+        Returns:
+            List of (doc_id, score) tuples, best first
+        """
+        if self.n_docs == 0 or k <= 0:
+            return []
+        doc_parts: list[np.ndarray] = []
+        score_parts: list[np.ndarray] = []
+        for term in set(tokenize(query)):
+            postings = self.postings(term)
+            if postings is None:
+                continue
+            docs, tfs = postings
+            df = len(docs)
+            idf = np.log(1 + (self.n_docs - df + 0.5) / (df + 0.5))
+            tf = tfs.astype(np.float32)
+            lengths = self.doc_lengths[docs].astype(np.float32)
+            norm = self.k1 * (1 - self.b + self.b * lengths / self._avg_length)
+            doc_parts.append(docs)
+            score_parts.append(idf * tf * (self.k1 + 1) / (tf + norm))
+        if not doc_parts:
+            return []
+
+        # Sum per-term contributions only over documents that matched something
+        all_docs = np.concatenate(doc_parts)
+        unique_docs, inverse = np.unique(all_docs, return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(score_parts))
+        k = min(k, len(unique_docs))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(unique_docs[i]), float(scores[i])) for i in top]
+
+    def search(self, query: str, k: int = 5) -> list[SearchResult]:
+        """Rank documents and build highlighted snippets for the top results.
+
+        Args:
+            query: Free-text query
+            k: Maximum number of results
+
+        Returns:
+            SearchResults, best first
+        """
+        terms = set(tokenize(query))
+        results = []
+        for doc_id, score in self.rank(query, k):
+            rel_path = self.doc_path(doc_id)
+            try:
+                title, text = extract_text(self.root / rel_path)
+            except OSError:
+                continue  # Document deleted since indexing
+            results.append(
+                SearchResult(
+                    path=rel_path,
+                    title=title,
+                    score=score,
+                    snippet=make_snippet(text, terms, CORPUS_SNIPPET_CHARS),
+                )
+            )
+        return results
+
+
+_default_index: CorpusIndex | None = None
+_default_build: tuple[Path, Future] | None = None  # (index dir, running build)
+_default_lock = threading.Lock()
+_builder = ThreadPoolExecutor(max_workers=1, thread_name_prefix="corpus-index")
+
+
+def _install_rebuild(build: Future) -> None:
+    """Swap a finished background rebuild in for the stale shared index."""
+    global _default_index, _default_build
+    with _default_lock:
+        if _default_build is None or _default_build[1] is not build:
+            return
+        index_dir, _ = _default_build
+        _default_build = None
+        if build.exception() is None and index_dir == CORPUS_INDEX_DIR:
+            _default_index = build.result()
+
+
+def get_corpus_index(timeout: float | None = 0.0) -> CorpusIndex | None:
+    """Return the index over CORPUS_DIR, building it in the background if needed.
+
+    The first call without an index on disk starts the build on a worker
+    thread rather than blocking the caller for the whole corpus. An index
+    on disk is checked against the corpus_manifest of CORPUS_DIR when it is
+    opened; if documents were added, removed or edited since it was built,
+    it keeps answering while a fresh one is built in the background.
+
+    Args:
+        timeout: Seconds to wait for a build in progress (None = until done)
+
+    Returns:
+        Shared CorpusIndex instance, or None while the first one is being built
+    """
+    global _default_index, _default_build
+    stale = None
+    with _default_lock:
+        if _default_index is not None and _default_index.index_dir == CORPUS_INDEX_DIR:
+            return _default_index
+        if _default_build is None or _default_build[0] != CORPUS_INDEX_DIR:
+            if (CORPUS_INDEX_DIR / "meta.json").exists():
+                stale = CorpusIndex(CORPUS_INDEX_DIR)
+                if stale.corpus == corpus_manifest(CORPUS_DIR, CORPUS_INDEX_DIR):
+                    _default_index = stale
+                    return stale
+                _default_index = stale
+            build = _builder.submit(build_corpus_index, CORPUS_DIR, CORPUS_INDEX_DIR)
+            _default_build = (CORPUS_INDEX_DIR, build)
+        index_dir, build = _default_build
+    if stale is not None:
+        # Outside the lock: the callback runs right away if the build is done
+        build.add_done_callback(_install_rebuild)
+        return stale
+    try:
+        index = build.result(timeout)
+    except FutureTimeoutError:
+        return None
+    except BaseException:
+        with _default_lock:
+            if _default_build is not None and _default_build[1] is build:
+                _default_build = None  # Let the next call retry
+        raise
+    with _default_lock:
+        if index_dir == CORPUS_INDEX_DIR:
+            _default_index = index
+    return index
+
+
+def main() -> None:
+    """Rebuild the corpus index from the command line."""
+    start = time.perf_counter()
+    index = build_corpus_index(CORPUS_DIR, CORPUS_INDEX_DIR)
+    elapsed = time.perf_counter() - start
+    print(
+        f"Indexed {index.n_docs} documents ({index.n_terms} terms) "
+        f"from {CORPUS_DIR} in {elapsed:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
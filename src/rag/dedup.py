@@ -0,0 +1,196 @@
+"""Near-duplicate chunk detection with MinHash signatures and LSH banding.
+
+Exact duplicates are already stored once by ChunkStore, because identical
+text has an identical content hash. Scraped corpora are mostly made of
+*near* duplicates instead: boilerplate with a changed date, mirrored pages
+with a different footer. Those are caught here before they are embedded.
+
+1. **Shingles**: a chunk becomes the set of its lower-cased word 3-grams,
+   each hashed to an integer (one CRC-32 per word, combined arithmetically).
+2. **MinHash**: ``permutations`` multiply-shift hash functions are applied to
+   every shingle at once in numpy; the minimum per function is the
+   signature. The fraction of equal signature entries between two chunks
+   estimates the Jaccard similarity of their shingle sets.
+3. **LSH**: signatures are cut into bands, and chunks that agree on every
+   entry of at least one band land in the same bucket. Only bucket mates are
+   compared, so a lookup costs O(bands) instead of a scan of the store. The
+   band count is chosen so the probability of sharing a bucket rises
+   steeply around the similarity threshold.
+
+Example:
+    >>> index = NearDuplicateIndex(threshold=0.8)
+    >>> text = " ".join(f"word{i}" for i in range(100))
+    >>> a, b = index.signatures([text, text + " Updated 2024."])
+    >>> index.add("a", a)
+    >>> index.find(b)
+    'a'
+"""
+
+import re
+import zlib
+
+import numpy as np
+
+from src.config import MINHASH_PERMUTATIONS, NEAR_DUPLICATE_THRESHOLD
+
+_WORD_RE = re.compile(r"\w+")
+_SHINGLE_WORDS = 3
+# Odd multipliers combining the word hashes of a shingle into one integer
+_SHINGLE_MIX = np.array(
+    [0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9], dtype=np.uint64
+)
+
+
+def shingle_hashes(text: str) -> np.ndarray:
+    """Hash the word 3-grams of a text.
+
+    Args:
+        text: Text to shingle (case and punctuation are ignored)
+
+    Returns:
+        Distinct uint64 shingle hashes; texts shorter than three words give
+        one shingle of all their words (the empty text hashes to one value)
+    """
+    words = np.array(
+        [zlib.crc32(word.encode("utf-8")) for word in _WORD_RE.findall(text.lower())],
+        dtype=np.uint64,
+    )
+    if len(words) < _SHINGLE_WORDS:
+        return (words * _SHINGLE_MIX[: len(words)]).sum(keepdims=True, dtype=np.uint64)
+    windows = np.lib.stride_tricks.sliding_window_view(words, _SHINGLE_WORDS)
+    return np.unique((windows * _SHINGLE_MIX).sum(axis=1, dtype=np.uint64))
+
+
+def lsh_bands(threshold: float, permutations: int) -> tuple[int, int]:
+    """Choose the LSH band layout for a similarity threshold.
+
+    Two chunks with Jaccard similarity s share a bucket with probability
+    1 - (1 - s^rows)^bands. The layout minimizing the area of false positives
+    (below the threshold) plus false negatives (above it) is returned.
+
+    Args:
+        threshold: Jaccard similarity that should count as a duplicate
+        permutations: Signature length
+
+    Returns:
+        Tuple of (bands, rows per band), with bands * rows <= permutations
+    """
+    similarity = np.linspace(0.0, 1.0, 201)
+    below = similarity < threshold
+    best, layout = np.inf, (1, permutations)
+    for bands in range(1, permutations + 1):
+        rows = permutations // bands
+        collide = 1 - (1 - similarity**rows) ** bands
+        error = collide[below].sum() + (1 - collide[~below]).sum()
+        if error < best:
+            best, layout = error, (bands, rows)
+    return layout
+
+
+class NearDuplicateIndex:
+    """LSH index of MinHash signatures, keyed by chunk ID.
+
+    Attributes:
+        threshold: Estimated Jaccard similarity at which find() reports a match
+        bands: LSH bands per signature
+        rows: Signature entries per band
+    """
+
+    def __init__(
+        self,
+        threshold: float = NEAR_DUPLICATE_THRESHOLD,
+        permutations: int = MINHASH_PERMUTATIONS,
+        seed: int = 0,
+    ) -> None:
+        """Initialize an empty index.
+
+        Args:
+            threshold: Estimated Jaccard similarity that counts as a duplicate
+            permutations: MinHash functions per signature (more = less noise)
+            seed: Seed of the hash functions; signatures are only comparable
+                between indexes with the same seed and permutations
+        """
+        rng = np.random.default_rng(seed)
+        self.threshold = threshold
+        self.bands, self.rows = lsh_bands(threshold, permutations)
+        self._multipliers = rng.integers(
+            0, 2**64, size=permutations, dtype=np.uint64
+        ) | np.uint64(1)
+        self._offsets = rng.integers(0, 2**64, size=permutations, dtype=np.uint64)
+        self._signatures: dict[str, np.ndarray] = {}
+        self._buckets: list[dict[bytes, list[str]]] = [{} for _ in range(self.bands)]
+
+    def __len__(self) -> int:
+        """Number of indexed chunks."""
+        return len(self._signatures)
+
+    def __contains__(self, key: object) -> bool:
+        """Whether a chunk ID is indexed."""
+        return key in self._signatures
+
+    def signatures(self, texts: list[str]) -> np.ndarray:
+        """Compute MinHash signatures for a batch of texts.
+
+        Args:
+            texts: Texts to sign
+
+        Returns:
+            (len(texts), permutations) uint32 array
+        """
+        signatures = np.empty((len(texts), len(self._multipliers)), dtype=np.uint32)
+        for i, text in enumerate(texts):
+            # Multiply-shift hashing: the top 32 bits of a*x + b (mod 2^64),
+            # one (shingles, permutations) matrix per text to stay in cache
+            shingles = shingle_hashes(text)[:, None]
+            hashed = (shingles * self._multipliers + self._offsets) >> np.uint64(32)
+            signatures[i] = hashed.min(axis=0)
+        return signatures
+
+    def _keys(self, signature: np.ndarray) -> list[bytes]:
+        """Bucket key of each band of a signature."""
+        return [
+            signature[band * self.rows : (band + 1) * self.rows].tobytes()
+            for band in range(self.bands)
+        ]
+
+    def find(self, signature: np.ndarray) -> str | None:
+        """Return the indexed chunk most similar to a signature, if close enough.
+
+        Args:
+            signature: MinHash signature from signatures()
+
+        Returns:
+            ID of the most similar bucket mate whose estimated Jaccard
+            similarity reaches the threshold, or None
+        """
+        best, best_similarity = None, self.threshold
+        seen = set()
+        for buckets, key in zip(self._buckets, self._keys(signature)):
+            for candidate in buckets.get(key, ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                similarity = float(np.mean(self._signatures[candidate] == signature))
+                if similarity > best_similarity or (
+                    best is None and similarity == best_similarity
+                ):
+                    best, best_similarity = candidate, similarity
+        return best
+
+    def add(self, key: str, signature: np.ndarray) -> None:
+        """Index a chunk's signature (replacing any previous one)."""
+        self.remove(key)
+        self._signatures[key] = signature
+        for buckets, band_key in zip(self._buckets, self._keys(signature)):
+            buckets.setdefault(band_key, []).append(key)
+
+    def remove(self, key: str) -> None:
+        """Drop a chunk from the index (no-op if it is not indexed)."""
+        signature = self._signatures.pop(key, None)
+        if signature is None:
+            return
+        for buckets, band_key in zip(self._buckets, self._keys(signature)):
+            bucket = buckets[band_key]
+            bucket.remove(key)
+            if not bucket:
+                del buckets[band_key]
@@ -0,0 +1,461 @@
+"""Batched text embedding with a persistent, content-addressed cache.
+
+Texts go through three steps:
+
+1. **Cache lookup**: each text is keyed by its content hash (see
+   ``chunking.content_hash``). Vectors already computed by the same model are
+   read from an on-disk EmbeddingCache, so unchanged chunks are never
+   embedded twice, across runs and across documents.
+2. **Batching**: the remaining texts are grouped into batches bounded both by
+   count and by total (approximate) tokens, which is what remote embedding
+   APIs and local models limit.
+3. **Backend**: each batch is embedded by a pluggable EmbeddingBackend and
+   the new vectors are appended to the cache.
+
+Queries are batched the same way but cached only in memory, in a small LRU.
+
+The default HashingBackend needs no network or model download: it hashes
+words and word pairs into a fixed number of signed dimensions. It is fast and
+fully deterministic, so retrieval can be tested and benchmarked offline, and
+texts sharing vocabulary land close together.
+
+Cache layout on disk (one directory per model)::
+
+    .cache/embeddings/
+    └── hashing-v1-384-1f2e3d4c/
+        ├── meta.json     model ID and dimension
+        ├── keys.bin      16-byte content hashes, one per row
+        ├── vectors.f32   float32 rows in the same order
+        └── lock          flock()ed by whichever process is appending
+"""
+
+import fcntl
+import json
+import math
+import os
+import re
+import threading
+import zlib
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterator, Protocol
+
+import numpy as np
+
+from src.config import (
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_BATCH_TOKENS,
+    EMBEDDING_CACHE_DIR,
+    EMBEDDING_DIM,
+    QUERY_EMBEDDING_CACHE_ENTRIES,
+)
+from src.rag.chunking import content_hash, count_tokens
+from src.rag.sparse import tokenize
+
+_KEY_BYTES = 16  # Raw size of a content_hash digest
+
+
+class EmbeddingBackend(Protocol):
+    """Anything that turns a batch of texts into vectors.
+
+    Attributes:
+        model_id: Identifies the model; vectors are only reused for the same ID
+        dim: Vector dimension
+    """
+
+    model_id: str
+    dim: int
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        """Embed a batch of texts.
+
+        Args:
+            texts: Texts to embed
+
+        Returns:
+            float32 array of shape (len(texts), dim) with L2-normalized rows
+        """
+        ...
+
+
+@lru_cache(maxsize=1 << 16)
+def _feature_slot(feature: str, dim: int) -> tuple[int, float]:
+    """Map a feature to a dimension and a sign (CRC32 is stable across runs)."""
+    h = zlib.crc32(feature.encode("utf-8"))
+    return h % dim, 1.0 if h & 0x80000000 else -1.0
+
+
+class HashingBackend:
+    """Deterministic, network-free embeddings from hashed word features.
+
+    Words and adjacent word pairs are hashed to one of ``dim`` dimensions with
+    a random sign (the "hashing trick"), weighted by ``1 + log(count)``, and
+    the vector is L2-normalized. Cosine similarity then approximates weighted
+    vocabulary overlap, which is enough to exercise and benchmark retrieval.
+    """
+
+    model_id: str
+    dim: int
+
+    def __init__(self, dim: int = EMBEDDING_DIM, bigram_weight: float = 0.5) -> None:
+        """Initialize the backend.
+
+        Args:
+            dim: Vector dimension
+            bigram_weight: Weight of word-pair features relative to single words
+        """
+        self.dim = dim
+        self.bigram_weight = bigram_weight
+        self.model_id = f"hashing-v1-{dim}"
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        """Embed a batch of texts (see EmbeddingBackend.embed)."""
+        rows: list[int] = []
+        cols: list[int] = []
+        values: list[float] = []
+        for row, text in enumerate(texts):
+            tokens = tokenize(text)
+            for weight, features in (
+                (1.0, Counter(tokens)),
+                (self.bigram_weight, Counter(zip(tokens, tokens[1:]))),
+            ):
+                for feature, count in features.items():
+                    key = feature if isinstance(feature, str) else " ".join(feature)
+                    col, sign = _feature_slot(key, self.dim)
+                    rows.append(row)
+                    cols.append(col)
+                    values.append(sign * weight * (1.0 + math.log(count)))
+
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        np.add.at(matrix, (rows, cols), np.asarray(values, dtype=np.float32))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.divide(matrix, norms, out=matrix, where=norms > 0)
+        return matrix
+
+
+def iter_batches(
+    texts: list[str], max_size: int, max_tokens: int
+) -> Iterator[list[int]]:
+    """Group texts into batches bounded by count and total tokens.
+
+    A single text larger than max_tokens forms a batch of its own.
+
+    Args:
+        texts: Texts to group
+        max_size: Maximum texts per batch
+        max_tokens: Maximum approximate tokens per batch
+
+    Yields:
+        Lists of indices into texts, in order
+    """
+    batch: list[int] = []
+    batch_tokens = 0
+    for i, text in enumerate(texts):
+        tokens = count_tokens(text)
+        if batch and (len(batch) >= max_size or batch_tokens + tokens > max_tokens):
+            yield batch
+            batch, batch_tokens = [], 0
+        batch.append(i)
+        batch_tokens += tokens
+    if batch:
+        yield batch
+
+
+class EmbeddingCache:
+    """Append-only on-disk vector cache keyed by content hash, for one model.
+
+    Vectors are appended before their keys, so after a crash the key file is
+    never ahead of the vector file; any partial tail is trimmed on open. The
+    cache is not fsynced: losing recent entries only costs recomputation.
+
+    Several processes may share a cache directory. Appends hold an exclusive
+    flock() on the lock file and first index whatever other processes wrote,
+    so row numbers always follow the files on disk.
+    """
+
+    model_id: str
+    dim: int
+
+    def __init__(self, root: Path, model_id: str, dim: int) -> None:
+        """Open (or create) the cache for a model.
+
+        Args:
+            root: Directory holding one subdirectory per model
+            model_id: Model identifier (see EmbeddingBackend.model_id)
+            dim: Vector dimension
+        """
+        self.model_id = model_id
+        self.dim = dim
+        safe = re.sub(r"[^A-Za-z0-9._-]+", "-", model_id)[:60]
+        self.path = Path(root) / f"{safe}-{content_hash(model_id)[:8]}"
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._keys_path = self.path / "keys.bin"
+        self._vectors_path = self.path / "vectors.f32"
+        self._row_bytes = dim * 4
+        self._lock = threading.Lock()
+        self._rows: dict[str, int] = {}
+        self._count = 0  # Rows of the files indexed into _rows so far
+        self._matrix: np.ndarray | None = None
+
+        with self._file_lock():
+            meta_path = self.path / "meta.json"
+            meta = {"model_id": model_id, "dim": dim}
+            if meta_path.exists() and json.loads(meta_path.read_text()) != meta:
+                # Same directory name but a different model: start over
+                self._keys_path.unlink(missing_ok=True)
+                self._vectors_path.unlink(missing_ok=True)
+            meta_path.write_text(json.dumps(meta))
+            self._refresh()
+
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        """Hold the exclusive lock that serializes appends across processes."""
+        fd = os.open(self.path / "lock", os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)  # Also releases the lock
+
+    def _refresh(self) -> None:
+        """Index rows appended since the last call and trim any torn tail.
+
+        Must run under the file lock: no writer is then mid-append, so a key or
+        vector file longer than the other is the tail of a crashed writer.
+        """
+        keys = b""
+        if self._keys_path.exists():
+            with open(self._keys_path, "rb") as f:
+                f.seek(self._count * _KEY_BYTES)
+                keys = f.read()
+        vector_bytes = (
+            self._vectors_path.stat().st_size if self._vectors_path.exists() else 0
+        )
+        count = min(
+            self._count + len(keys) // _KEY_BYTES, vector_bytes // self._row_bytes
+        )
+        if len(keys) != (count - self._count) * _KEY_BYTES:
+            with open(self._keys_path, "r+b") as f:
+                f.truncate(count * _KEY_BYTES)
+        if vector_bytes != count * self._row_bytes:
+            with open(self._vectors_path, "r+b") as f:
+                f.truncate(count * self._row_bytes)
+        for row in range(self._count, count):
+            offset = (row - self._count) * _KEY_BYTES
+            self._rows.setdefault(keys[offset : offset + _KEY_BYTES].hex(), row)
+        self._count = count
+
+    def __len__(self) -> int:
+        """Number of cached vectors."""
+        return len(self._rows)
+
+    def __contains__(self, key: object) -> bool:
+        """Whether a vector is cached for this content hash."""
+        return key in self._rows
+
+    def lookup(self, keys: list[str]) -> tuple[np.ndarray, np.ndarray]:
+        """Fetch cached vectors.
+
+        Args:
+            keys: Content hashes
+
+        Returns:
+            Tuple of (found, vectors): a boolean mask over keys, and a float32
+            array holding the vectors of the found keys in order
+        """
+        with self._lock:
+            rows = [self._rows.get(key, -1) for key in keys]
+            found = np.array([row >= 0 for row in rows], dtype=bool)
+            if not found.any():
+                return found, np.empty((0, self.dim), dtype=np.float32)
+            if self._matrix is None or self._matrix.shape[0] <= max(rows):
+                # The file grew since it was last mapped
+                self._matrix = np.memmap(
+                    self._vectors_path, dtype=np.float32, mode="r"
+                ).reshape(-1, self.dim)
+            return found, np.asarray(self._matrix[[r for r in rows if r >= 0]])
+
+    def put(self, keys: list[str], vectors: np.ndarray) -> None:
+        """Append vectors for content hashes that are not cached yet.
+
+        Args:
+            keys: Content hashes
+            vectors: Array of shape (len(keys), dim)
+        """
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        with self._lock:
+            if all(key in self._rows for key in keys):
+                return
+            with self._file_lock():
+                self._refresh()  # Pick up rows other processes appended
+                new = [i for i, key in enumerate(keys) if key not in self._rows]
+                new = list({keys[i]: i for i in new}.values())  # First of dupes
+                if not new:
+                    return
+                with open(self._vectors_path, "ab") as f:
+                    f.write(vectors[new].tobytes())
+                with open(self._keys_path, "ab") as f:
+                    f.write(b"".join(bytes.fromhex(keys[i]) for i in new))
+                for offset, i in enumerate(new):
+                    self._rows[keys[i]] = self._count + offset
+                self._count += len(new)
+
+
+class EmbeddingService:
+    """Embeds texts in bounded batches, reusing cached vectors.
+
+    Attributes:
+        hits: Texts served from the cache so far
+        misses: Texts sent to the backend so far
+    """
+
+    backend: EmbeddingBackend
+    cache: EmbeddingCache | None
+    hits: int
+    misses: int
+
+    def __init__(
+        self,
+        backend: EmbeddingBackend,
+        cache: EmbeddingCache | None = None,
+        batch_size: int = EMBEDDING_BATCH_SIZE,
+        batch_tokens: int = EMBEDDING_BATCH_TOKENS,
+        query_cache_entries: int = QUERY_EMBEDDING_CACHE_ENTRIES,
+    ) -> None:
+        """Initialize the service.
+
+        Args:
+            backend: Model that computes vectors
+            cache: Persistent cache for this backend's model (None disables it)
+            batch_size: Maximum texts per backend call
+            batch_tokens: Maximum approximate tokens per backend call
+            query_cache_entries: Query vectors kept in memory (0 disables it)
+        """
+        if cache is not None and cache.model_id != backend.model_id:
+            raise ValueError(
+                f"Cache is for model {cache.model_id!r}, "
+                f"backend is {backend.model_id!r}"
+            )
+        self.backend = backend
+        self.cache = cache
+        self.batch_size = batch_size
+        self.batch_tokens = batch_tokens
+        self.hits = 0
+        self.misses = 0
+        self.query_cache_entries = query_cache_entries
+        self._queries: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._queries_lock = threading.Lock()
+
+    @property
+    def dim(self) -> int:
+        """Vector dimension of the backend."""
+        return self.backend.dim
+
+    @property
+    def model_id(self) -> str:
+        """Model identifier of the backend."""
+        return self.backend.model_id
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        """Embed texts, computing only those not embedded before.
+
+        Duplicate texts within the call are embedded once.
+
+        Args:
+            texts: Texts to embed
+
+        Returns:
+            float32 array of shape (len(texts), dim)
+        """
+        keys = [content_hash(text) for text in texts]
+        first: dict[str, int] = {}
+        for i, key in enumerate(keys):
+            first.setdefault(key, i)
+        unique_keys = list(first)
+        unique = np.empty((len(unique_keys), self.dim), dtype=np.float32)
+
+        if self.cache is not None:
+            found, cached = self.cache.lookup(unique_keys)
+            unique[found] = cached
+            missing = np.flatnonzero(~found).tolist()
+        else:
+            missing = list(range(len(unique_keys)))
+        self.hits += len(unique_keys) - len(missing)
+        self.misses += len(missing)
+
+        missing_texts = [texts[first[unique_keys[i]]] for i in missing]
+        for batch in iter_batches(missing_texts, self.batch_size, self.batch_tokens):
+            vectors = self.backend.embed([missing_texts[i] for i in batch])
+            rows = [missing[i] for i in batch]
+            unique[rows] = vectors
+            if self.cache is not None:
+                self.cache.put([unique_keys[row] for row in rows], vectors)
+
+        index = {key: i for i, key in enumerate(unique_keys)}
+        return unique[[index[key] for key in keys]]
+
+    def embed_queries(self, queries: list[str]) -> np.ndarray:
+        """Embed queries in bounded batches, reusing recently embedded ones.
+
+        Query vectors are kept in a small in-memory LRU rather than the
+        on-disk cache, which would otherwise grow with every query asked.
+
+        Args:
+            queries: Query texts
+
+        Returns:
+            float32 array of shape (len(queries), dim)
+        """
+        vectors = np.empty((len(queries), self.dim), dtype=np.float32)
+        missing: dict[str, list[int]] = {}
+        with self._queries_lock:
+            for i, query in enumerate(queries):
+                cached = self._queries.get(query)
+                if cached is None:
+                    missing.setdefault(query, []).append(i)
+                else:
+                    self._queries.move_to_end(query)
+                    vectors[i] = cached
+        texts = list(missing)
+        for batch in iter_batches(texts, self.batch_size, self.batch_tokens):
+            embedded = self.backend.embed([texts[i] for i in batch])
+            with self._queries_lock:
+                for i, vector in zip(batch, embedded):
+                    vectors[missing[texts[i]]] = vector
+                    if self.query_cache_entries > 0:
+                        self._queries[texts[i]] = np.asarray(vector, np.float32)
+                while len(self._queries) > self.query_cache_entries:
+                    self._queries.popitem(last=False)
+        return vectors
+
+    def embed_query(self, query: str) -> np.ndarray:
+        """Embed a single query (see embed_queries).
+
+        Args:
+            query: Query text
+
+        Returns:
+            float32 vector of shape (dim,)
+        """
+        return self.embed_queries([query])[0]
+
+
+_default_service: EmbeddingService | None = None
+_default_service_lock = threading.Lock()
+
+
+def get_embedding_service() -> EmbeddingService:
+    """Return the process-wide embedding service (hashing backend, disk cache).
+
+    Returns:
+        Shared EmbeddingService instance
+    """
+    global _default_service
+    with _default_service_lock:
+        if _default_service is None:
+            backend = HashingBackend()
+            cache = EmbeddingCache(EMBEDDING_CACHE_DIR, backend.model_id, backend.dim)
+            _default_service = EmbeddingService(backend, cache)
+        return _default_service
@@ -0,0 +1,389 @@
+"""Parallel, pipelined ingestion of a document corpus into the hybrid index.
+
+Ingestion has three stages with very different costs, linked by bounded
+queues so they overlap instead of running one after another:
+
+1. **Parse and chunk** (process pool): documents are read, converted to text
+   and chunked with content-defined chunking in worker processes, in batches
+   of ``_DOC_BATCH`` documents. At most ``workers * 2`` batches are in flight.
+2. **Embed** (thread): chunks are de-duplicated through a ChunkStore as
+   documents arrive, near duplicates (boilerplate, mirrored pages) included,
+   and the new ones are embedded in batches of ``EMBEDDING_BATCH_SIZE`` as
+   soon as enough have streamed in.
+3. **Write** (caller's thread): embedded chunks are applied to BM25 and the
+   vector table in bulk batches of ``INGEST_WRITE_CHUNKS``; the finished
+   index is saved once and swapped into place atomically.
+
+A full queue blocks the stage feeding it, so memory stays bounded whichever
+stage is the bottleneck. The IngestReport gives documents per second and the
+fraction of wall time each stage spent working (the pool's figure is per
+worker), which shows where to add capacity.
+
+Run ``just ingest`` to rebuild the RAG index from notes/ and data/.
+"""
+
+import argparse
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Iterator
+
+import numpy as np
+
+from src.config import (
+    CHUNK_TARGET_TOKENS,
+    CORPUS_DIR,
+    EMBEDDING_BATCH_SIZE,
+    INGEST_QUEUE_BATCHES,
+    INGEST_WRITE_CHUNKS,
+    NEAR_DUPLICATE_THRESHOLD,
+    NOTES_DIR,
+    RAG_INDEX_DIR,
+)
+from src.rag.chunking import Chunk, ChunkStore, chunk_text
+from src.rag.corpus import extract_text, iter_corpus_files
+from src.rag.embeddings import EmbeddingService, get_embedding_service
+from src.rag.retriever import HybridRetriever, save_hybrid_index
+from src.rag.sparse import BM25Index
+
+_DOC_BATCH = 16  # Documents per process-pool task
+_DONE = object()  # End-of-stream marker passed down the queues
+
+
+@dataclass
+class IngestReport:
+    """Throughput of one ingestion run.
+
+    Attributes:
+        documents: Documents parsed
+        chunks: Chunks produced (including duplicates)
+        embedded: Distinct chunks embedded and indexed
+        merged: Chunks merged into a stored near duplicate instead of embedded
+        seconds: Wall time of the whole run
+        busy: Seconds each stage ("parse", "embed", "write") spent working;
+            "parse" is summed over all worker processes
+        workers: Parse worker processes
+    """
+
+    documents: int = 0
+    chunks: int = 0
+    embedded: int = 0
+    merged: int = 0
+    seconds: float = 0.0
+    busy: dict[str, float] = field(default_factory=dict)
+    workers: int = 1
+
+    @property
+    def docs_per_second(self) -> float:
+        """Documents ingested per second of wall time."""
+        return self.documents / self.seconds if self.seconds else 0.0
+
+    @property
+    def dedup_ratio(self) -> float:
+        """Fraction of chunks not embedded because an equal or similar one was."""
+        return 1 - self.embedded / self.chunks if self.chunks else 0.0
+
+    @property
+    def utilization(self) -> dict[str, float]:
+        """Fraction of wall time each stage was busy (per worker for "parse")."""
+        if not self.seconds:
+            return {stage: 0.0 for stage in self.busy}
+        return {
+            stage: busy / (self.seconds * (self.workers if stage == "parse" else 1))
+            for stage, busy in self.busy.items()
+        }
+
+
+@dataclass
+class _Failed:
+    """Carries an exception from a stage thread to the stage after it."""
+
+    error: BaseException
+
+
+def document_source(path: Path, roots: list[Path]) -> str:
+    """Identifier of a document: its root's name plus the relative path."""
+    for root in roots:
+        if path.is_relative_to(root):
+            return f"{root.name}/{path.relative_to(root).as_posix()}"
+    return path.as_posix()
+
+
+def _chunk_documents(
+    items: list[tuple[str, str]], target_tokens: int
+) -> tuple[list[tuple[str, list[Chunk]]], float]:
+    """Parse and chunk a batch of documents (runs in a worker process).
+
+    Args:
+        items: (path, source) pairs
+        target_tokens: Desired chunk size in tokens
+
+    Returns:
+        Tuple of ((source, chunks) per readable document, seconds spent)
+    """
+    start = time.perf_counter()
+    documents = []
+    for path, source in items:
+        try:
+            _, text = extract_text(Path(path))
+        except OSError:
+            continue  # Deleted or unreadable since the scan
+        documents.append(
+            (
+                source,
+                list(chunk_text(text, source, target_tokens, content_defined=True)),
+            )
+        )
+    return documents, time.perf_counter() - start
+
+
+def _put(out: queue.Queue, item: Any, stop: threading.Event) -> None:
+    """Put into a bounded queue, giving up once the pipeline is stopping."""
+    while not stop.is_set():
+        try:
+            out.put(item, timeout=0.1)
+            return
+        except queue.Full:
+            continue
+
+
+def _get(source: queue.Queue, stop: threading.Event) -> Any:
+    """Take the next item from a queue, re-raising a failure from upstream.
+
+    Returns _DONE once the pipeline is stopping and the queue is drained.
+    """
+    while True:
+        try:
+            item = source.get(timeout=0.1)
+            break
+        except queue.Empty:
+            if stop.is_set():
+                return _DONE
+    if isinstance(item, _Failed):
+        raise item.error
+    return item
+
+
+def _run_stage(
+    target: Callable[[], None], out: queue.Queue, stop: threading.Event
+) -> threading.Thread:
+    """Start a stage thread that always ends its output with _DONE or _Failed."""
+
+    def run() -> None:
+        try:
+            target()
+            _put(out, _DONE, stop)
+        except BaseException as error:  # Re-raised by the consumer
+            _put(out, _Failed(error), stop)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def ingest_corpus(
+    roots: list[Path],
+    index_dir: Path,
+    embedder: EmbeddingService | None = None,
+    workers: int | None = None,
+    ann: bool = False,
+    target_tokens: int = CHUNK_TARGET_TOKENS,
+    queue_batches: int = INGEST_QUEUE_BATCHES,
+    write_chunks: int = INGEST_WRITE_CHUNKS,
+    near_duplicates: float | None = NEAR_DUPLICATE_THRESHOLD,
+    **options: Any,
+) -> tuple[HybridRetriever, IngestReport]:
+    """Index every supported document under some directories.
+
+    Args:
+        roots: Directories to ingest (hidden files and directories are skipped)
+        index_dir: Destination of the HybridRetriever (replaced atomically)
+        embedder: Embedding service (default: the shared one)
+        workers: Parse processes (defaults to the CPU count; 1 parses in a thread)
+        ann: Use an IVFPQIndex instead of an ExactRetriever
+        target_tokens: Desired chunk size in tokens
+        queue_batches: Capacity of each queue between stages, in batches
+        write_chunks: Chunks applied to the indexes per bulk write
+        near_duplicates: Similarity at which a chunk is merged into a stored
+            near duplicate instead of being embedded (None: exact copies only)
+        **options: Passed on to HybridRetriever()
+
+    Returns:
+        Tuple of (opened retriever, throughput report)
+    """
+    roots = [Path(root) for root in roots]
+    embedder = embedder or get_embedding_service()
+    workers = workers or os.cpu_count() or 1
+    report = IngestReport(workers=workers)
+    busy = {"parse": 0.0, "embed": 0.0, "write": 0.0}
+    stop = threading.Event()
+    parsed: queue.Queue = queue.Queue(maxsize=queue_batches)
+    embedded: queue.Queue = queue.Queue(maxsize=queue_batches)
+    store = ChunkStore(near_duplicates)
+    doc_metadata: dict[str, dict[str, Any]] = {}
+    start = time.perf_counter()
+
+    def batches() -> Iterator[list[tuple[str, str]]]:
+        batch: list[tuple[str, str]] = []
+        for root in roots:
+            if not root.is_dir():
+                continue
+            for path in iter_corpus_files(root):
+                source = document_source(path, roots)
+                try:
+                    doc_metadata[source] = {"mtime": path.stat().st_mtime}
+                except OSError:
+                    pass  # Skipped by the parser too
+                batch.append((str(path), source))
+                if len(batch) == _DOC_BATCH:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+
+    def parse() -> None:
+        if workers <= 1:
+            for batch in batches():
+                documents, seconds = _chunk_documents(batch, target_tokens)
+                busy["parse"] += seconds
+                _put(parsed, documents, stop)
+            return
+        # Spawn rather than fork: the pool is started from a pipeline thread
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            in_flight: deque[Future] = deque()
+            for batch in batches():
+                in_flight.append(
+                    executor.submit(_chunk_documents, batch, target_tokens)
+                )
+                while len(in_flight) >= workers * 2 or (
+                    in_flight and in_flight[0].done()
+                ):
+                    documents, seconds = in_flight.popleft().result()
+                    busy["parse"] += seconds
+                    _put(parsed, documents, stop)
+                if stop.is_set():
+                    return
+            while in_flight:
+                documents, seconds = in_flight.popleft().result()
+                busy["parse"] += seconds
+                _put(parsed, documents, stop)
+
+    def embed() -> None:
+        pending: list[Chunk] = []
+
+        def flush() -> None:
+            began = time.perf_counter()
+            vectors = embedder.embed([chunk.text for chunk in pending])
+            busy["embed"] += time.perf_counter() - began
+            _put(embedded, (list(pending), vectors), stop)
+            pending.clear()
+
+        while (documents := _get(parsed, stop)) is not _DONE:
+            began = time.perf_counter()
+            for source, chunks in documents:
+                result = store.ingest(source, chunks)
+                pending.extend(result.new)
+                report.merged += result.merged
+                report.documents += 1
+                report.chunks += len(chunks)
+            busy["embed"] += time.perf_counter() - began
+            while len(pending) >= EMBEDDING_BATCH_SIZE:
+                rest = pending[EMBEDDING_BATCH_SIZE:]
+                del pending[EMBEDDING_BATCH_SIZE:]
+                flush()
+                pending.extend(rest)
+        if pending:
+            flush()
+
+    threads = [_run_stage(parse, parsed, stop), _run_stage(embed, embedded, stop)]
+    sparse = BM25Index()
+    ids: list[str] = []
+    blocks: list[np.ndarray] = []
+    buffered: list[tuple[list[Chunk], np.ndarray]] = []
+    buffered_chunks = 0
+
+    def write() -> None:
+        began = time.perf_counter()
+        for chunks, vectors in buffered:
+            for chunk in chunks:
+                sparse.add(chunk.chunk_id, chunk.text)
+            ids.extend(chunk.chunk_id for chunk in chunks)
+            blocks.append(vectors)
+        buffered.clear()
+        busy["write"] += time.perf_counter() - began
+
+    try:
+        while (item := _get(embedded, stop)) is not _DONE:
+            buffered.append(item)
+            buffered_chunks += len(item[0])
+            if buffered_chunks >= write_chunks:
+                write()
+                buffered_chunks = 0
+        write()
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+    began = time.perf_counter()
+    vectors = (
+        np.concatenate(blocks)
+        if blocks
+        else np.empty((0, embedder.dim), dtype=np.float32)
+    )
+    save_hybrid_index(
+        index_dir, store, sparse, ids, vectors, ann=ann, doc_metadata=doc_metadata
+    )
+    busy["write"] += time.perf_counter() - began
+
+    report.embedded = len(ids)
+    report.busy = busy
+    report.seconds = time.perf_counter() - start
+    return HybridRetriever.open(index_dir, embedder, **options), report
+
+
+def main() -> None:
+    """Rebuild the RAG index from notes/ and data/ and print throughput."""
+    parser = argparse.ArgumentParser(description="Ingest documents into the RAG index")
+    parser.add_argument("roots", nargs="*", type=Path, default=[NOTES_DIR, CORPUS_DIR])
+    parser.add_argument("--index-dir", type=Path, default=RAG_INDEX_DIR / "bulk")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--ann", action="store_true", help="build an IVF-PQ index")
+    parser.add_argument(
+        "--near-duplicates",
+        type=float,
+        default=NEAR_DUPLICATE_THRESHOLD,
+        help="Jaccard similarity at which chunks are merged (0 disables)",
+    )
+    args = parser.parse_args()
+
+    retriever, report = ingest_corpus(
+        args.roots,
+        args.index_dir,
+        workers=args.workers,
+        ann=args.ann,
+        near_duplicates=args.near_duplicates or None,
+    )
+    retriever.close()
+    print(
+        f"Ingested {report.documents} documents ({report.chunks} chunks, "
+        f"{report.embedded} distinct) in {report.seconds:.1f}s: "
+        f"{report.docs_per_second:.1f} docs/s"
+    )
+    print(
+        f"  dedup  {report.dedup_ratio:6.1%} of chunks not embedded "
+        f"({report.merged} near duplicates)"
+    )
+    for stage, fraction in report.utilization.items():
+        print(f"  {stage:<6} {fraction:6.1%} busy")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""Read-only views over a base index plus rows appended by delta generations.
+
+The index watcher publishes each change as a small delta on top of a full
+base generation (see src/rag/watcher.py). A delta appends one row for every
+chunk it adds or whose metadata changed, and tombstones the rows those
+chunks had before, so readers number the rows as the base's followed by
+every delta's, in order, and skip the dead ones:
+
+- **LayeredRetriever** searches the base's ExactRetriever (restricted to its
+  live rows when some are dead) and scores the appended float32 rows
+  exactly, then merges the two rankings.
+- **LayeredMetadata** resolves ``where`` filters over the same numbering,
+  from the base's MetadataIndex and one per delta.
+"""
+
+from typing import Any
+
+import numpy as np
+
+from src.rag.metadata import MetadataIndex
+from src.rag.retriever import ExactRetriever
+
+
+class LayeredRetriever:
+    """Exact search over a base matrix plus appended rows, skipping dead rows."""
+
+    base: ExactRetriever
+    ids: list[str]
+    vectors: np.ndarray
+    alive: np.ndarray
+
+    def __init__(
+        self,
+        base: ExactRetriever,
+        ids: list[str],
+        vectors: np.ndarray,
+        alive: np.ndarray,
+    ) -> None:
+        """Stack appended rows on a base index.
+
+        Args:
+            base: Dense index of the base generation (the first rows)
+            ids: Chunk ID of each appended row
+            vectors: (len(ids), dim) float32 vectors of the appended rows
+            alive: Boolean mask over all rows; False marks tombstoned rows
+        """
+        self.base = base
+        self.ids = ids
+        self.vectors = np.asarray(vectors, dtype=np.float32)
+        self.alive = alive
+        base_alive = alive[: len(base)]
+        self._base_rows = None if base_alive.all() else np.flatnonzero(base_alive)
+        self._extra_rows = np.flatnonzero(alive[len(base) :])
+
+    def __len__(self) -> int:
+        """Number of live rows."""
+        return int(self.alive.sum())
+
+    def chunk_id(self, row: int) -> str:
+        """Return the chunk ID stored at a row."""
+        if row < len(self.base):
+            return self.base.chunk_id(row)
+        return self.ids[row - len(self.base)]
+
+    def live(self) -> tuple[list[str], np.ndarray]:
+        """Return the chunk IDs and float32 vectors of all live rows, in row order."""
+        base_rows = (
+            np.arange(len(self.base)) if self._base_rows is None else self._base_rows
+        )
+        ids = [self.base.chunk_id(int(row)) for row in base_rows]
+        ids.extend(self.ids[row] for row in self._extra_rows)
+        vectors = np.concatenate(
+            [self.base.vectors(base_rows), self.vectors[self._extra_rows]]
+        )
+        return ids, vectors
+
+    def search_batch(
+        self, queries: np.ndarray, k: int, rows: np.ndarray | None = None
+    ) -> list[list[tuple[str, float]]]:
+        """Rank live chunks against many queries.
+
+        Args:
+            queries: (n_queries, dim) float array
+            k: Results per query
+            rows: Only score these rows (sorted; e.g. from LayeredMetadata)
+
+        Returns:
+            One list of (chunk_id, score) tuples per query, best first
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        if rows is None:
+            base_rows, extra_rows = self._base_rows, self._extra_rows
+        else:
+            rows = np.asarray(rows, dtype=np.int64)
+            rows = rows[self.alive[rows]]
+            split = int(np.searchsorted(rows, len(self.base)))
+            base_rows, extra_rows = rows[:split], rows[split:] - len(self.base)
+        results = self.base.search_batch(queries, k, base_rows)
+        if not len(extra_rows) or k <= 0:
+            return results
+        scores = queries @ self.vectors[extra_rows].T  # (n_queries, extra rows)
+        top = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+        merged = []
+        for result, row_top, row_scores in zip(results, top, scores):
+            extra = [(self.ids[extra_rows[j]], float(row_scores[j])) for j in row_top]
+            merged.append(sorted(result + extra, key=lambda pair: -pair[1])[:k])
+        return merged
+
+    def search(
+        self, query: np.ndarray, k: int, rows: np.ndarray | None = None
+    ) -> list[tuple[str, float]]:
+        """Rank live chunks against one query (see search_batch)."""
+        return self.search_batch(np.asarray(query)[None, :], k, rows)[0]
+
+
+class LayeredMetadata:
+    """Filterable attributes of a base's rows followed by each delta's rows."""
+
+    count: int
+
+    def __init__(self, parts: list[MetadataIndex], alive: np.ndarray) -> None:
+        """Stack per-generation metadata indexes.
+
+        Args:
+            parts: Index over the base rows, then one per delta, in order
+            alive: Boolean mask over all rows; False marks tombstoned rows
+        """
+        self.parts = parts
+        self.alive = alive
+        self.count = len(alive)
+        self._offsets = np.cumsum([0] + [part.count for part in parts[:-1]])
+
+    @property
+    def fields(self) -> list[str]:
+        """Names of the fields indexed in any part."""
+        return list(dict.fromkeys(name for part in self.parts for name in part.fields))
+
+    def rows(self, filters: dict[str, Any]) -> np.ndarray:
+        """Return the live rows matching every condition of a filter.
+
+        Args:
+            filters: Field name -> condition (see MetadataIndex)
+
+        Returns:
+            Sorted int64 row numbers
+        """
+        rows = np.concatenate(
+            [
+                part.rows(filters) + offset
+                for part, offset in zip(self.parts, self._offsets)
+            ]
+        ).astype(np.int64)
+        return rows[self.alive[rows]]
@@ -0,0 +1,296 @@
+"""Per-field metadata indexes for filtering retrieval before scoring.
+
+Filtering results after ranking wastes the scoring work and breaks top-k: if
+most of the best chunks are filtered out, fewer than k remain. Instead, a
+MetadataIndex is stored next to the vectors, aligned with their row
+numbers, and turns a filter into the sorted array of matching rows; only
+those rows are then scored.
+
+Two kinds of field are supported, chosen from the values at build time:
+
+- **Categorical** (strings, e.g. ``source`` or ``tag``): for every distinct
+  value, the sorted array of rows having it (an inverted list). A row may
+  have several values (a chunk shared by two documents has two sources).
+- **Numeric** (ints and floats, e.g. ``mtime``): all (value, row) pairs
+  sorted by value, so a range is two binary searches and a slice.
+
+Filters are dicts of field conditions, all of which must hold::
+
+    {"source": "notes/raft.md"}                  # equality
+    {"tag": ["kafka", "raft"]}                   # any of the values
+    {"mtime": {"gte": 1.7e9, "lt": 1.8e9}}       # range (gt, gte, lt, lte)
+
+Layout (arrays are memory-mapped when opened, so opening reads only
+meta.json; the same arrays can be embedded in a snapshot, see to_arrays)::
+
+    <index_dir>/
+    ├── meta.json             row count; name and kind of each field
+    ├── <i>.rows.npy          field i: rows, grouped by value or sorted by value
+    ├── <i>.values.npy        numeric: sorted values parallel to rows;
+    │                         categorical: sorted distinct values (UTF-8 blob)
+    └── <i>.offsets.npy       categorical: start of each value's rows
+        <i>.value_offsets.npy categorical: start of each distinct value
+"""
+
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Any, Iterable
+
+import numpy as np
+
+from src.rag.arrays import StringTable, encode_strings
+
+METADATA_FORMAT_VERSION = 1
+_RANGE_OPS = {"gt", "gte", "lt", "lte"}
+
+
+def _values(value: Any) -> list[Any]:
+    """A field value as a list (None means no value)."""
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return list(value)
+    return [value]
+
+
+class MetadataIndex:
+    """Filterable attributes of the rows of a vector store."""
+
+    count: int
+
+    def __init__(self, count: int, fields: dict[str, dict[str, Any]]) -> None:
+        """Wrap per-field arrays (see build and open).
+
+        Args:
+            count: Number of rows covered
+            fields: Field name -> {"kind", "rows", "values" and (categorical
+                fields, whose values are a sorted StringTable) "offsets"}
+        """
+        self.count = count
+        self._fields = fields
+
+    @classmethod
+    def build(cls, rows: Iterable[dict[str, Any]]) -> "MetadataIndex":
+        """Index the metadata of every row.
+
+        Args:
+            rows: One dict per vector row, in row order; values are scalars
+                or lists of scalars (a field is numeric if all its values are)
+
+        Returns:
+            The in-memory index
+        """
+        pairs: dict[str, list[tuple[Any, int]]] = {}
+        count = 0
+        for row, metadata in enumerate(rows):
+            count = row + 1
+            for name, value in metadata.items():
+                for item in _values(value):
+                    pairs.setdefault(name, []).append((item, row))
+
+        fields: dict[str, dict[str, Any]] = {}
+        for name, items in pairs.items():
+            numeric = all(
+                isinstance(v, (int, float)) and not isinstance(v, bool)
+                for v, _ in items
+            )
+            if numeric:
+                values = np.array([v for v, _ in items], dtype=np.float64)
+                row_ids = np.array([r for _, r in items], dtype=np.int64)
+                order = np.argsort(values, kind="stable")
+                fields[name] = {
+                    "kind": "numeric",
+                    "values": values[order],
+                    "rows": row_ids[order],
+                }
+            else:
+                grouped: dict[str, set[int]] = {}
+                for value, row in items:
+                    grouped.setdefault(str(value), set()).add(row)
+                distinct = sorted(grouped)
+                postings = [sorted(grouped[value]) for value in distinct]
+                offsets = np.zeros(len(distinct) + 1, dtype=np.int64)
+                np.cumsum([len(p) for p in postings], out=offsets[1:])
+                fields[name] = {
+                    "kind": "categorical",
+                    "values": StringTable(
+                        *encode_strings(distinct), order=range(len(distinct))
+                    ),
+                    "offsets": offsets,
+                    "rows": np.fromiter(
+                        (row for p in postings for row in p), dtype=np.int64
+                    ),
+                }
+        return cls(count, fields)
+
+    @property
+    def fields(self) -> list[str]:
+        """Names of the indexed fields."""
+        return list(self._fields)
+
+    def _field_rows(self, name: str, condition: Any) -> np.ndarray:
+        """Sorted unique rows satisfying one field condition."""
+        field = self._fields.get(name)
+        if field is None:
+            return np.empty(0, dtype=np.int64)
+
+        if field["kind"] == "numeric":
+            values, rows = field["values"], field["rows"]
+            if isinstance(condition, dict):
+                unknown = set(condition) - _RANGE_OPS
+                if unknown:
+                    raise ValueError(f"Unknown range operators: {sorted(unknown)}")
+                lo, hi = 0, len(values)
+                if "gte" in condition:
+                    lo = max(lo, np.searchsorted(values, condition["gte"], "left"))
+                if "gt" in condition:
+                    lo = max(lo, np.searchsorted(values, condition["gt"], "right"))
+                if "lte" in condition:
+                    hi = min(hi, np.searchsorted(values, condition["lte"], "right"))
+                if "lt" in condition:
+                    hi = min(hi, np.searchsorted(values, condition["lt"], "left"))
+                parts = [rows[lo:hi]] if lo < hi else []
+            else:
+                parts = []
+                for value in _values(condition):
+                    lo = np.searchsorted(values, value, "left")
+                    hi = np.searchsorted(values, value, "right")
+                    parts.append(rows[lo:hi])
+        else:
+            if isinstance(condition, dict):
+                raise ValueError(f"Range filter on categorical field {name!r}")
+            offsets = field["offsets"]
+            parts = []
+            for value in _values(condition):
+                i = field["values"].find(str(value))
+                if i is not None:
+                    parts.append(field["rows"][offsets[i] : offsets[i + 1]])
+
+        if not parts:
+            return np.empty(0, dtype=np.int64)
+        if len(parts) == 1 and field["kind"] == "categorical":
+            return np.asarray(parts[0])  # Already sorted and unique
+        return np.unique(np.concatenate(parts))
+
+    def rows(self, filters: dict[str, Any]) -> np.ndarray:
+        """Return the rows matching every condition of a filter.
+
+        Args:
+            filters: Field name -> condition (see module docstring)
+
+        Returns:
+            Sorted int64 row numbers (all rows for an empty filter)
+        """
+        if not filters:
+            return np.arange(self.count, dtype=np.int64)
+        matches = sorted(
+            (self._field_rows(name, condition) for name, condition in filters.items()),
+            key=len,
+        )
+        result = matches[0]
+        for other in matches[1:]:
+            if len(result) == 0:
+                break
+            result = np.intersect1d(result, other, assume_unique=True)
+        return result
+
+    def to_arrays(self) -> tuple[dict[str, Any], dict[str, np.ndarray]]:
+        """Export the index as a JSON-compatible header and named arrays.
+
+        Returns:
+            Tuple of (header, arrays) accepted by from_arrays
+        """
+        header: dict[str, Any] = {
+            "version": METADATA_FORMAT_VERSION,
+            "count": self.count,
+            "fields": [],
+        }
+        arrays: dict[str, np.ndarray] = {}
+        for i, (name, field) in enumerate(self._fields.items()):
+            header["fields"].append({"name": name, "kind": field["kind"]})
+            arrays[f"{i}.rows"] = np.asarray(field["rows"])
+            if field["kind"] == "numeric":
+                arrays[f"{i}.values"] = np.asarray(field["values"])
+            else:
+                blob, value_offsets = field["values"].arrays
+                arrays[f"{i}.values"] = blob
+                arrays[f"{i}.value_offsets"] = value_offsets
+                arrays[f"{i}.offsets"] = np.asarray(field["offsets"])
+        return header, arrays
+
+    @classmethod
+    def from_arrays(
+        cls, header: dict[str, Any], arrays: dict[str, np.ndarray]
+    ) -> "MetadataIndex":
+        """Wrap arrays exported by to_arrays without copying them.
+
+        Args:
+            header: Header of to_arrays
+            arrays: Arrays of to_arrays (typically memory-mapped)
+
+        Returns:
+            The index
+
+        Raises:
+            ValueError: If the arrays were written by an incompatible version
+        """
+        if header["version"] != METADATA_FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported metadata index version {header['version']} "
+                f"(expected {METADATA_FORMAT_VERSION})"
+            )
+        fields: dict[str, dict[str, Any]] = {}
+        for i, entry in enumerate(header["fields"]):
+            field: dict[str, Any] = {"kind": entry["kind"], "rows": arrays[f"{i}.rows"]}
+            if entry["kind"] == "numeric":
+                field["values"] = arrays[f"{i}.values"]
+            else:
+                offsets = arrays[f"{i}.value_offsets"]
+                field["values"] = StringTable(
+                    arrays[f"{i}.values"], offsets, order=range(len(offsets) - 1)
+                )
+                field["offsets"] = arrays[f"{i}.offsets"]
+            fields[entry["name"]] = field
+        return cls(header["count"], fields)
+
+    def save(self, index_dir: Path) -> None:
+        """Write the index to a directory, atomically replacing it.
+
+        Args:
+            index_dir: Destination directory
+        """
+        index_dir = Path(index_dir)
+        build_dir = index_dir.with_name(f"{index_dir.name}.build-{os.getpid()}")
+        shutil.rmtree(build_dir, ignore_errors=True)
+        build_dir.mkdir(parents=True)
+        header, arrays = self.to_arrays()
+        for name, array in arrays.items():
+            np.save(build_dir / f"{name}.npy", array)
+        (build_dir / "meta.json").write_text(json.dumps(header), encoding="utf-8")
+
+        old_dir = index_dir.with_name(f"{index_dir.name}.old-{os.getpid()}")
+        if index_dir.exists():
+            os.replace(index_dir, old_dir)
+        os.replace(build_dir, index_dir)
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+    @classmethod
+    def open(cls, index_dir: Path) -> "MetadataIndex":
+        """Open an index written by save, memory-mapping its arrays.
+
+        Args:
+            index_dir: Directory written by save
+
+        Returns:
+            The index
+        """
+        index_dir = Path(index_dir)
+        header = json.loads((index_dir / "meta.json").read_text(encoding="utf-8"))
+        arrays = {}
+        for path in index_dir.glob("*.npy"):
+            # Empty arrays cannot be memory-mapped
+            mmap_mode = "r" if path.stat().st_size > 128 else None
+            arrays[path.name.removesuffix(".npy")] = np.load(path, mmap_mode=mmap_mode)
+        return cls.from_arrays(header, arrays)
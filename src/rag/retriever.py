@@ -0,0 +1,1639 @@
+"""Dense, approximate and hybrid retrieval over chunk embeddings.
+
+Three retrievers share the ``search``/``search_batch`` interface:
+
+- **ExactRetriever** scores every stored vector, so its results are exact for
+  the stored precision. Vectors are one contiguous float16 matrix (half the
+  float32 size) or int8 with a float32 scale per row (a quarter). Opening an
+  index only reads ``meta.json``; the matrix and ID table are memory-mapped.
+  The matrix is scanned in blocks of ``block_rows``, each block multiplied
+  against all queries of a batch at once, and the best rows are picked with
+  ``argpartition`` instead of a full sort.
+- **IVFPQIndex** scans only the inverted-file cells nearest to the query and
+  scores product-quantized codes, re-scoring a short list exactly. It supports
+  inserts, tombstone deletes and single-file save/load.
+- **HybridRetriever** runs BM25 over the chunk text and one of the above over
+  its embeddings concurrently, then fuses the two rankings, so exact
+  identifiers and paraphrases are both found. Results of opened indexes are
+  memoized in a RetrievalCache keyed by the index generation. A ``where``
+  filter (source, mtime, ...) is resolved against a MetadataIndex first, and
+  both sides only score the matching rows. An optional **Reranker** rescores
+  the top fused candidates with local features before the top k are cut.
+
+Vectors are expected to be L2-normalized (as EmbeddingService returns them),
+so the dot product is the cosine similarity.
+
+ExactRetriever layout::
+
+    <index_dir>/
+    ├── meta.json          count, dimension, dtype, format version
+    ├── vectors.npy        (count, dim) float16 or int8 matrix
+    ├── scales.npy         (count,) float32 dequantization scales (int8 only)
+    ├── ids.bin            concatenated UTF-8 chunk IDs
+    └── id_offsets.npy     uint64 start offset of each ID (count + 1 entries)
+
+HybridRetriever layout::
+
+    <index_dir>/
+    ├── meta.json          generation number (bumped by the index watcher)
+    ├── chunks.json        ChunkStore: chunk texts and per-document order
+    ├── sparse.json        BM25Index over the chunk texts
+    ├── metadata/          MetadataIndex over the vector rows
+    └── dense/ or ann.idx  ExactRetriever directory or IVFPQIndex file
+"""
+
+import hashlib
+import itertools
+import json
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Hashable, Iterable, Literal, Mapping, Protocol
+
+import numpy as np
+
+from src.config import (
+    ANN_NPROBE,
+    ANN_REFINE_FACTOR,
+    HYBRID_CANDIDATES,
+    HYBRID_DENSE_WEIGHT,
+    HYBRID_FUSION,
+    RERANK_CACHE_ENTRIES,
+    RERANK_CANDIDATES,
+    RERANK_WEIGHTS,
+    RETRIEVAL_CACHE_BYTES,
+    RETRIEVER_BLOCK_ROWS,
+    RRF_K,
+    VECTOR_DTYPE,
+)
+from src.rag.arrays import (
+    StringTable,
+    encode_strings,
+    read_array_file,
+    write_array_file,
+)
+from src.rag.chunking import Chunk, ChunkStore
+from src.rag.embeddings import EmbeddingService
+from src.rag.metadata import MetadataIndex
+from src.rag.sparse import BM25Index, tokenize
+
+VECTOR_FORMAT_VERSION = 1
+ANN_FORMAT_VERSION = 1
+
+VectorDType = Literal["float16", "int8"]
+FusionMethod = Literal["rrf", "weighted"]
+
+
+class SparseIndex(Protocol):
+    """Anything that ranks chunk IDs against a text query (BM25Index or frozen)."""
+
+    def __len__(self) -> int:
+        """Number of indexed chunks."""
+        ...
+
+    def __contains__(self, doc_id: object) -> bool:
+        """Whether a chunk is indexed."""
+        ...
+
+    def search(
+        self, query: str, k: int = 10, allowed: Callable[[str], bool] | None = None
+    ) -> list[tuple[str, float]]:
+        """Return up to k (chunk_id, score) tuples, best first."""
+        ...
+
+
+class ChunkSource(Protocol):
+    """Read access to chunk texts and where they occur (ChunkStore or frozen)."""
+
+    def __len__(self) -> int:
+        """Number of distinct chunks stored."""
+        ...
+
+    def __contains__(self, chunk_id: object) -> bool:
+        """Whether a chunk with this ID is stored."""
+        ...
+
+    @property
+    def dedup_ratio(self) -> float:
+        """Fraction of chunk references served by an already stored chunk."""
+        ...
+
+    def get(self, chunk_id: str) -> str | None:
+        """Return the text of a stored chunk, or None if it is unknown."""
+        ...
+
+    def chunk_ids(self, source: str) -> list[str]:
+        """Return the chunk IDs of a document in order (empty if unknown)."""
+        ...
+
+    def sources(self) -> list[str]:
+        """Return the identifiers of all ingested documents."""
+        ...
+
+    def locations(self, chunk_id: str) -> list[tuple[str, int]]:
+        """Return every (source, position) where a chunk occurs."""
+        ...
+
+
+class Retriever(Protocol):
+    """Anything that ranks stored chunk IDs against query vectors."""
+
+    def search(
+        self, query: np.ndarray, k: int, rows: np.ndarray | None = None
+    ) -> list[tuple[str, float]]:
+        """Return up to k (chunk_id, score) tuples, best first."""
+        ...
+
+    def search_batch(
+        self, queries: np.ndarray, k: int, rows: np.ndarray | None = None
+    ) -> list[list[tuple[str, float]]]:
+        """Run search for every row of a (n_queries, dim) array."""
+        ...
+
+    def chunk_id(self, row: int) -> str:
+        """Return the chunk ID stored at a row."""
+        ...
+
+
+def quantize(vectors: np.ndarray, dtype: VectorDType) -> tuple[np.ndarray, np.ndarray]:
+    """Convert float vectors to the stored representation.
+
+    int8 uses symmetric per-row scaling: each row is divided by its largest
+    absolute value over 127, which keeps the relative error of every row below
+    about half a percent of its largest component.
+
+    Args:
+        vectors: (count, dim) float array
+        dtype: Storage type
+
+    Returns:
+        Tuple of (stored matrix, float32 per-row scales; all ones for float16)
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if dtype == "float16":
+        return vectors.astype(np.float16), np.ones(len(vectors), dtype=np.float32)
+    if dtype != "int8":
+        raise ValueError(f"Unsupported vector dtype {dtype!r}")
+    peak = np.abs(vectors).max(axis=1) if vectors.size else np.zeros(len(vectors))
+    scales = np.where(peak > 0, peak / 127.0, 1.0).astype(np.float32)
+    quantized = np.rint(vectors / scales[:, None]).clip(-127, 127).astype(np.int8)
+    return quantized, scales
+
+
+def build_vector_index(
+    index_dir: Path,
+    ids: list[str],
+    vectors: np.ndarray,
+    dtype: VectorDType = VECTOR_DTYPE,
+) -> "ExactRetriever":
+    """Write an index for ExactRetriever, atomically replacing any old one.
+
+    Args:
+        index_dir: Destination directory
+        ids: Chunk ID of each vector row
+        vectors: (len(ids), dim) float array
+        dtype: Storage type ("float16" or "int8")
+
+    Returns:
+        The opened index
+    """
+    index_dir = Path(index_dir)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim != 2 or len(vectors) != len(ids):
+        raise ValueError(
+            f"Expected a ({len(ids)}, dim) vector array, got shape {vectors.shape}"
+        )
+    build_dir = index_dir.with_name(f"{index_dir.name}.build-{os.getpid()}")
+    shutil.rmtree(build_dir, ignore_errors=True)
+    build_dir.mkdir(parents=True)
+
+    matrix, scales = quantize(vectors, dtype)
+    np.save(build_dir / "vectors.npy", matrix)
+    if dtype == "int8":
+        np.save(build_dir / "scales.npy", scales)
+    blob, offsets = encode_strings(ids)
+    (build_dir / "ids.bin").write_bytes(blob.tobytes())
+    np.save(build_dir / "id_offsets.npy", offsets)
+    meta = {
+        "version": VECTOR_FORMAT_VERSION,
+        "count": len(ids),
+        "dim": vectors.shape[1],
+        "dtype": dtype,
+    }
+    (build_dir / "meta.json").write_text(json.dumps(meta), encoding="utf-8")
+
+    old_dir = index_dir.with_name(f"{index_dir.name}.old-{os.getpid()}")
+    if index_dir.exists():
+        os.replace(index_dir, old_dir)
+    os.replace(build_dir, index_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    return ExactRetriever(index_dir)
+
+
+class ExactRetriever:
+    """Brute-force cosine search over a memory-mapped, quantized matrix."""
+
+    index_dir: Path
+    count: int
+    dim: int
+    dtype: VectorDType
+
+    def __init__(self, index_dir: Path, block_rows: int = RETRIEVER_BLOCK_ROWS) -> None:
+        """Open an index. Only metadata is read; vectors and IDs are mapped.
+
+        Args:
+            index_dir: Directory written by build_vector_index
+            block_rows: Rows converted to float32 and scored at a time
+
+        Raises:
+            ValueError: If the index was written by an incompatible version
+        """
+        self.index_dir = Path(index_dir)
+        meta = json.loads((self.index_dir / "meta.json").read_text(encoding="utf-8"))
+        if meta["version"] != VECTOR_FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported vector index version {meta['version']} "
+                f"(expected {VECTOR_FORMAT_VERSION})"
+            )
+        self.block_rows = block_rows
+        ids_path = self.index_dir / "ids.bin"
+        self._attach(
+            np.load(self.index_dir / "vectors.npy", mmap_mode="r"),
+            np.load(self.index_dir / "scales.npy", mmap_mode="r")
+            if meta["dtype"] == "int8"
+            else None,
+            StringTable(
+                # Empty files cannot be memory-mapped
+                np.memmap(ids_path, dtype=np.uint8, mode="r")
+                if ids_path.stat().st_size
+                else np.empty(0, dtype=np.uint8),
+                np.load(self.index_dir / "id_offsets.npy", mmap_mode="r"),
+            ),
+        )
+
+    @classmethod
+    def from_arrays(
+        cls,
+        source: Path,
+        vectors: np.ndarray,
+        scales: np.ndarray | None,
+        ids: StringTable,
+        block_rows: int = RETRIEVER_BLOCK_ROWS,
+    ) -> "ExactRetriever":
+        """Wrap already mapped arrays (e.g. from a snapshot) without copying.
+
+        Args:
+            source: File or directory the arrays come from
+            vectors: (count, dim) float16 or int8 matrix
+            scales: (count,) float32 scales for int8, else None
+            ids: Chunk ID of each row
+            block_rows: Rows converted to float32 and scored at a time
+
+        Returns:
+            The retriever
+        """
+        retriever = cls.__new__(cls)
+        retriever.index_dir = Path(source)
+        retriever.block_rows = block_rows
+        retriever._attach(vectors, scales, ids)
+        return retriever
+
+    def to_arrays(self) -> dict[str, np.ndarray]:
+        """Export the stored matrix, scales (int8 only) and chunk ID table."""
+        ids, id_offsets = self._ids.arrays
+        arrays = {"vectors": self._vectors, "ids": ids, "id_offsets": id_offsets}
+        if self._scales is not None:
+            arrays["scales"] = self._scales
+        return arrays
+
+    def _attach(
+        self, vectors: np.ndarray, scales: np.ndarray | None, ids: StringTable
+    ) -> None:
+        """Set the stored arrays and the attributes derived from them."""
+        self._vectors = vectors
+        self._scales = scales
+        self._ids = ids
+        self.count, self.dim = vectors.shape
+        self.dtype = "int8" if scales is not None else "float16"
+
+    def __len__(self) -> int:
+        """Number of stored vectors."""
+        return self.count
+
+    def chunk_id(self, row: int) -> str:
+        """Return the chunk ID stored at a row."""
+        return self._ids[row]
+
+    def vectors(self, rows: np.ndarray) -> np.ndarray:
+        """Dequantize selected rows to float32.
+
+        Args:
+            rows: Row numbers
+
+        Returns:
+            (len(rows), dim) float32 array
+        """
+        block = np.asarray(self._vectors[rows], dtype=np.float32)
+        if self._scales is not None:
+            block *= self._scales[rows][:, None]
+        return block
+
+    def rank_batch(
+        self, queries: np.ndarray, k: int, rows: np.ndarray | None = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Find the k best rows for every query.
+
+        Args:
+            queries: (n_queries, dim) float array
+            k: Results per query
+            rows: Only score these rows (sorted; e.g. from a MetadataIndex)
+
+        Returns:
+            Tuple of (rows, scores), both shaped (n_queries, min(k, count)) and
+            sorted best first
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        if queries.shape[1] != self.dim:
+            raise ValueError(f"Query dimension {queries.shape[1]} != {self.dim}")
+        if rows is not None:
+            rows = np.asarray(rows, dtype=np.int64)
+        total = self.count if rows is None else len(rows)
+        k = min(k, total)
+        n_queries = len(queries)
+        if k <= 0:
+            empty = np.empty((n_queries, 0))
+            return empty.astype(np.int64), empty.astype(np.float32)
+
+        best_rows = np.empty((n_queries, 0), dtype=np.int64)
+        best_scores = np.empty((n_queries, 0), dtype=np.float32)
+        queries_t = np.ascontiguousarray(queries.T)
+        for start in range(0, total, self.block_rows):
+            end = min(start + self.block_rows, total)
+            # A filtered scan gathers the selected rows block by block, so its
+            # cost follows the number of matches rather than the index size
+            selected = slice(start, end) if rows is None else rows[start:end]
+            block = np.asarray(self._vectors[selected], dtype=np.float32)
+            scores = (block @ queries_t).T  # (n_queries, block rows)
+            if self._scales is not None:
+                scores *= self._scales[selected]
+            if scores.shape[1] > k:
+                top = np.argpartition(scores, -k, axis=1)[:, -k:]
+                scores = np.take_along_axis(scores, top, axis=1)
+            else:
+                top = np.broadcast_to(np.arange(end - start), scores.shape)
+            # Merge this block's candidates into the running best k
+            found = top + start if rows is None else rows[start:end][top]
+            candidates = np.concatenate([best_rows, found], axis=1)
+            scores = np.concatenate([best_scores, scores], axis=1)
+            if scores.shape[1] > k:
+                keep = np.argpartition(scores, -k, axis=1)[:, -k:]
+                candidates = np.take_along_axis(candidates, keep, axis=1)
+                scores = np.take_along_axis(scores, keep, axis=1)
+            best_rows, best_scores = candidates, scores
+
+        order = np.argsort(-best_scores, axis=1, kind="stable")
+        return (
+            np.take_along_axis(best_rows, order, axis=1),
+            np.take_along_axis(best_scores, order, axis=1),
+        )
+
+    def search_batch(
+        self, queries: np.ndarray, k: int, rows: np.ndarray | None = None
+    ) -> list[list[tuple[str, float]]]:
+        """Rank stored chunks against many queries in one pass over the matrix.
+
+        Args:
+            queries: (n_queries, dim) float array
+            k: Results per query
+            rows: Only score these rows (sorted)
+
+        Returns:
+            One list of (chunk_id, score) tuples per query, best first
+        """
+        found, scores = self.rank_batch(queries, k, rows)
+        return [
+            [(self.chunk_id(int(r)), float(s)) for r, s in zip(row_ids, row_scores)]
+            for row_ids, row_scores in zip(found, scores)
+        ]
+
+    def search(
+        self, query: np.ndarray, k: int, rows: np.ndarray | None = None
+    ) -> list[tuple[str, float]]:
+        """Rank stored chunks against one query.
+
+        Args:
+            query: (dim,) float vector
+            k: Maximum number of results
+            rows: Only score these rows (sorted)
+
+        Returns:
+            List of (chunk_id, score) tuples, best first
+        """
+        return self.search_batch(np.asarray(query)[None, :], k, rows)[0]
+
+
+def _nearest_centroids(data: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Index of the L2-nearest centroid for every row, computed in blocks."""
+    half_norms = 0.5 * np.einsum("ij,ij->i", centroids, centroids)
+    assign = np.empty(len(data), dtype=np.int64)
+    for start in range(0, len(data), 8192):
+        block = np.asarray(data[start : start + 8192], dtype=np.float32)
+        assign[start : start + len(block)] = np.argmax(
+            block @ centroids.T - half_norms, axis=1
+        )
+    return assign
+
+
+def _kmeans(
+    data: np.ndarray, k: int, iterations: int, rng: np.random.Generator
+) -> np.ndarray:
+    """Lloyd's k-means; empty clusters are re-seeded with random points."""
+    k = min(k, len(data))
+    centroids = data[rng.choice(len(data), k, replace=False)].astype(np.float32)
+    for _ in range(iterations):
+        assign = _nearest_centroids(data, centroids)
+        order = np.argsort(assign, kind="stable")
+        counts = np.bincount(assign, minlength=k)
+        nonempty = np.flatnonzero(counts)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[nonempty]
+        sums = np.add.reduceat(data[order], starts, axis=0)
+        centroids[nonempty] = sums / counts[nonempty, None]
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            centroids[empty] = data[rng.choice(len(data), len(empty))]
+    return centroids
+
+
+class IVFPQIndex:
+    """Approximate cosine search with an inverted file and product quantization.
+
+    **Build**: k-means splits the vectors into ``nlist`` cells. Each vector is
+    stored in the list of its nearest cell centroid, and its residual (vector
+    minus centroid) is compressed with product quantization: the dimensions
+    are cut into ``m`` groups and each group is replaced by the index of the
+    nearest of 256 trained sub-centroids, so a vector costs ``m`` bytes.
+
+    **Search**: only the ``nprobe`` cells closest to the query are scanned.
+    Scores are ``q·centroid + q·residual``, where the second term is a sum of
+    ``m`` lookups in a per-query table. The best ``k * refine_factor``
+    candidates are then re-scored exactly against float16 copies of the
+    vectors (``refine_factor=0`` skips this and uses PQ scores directly).
+    Raising ``nprobe`` or ``refine_factor`` trades speed for recall.
+
+    **Updates**: inserts are assigned to the existing cells (upserting by ID);
+    deletes set a tombstone that search skips. ``save`` drops tombstoned rows.
+    After heavy churn, rebuilding re-trains the cells on the current data.
+    """
+
+    dim: int
+    nlist: int
+    m: int
+    nprobe: int
+    refine_factor: int
+
+    def __init__(
+        self,
+        centroids: np.ndarray,
+        codebooks: np.ndarray,
+        nprobe: int = ANN_NPROBE,
+        refine_factor: int = ANN_REFINE_FACTOR,
+    ) -> None:
+        """Create an empty index from trained quantizers (see build).
+
+        Args:
+            centroids: (nlist, dim) coarse cell centroids
+            codebooks: (m, 256, dim // m) residual sub-centroids
+            nprobe: Cells scanned per query
+            refine_factor: Candidates re-scored exactly, as a multiple of k
+        """
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.codebooks = np.asarray(codebooks, dtype=np.float32)
+        self.nlist, self.dim = self.centroids.shape
+        self.m = len(self.codebooks)
+        self.nprobe = nprobe
+        self.refine_factor = refine_factor
+        self._sub = self.dim // self.m
+        self._count = 0
+        self._codes = np.empty((0, self.m), dtype=np.uint8)
+        self._vectors = np.empty((0, self.dim), dtype=np.float16)
+        self._assign = np.empty(0, dtype=np.int32)
+        self._deleted = np.empty(0, dtype=bool)
+        self._ids: list[str] | StringTable = []
+        self._rows: dict[str, int] | None = {}
+        # Per-cell row numbers (None until first search) plus rows inserted since
+        self._lists: list[np.ndarray] | None = None
+        self._pending: list[list[int]] = [[] for _ in range(self.nlist)]
+
+    @classmethod
+    def build(
+        cls,
+        ids: list[str],
+        vectors: np.ndarray,
+        nlist: int | None = None,
+        m: int | None = None,
+        nprobe: int = ANN_NPROBE,
+        refine_factor: int = ANN_REFINE_FACTOR,
+        train_size: int = 50_000,
+        iterations: int = 10,
+        seed: int = 0,
+    ) -> "IVFPQIndex":
+        """Train quantizers on (a sample of) the vectors and insert them all.
+
+        Args:
+            ids: Chunk ID of each vector
+            vectors: (len(ids), dim) float array
+            nlist: Number of cells (default 4 * sqrt(count))
+            m: PQ groups; must divide dim (default: largest divisor <= dim / 4)
+            nprobe: Cells scanned per query
+            refine_factor: Candidates re-scored exactly, as a multiple of k
+            train_size: Maximum vectors used to train the quantizers
+            iterations: k-means iterations
+            seed: Seed for sampling and k-means initialization
+
+        Returns:
+            Populated index
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        count, dim = vectors.shape
+        if count == 0:
+            raise ValueError("Cannot train an ANN index without vectors")
+        if m is None:
+            m = max(d for d in range(1, max(dim // 4, 1) + 1) if dim % d == 0)
+        if dim % m:
+            raise ValueError(f"PQ groups ({m}) must divide the dimension ({dim})")
+        nlist = nlist or max(1, int(4 * np.sqrt(count)))
+
+        rng = np.random.default_rng(seed)
+        sample = vectors[rng.choice(count, min(train_size, count), replace=False)]
+        centroids = _kmeans(sample, nlist, iterations, rng)
+        # 256 sub-centroids per group need far fewer points than the cells
+        pq_sample = sample[: 256 * 64]
+        residuals = pq_sample - centroids[_nearest_centroids(pq_sample, centroids)]
+        sub = dim // m
+        codebooks = np.zeros((m, 256, sub), dtype=np.float32)
+        for j in range(m):
+            trained = _kmeans(
+                residuals[:, j * sub : (j + 1) * sub], 256, iterations, rng
+            )
+            codebooks[j, : len(trained)] = trained
+            codebooks[j, len(trained) :] = np.inf  # Never chosen by the encoder
+
+        index = cls(centroids, codebooks, nprobe=nprobe, refine_factor=refine_factor)
+        index.insert(ids, vectors)
+        return index
+
+    def __len__(self) -> int:
+        """Number of live (not deleted) vectors."""
+        return self._count - int(self._deleted[: self._count].sum())
+
+    def __contains__(self, chunk_id: object) -> bool:
+        """Whether a live vector is stored under this ID."""
+        return chunk_id in self._row_map()
+
+    def _row_map(self) -> dict[str, int]:
+        """ID -> live row, built on first use after load."""
+        if self._rows is None:
+            self._rows = {
+                chunk_id: row
+                for row, chunk_id in enumerate(self._ids)
+                if not self._deleted[row]
+            }
+        return self._rows
+
+    def chunk_id(self, row: int) -> str:
+        """Return the chunk ID stored at a row."""
+        return self._ids[row]
+
+    def _encode(self, vectors: np.ndarray, assign: np.ndarray) -> np.ndarray:
+        """PQ-encode the residuals of vectors against their cell centroids."""
+        residuals = vectors - self.centroids[assign]
+        codes = np.empty((len(vectors), self.m), dtype=np.uint8)
+        for j in range(self.m):
+            part = residuals[:, j * self._sub : (j + 1) * self._sub]
+            codebook = self.codebooks[j]
+            finite = np.isfinite(codebook[:, 0])
+            codes[:, j] = _nearest_centroids(part, codebook[finite])
+        return codes
+
+    def _grow(self, extra: int) -> None:
+        """Make room for extra rows (copying memory-mapped arrays into RAM)."""
+        needed = self._count + extra
+        capacity = len(self._assign)
+        if needed <= capacity and not isinstance(self._codes, np.memmap):
+            return
+        capacity = max(needed, 2 * capacity, 1024)
+
+        def grown(array: np.ndarray) -> np.ndarray:
+            bigger = np.zeros((capacity, *array.shape[1:]), dtype=array.dtype)
+            bigger[: self._count] = array[: self._count]
+            return bigger
+
+        self._codes = grown(self._codes)
+        self._vectors = grown(self._vectors)
+        self._assign = grown(self._assign)
+        self._deleted = grown(self._deleted)
+
+    def insert(self, ids: list[str], vectors: np.ndarray) -> None:
+        """Add vectors, replacing any live vector stored under the same ID.
+
+        Args:
+            ids: Chunk IDs
+            vectors: (len(ids), dim) float array
+        """
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(ids), self.dim)
+        self.delete(ids)
+        assign = _nearest_centroids(vectors, self.centroids)
+        codes = self._encode(vectors, assign)
+        self._grow(len(ids))
+        start, end = self._count, self._count + len(ids)
+        self._codes[start:end] = codes
+        self._vectors[start:end] = vectors
+        self._assign[start:end] = assign
+        self._deleted[start:end] = False
+        rows = self._row_map()
+        for offset, (chunk_id, cell) in enumerate(zip(ids, assign.tolist())):
+            rows[chunk_id] = start + offset
+            self._pending[cell].append(start + offset)
+        if not isinstance(self._ids, list):
+            self._ids = list(self._ids)  # Decoded once, on the first update
+        self._ids.extend(ids)
+        self._count = end
+
+    def delete(self, ids: list[str]) -> int:
+        """Tombstone vectors by ID.
+
+        Args:
+            ids: Chunk IDs (unknown IDs are ignored)
+
+        Returns:
+            Number of vectors deleted
+        """
+        rows = self._row_map()
+        deleted = 0
+        for chunk_id in ids:
+            row = rows.pop(chunk_id, None)
+            if row is not None:
+                self._deleted[row] = True
+                deleted += 1
+        return deleted
+
+    def _cell_rows(self, cell: int) -> np.ndarray:
+        """Row numbers stored in a cell, merging rows inserted since last use."""
+        if self._lists is None:
+            assign = self._assign[: self._count]
+            order = np.argsort(assign, kind="stable")
+            bounds = np.cumsum(np.bincount(assign, minlength=self.nlist))[:-1]
+            self._lists = np.split(order, bounds)
+            for pending in self._pending:
+                pending.clear()
+        rows = self._lists[cell]
+        if self._pending[cell]:
+            rows = np.concatenate([rows, np.array(self._pending[cell], dtype=np.int64)])
+            self._pending[cell].clear()
+        self._lists[cell] = rows
+        return rows
+
+    def rank(
+        self, query: np.ndarray, k: int, rows: np.ndarray | None = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Find approximately the k best live rows for a query.
+
+        With a row filter, a selection smaller than what an unfiltered probe
+        would scan is scored exactly; otherwise probing only keeps allowed
+        rows and widens (doubling nprobe) until the short list can be filled,
+        so selective filters neither slow search down nor starve top-k.
+
+        Args:
+            query: (dim,) float vector
+            k: Maximum number of results
+            rows: Only consider these rows (e.g. from a MetadataIndex)
+
+        Returns:
+            Tuple of (rows, scores), sorted best first
+        """
+        query = np.asarray(query, dtype=np.float32).reshape(self.dim)
+        if k <= 0 or self._count == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        nprobe = min(self.nprobe, self.nlist)
+        allowed = None
+        if rows is not None:
+            rows = np.asarray(rows, dtype=np.int64)
+            rows = rows[rows < self._count]
+            rows = rows[~self._deleted[rows]]
+            if len(rows) * self.nlist <= self._count * nprobe:
+                scores = np.asarray(self._vectors[rows], dtype=np.float32) @ query
+                order = np.argsort(-scores, kind="stable")[:k]
+                return rows[order], scores[order].astype(np.float32)
+            allowed = np.zeros(self._count, dtype=bool)
+            allowed[rows] = True
+
+        shortlist = k * self.refine_factor if self.refine_factor > 0 else k
+        half_norms = 0.5 * np.einsum("ij,ij->i", self.centroids, self.centroids)
+        coarse = self.centroids @ query
+        ranked = np.argsort(-(coarse - half_norms), kind="stable")
+        per_cell: list[np.ndarray] = []
+        probed = found = 0
+        while True:
+            for cell in ranked[probed:nprobe]:
+                cell_rows = self._cell_rows(int(cell))
+                keep = ~self._deleted[cell_rows]
+                if allowed is not None:
+                    keep &= allowed[cell_rows]
+                per_cell.append(cell_rows[keep])
+                found += len(per_cell[-1])
+            probed = nprobe
+            if allowed is None or found >= shortlist or nprobe == self.nlist:
+                break
+            nprobe = min(2 * nprobe, self.nlist)
+        rows = np.concatenate(per_cell)
+        if len(rows) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        # table[j, c] = q_j · codebook[j, c]; unused codebook slots score 0
+        table = np.einsum(
+            "jcs,js->jc",
+            np.nan_to_num(self.codebooks, posinf=0.0),
+            query.reshape(self.m, self._sub),
+        )
+        codes = self._codes[rows].astype(np.int64) + 256 * np.arange(self.m)
+        scores = coarse[self._assign[rows]] + table.ravel()[codes].sum(axis=1)
+
+        if len(rows) > shortlist:
+            top = np.argpartition(-scores, shortlist - 1)[:shortlist]
+            rows, scores = rows[top], scores[top]
+        if self.refine_factor > 0:
+            scores = np.asarray(self._vectors[rows], dtype=np.float32) @ query
+        order = np.argsort(-scores, kind="stable")[:k]
+        return rows[order], scores[order].astype(np.float32)
+
+    def search(
+        self, query: np.ndarray, k: int, rows: np.ndarray | None = None
+    ) -> list[tuple[str, float]]:
+        """Rank stored chunks against one query (see rank).
+
+        Args:
+            query: (dim,) float vector
+            k: Maximum number of results
+            rows: Only consider these rows
+
+        Returns:
+            List of (chunk_id, score) tuples, best first
+        """
+        found, scores = self.rank(query, k, rows)
+        return [(self._ids[int(r)], float(s)) for r, s in zip(found, scores)]
+
+    def search_batch(
+        self, queries: np.ndarray, k: int, rows: np.ndarray | None = None
+    ) -> list[list[tuple[str, float]]]:
+        """Run search for every row of a (n_queries, dim) array."""
+        return [self.search(query, k, rows) for query in np.atleast_2d(queries)]
+
+    def to_arrays(self) -> tuple[dict, dict[str, np.ndarray]]:
+        """Export the live rows as (header, arrays) for write_array_file."""
+        live = np.flatnonzero(~self._deleted[: self._count])
+        header = {
+            "version": ANN_FORMAT_VERSION,
+            "nprobe": self.nprobe,
+            "refine_factor": self.refine_factor,
+        }
+        ids, id_offsets = encode_strings(self._ids[row] for row in live.tolist())
+        arrays = {
+            "centroids": self.centroids,
+            "codebooks": self.codebooks,
+            "codes": self._codes[live],
+            "vectors": self._vectors[live],
+            "assign": self._assign[live],
+            "id_offsets": id_offsets,
+            "ids": ids,
+        }
+        return header, arrays
+
+    def save(self, path: Path) -> None:
+        """Write the index (without tombstoned rows) to one file, atomically.
+
+        Args:
+            path: Destination file
+        """
+        write_array_file(Path(path), *self.to_arrays())
+
+    @classmethod
+    def from_arrays(cls, header: dict, arrays: dict[str, np.ndarray]) -> "IVFPQIndex":
+        """Wrap arrays exported by to_arrays (typically memory-mapped).
+
+        The large arrays are not copied and chunk IDs are decoded on demand,
+        so the cost does not depend on how many vectors the index holds.
+
+        Args:
+            header: Header of to_arrays
+            arrays: Arrays of to_arrays
+
+        Returns:
+            The index, ready to search (and to update)
+        """
+        if header["version"] != ANN_FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported ANN index version {header['version']} "
+                f"(expected {ANN_FORMAT_VERSION})"
+            )
+        index = cls(
+            np.array(arrays["centroids"]),
+            np.array(arrays["codebooks"]),
+            nprobe=header["nprobe"],
+            refine_factor=header["refine_factor"],
+        )
+        index._codes = arrays["codes"]
+        index._vectors = arrays["vectors"]
+        index._assign = arrays["assign"]
+        index._count = len(index._assign)
+        index._deleted = np.zeros(index._count, dtype=bool)
+        index._ids = StringTable(arrays["ids"], arrays["id_offsets"])
+        index._rows = None
+        return index
+
+    @classmethod
+    def load(cls, path: Path) -> "IVFPQIndex":
+        """Open an index written by save (see from_arrays).
+
+        Args:
+            path: File written by save
+
+        Returns:
+            The index, ready to search (and to update)
+        """
+        return cls.from_arrays(*read_array_file(Path(path)))
+
+
+def reciprocal_rank_fusion(
+    rankings: list[list[tuple[str, float]]],
+    weights: list[float] | None = None,
+    rrf_k: int = RRF_K,
+) -> list[tuple[str, float]]:
+    """Fuse rankings by summing ``weight / (rrf_k + rank)`` per ID.
+
+    Only ranks are used, so retrievers with incomparable score scales (BM25
+    and cosine) can be combined without calibration.
+
+    Args:
+        rankings: Lists of (id, score) tuples, each best first
+        weights: Per-ranking weight (default 1.0 each)
+        rrf_k: Damping constant; larger values flatten the rank contribution
+
+    Returns:
+        Fused (id, score) tuples, best first
+    """
+    weights = weights or [1.0] * len(rankings)
+    fused: dict[str, float] = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, (chunk_id, _) in enumerate(ranking, start=1):
+            fused[chunk_id] = fused.get(chunk_id, 0.0) + weight / (rrf_k + rank)
+    return sorted(fused.items(), key=lambda item: (-item[1], item[0]))
+
+
+def weighted_score_fusion(
+    rankings: list[list[tuple[str, float]]], weights: list[float]
+) -> list[tuple[str, float]]:
+    """Fuse rankings by a weighted sum of min-max normalized scores.
+
+    Args:
+        rankings: Lists of (id, score) tuples, each best first
+        weights: Per-ranking weight
+
+    Returns:
+        Fused (id, score) tuples, best first; IDs missing from a ranking
+        get 0 from it
+    """
+    fused: dict[str, float] = {}
+    for ranking, weight in zip(rankings, weights):
+        if not ranking:
+            continue
+        scores = [score for _, score in ranking]
+        low, span = min(scores), max(scores) - min(scores)
+        for chunk_id, score in ranking:
+            normalized = (score - low) / span if span > 0 else 1.0
+            fused[chunk_id] = fused.get(chunk_id, 0.0) + weight * normalized
+    return sorted(fused.items(), key=lambda item: (-item[1], item[0]))
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase a query and collapse whitespace.
+
+    Both BM25 tokenization and the query embedding ignore case and spacing,
+    so queries that normalize equally have identical results.
+    """
+    return " ".join(query.lower().split())
+
+
+class RetrievalCache:
+    """LRU cache of search results bounded by approximate memory use.
+
+    Keys combine the index identity and generation with the normalized query,
+    k and filters. When a newer generation of an index is seen, every entry
+    of older generations of that index is dropped, so results computed
+    before an incremental update are never served after it.
+    """
+
+    max_bytes: int
+
+    def __init__(self, max_bytes: int = RETRIEVAL_CACHE_BYTES) -> None:
+        """Create an empty cache.
+
+        Args:
+            max_bytes: Approximate memory bound for keys and results
+        """
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.size_bytes = 0
+        self._entries: OrderedDict[tuple, tuple[list[tuple[str, float]], int]] = (
+            OrderedDict()
+        )
+        self._generations: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Number of cached result lists."""
+        return len(self._entries)
+
+    @staticmethod
+    def key(
+        index_id: str, generation: int, query: str, k: int, filters: Hashable = None
+    ) -> tuple:
+        """Build the cache key of one search."""
+        return (index_id, generation, normalize_query(query), k, filters)
+
+    def _observe(self, index_id: str, generation: int) -> None:
+        """Drop an index's entries from generations older than this one."""
+        known = self._generations.get(index_id)
+        if known is not None and known >= generation:
+            return
+        self._generations[index_id] = generation
+        if known is not None:
+            for key in [key for key in self._entries if key[0] == index_id]:
+                if key[1] < generation:
+                    self.size_bytes -= self._entries.pop(key)[1]
+
+    def get(self, key: tuple) -> list[tuple[str, float]] | None:
+        """Return a copy of the cached results for a key, or None."""
+        with self._lock:
+            self._observe(key[0], key[1])
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return list(entry[0])
+
+    def put(self, key: tuple, results: list[tuple[str, float]]) -> None:
+        """Store results, evicting least recently used entries over the bound."""
+        size = 200 + len(key[0]) + len(key[2]) + sum(100 + len(c) for c, _ in results)
+        with self._lock:
+            self._observe(key[0], key[1])
+            if key[1] < self._generations[key[0]] or size > self.max_bytes:
+                return  # Computed on an index that has been replaced meanwhile
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size_bytes -= old[1]
+            self._entries[key] = (list(results), size)
+            self.size_bytes += size
+            while self.size_bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.size_bytes -= evicted
+
+    def clear(self) -> None:
+        """Drop every entry."""
+        with self._lock:
+            self._entries.clear()
+            self.size_bytes = 0
+
+
+_default_cache: RetrievalCache | None = None
+_default_cache_lock = threading.Lock()
+
+
+def get_retrieval_cache() -> RetrievalCache:
+    """Return the process-wide retrieval cache shared by opened indexes.
+
+    Returns:
+        Shared RetrievalCache instance
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = RetrievalCache()
+        return _default_cache
+
+
+def _shortest_span(tokens: np.ndarray, terms: np.ndarray) -> int:
+    """Length of the shortest token window containing every one of the terms.
+
+    Args:
+        tokens: Term ID of each token of a text
+        terms: Distinct term IDs, all occurring in tokens
+
+    Returns:
+        Window length in tokens
+    """
+    positions = [np.flatnonzero(tokens == term) for term in terms]
+    starts = np.unique(np.concatenate(positions))
+    # The window starting at p ends at the latest of each term's next
+    # occurrence at or after p (never, if some term does not occur again)
+    ends = np.zeros(len(starts), dtype=np.int64)
+    for occurrences in positions:
+        after = np.searchsorted(occurrences, starts)
+        following = occurrences[np.minimum(after, len(occurrences) - 1)]
+        following[after == len(occurrences)] = np.iinfo(np.int64).max
+        ends = np.maximum(ends, following)
+    return int((ends - starts).min()) + 1
+
+
+class Reranker:
+    """Local second-stage scorer for the top candidates of a first-stage ranking.
+
+    Every (query, chunk) pair gets four features in [0, 1], combined by a
+    weighted sum:
+
+    - **similarity**: cosine of the query and chunk embeddings
+    - **coverage**: fraction of the distinct query terms found in the chunk
+    - **proximity**: matched terms divided by the length of the shortest
+      window containing all of them (0 with fewer than two matched terms)
+    - **field**: fraction of the query terms found in the chunk's Markdown
+      heading lines
+
+    Queries and candidate chunks are each embedded in one batch (served by
+    the embedding service's caches) and the similarities of the whole batch
+    are one matrix product; coverage and field come from products of
+    term-presence matrices, so only proximity is computed per pair. Scores
+    are cached under a hash of the normalized query and the chunk ID. The
+    chunk ID is a hash of the text, so a cached score stays valid across
+    index generations.
+    """
+
+    def __init__(
+        self,
+        embedder: EmbeddingService,
+        candidates: int = RERANK_CANDIDATES,
+        weights: Mapping[str, float] | None = None,
+        max_entries: int = RERANK_CACHE_ENTRIES,
+    ) -> None:
+        """Create a reranker with an empty score cache.
+
+        Args:
+            embedder: Embeds candidate chunks (same model as the index)
+            candidates: Fused candidates rescored per query
+            weights: Weight per feature name (default RERANK_WEIGHTS; missing
+                features get 0)
+            max_entries: Cached (query, chunk) scores
+        """
+        self.embedder = embedder
+        self.candidates = candidates
+        self.weights = dict(weights if weights is not None else RERANK_WEIGHTS)
+        unknown = set(self.weights) - {"similarity", "coverage", "proximity", "field"}
+        if unknown:
+            raise ValueError(f"Unknown rerank features: {sorted(unknown)}")
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._scores: OrderedDict[bytes, float] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def identity(self) -> str:
+        """Settings that change rerank results, for result cache keys."""
+        weights = ",".join(f"{n}={w}" for n, w in sorted(self.weights.items()))
+        return f"{self.embedder.model_id}|{self.candidates}|{weights}"
+
+    @staticmethod
+    def _key(query: str, chunk_id: str) -> bytes:
+        """Score cache key of a (normalized query, chunk) pair."""
+        return hashlib.blake2b(
+            f"{query}\0{chunk_id}".encode("utf-8"), digest_size=16
+        ).digest()
+
+    def features(
+        self,
+        queries: list[str],
+        query_vectors: np.ndarray,
+        texts: list[str],
+        pairs: np.ndarray,
+    ) -> dict[str, np.ndarray]:
+        """Compute every feature for (query, text) index pairs.
+
+        Args:
+            queries: Query strings
+            query_vectors: (len(queries), dim) normalized query embeddings
+            texts: Candidate texts
+            pairs: (n, 2) array of (query index, text index) rows
+
+        Returns:
+            Feature name -> (n,) float array
+        """
+        vocabulary: dict[str, int] = {}
+        query_terms = [
+            np.array(
+                [vocabulary.setdefault(t, len(vocabulary)) for t in set(tokenize(q))],
+                dtype=np.int64,
+            )
+            for q in queries
+        ]
+        asked = np.zeros((len(queries), len(vocabulary)), dtype=np.float32)
+        for i, terms in enumerate(query_terms):
+            asked[i, terms] = 1.0
+        tokens = []
+        present = np.zeros((len(texts), len(vocabulary)), dtype=np.float32)
+        in_heading = np.zeros_like(present)
+        for j, text in enumerate(texts):
+            ids = np.array([vocabulary.get(t, -1) for t in tokenize(text)], dtype=int)
+            tokens.append(ids)
+            present[j, ids[ids >= 0]] = 1.0
+            heading = " ".join(
+                line for line in text.splitlines() if line.lstrip().startswith("#")
+            )
+            heading_ids = [vocabulary[t] for t in tokenize(heading) if t in vocabulary]
+            in_heading[j, heading_ids] = 1.0
+
+        q, t = pairs[:, 0], pairs[:, 1]
+        lengths = np.maximum(asked.sum(axis=1), 1.0)[q]
+        matched = np.einsum("nv,nv->n", asked[q], present[t])
+        chunk_vectors = self.embedder.embed(texts)
+        proximity = np.zeros(len(pairs), dtype=np.float32)
+        for n in np.flatnonzero(matched >= 2):
+            terms = query_terms[q[n]][present[t[n], query_terms[q[n]]] > 0]
+            proximity[n] = len(terms) / _shortest_span(tokens[t[n]], terms)
+        return {
+            "similarity": np.einsum(
+                "nd,nd->n", query_vectors[q], chunk_vectors[t].astype(np.float32)
+            ),
+            "coverage": matched / lengths,
+            "proximity": proximity,
+            "field": np.einsum("nv,nv->n", asked[q], in_heading[t]) / lengths,
+        }
+
+    def rerank(
+        self,
+        queries: list[str],
+        rankings: list[list[tuple[str, float]]],
+        text: Callable[[str], str | None],
+        query_vectors: np.ndarray | None = None,
+    ) -> list[list[tuple[str, float]]]:
+        """Rescore and reorder the candidates of many queries.
+
+        Args:
+            queries: Free-text queries
+            rankings: First-stage (chunk_id, score) candidates per query; all
+                of them are rescored
+            text: Returns the text of a chunk ID (None if unknown)
+            query_vectors: Query embeddings, if already computed
+
+        Returns:
+            One list of (chunk_id, rerank score) tuples per query, best first
+        """
+        normalized = [normalize_query(query) for query in queries]
+        keys = [
+            [self._key(query, chunk_id) for chunk_id, _ in ranking]
+            for query, ranking in zip(normalized, rankings)
+        ]
+        scores: list[list[float | None]] = []
+        with self._lock:
+            for query_keys in keys:
+                found = [self._scores.get(key) for key in query_keys]
+                for key, score in zip(query_keys, found):
+                    if score is not None:
+                        self._scores.move_to_end(key)
+                self.hits += sum(score is not None for score in found)
+                self.misses += sum(score is None for score in found)
+                scores.append(found)
+
+        todo = [
+            (i, j)
+            for i, found in enumerate(scores)
+            for j, score in enumerate(found)
+            if score is None
+        ]
+        if todo:
+            asked = sorted({i for i, _ in todo})
+            position = {
+                chunk_id: n
+                for n, chunk_id in enumerate(
+                    dict.fromkeys(rankings[i][j][0] for i, j in todo)
+                )
+            }
+            if query_vectors is None:
+                vectors = self.embedder.embed_queries([queries[i] for i in asked])
+            else:
+                vectors = np.asarray(query_vectors, dtype=np.float32)[asked]
+            row = {i: n for n, i in enumerate(asked)}
+            pairs = np.array(
+                [(row[i], position[rankings[i][j][0]]) for i, j in todo],
+                dtype=np.int64,
+            )
+            features = self.features(
+                [normalized[i] for i in asked],
+                vectors,
+                [text(chunk_id) or "" for chunk_id in position],
+                pairs,
+            )
+            total = sum(
+                (
+                    self.weights.get(name, 0.0) * values
+                    for name, values in features.items()
+                ),
+                np.zeros(len(pairs), dtype=np.float32),
+            )
+            with self._lock:
+                for (i, j), score in zip(todo, total.tolist()):
+                    scores[i][j] = score
+                    self._scores[keys[i][j]] = score
+                while len(self._scores) > self.max_entries:
+                    self._scores.popitem(last=False)
+
+        return [
+            sorted(
+                (
+                    (chunk_id, float(score or 0.0))
+                    for (chunk_id, _), score in zip(ranking, found)
+                ),
+                key=lambda item: (-item[1], item[0]),
+            )
+            for ranking, found in zip(rankings, scores)
+        ]
+
+    def clear(self) -> None:
+        """Drop every cached score."""
+        with self._lock:
+            self._scores.clear()
+
+
+def read_generation(index_dir: Path) -> int:
+    """Return the generation of a HybridRetriever directory (0 if unknown)."""
+    try:
+        meta = json.loads((Path(index_dir) / "meta.json").read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return 0
+    return int(meta.get("generation", 0))
+
+
+def chunk_metadata(
+    chunks: ChunkSource, ids: list[str], doc_metadata: Mapping[str, dict[str, Any]]
+) -> list[dict[str, list[Any]]]:
+    """Filterable fields of each chunk, for a MetadataIndex over its vector rows.
+
+    Args:
+        chunks: Where each chunk occurs
+        ids: Chunk ID of each vector row
+        doc_metadata: Source -> filterable fields of that document
+
+    Returns:
+        One dict per row: the sources of the documents containing the chunk
+        plus those documents' fields (a shared chunk has all their values)
+    """
+    rows = []
+    for chunk_id in ids:
+        sources = sorted({source for source, _ in chunks.locations(chunk_id)})
+        row: dict[str, list[Any]] = {"source": list(sources)}
+        for source in sources:
+            for name, value in doc_metadata.get(source, {}).items():
+                values = value if isinstance(value, (list, tuple)) else [value]
+                row.setdefault(name, []).extend(values)
+        rows.append(row)
+    return rows
+
+
+def save_hybrid_index(
+    index_dir: Path,
+    chunks: ChunkStore,
+    sparse: BM25Index,
+    ids: list[str],
+    vectors: np.ndarray,
+    ann: bool = False,
+    dtype: VectorDType = VECTOR_DTYPE,
+    generation: int | None = None,
+    doc_metadata: Mapping[str, dict[str, Any]] | None = None,
+) -> None:
+    """Write the files of a HybridRetriever, atomically replacing any old ones.
+
+    Every vector row gets metadata for filtering: the sources of the
+    documents containing the chunk, plus the fields those documents have in
+    ``doc_metadata`` (a chunk shared by several documents has all values).
+
+    Args:
+        index_dir: Destination directory
+        chunks: Chunk texts and document order
+        sparse: BM25 index keyed by chunk ID
+        ids: Chunk ID of each vector row
+        vectors: (len(ids), dim) float array
+        ann: Store an IVFPQIndex instead of an ExactRetriever
+        dtype: Storage type of the exact retriever's matrix
+        generation: Version number; cached results of lower ones are dropped
+            (default: one more than the index being replaced)
+        doc_metadata: Source -> filterable fields (e.g. {"mtime": 1.7e9})
+    """
+    index_dir = Path(index_dir)
+    if generation is None:
+        generation = read_generation(index_dir) + 1
+    build_dir = index_dir.with_name(f"{index_dir.name}.build-{os.getpid()}")
+    shutil.rmtree(build_dir, ignore_errors=True)
+    build_dir.mkdir(parents=True)
+    (build_dir / "meta.json").write_text(
+        json.dumps({"generation": generation}), encoding="utf-8"
+    )
+    (build_dir / "chunks.json").write_text(
+        json.dumps(chunks.to_dict()), encoding="utf-8"
+    )
+    (build_dir / "sparse.json").write_text(
+        json.dumps(sparse.to_dict()), encoding="utf-8"
+    )
+    if ann and len(ids):
+        IVFPQIndex.build(ids, vectors).save(build_dir / "ann.idx")
+    else:
+        build_vector_index(build_dir / "dense", ids, vectors, dtype=dtype)
+    rows = chunk_metadata(chunks, ids, doc_metadata or {})
+    MetadataIndex.build(rows).save(build_dir / "metadata")
+
+    old_dir = index_dir.with_name(f"{index_dir.name}.old-{os.getpid()}")
+    if index_dir.exists():
+        os.replace(index_dir, old_dir)
+    os.replace(build_dir, index_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+
+class HybridRetriever:
+    """BM25 and vector retrieval run concurrently and fused into one ranking.
+
+    Both sides rank ``candidates`` chunks per query; the dense side (query
+    embedding plus matrix scan, both mostly outside the GIL) runs on a worker
+    thread while BM25 runs on the caller's thread, so fusion adds little over
+    the slower of the two. With a ``reranker``, the top fused candidates are
+    rescored by it before the top k are returned.
+    """
+
+    sparse: SparseIndex
+    dense: Retriever
+    embedder: EmbeddingService
+    chunks: ChunkSource
+
+    def __init__(
+        self,
+        sparse: SparseIndex,
+        dense: Retriever,
+        embedder: EmbeddingService,
+        chunks: ChunkSource,
+        fusion: FusionMethod = HYBRID_FUSION,
+        dense_weight: float = HYBRID_DENSE_WEIGHT,
+        candidates: int = HYBRID_CANDIDATES,
+        cache: RetrievalCache | None = None,
+        index_id: str = "",
+        generation: int = 0,
+        metadata: MetadataIndex | None = None,
+        reranker: Reranker | None = None,
+    ) -> None:
+        """Combine existing indexes (see build and open).
+
+        Args:
+            sparse: BM25 index keyed by chunk ID
+            dense: Vector retriever keyed by chunk ID
+            embedder: Embeds queries for the dense side
+            chunks: Chunk texts and document order
+            fusion: "rrf" (reciprocal-rank fusion) or "weighted" (score fusion)
+            dense_weight: Weight of the dense ranking; sparse gets the rest
+            candidates: Chunks ranked by each side before fusion
+            cache: Result cache (open uses the shared one; None disables)
+            index_id: Identifies the index in cache keys (open uses its path)
+            generation: Index version in cache keys
+            metadata: Filterable fields of the dense rows (needed for ``where``)
+            reranker: Rescores the top fused candidates (None skips reranking)
+        """
+        self.sparse = sparse
+        self.dense = dense
+        self.embedder = embedder
+        self.chunks = chunks
+        self.fusion = fusion
+        self.dense_weight = dense_weight
+        self.candidates = candidates
+        self.cache = cache
+        self.index_id = index_id
+        self.generation = generation
+        self.metadata = metadata
+        self.reranker = reranker
+        self._row_of: dict[str, int] | None = None
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="dense")
+
+    @classmethod
+    def build(
+        cls,
+        index_dir: Path,
+        chunks: Iterable[Chunk],
+        embedder: EmbeddingService,
+        ann: bool = False,
+        dtype: VectorDType = VECTOR_DTYPE,
+        doc_metadata: Mapping[str, dict[str, Any]] | None = None,
+        **options: Any,
+    ) -> "HybridRetriever":
+        """Index chunks into both indexes in one pass and save them.
+
+        Consecutive chunks with the same source form one document. Chunks
+        whose text was already seen (in any document) are indexed once.
+
+        Args:
+            index_dir: Destination directory (replaced atomically)
+            chunks: Chunks of all documents, grouped by source
+            embedder: Embedding service (its cache skips unchanged chunks)
+            ann: Use an IVFPQIndex instead of an ExactRetriever
+            dtype: Storage type of the exact retriever's matrix
+            doc_metadata: Source -> filterable fields of that document
+            **options: Passed on to HybridRetriever()
+
+        Returns:
+            The opened retriever
+        """
+        index_dir = Path(index_dir)
+        store = ChunkStore()
+        sparse = BM25Index()
+        ids: list[str] = []
+        blocks: list[np.ndarray] = []
+        for source, group in itertools.groupby(chunks, key=lambda c: c.source):
+            new = store.ingest(source, group).new
+            for chunk in new:
+                sparse.add(chunk.chunk_id, chunk.text)
+            if new:
+                ids.extend(chunk.chunk_id for chunk in new)
+                blocks.append(embedder.embed([chunk.text for chunk in new]))
+        vectors = (
+            np.concatenate(blocks)
+            if blocks
+            else np.empty((0, embedder.dim), dtype=np.float32)
+        )
+
+        save_hybrid_index(
+            index_dir,
+            store,
+            sparse,
+            ids,
+            vectors,
+            ann=ann,
+            dtype=dtype,
+            doc_metadata=doc_metadata,
+        )
+        return cls.open(index_dir, embedder, **options)
+
+    @classmethod
+    def open(
+        cls,
+        index_dir: Path,
+        embedder: EmbeddingService,
+        dense: Retriever | None = None,
+        **options: Any,
+    ) -> "HybridRetriever":
+        """Open an index written by build.
+
+        Results are cached in the shared RetrievalCache unless ``cache`` is
+        given in options.
+
+        Args:
+            index_dir: Directory written by build
+            embedder: Embedding service (same model as at build time)
+            dense: Serves the stored vectors instead of the index's own
+                dense/ or ann.idx (e.g. a ShardedRetriever)
+            **options: Passed on to HybridRetriever()
+
+        Returns:
+            The opened retriever
+        """
+        index_dir = Path(index_dir)
+        options.setdefault("cache", get_retrieval_cache())
+        options.setdefault("index_id", str(index_dir.resolve()))
+        options.setdefault("generation", read_generation(index_dir))
+        if "metadata" not in options and (index_dir / "metadata").is_dir():
+            options["metadata"] = MetadataIndex.open(index_dir / "metadata")
+        chunks = ChunkStore.from_dict(
+            json.loads((index_dir / "chunks.json").read_text(encoding="utf-8"))
+        )
+        sparse = BM25Index.from_dict(
+            json.loads((index_dir / "sparse.json").read_text(encoding="utf-8"))
+        )
+        ann_path = index_dir / "ann.idx"
+        if dense is None:
+            dense = (
+                IVFPQIndex.load(ann_path)
+                if ann_path.exists()
+                else ExactRetriever(index_dir / "dense")
+            )
+        return cls(sparse, dense, embedder, chunks, **options)
+
+    def _fuse(
+        self, sparse: list[tuple[str, float]], dense: list[tuple[str, float]], k: int
+    ) -> list[tuple[str, float]]:
+        """Combine one query's sparse and dense rankings."""
+        weights = [1.0 - self.dense_weight, self.dense_weight]
+        if self.fusion == "weighted":
+            return weighted_score_fusion([sparse, dense], weights)[:k]
+        return reciprocal_rank_fusion([sparse, dense], weights)[:k]
+
+    def search(
+        self, query: str, k: int = 10, where: dict[str, Any] | None = None
+    ) -> list[tuple[str, float]]:
+        """Rank chunks against a text query.
+
+        Args:
+            query: Free-text query
+            k: Maximum number of results
+            where: Metadata filter (see MetadataIndex), applied before scoring
+
+        Returns:
+            List of (chunk_id, score) tuples, best first (fused or rerank
+            scores)
+        """
+        return self.search_batch([query], k, where)[0]
+
+    def _sparse_filter(self, rows: np.ndarray) -> Callable[[str], bool]:
+        """Predicate accepting the chunk IDs of the given dense rows."""
+        missing = self.metadata.count if self.metadata else 0
+        if self._row_of is None:
+            # A layered dense side may list a chunk in a dead row and again
+            # later; the later, live row wins
+            self._row_of = {self.dense.chunk_id(row): row for row in range(missing)}
+        allowed = np.zeros(missing + 1, dtype=bool)
+        allowed[rows] = True
+        row_of = self._row_of
+        return lambda chunk_id: bool(allowed[row_of.get(chunk_id, missing)])
+
+    def search_batch(
+        self, queries: list[str], k: int = 10, where: dict[str, Any] | None = None
+    ) -> list[list[tuple[str, float]]]:
+        """Rank chunks against many text queries.
+
+        The dense side embeds all queries in one batch and scores them in one
+        pass over the vectors while BM25 handles the queries one by one.
+        With ``where``, the matching rows are looked up once and each side
+        scores only those, so k results are returned whenever k chunks match.
+
+        Args:
+            queries: Free-text queries
+            k: Maximum number of results per query
+            where: Metadata filter (see MetadataIndex), applied before scoring
+
+        Returns:
+            One list of (chunk_id, score) tuples per query, best first (fused
+            or rerank scores)
+
+        Raises:
+            ValueError: If filtering an index saved without metadata
+        """
+        if not queries or k <= 0:
+            return [[] for _ in queries]
+        if where and self.metadata is None:
+            raise ValueError("This index has no metadata; rebuild it to filter")
+        filters = json.dumps(where, sort_keys=True, default=str) if where else None
+        results: list[list[tuple[str, float]] | None] = [None] * len(queries)
+        keys: list[tuple] = []
+        if self.cache is not None:
+            # Fusion settings change results, so they are part of the identity
+            index_id = (
+                f"{self.index_id}|{self.fusion}|{self.dense_weight}|{self.candidates}"
+            )
+            if self.reranker is not None:
+                index_id += f"|rerank={self.reranker.identity}"
+            keys = [
+                RetrievalCache.key(index_id, self.generation, query, k, filters)
+                for query in queries
+            ]
+            results = [self.cache.get(key) for key in keys]
+        missing = [i for i, result in enumerate(results) if result is None]
+        if not missing:
+            return [result or [] for result in results]
+
+        rows = self.metadata.rows(where) if where and self.metadata else None
+        allowed = self._sparse_filter(rows) if rows is not None else None
+        todo = [queries[i] for i in missing]
+
+        def dense_side() -> tuple[np.ndarray, list[list[tuple[str, float]]], bool]:
+            vectors = self.embedder.embed_queries(todo)
+            dense = self.dense.search_batch(vectors, self.candidates, rows)
+            # A sharded dense side lists the shards that timed out; read it
+            # here, on the single dense thread, before another search runs
+            complete = not getattr(self.dense, "missed", None)
+            return vectors, dense, complete
+
+        dense_future = self._pool.submit(dense_side)
+        sparse = [self.sparse.search(query, self.candidates, allowed) for query in todo]
+        vectors, dense, complete = dense_future.result()
+        depth = k if self.reranker is None else max(k, self.reranker.candidates)
+        fused = [self._fuse(s, d, depth) for s, d in zip(sparse, dense)]
+        if self.reranker is not None:
+            fused = self.reranker.rerank(todo, fused, self.chunks.get, vectors)
+        for i, ranking in zip(missing, fused):
+            results[i] = ranking[:k]
+            if self.cache is not None and complete:  # Never cache partial results
+                self.cache.put(keys[i], results[i] or [])
+        return [result or [] for result in results]
+
+    def close(self) -> None:
+        """Stop the dense worker thread (and the dense side's own workers)."""
+        self._pool.shutdown(wait=False)
+        close = getattr(self.dense, "close", None)
+        if close is not None:
+            close()
@@ -0,0 +1,484 @@
+"""Sharded exact vector search served by worker processes.
+
+When one process can no longer hold or scan every vector, the matrix is split
+into contiguous row ranges (shards), each an ExactRetriever directory, and
+ShardedRetriever serves every shard from its own worker process:
+
+- **Scatter-gather**: a query batch is sent to all shards at once, each
+  worker scores its rows (outside the GIL, on its own core) and returns its
+  top k as global row numbers, and the per-shard results are merged into
+  the overall top k. Row filters (see MetadataIndex) are split by range so
+  each shard only scores its matching rows.
+- **Shared memory**: by default workers memory-map their shard files, so
+  the page cache holds one copy. With ``shared_memory=True`` the parent
+  loads every shard into a ``multiprocessing.shared_memory`` block once and
+  the workers attach to it, so nothing is read from disk while serving.
+- **Timeouts**: a batch waits at most ``timeout`` seconds. Shards that have
+  not answered by then are left out of the result (listed in ``missed``
+  and counted in ``timeouts``), and their late replies are discarded.
+  HybridRetriever does not cache such partial results. A worker that dies
+  during a query is left out the same way (listed in ``missed``) and is
+  restarted on the next query.
+
+ShardedRetriever implements the Retriever interface, so it can serve the
+dense side of a HybridRetriever (see open_sharded).
+
+Layout::
+
+    <index_dir>/
+    ├── meta.json          count, dim and the row range of each shard
+    └── shard-000/ ...     one ExactRetriever directory per shard
+"""
+
+import json
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+from multiprocessing.connection import Connection, wait
+from multiprocessing.shared_memory import SharedMemory
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+from src.config import RETRIEVER_BLOCK_ROWS, SHARD_TIMEOUT_SECONDS, VECTOR_DTYPE
+from src.rag.arrays import StringTable
+from src.rag.embeddings import EmbeddingService
+from src.rag.retriever import (
+    ExactRetriever,
+    HybridRetriever,
+    VectorDType,
+    build_vector_index,
+)
+
+SHARD_FORMAT_VERSION = 1
+
+
+def build_sharded_index(
+    index_dir: Path,
+    ids: list[str],
+    vectors: np.ndarray,
+    shards: int,
+    dtype: VectorDType = VECTOR_DTYPE,
+) -> None:
+    """Split vectors into equal contiguous shards, atomically replacing any old index.
+
+    Args:
+        index_dir: Destination directory
+        ids: Chunk ID of each vector row
+        vectors: (len(ids), dim) float array
+        shards: Number of shards (at most one per vector)
+        dtype: Storage type of the shard matrices
+    """
+    index_dir = Path(index_dir)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    shards = max(1, min(shards, len(ids)))
+    bounds = np.linspace(0, len(ids), shards + 1).astype(int).tolist()
+    build_dir = index_dir.with_name(f"{index_dir.name}.build-{os.getpid()}")
+    shutil.rmtree(build_dir, ignore_errors=True)
+    build_dir.mkdir(parents=True)
+    meta: dict[str, Any] = {
+        "version": SHARD_FORMAT_VERSION,
+        "count": len(ids),
+        "dim": vectors.shape[1],
+        "shards": [],
+    }
+    for shard, (start, end) in enumerate(zip(bounds, bounds[1:])):
+        name = f"shard-{shard:03d}"
+        build_vector_index(
+            build_dir / name, ids[start:end], vectors[start:end], dtype=dtype
+        )
+        meta["shards"].append({"name": name, "start": start, "count": end - start})
+    (build_dir / "meta.json").write_text(json.dumps(meta), encoding="utf-8")
+
+    old_dir = index_dir.with_name(f"{index_dir.name}.old-{os.getpid()}")
+    if index_dir.exists():
+        os.replace(index_dir, old_dir)
+    os.replace(build_dir, index_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+
+def shard_hybrid_index(index_dir: Path, shards: int) -> Path:
+    """Write a sharded copy of a HybridRetriever's exact vectors.
+
+    Args:
+        index_dir: Directory written by HybridRetriever.build (with dense/)
+        shards: Number of shards
+
+    Returns:
+        The sharded index directory (``index_dir / "shards"``)
+    """
+    dense = ExactRetriever(Path(index_dir) / "dense")
+    rows = np.arange(len(dense))
+    build_sharded_index(
+        Path(index_dir) / "shards",
+        [dense.chunk_id(row) for row in rows.tolist()],
+        dense.vectors(rows),
+        shards,
+        dtype=dense.dtype,
+    )
+    return Path(index_dir) / "shards"
+
+
+def _attach(spec: dict[str, Any]) -> tuple[SharedMemory, np.ndarray]:
+    """Map a shared memory block described by _share as an array."""
+    block = SharedMemory(name=spec["name"])
+    array = np.ndarray(tuple(spec["shape"]), np.dtype(spec["dtype"]), block.buf)
+    return block, array
+
+
+def _serve_shard(
+    conn: Connection,
+    shard_dir: str,
+    start: int,
+    shared: dict[str, dict[str, Any]] | None,
+    block_rows: int,
+) -> None:
+    """Worker process: answer (request, queries, k, rows) messages for one shard.
+
+    Replies are (request, global rows, scores) or (request, exception); a
+    None message or a closed pipe stops the worker.
+    """
+    retriever = ExactRetriever(Path(shard_dir), block_rows=block_rows)
+    blocks = []
+    if shared is not None:
+        arrays = retriever.to_arrays()
+        block, vectors = _attach(shared["vectors"])
+        blocks.append(block)
+        scales = None
+        if "scales" in shared:
+            block, scales = _attach(shared["scales"])
+            blocks.append(block)
+        retriever = ExactRetriever.from_arrays(
+            Path(shard_dir),
+            vectors,
+            scales,
+            StringTable(arrays["ids"], arrays["id_offsets"]),
+            block_rows=block_rows,
+        )
+    conn.send("ready")
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+        request, queries, k, rows = message
+        try:
+            found, scores = retriever.rank_batch(queries, k, rows)
+            conn.send((request, found + start, scores))
+        except Exception as error:  # Re-raised by the caller
+            conn.send((request, error))
+    del retriever
+    for block in blocks:
+        block.close()
+
+
+class ShardedRetriever:
+    """Exact search over shards served in parallel by worker processes."""
+
+    index_dir: Path
+    count: int
+    dim: int
+    timeout: float
+
+    def __init__(
+        self,
+        index_dir: Path,
+        timeout: float = SHARD_TIMEOUT_SECONDS,
+        shared_memory: bool = False,
+        block_rows: int = RETRIEVER_BLOCK_ROWS,
+        start_timeout: float = 60.0,
+    ) -> None:
+        """Start one worker per shard and wait until all are serving.
+
+        Args:
+            index_dir: Directory written by build_sharded_index
+            timeout: Seconds a search waits for the slowest shard
+            shared_memory: Serve the matrices from shared memory blocks
+                loaded once by this process instead of from the files
+            block_rows: Rows each worker scores per matrix multiply
+            start_timeout: Seconds to wait for the workers to start
+
+        Raises:
+            ValueError: If the index was written by an incompatible version
+            TimeoutError: If a worker does not start in time
+            RuntimeError: If a worker fails to start
+        """
+        self.index_dir = Path(index_dir)
+        meta = json.loads((self.index_dir / "meta.json").read_text(encoding="utf-8"))
+        if meta["version"] != SHARD_FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported sharded index version {meta['version']} "
+                f"(expected {SHARD_FORMAT_VERSION})"
+            )
+        self.count = meta["count"]
+        self.dim = meta["dim"]
+        self.timeout = timeout
+        self.block_rows = block_rows
+        self.start_timeout = start_timeout
+        self._shards = meta["shards"]
+        self._starts = np.array([s["start"] for s in self._shards] + [self.count])
+        # The parent only decodes chunk IDs; workers do the scoring
+        self._local = [ExactRetriever(self.index_dir / s["name"]) for s in self._shards]
+        self.timeouts = [0] * len(self._shards)
+        self.missed: list[int] = []
+        self._request = 0
+        self._lock = threading.Lock()
+        self._context = multiprocessing.get_context("spawn")
+        self._blocks: list[SharedMemory] = []
+        self._shared: list[dict[str, dict[str, Any]] | None] = [
+            self._share(shard) if shared_memory else None for shard in self._local
+        ]
+        self._workers: list[tuple[Any, Connection] | None] = [None] * len(self._shards)
+        conns = [self._start(shard) for shard in range(len(self._shards))]
+        for shard, conn in enumerate(conns):
+            self._ready(shard, conn)
+
+    def _share(self, shard: ExactRetriever) -> dict[str, dict[str, Any]]:
+        """Copy a shard's matrix (and scales) into shared memory blocks."""
+        specs = {}
+        for name, array in shard.to_arrays().items():
+            if name not in ("vectors", "scales"):
+                continue
+            block = SharedMemory(create=True, size=max(array.nbytes, 1))
+            np.ndarray(array.shape, array.dtype, block.buf)[...] = array
+            self._blocks.append(block)
+            specs[name] = {
+                "name": block.name,
+                "shape": list(array.shape),
+                "dtype": array.dtype.str,
+            }
+        return specs
+
+    def _start(self, shard: int) -> Connection:
+        """Start the worker process of a shard and return its pipe."""
+        parent, child = self._context.Pipe()
+        process = self._context.Process(
+            target=_serve_shard,
+            args=(
+                child,
+                str(self.index_dir / self._shards[shard]["name"]),
+                self._shards[shard]["start"],
+                self._shared[shard],
+                self.block_rows,
+            ),
+            daemon=True,
+        )
+        process.start()
+        child.close()
+        self._workers[shard] = (process, parent)
+        return parent
+
+    def _ready(self, shard: int, conn: Connection) -> None:
+        """Wait for a started worker's ready message."""
+        if not conn.poll(self.start_timeout):
+            raise TimeoutError(f"Shard {shard} worker did not start")
+        try:
+            conn.recv()
+        except EOFError:
+            raise RuntimeError(f"Shard {shard} worker exited while starting") from None
+
+    def _connection(self, shard: int) -> Connection:
+        """Return a shard's pipe, restarting its worker if it has died."""
+        worker = self._workers[shard]
+        if worker is not None and worker[0].is_alive():
+            return worker[1]
+        if worker is not None:
+            worker[1].close()
+        conn = self._start(shard)
+        self._ready(shard, conn)
+        return conn
+
+    def _discard(self, shard: int) -> None:
+        """Drop a shard's broken worker so the next query restarts it."""
+        worker = self._workers[shard]
+        if worker is None:
+            return
+        process, conn = worker
+        conn.close()
+        if process.is_alive():
+            process.kill()
+        process.join()
+        self._workers[shard] = None
+
+    def __len__(self) -> int:
+        """Number of stored vectors."""
+        return self.count
+
+    @property
+    def shards(self) -> int:
+        """Number of shards (and worker processes)."""
+        return len(self._shards)
+
+    def chunk_id(self, row: int) -> str:
+        """Return the chunk ID stored at a (global) row."""
+        shard = int(np.searchsorted(self._starts, row, side="right")) - 1
+        return self._local[shard].chunk_id(row - int(self._starts[shard]))
+
+    def rank_batch(
+        self, queries: np.ndarray, k: int, rows: np.ndarray | None = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Scatter queries to all shards and merge their top k.
+
+        Args:
+            queries: (n_queries, dim) float array
+            k: Results per query
+            rows: Only score these (sorted, global) rows
+
+        Returns:
+            Tuple of (rows, scores), both shaped (n_queries, <= k) and sorted
+            best first; shards that timed out or died contribute nothing
+
+        Raises:
+            Exception: Whatever a shard raised while scoring
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        if rows is not None:
+            rows = np.asarray(rows, dtype=np.int64)
+        k = min(k, self.count)
+        if k <= 0:
+            empty = np.empty((len(queries), 0))
+            return empty.astype(np.int64), empty.astype(np.float32)
+
+        with self._lock:
+            self._request += 1
+            request = self._request
+            pending: dict[Connection, int] = {}
+            failed: list[int] = []
+            for shard in range(len(self._shards)):
+                local = None
+                if rows is not None:
+                    lo, hi = np.searchsorted(rows, self._starts[shard : shard + 2])
+                    if lo == hi:
+                        continue  # No allowed row in this shard
+                    local = rows[lo:hi] - self._starts[shard]
+                conn = self._connection(shard)
+                try:
+                    conn.send((request, queries, k, local))
+                except (EOFError, OSError):  # Died since the liveness check
+                    self._discard(shard)
+                    failed.append(shard)
+                    continue
+                pending[conn] = shard
+
+            found: list[np.ndarray] = []
+            scores: list[np.ndarray] = []
+            deadline = time.monotonic() + self.timeout
+            while pending and (remaining := deadline - time.monotonic()) > 0:
+                ready = set(wait(list(pending), remaining))
+                for conn in [conn for conn in pending if conn in ready]:
+                    try:
+                        reply = conn.recv()
+                    except (EOFError, OSError):  # Died; restarted on next use
+                        shard = pending.pop(conn)
+                        self._discard(shard)
+                        failed.append(shard)
+                        continue
+                    if reply[0] != request:
+                        continue  # Late answer to a query that timed out
+                    pending.pop(conn)
+                    if len(reply) == 2:
+                        raise reply[1]
+                    found.append(reply[1])
+                    scores.append(reply[2])
+            for shard in pending.values():
+                self.timeouts[shard] += 1
+            self.missed = sorted([*pending.values(), *failed])
+
+        if not found:
+            empty = np.empty((len(queries), 0))
+            return empty.astype(np.int64), empty.astype(np.float32)
+        merged_rows = np.concatenate(found, axis=1)
+        merged_scores = np.concatenate(scores, axis=1)
+        if merged_scores.shape[1] > k:
+            keep = np.argpartition(merged_scores, -k, axis=1)[:, -k:]
+            merged_rows = np.take_along_axis(merged_rows, keep, axis=1)
+            merged_scores = np.take_along_axis(merged_scores, keep, axis=1)
+        order = np.argsort(-merged_scores, axis=1, kind="stable")
+        return (
+            np.take_along_axis(merged_rows, order, axis=1),
+            np.take_along_axis(merged_scores, order, axis=1),
+        )
+
+    def search_batch(
+        self, queries: np.ndarray, k: int, rows: np.ndarray | None = None
+    ) -> list[list[tuple[str, float]]]:
+        """Rank stored chunks against many queries across all shards.
+
+        Args:
+            queries: (n_queries, dim) float array
+            k: Results per query
+            rows: Only score these (sorted, global) rows
+
+        Returns:
+            One list of (chunk_id, score) tuples per query, best first
+        """
+        found, scores = self.rank_batch(queries, k, rows)
+        return [
+            [(self.chunk_id(int(r)), float(s)) for r, s in zip(row_ids, row_scores)]
+            for row_ids, row_scores in zip(found, scores)
+        ]
+
+    def search(
+        self, query: np.ndarray, k: int, rows: np.ndarray | None = None
+    ) -> list[tuple[str, float]]:
+        """Rank stored chunks against one query.
+
+        Args:
+            query: (dim,) float vector
+            k: Maximum number of results
+            rows: Only score these (sorted, global) rows
+
+        Returns:
+            List of (chunk_id, score) tuples, best first
+        """
+        return self.search_batch(np.asarray(query)[None, :], k, rows)[0]
+
+    def close(self) -> None:
+        """Stop the workers and free the shared memory blocks."""
+        for worker in self._workers:
+            if worker is None:
+                continue
+            process, conn = worker
+            try:
+                conn.send(None)
+            except OSError:
+                pass
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+            conn.close()
+        self._workers = [None] * len(self._shards)
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks.clear()
+
+
+def open_sharded(
+    index_dir: Path, embedder: EmbeddingService, **options: Any
+) -> HybridRetriever:
+    """Open a HybridRetriever whose dense side is served by shard workers.
+
+    Args:
+        index_dir: Directory written by HybridRetriever.build and sharded
+            with shard_hybrid_index
+        embedder: Embedding service (same model as at build time)
+        **options: ShardedRetriever options (timeout, shared_memory,
+            block_rows) and HybridRetriever options
+
+    Returns:
+        The opened retriever; close() also stops the workers
+    """
+    shard_options = {
+        name: options.pop(name)
+        for name in ("timeout", "shared_memory", "block_rows", "start_timeout")
+        if name in options
+    }
+    dense = ShardedRetriever(Path(index_dir) / "shards", **shard_options)
+    return HybridRetriever.open(index_dir, embedder, dense=dense, **options)
@@ -0,0 +1,444 @@
+"""Single-file snapshots of the hybrid index for fast cold starts.
+
+Opening an index directory parses chunks.json and sparse.json in full, which
+dominates the start-up of the CLI, batch jobs and servers. A snapshot stores
+everything a HybridRetriever needs in one array file (see src.rag.arrays):
+
+- the dense side (ExactRetriever matrix or IVFPQIndex arrays) and its IDs,
+- chunk texts, document chunk lists and the chunk -> location map,
+- BM25 postings as CSR arrays (sorted vocabulary, per-term document rows and
+  term frequencies, document lengths),
+- the MetadataIndex used by ``where`` filters.
+
+Nothing is parsed or copied when opening: only the JSON header is read and
+every array is memory-mapped, so ``open_snapshot`` takes the same time for
+any index size and pages are loaded as searches touch them (and shared
+between processes through the page cache). The chunk store and BM25 index
+come back as read-only views (FrozenChunkStore, FrozenBM25Index).
+
+The header carries a format name and version, and every array a CRC-32;
+``open_snapshot(verify=True)`` checks them all. Snapshots are written to a
+temporary file, fsynced and renamed into place, so readers never see a
+partially written one.
+
+Run ``just snapshot`` to snapshot the index published by the watcher.
+"""
+
+import argparse
+import math
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+import numpy as np
+
+from src.config import RAG_INDEX_DIR, RAG_SNAPSHOT_PATH
+from src.rag.arrays import (
+    StringTable,
+    encode_strings,
+    read_array_file,
+    write_array_file,
+)
+from src.rag.chunking import ChunkStore
+from src.rag.embeddings import EmbeddingService, get_embedding_service
+from src.rag.metadata import MetadataIndex
+from src.rag.retriever import (
+    ExactRetriever,
+    HybridRetriever,
+    IVFPQIndex,
+    Retriever,
+    get_retrieval_cache,
+)
+from src.rag.sparse import BM25Index, tokenize
+from src.rag.watcher import current_generation, merge_generation
+
+SNAPSHOT_FORMAT = "rag-snapshot"
+SNAPSHOT_FORMAT_VERSION = 1
+
+
+def _sorted_table(strings: list[str]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Encode strings plus the row order that sorts them (for lookups)."""
+    blob, offsets = encode_strings(strings)
+    order = np.array(sorted(range(len(strings)), key=strings.__getitem__))
+    return blob, offsets, order.astype(np.int64)
+
+
+def _csr(groups: list[list[int]]) -> tuple[np.ndarray, np.ndarray]:
+    """Flatten lists of ints into (offsets, values) arrays."""
+    offsets = np.zeros(len(groups) + 1, dtype=np.int64)
+    np.cumsum([len(group) for group in groups], out=offsets[1:])
+    values = np.fromiter((v for group in groups for v in group), dtype=np.int64)
+    return offsets, values
+
+
+class FrozenChunkStore:
+    """Read-only ChunkStore over memory-mapped snapshot arrays."""
+
+    def __init__(self, arrays: dict[str, np.ndarray]) -> None:
+        """Wrap the ``chunks.*`` arrays of a snapshot."""
+        self._ids = StringTable(arrays["ids"], arrays["id_offsets"], arrays["id_order"])
+        self._texts = StringTable(arrays["texts"], arrays["text_offsets"])
+        self._sources = StringTable(
+            arrays["sources"], arrays["source_offsets"], arrays["source_order"]
+        )
+        self._doc_offsets = arrays["doc_offsets"]
+        self._doc_chunks = arrays["doc_chunks"]
+        self._location_offsets = arrays["location_offsets"]
+        self._locations = arrays["locations"]
+
+    @staticmethod
+    def to_arrays(store: ChunkStore) -> dict[str, np.ndarray]:
+        """Encode a ChunkStore as the arrays FrozenChunkStore reads."""
+        data = store.to_dict()
+        ids = list(data["chunks"])
+        rows = {chunk_id: row for row, chunk_id in enumerate(ids)}
+        sources = list(data["docs"])
+        doc_offsets, doc_chunks = _csr(
+            [[rows[chunk_id] for chunk_id in data["docs"][s]] for s in sources]
+        )
+        # Every (document row, position) of each chunk, flattened per chunk
+        where: list[list[int]] = [[] for _ in ids]
+        for doc, source in enumerate(sources):
+            for position, chunk_id in enumerate(data["docs"][source]):
+                where[rows[chunk_id]].extend((doc, position))
+        location_offsets, locations = _csr(where)
+        id_blob, id_offsets, id_order = _sorted_table(ids)
+        source_blob, source_offsets, source_order = _sorted_table(sources)
+        texts, text_offsets = encode_strings(data["chunks"][i] for i in ids)
+        return {
+            "ids": id_blob,
+            "id_offsets": id_offsets,
+            "id_order": id_order,
+            "texts": texts,
+            "text_offsets": text_offsets,
+            "sources": source_blob,
+            "source_offsets": source_offsets,
+            "source_order": source_order,
+            "doc_offsets": doc_offsets,
+            "doc_chunks": doc_chunks,
+            "location_offsets": location_offsets,
+            "locations": locations,
+        }
+
+    def __len__(self) -> int:
+        """Number of distinct chunks stored."""
+        return len(self._ids)
+
+    def __contains__(self, chunk_id: object) -> bool:
+        """Whether a chunk with this ID is stored."""
+        return isinstance(chunk_id, str) and self._ids.find(chunk_id) is not None
+
+    @property
+    def dedup_ratio(self) -> float:
+        """Fraction of chunk references served by an already stored chunk."""
+        total = len(self._doc_chunks)
+        return 1 - len(self) / total if total else 0.0
+
+    def get(self, chunk_id: str) -> str | None:
+        """Return the text of a stored chunk, or None if it is unknown."""
+        row = self._ids.find(chunk_id)
+        return None if row is None else self._texts[row]
+
+    def chunk_ids(self, source: str) -> list[str]:
+        """Return the chunk IDs of a document in order (empty if unknown)."""
+        doc = self._sources.find(source)
+        if doc is None:
+            return []
+        start, end = self._doc_offsets[doc], self._doc_offsets[doc + 1]
+        return [self._ids[int(row)] for row in self._doc_chunks[start:end]]
+
+    def sources(self) -> list[str]:
+        """Return the identifiers of all ingested documents."""
+        return list(self._sources)
+
+    def locations(self, chunk_id: str) -> list[tuple[str, int]]:
+        """Return every (source, position) where a chunk occurs."""
+        row = self._ids.find(chunk_id)
+        if row is None:
+            return []
+        start, end = self._location_offsets[row], self._location_offsets[row + 1]
+        pairs = self._locations[start:end].reshape(-1, 2).tolist()
+        return [(self._sources[doc], position) for doc, position in pairs]
+
+
+class FrozenBM25Index:
+    """Read-only BM25 over CSR postings, scored with NumPy.
+
+    Ranks exactly like BM25Index (ties may be ordered differently).
+    """
+
+    k1: float
+    b: float
+
+    def __init__(self, header: dict[str, Any], arrays: dict[str, np.ndarray]) -> None:
+        """Wrap the ``sparse.*`` arrays and header of a snapshot."""
+        self.k1 = header["k1"]
+        self.b = header["b"]
+        self._total_length = header["total_length"]
+        offsets = arrays["term_offsets"]
+        self._terms = StringTable(
+            arrays["terms"], offsets, order=range(len(offsets) - 1)
+        )
+        self._ids = StringTable(arrays["ids"], arrays["id_offsets"], arrays["id_order"])
+        self._posting_offsets = arrays["posting_offsets"]
+        self._posting_docs = arrays["posting_docs"]
+        self._posting_tfs = arrays["posting_tfs"]
+        self._doc_lengths = arrays["doc_lengths"]
+
+    @staticmethod
+    def to_arrays(index: BM25Index) -> tuple[dict[str, Any], dict[str, np.ndarray]]:
+        """Encode a BM25Index as the header and arrays FrozenBM25Index reads."""
+        data = index.to_dict()
+        ids = list(data["docs"])
+        postings: dict[str, list[tuple[int, int]]] = {}
+        for doc, counts in enumerate(data["docs"].values()):
+            for term, tf in counts.items():
+                postings.setdefault(term, []).append((doc, tf))
+        terms = sorted(postings)
+        posting_offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum([len(postings[term]) for term in terms], out=posting_offsets[1:])
+        pairs = np.array(
+            [pair for term in terms for pair in postings[term]], dtype=np.int32
+        ).reshape(-1, 2)
+        lengths = [sum(counts.values()) for counts in data["docs"].values()]
+        term_blob, term_offsets = encode_strings(terms)
+        id_blob, id_offsets, id_order = _sorted_table(ids)
+        header = {"k1": data["k1"], "b": data["b"], "total_length": sum(lengths)}
+        arrays = {
+            "terms": term_blob,
+            "term_offsets": term_offsets,
+            "ids": id_blob,
+            "id_offsets": id_offsets,
+            "id_order": id_order,
+            "posting_offsets": posting_offsets,
+            "posting_docs": np.ascontiguousarray(pairs[:, 0]),
+            "posting_tfs": np.ascontiguousarray(pairs[:, 1]),
+            "doc_lengths": np.array(lengths, dtype=np.int32),
+        }
+        return header, arrays
+
+    def __len__(self) -> int:
+        """Number of indexed documents."""
+        return len(self._doc_lengths)
+
+    def __contains__(self, doc_id: object) -> bool:
+        """Whether a document is indexed."""
+        return isinstance(doc_id, str) and self._ids.find(doc_id) is not None
+
+    def search(
+        self, query: str, k: int = 10, allowed: Callable[[str], bool] | None = None
+    ) -> list[tuple[str, float]]:
+        """Rank documents against a query (see BM25Index.search).
+
+        Args:
+            query: Free-text query
+            k: Maximum number of results
+            allowed: Only score documents for which this returns True
+
+        Returns:
+            List of (doc_id, score) tuples, best first
+        """
+        n_docs = len(self._doc_lengths)
+        if n_docs == 0 or k <= 0:
+            return []
+        avg_length = self._total_length / n_docs
+        docs: list[np.ndarray] = []
+        contributions: list[np.ndarray] = []
+        for term in set(tokenize(query)):
+            t = self._terms.find(term)
+            if t is None:
+                continue
+            start, end = self._posting_offsets[t], self._posting_offsets[t + 1]
+            rows = np.asarray(self._posting_docs[start:end])
+            tf = np.asarray(self._posting_tfs[start:end], dtype=np.float64)
+            df = end - start
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (
+                1 - self.b + self.b * self._doc_lengths[rows] / avg_length
+            )
+            docs.append(rows)
+            contributions.append(idf * tf * (self.k1 + 1) / (tf + norm))
+        if not docs:
+            return []
+        rows, inverse = np.unique(np.concatenate(docs), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(contributions))
+        if allowed is not None:
+            keep = np.fromiter(
+                (allowed(self._ids[int(row)]) for row in rows),
+                dtype=bool,
+                count=len(rows),
+            )
+            rows, scores = rows[keep], scores[keep]
+        if len(rows) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            rows, scores = rows[top], scores[top]
+        order = np.argsort(-scores, kind="stable")
+        return [(self._ids[int(rows[i])], float(scores[i])) for i in order]
+
+
+def save_snapshot(
+    path: Path, retriever: HybridRetriever, generation: int | None = None
+) -> None:
+    """Write a HybridRetriever to one snapshot file, atomically.
+
+    Args:
+        path: Destination file (replaced by a rename)
+        retriever: An index opened from a directory (with a mutable
+            ChunkStore and BM25Index)
+        generation: Version recorded in the snapshot (default: the
+            retriever's generation)
+
+    Raises:
+        TypeError: If the retriever was itself opened from a snapshot
+    """
+    if not isinstance(retriever.sparse, BM25Index) or not isinstance(
+        retriever.chunks, ChunkStore
+    ):
+        raise TypeError("Snapshots are written from an index directory")
+    dense: Retriever = retriever.dense
+    sparse_header, sparse_arrays = FrozenBM25Index.to_arrays(retriever.sparse)
+    header: dict[str, Any] = {
+        "format": SNAPSHOT_FORMAT,
+        "version": SNAPSHOT_FORMAT_VERSION,
+        "generation": (retriever.generation if generation is None else generation),
+        "created": time.time(),
+        "sparse": sparse_header,
+    }
+    arrays = {
+        f"chunks.{name}": array
+        for name, array in FrozenChunkStore.to_arrays(retriever.chunks).items()
+    }
+    arrays.update({f"sparse.{name}": array for name, array in sparse_arrays.items()})
+    if isinstance(dense, IVFPQIndex):
+        ann_header, ann_arrays = dense.to_arrays()
+        header["ann"] = ann_header
+        arrays.update({f"ann.{name}": array for name, array in ann_arrays.items()})
+    elif isinstance(dense, ExactRetriever):
+        arrays.update({f"dense.{n}": array for n, array in dense.to_arrays().items()})
+    else:
+        raise TypeError(f"Cannot snapshot a {type(dense).__name__} dense index")
+    if retriever.metadata is not None:
+        meta_header, meta_arrays = retriever.metadata.to_arrays()
+        header["metadata"] = meta_header
+        arrays.update({f"meta.{name}": array for name, array in meta_arrays.items()})
+    write_array_file(Path(path), header, arrays)
+
+
+def open_snapshot(
+    path: Path,
+    embedder: EmbeddingService | None = None,
+    verify: bool = False,
+    **options: Any,
+) -> HybridRetriever:
+    """Open a snapshot written by save_snapshot without loading its arrays.
+
+    Args:
+        path: Snapshot file
+        embedder: Embedding service (same model as at build time; default:
+            the shared one)
+        verify: Check every array's checksum first (reads the whole file)
+        **options: Passed on to HybridRetriever() (results are cached in the
+            shared RetrievalCache unless ``cache`` is given)
+
+    Returns:
+        A retriever over read-only, memory-mapped indexes
+
+    Raises:
+        ValueError: If the file is not a snapshot of this version, is
+            truncated, or fails verification
+    """
+    path = Path(path)
+    header, arrays = read_array_file(path, verify=verify)
+    if header.get("format") != SNAPSHOT_FORMAT:
+        raise ValueError(f"{path} is not a RAG index snapshot")
+    if header["version"] != SNAPSHOT_FORMAT_VERSION:
+        raise ValueError(
+            f"Unsupported snapshot version {header['version']} "
+            f"(expected {SNAPSHOT_FORMAT_VERSION})"
+        )
+
+    def section(prefix: str) -> dict[str, np.ndarray]:
+        return {
+            name.removeprefix(prefix): array
+            for name, array in arrays.items()
+            if name.startswith(prefix)
+        }
+
+    dense: Retriever
+    if "ann" in header:
+        dense = IVFPQIndex.from_arrays(header["ann"], section("ann."))
+    else:
+        exact = section("dense.")
+        dense = ExactRetriever.from_arrays(
+            path,
+            exact["vectors"],
+            exact.get("scales"),
+            StringTable(exact["ids"], exact["id_offsets"]),
+        )
+    if "metadata" in header:
+        options.setdefault(
+            "metadata", MetadataIndex.from_arrays(header["metadata"], section("meta."))
+        )
+    options.setdefault("cache", get_retrieval_cache())
+    options.setdefault("index_id", str(path.resolve()))
+    options.setdefault("generation", header["generation"])
+    return HybridRetriever(
+        FrozenBM25Index(header["sparse"], section("sparse.")),
+        dense,
+        embedder or get_embedding_service(),
+        FrozenChunkStore(section("chunks.")),
+        **options,
+    )
+
+
+def main() -> None:
+    """Snapshot an index directory, or check and time opening a snapshot."""
+    parser = argparse.ArgumentParser(description="Write or check RAG index snapshots")
+    parser.add_argument(
+        "index_dir",
+        nargs="?",
+        type=Path,
+        help="index directory (default: the watcher's current generation)",
+    )
+    parser.add_argument("--output", type=Path, default=RAG_SNAPSHOT_PATH)
+    parser.add_argument(
+        "--check", action="store_true", help="verify --output and time opening it"
+    )
+    args = parser.parse_args()
+
+    if args.check:
+        start = time.perf_counter()
+        retriever = open_snapshot(args.output, verify=True)
+        verified = time.perf_counter() - start
+        start = time.perf_counter()
+        open_snapshot(args.output).close()
+        opened = time.perf_counter() - start
+        print(
+            f"{args.output}: {len(retriever.chunks)} chunks, checksums OK "
+            f"({verified:.2f}s); open takes {opened * 1000:.1f} ms"
+        )
+        retriever.close()
+        return
+
+    index_dir = args.index_dir
+    if index_dir is None:
+        generation_dir = current_generation(RAG_INDEX_DIR)
+        if generation_dir is None:
+            parser.error(
+                f"No index directory given and none published in {RAG_INDEX_DIR}"
+            )
+        index_dir = merge_generation(generation_dir)  # Deltas folded into a base
+    embedder = get_embedding_service()
+    retriever = HybridRetriever.open(index_dir, embedder)
+    start = time.perf_counter()
+    save_snapshot(args.output, retriever)
+    retriever.close()
+    size = args.output.stat().st_size
+    print(
+        f"Wrote {args.output} ({size / 2**20:.1f} MiB) from {index_dir} "
+        f"in {time.perf_counter() - start:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
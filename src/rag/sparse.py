@@ -0,0 +1,172 @@
+"""Sparse (keyword) retrieval with an inverted index and BM25 scoring.
+
+BM25 ranks documents by how often the query terms appear in them, discounted
+by how common each term is across the corpus and normalized by document
+length. It complements vector search: exact identifiers, error codes and
+names are matched literally instead of by meaning.
+
+The index supports incremental ``add``/``remove`` so callers can keep it in
+sync with a changing corpus without rebuilding it.
+"""
+
+import heapq
+import math
+import re
+from typing import Any, Callable
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> list[str]:
+    """Split text into lowercase word tokens.
+
+    Args:
+        text: Text to tokenize
+
+    Returns:
+        List of tokens (letters, digits and underscores)
+
+    Example:
+        >>> tokenize("ERR_CONN_RESET in Python 3.12")
+        ['err_conn_reset', 'in', 'python', '3', '12']
+    """
+    return _TOKEN_RE.findall(text.lower())
+
+
+class BM25Index:
+    """In-memory inverted index with BM25 ranking and incremental updates."""
+
+    k1: float
+    b: float
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75) -> None:
+        """Initialize an empty index.
+
+        Args:
+            k1: Term-frequency saturation (higher = repeated terms count more)
+            b: Length normalization strength (0 = none, 1 = full)
+        """
+        self.k1 = k1
+        self.b = b
+        # term -> {doc_id: term frequency}
+        self._postings: dict[str, dict[str, int]] = {}
+        # doc_id -> {term: term frequency}, needed to remove a document
+        self._doc_terms: dict[str, dict[str, int]] = {}
+        self._doc_lengths: dict[str, int] = {}
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        """Number of indexed documents."""
+        return len(self._doc_lengths)
+
+    def __contains__(self, doc_id: object) -> bool:
+        """Whether a document is indexed."""
+        return doc_id in self._doc_lengths
+
+    def add(self, doc_id: str, text: str) -> None:
+        """Index a document, replacing any previous version with the same ID.
+
+        Args:
+            doc_id: Unique document identifier
+            text: Document text
+        """
+        self.add_tokens(doc_id, tokenize(text))
+
+    def add_tokens(self, doc_id: str, tokens: list[str]) -> None:
+        """Index pre-tokenized text, replacing any previous version.
+
+        Args:
+            doc_id: Unique document identifier
+            tokens: Document tokens (see tokenize)
+        """
+        self.remove(doc_id)
+        counts: dict[str, int] = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+        for term, tf in counts.items():
+            self._postings.setdefault(term, {})[doc_id] = tf
+        self._doc_terms[doc_id] = counts
+        self._doc_lengths[doc_id] = len(tokens)
+        self._total_length += len(tokens)
+
+    def remove(self, doc_id: str) -> bool:
+        """Remove a document from the index.
+
+        Args:
+            doc_id: Document identifier
+
+        Returns:
+            True if the document was indexed, False otherwise
+        """
+        counts = self._doc_terms.pop(doc_id, None)
+        if counts is None:
+            return False
+        for term in counts:
+            posting = self._postings[term]
+            del posting[doc_id]
+            if not posting:
+                del self._postings[term]
+        self._total_length -= self._doc_lengths.pop(doc_id)
+        return True
+
+    def search(
+        self, query: str, k: int = 10, allowed: Callable[[str], bool] | None = None
+    ) -> list[tuple[str, float]]:
+        """Rank documents against a query.
+
+        Args:
+            query: Free-text query
+            k: Maximum number of results
+            allowed: Only score documents for which this returns True
+
+        Returns:
+            List of (doc_id, score) tuples, best first
+        """
+        n_docs = len(self._doc_lengths)
+        if n_docs == 0 or k <= 0:
+            return []
+        avg_length = self._total_length / n_docs
+        scores: dict[str, float] = {}
+        for term in set(tokenize(query)):
+            posting = self._postings.get(term)
+            if not posting:
+                continue
+            df = len(posting)
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            for doc_id, tf in posting.items():
+                if allowed is not None and not allowed(doc_id):
+                    continue
+                norm = self.k1 * (
+                    1 - self.b + self.b * self._doc_lengths[doc_id] / avg_length
+                )
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (
+                    tf + norm
+                )
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def to_dict(self) -> dict[str, Any]:
+        """Serialize the index to a JSON-compatible dict.
+
+        Only per-document term counts are stored; postings are rebuilt on load.
+        """
+        return {"k1": self.k1, "b": self.b, "docs": self._doc_terms}
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "BM25Index":
+        """Rebuild an index serialized with to_dict.
+
+        Args:
+            data: Dict produced by to_dict
+
+        Returns:
+            Restored BM25Index
+        """
+        index = cls(k1=data["k1"], b=data["b"])
+        for doc_id, counts in data["docs"].items():
+            for term, tf in counts.items():
+                index._postings.setdefault(term, {})[doc_id] = tf
+            index._doc_terms[doc_id] = counts
+            length = sum(counts.values())
+            index._doc_lengths[doc_id] = length
+            index._total_length += length
+        return index
@@ -0,0 +1,934 @@
+"""Incremental indexing of notes/ and data/ into the hybrid RAG index.
+
+Rebuilding the index from scratch on every change re-reads and re-chunks the
+whole corpus. The watcher instead keeps a **manifest** of every indexed file
+(path, mtime, size and content hash) and, on each pass:
+
+1. **Stat scan**: walks the watched roots and compares each file's mtime and
+   size with the manifest. Only files whose stat changed are read and hashed;
+   a changed hash (or a new path) marks the document as modified, a path
+   missing from the scan marks it as deleted.
+2. **Update**: changed documents are re-chunked with content-defined chunking
+   and re-ingested into a ChunkStore, so only chunks whose text is new get
+   embedded and added to BM25; chunks no document uses any more are removed.
+3. **Publish**: the changes are written as a new *delta* generation on top
+   of the previous one: the new chunk lists of the changed documents, one
+   appended vector row per chunk they touched and a tombstone for each row
+   those chunks had, so a pass costs O(changes) rather than O(corpus). The
+   ``CURRENT`` pointer is then replaced atomically. Readers (LiveIndex) keep
+   using the generation they opened until they see the new pointer, so the
+   index is readable at all times and never seen half-written.
+4. **Merge**: readers replay every delta on top of the base, so once
+   ``merge_deltas`` have piled up a background thread folds them into a new
+   full base; later deltas are published on top of it.
+
+Notes saved through a NoteStore sit in its write-ahead log until compaction
+writes their .md files. The watcher reads the log (without opening the
+store) and indexes those notes under the path their file will have, so they
+are searchable as soon as they are saved.
+
+On Linux the watcher also listens for inotify events, which only wake the
+scan early; the periodic stat scan remains the source of truth, so events
+lost to queue overflows or unsupported filesystems are harmless.
+
+Index layout::
+
+    .cache/rag-index/
+    ├── CURRENT            name of the latest complete generation
+    ├── gen-000040/        a base: HybridRetriever directory plus manifest.json
+    ├── gen-000041/        a delta on top of gen-000040
+    │   ├── manifest.json  generation number and chain (base first, then deltas)
+    │   ├── delta.json     changed documents and files, appended and dead rows
+    │   ├── vectors.npy    float32 vectors of the appended rows
+    │   └── metadata/      MetadataIndex over the appended rows
+    ├── gen-000042/        a delta on top of gen-000041
+    └── base-000042/       gen-000042 merged into a base for later deltas
+
+Run ``just watch-index`` to keep the index up to date in the background.
+"""
+
+import argparse
+import ctypes
+import ctypes.util
+import hashlib
+import json
+import os
+import select
+import shutil
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable
+
+import numpy as np
+
+from src.config import (
+    CORPUS_DIR,
+    NOTES_DIR,
+    RAG_INDEX_DIR,
+    RAG_KEEP_GENERATIONS,
+    RAG_MERGE_DELTAS,
+    WATCH_INTERVAL_SECONDS,
+)
+from src.notes.store import Note, read_wal_notes
+from src.rag.chunking import Chunk, ChunkStore, chunk_text
+from src.rag.corpus import extract_text, iter_corpus_files
+from src.rag.embeddings import EmbeddingService, get_embedding_service
+from src.rag.ingest import document_source
+from src.rag.layered import LayeredMetadata, LayeredRetriever
+from src.rag.metadata import MetadataIndex
+from src.rag.retriever import (
+    ExactRetriever,
+    HybridRetriever,
+    Retriever,
+    chunk_metadata,
+    get_retrieval_cache,
+    save_hybrid_index,
+)
+from src.rag.sparse import BM25Index
+
+MANIFEST_FORMAT_VERSION = 2
+_GENERATION_PREFIX = "gen-"
+_BASE_PREFIX = "base-"
+
+
+@dataclass
+class ManifestEntry:
+    """What the watcher last indexed for one file.
+
+    Attributes:
+        mtime_ns: Modification time in nanoseconds
+        size: Size in bytes
+        digest: BLAKE2b hash of the file contents
+    """
+
+    mtime_ns: int
+    size: int
+    digest: str
+
+
+@dataclass
+class SyncReport:
+    """Outcome of one watcher pass.
+
+    Attributes:
+        added: Sources indexed for the first time
+        modified: Sources whose contents changed
+        deleted: Sources removed from the index
+        embedded: Chunks that had to be embedded
+        removed_chunks: Chunks dropped because no document uses them any more
+        generation: Generation published by this pass (None if nothing changed)
+        seconds: Wall time of the pass
+    """
+
+    added: list[str] = field(default_factory=list)
+    modified: list[str] = field(default_factory=list)
+    deleted: list[str] = field(default_factory=list)
+    embedded: int = 0
+    removed_chunks: int = 0
+    generation: int | None = None
+    seconds: float = 0.0
+
+    @property
+    def changed(self) -> bool:
+        """Whether any document was added, modified or deleted."""
+        return bool(self.added or self.modified or self.deleted)
+
+
+def file_digest(path: Path) -> str:
+    """Hash a file's contents without reading it into memory at once."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def current_generation(index_root: Path) -> Path | None:
+    """Return the directory of the latest published generation, if any."""
+    try:
+        name = (Path(index_root) / "CURRENT").read_text(encoding="utf-8").strip()
+    except FileNotFoundError:
+        return None
+    return Path(index_root) / name if name else None
+
+
+def _read_manifest(generation_dir: Path) -> dict[str, Any]:
+    """Read a generation's manifest.json.
+
+    Raises:
+        FileNotFoundError: If the generation is gone
+        ValueError: If it was written in another manifest format
+    """
+    manifest = json.loads(
+        (generation_dir / "manifest.json").read_text(encoding="utf-8")
+    )
+    if manifest.get("version") != MANIFEST_FORMAT_VERSION:
+        raise ValueError(f"Unsupported index manifest in {generation_dir}")
+    return manifest
+
+
+def _write_manifest(
+    directory: Path,
+    generation: int,
+    chain: list[str],
+    files: dict[str, ManifestEntry] | None = None,
+) -> None:
+    """Write manifest.json; only bases list every indexed file."""
+    manifest: dict[str, Any] = {
+        "version": MANIFEST_FORMAT_VERSION,
+        "generation": generation,
+        "chain": chain,
+    }
+    if files is not None:
+        manifest["files"] = {
+            source: entry.__dict__ for source, entry in sorted(files.items())
+        }
+    (directory / "manifest.json").write_text(json.dumps(manifest), encoding="utf-8")
+
+
+def _doc_metadata(files: dict[str, ManifestEntry]) -> dict[str, dict[str, Any]]:
+    """Filterable fields of each indexed file."""
+    return {source: {"mtime": entry.mtime_ns / 1e9} for source, entry in files.items()}
+
+
+@dataclass
+class _Generation:
+    """A published generation read back from disk, deltas applied.
+
+    Attributes:
+        generation: Generation number
+        chain: Directory names: the base, then the deltas on top of it
+        files: Manifest of the indexed files
+        chunks: Chunk texts and document order
+        sparse: BM25 index over the chunks
+    """
+
+    generation: int
+    chain: list[Path]
+    files: dict[str, ManifestEntry]
+    chunks: ChunkStore
+    sparse: BM25Index
+
+    @classmethod
+    def read(cls, generation_dir: Path) -> "_Generation":
+        """Load a generation's base and replay its deltas.
+
+        Raises:
+            FileNotFoundError: If the generation or part of its chain is gone
+            ValueError: If it was written in another manifest format
+        """
+        generation_dir = Path(generation_dir)
+        manifest = _read_manifest(generation_dir)
+        chain = [generation_dir.parent / name for name in manifest["chain"]]
+        base = chain[0]
+        files = {
+            source: ManifestEntry(**entry)
+            for source, entry in _read_manifest(base)["files"].items()
+        }
+        chunks = ChunkStore.from_dict(
+            json.loads((base / "chunks.json").read_text(encoding="utf-8"))
+        )
+        sparse = BM25Index.from_dict(
+            json.loads((base / "sparse.json").read_text(encoding="utf-8"))
+        )
+        for delta_dir in chain[1:]:
+            delta = json.loads((delta_dir / "delta.json").read_text(encoding="utf-8"))
+            for source, texts in delta["documents"]:
+                if texts is None:
+                    freed = chunks.remove(source)
+                else:
+                    # Only the text matters to the store; offsets are not kept
+                    result = chunks.ingest(
+                        source,
+                        (
+                            Chunk(text, source, i, 0, 0, 0)
+                            for i, text in enumerate(texts)
+                        ),
+                    )
+                    for chunk in result.new:
+                        sparse.add(chunk.chunk_id, chunk.text)
+                    freed = result.removed
+                for chunk_id in freed:
+                    sparse.remove(chunk_id)
+            for source, entry in delta["files"].items():
+                if entry is None:
+                    files.pop(source, None)
+                else:
+                    files[source] = ManifestEntry(**entry)
+        return cls(manifest["generation"], chain, files, chunks, sparse)
+
+    def dense(self) -> tuple[Retriever, MetadataIndex | LayeredMetadata]:
+        """Open the vector rows and their metadata: the base's plus every delta's."""
+        base = ExactRetriever(self.chain[0] / "dense")
+        metadata = MetadataIndex.open(self.chain[0] / "metadata")
+        if len(self.chain) == 1:
+            return base, metadata
+        row_of = {base.chunk_id(row): row for row in range(len(base))}
+        count, dead = len(base), []
+        ids: list[str] = []
+        blocks, parts = [], [metadata]
+        for delta_dir in self.chain[1:]:
+            delta = json.loads((delta_dir / "delta.json").read_text(encoding="utf-8"))
+            dead.extend(row_of.pop(chunk_id) for chunk_id in delta["dead"])
+            for chunk_id in delta["ids"]:
+                row_of[chunk_id] = count
+                count += 1
+            ids.extend(delta["ids"])
+            blocks.append(np.load(delta_dir / "vectors.npy"))
+            parts.append(MetadataIndex.open(delta_dir / "metadata"))
+        alive = np.ones(count, dtype=bool)
+        alive[dead] = False
+        return (
+            LayeredRetriever(base, ids, np.concatenate(blocks), alive),
+            LayeredMetadata(parts, alive),
+        )
+
+
+def open_generation(
+    generation_dir: Path, embedder: EmbeddingService, **options: Any
+) -> HybridRetriever:
+    """Open a published generation: its base with every delta on top.
+
+    Args:
+        generation_dir: Generation directory (e.g. from current_generation)
+        embedder: Embedding service (same model as at build time)
+        **options: Passed on to HybridRetriever()
+
+    Returns:
+        The opened retriever
+
+    Raises:
+        FileNotFoundError: If the generation was pruned
+    """
+    generation = _Generation.read(generation_dir)
+    dense, metadata = generation.dense()
+    options.setdefault("cache", get_retrieval_cache())
+    # Generations are versions of one index
+    options.setdefault("index_id", str(Path(generation_dir).parent.resolve()))
+    options.setdefault("generation", generation.generation)
+    options.setdefault("metadata", metadata)
+    return HybridRetriever(
+        generation.sparse, dense, embedder, generation.chunks, **options
+    )
+
+
+def merge_generation(generation_dir: Path) -> Path:
+    """Write a published generation as one full base directory.
+
+    Args:
+        generation_dir: Generation directory
+
+    Returns:
+        generation_dir itself if it is a base, else the base-NNNNNN directory
+        written next to it (a HybridRetriever directory plus manifest.json)
+    """
+    generation_dir = Path(generation_dir)
+    generation = _Generation.read(generation_dir)
+    dense, _ = generation.dense()
+    if not isinstance(dense, LayeredRetriever):
+        return generation.chain[0]  # No deltas: already a base
+    ids, vectors = dense.live()
+    base_dir = generation_dir.with_name(f"{_BASE_PREFIX}{generation.generation:06d}")
+    save_hybrid_index(
+        base_dir,
+        generation.chunks,
+        generation.sparse,
+        ids,
+        vectors,
+        generation=generation.generation,
+        doc_metadata=_doc_metadata(generation.files),
+    )
+    _write_manifest(base_dir, generation.generation, [base_dir.name], generation.files)
+    return base_dir
+
+
+class _Inotify:
+    """Minimal ctypes binding to Linux inotify, used only to wake the scanner."""
+
+    _MASK = (
+        0x00000002  # IN_MODIFY
+        | 0x00000008  # IN_CLOSE_WRITE
+        | 0x00000040  # IN_MOVED_FROM
+        | 0x00000080  # IN_MOVED_TO
+        | 0x00000100  # IN_CREATE
+        | 0x00000200  # IN_DELETE
+    )
+
+    def __init__(self) -> None:
+        """Open an inotify instance; raises OSError where unsupported."""
+        libc_name = ctypes.util.find_library("c")
+        if libc_name is None:
+            raise OSError("libc not found")
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self._libc, "inotify_init1"):
+            raise OSError("inotify is not available")
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._watched: set[str] = set()
+
+    def watch_tree(self, root: Path) -> None:
+        """Watch root and its (non-hidden) subdirectories not watched yet."""
+        for dirpath, dirnames, _ in os.walk(root):
+            dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+            if dirpath in self._watched:
+                continue
+            wd = self._libc.inotify_add_watch(self.fd, os.fsencode(dirpath), self._MASK)
+            if wd >= 0:
+                self._watched.add(dirpath)
+
+    def wait(self, timeout: float) -> bool:
+        """Block up to timeout seconds; return whether any event arrived."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return False
+        try:
+            while os.read(self.fd, 64 * 1024):
+                pass  # Drain; the scan works out what changed
+        except BlockingIOError:
+            pass
+        return True
+
+    def close(self) -> None:
+        """Release the inotify file descriptor."""
+        os.close(self.fd)
+
+
+class IndexWatcher:
+    """Keeps a published hybrid index in sync with directories of documents.
+
+    The working state (chunks, BM25 postings, chunk vectors and the manifest)
+    lives in memory; each pass that changes something publishes its changes
+    as a delta generation, and every ``merge_deltas`` deltas are merged into
+    a new base on a background thread. On start-up the state is restored
+    from the latest generation, so only files changed while the watcher was
+    down are re-indexed.
+    """
+
+    roots: list[Path]
+    index_root: Path
+    embedder: EmbeddingService
+    manifest: dict[str, ManifestEntry]
+
+    def __init__(
+        self,
+        roots: list[Path] | None = None,
+        index_root: Path = RAG_INDEX_DIR,
+        embedder: EmbeddingService | None = None,
+        interval: float = WATCH_INTERVAL_SECONDS,
+        keep_generations: int = RAG_KEEP_GENERATIONS,
+        merge_deltas: int = RAG_MERGE_DELTAS,
+        use_inotify: bool = True,
+    ) -> None:
+        """Load the latest published generation (if any).
+
+        Args:
+            roots: Directories to index (default: notes/ and data/)
+            index_root: Directory holding the index generations
+            embedder: Embedding service (default: the shared one)
+            interval: Seconds between stat scans
+            keep_generations: Published generations kept on disk (at least 1),
+                plus the bases and deltas they are built on
+            merge_deltas: Deltas stacked on a base before they are merged
+            use_inotify: Wake up early on file system events where supported
+        """
+        self.roots = [Path(root) for root in (roots or [NOTES_DIR, CORPUS_DIR])]
+        self.index_root = Path(index_root)
+        self.embedder = embedder or get_embedding_service()
+        self.interval = interval
+        self.keep_generations = max(1, keep_generations)
+        self.merge_deltas = max(1, merge_deltas)
+        self.use_inotify = use_inotify
+        self.manifest = {}
+        self.generation = 0
+        self._chunks = ChunkStore()
+        self._sparse = BM25Index()
+        self._vectors: dict[str, np.ndarray] = {}
+        # The published generation's directories: its base, then its deltas
+        self._chain: list[str] = []
+        # Changes not published yet: chunk ID -> whether it has a row in the
+        # published generation, new chunk lists, and new manifest entries
+        self._touched: dict[str, bool] = {}
+        self._updates: list[tuple[str, list[str] | None]] = []
+        self._files: dict[str, ManifestEntry | None] = {}
+        # Notes only in a NoteStore's WAL, by source, from the last scan
+        self._wal_notes: dict[str, Note] = {}
+        self._wal_cache: dict[Path, tuple[list[tuple[str, int, int]], dict]] = {}
+        self._lock = threading.Lock()
+        self._merge_lock = threading.Lock()
+        self._merging: str | None = None  # Base being written by merge()
+        self._merger: threading.Thread | None = None
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._load()
+
+    def _load(self) -> None:
+        """Restore the working state from the latest generation."""
+        generation_dir = current_generation(self.index_root)
+        if generation_dir is None:
+            return
+        try:
+            generation = _Generation.read(generation_dir)
+        except FileNotFoundError:
+            return
+        except ValueError:
+            return  # Unknown format: re-index everything
+        self.generation = generation.generation
+        self.manifest = generation.files
+        self._chunks, self._sparse = generation.chunks, generation.sparse
+        self._chain = [path.name for path in generation.chain]
+        ids = [
+            cid
+            for source in self._chunks.sources()
+            for cid in self._chunks.chunk_ids(source)
+        ]
+        ids = list(dict.fromkeys(ids))
+        if ids:
+            # Served from the embedding cache, at full float32 precision
+            vectors = self.embedder.embed([self._chunks.get(cid) or "" for cid in ids])
+            self._vectors = dict(zip(ids, vectors))
+
+    def scan(self) -> tuple[dict[str, tuple[Path, int, int]], list[str]]:
+        """Stat every document under the roots, and read notes still in a WAL.
+
+        A root holding a NoteStore may have notes that are only in its
+        write-ahead log; they are found under the path their .md file will
+        have, with the mtime and size of that file.
+
+        Returns:
+            Tuple of (found, changed): every current source with its path,
+            mtime in nanoseconds and size, and the sources whose mtime or size
+            differ from the manifest (including new ones)
+        """
+        found: dict[str, tuple[Path, int, int]] = {}
+        self._wal_notes = {}
+        for root in self.roots:
+            if not root.is_dir():
+                continue
+            # Before the walk: compaction deletes a log only after writing
+            # its notes' files, so a note is always seen in one or the other
+            logged = self._read_wal(root)
+            for path in iter_corpus_files(root):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue  # Deleted during the scan
+                found[document_source(path, self.roots)] = (
+                    path,
+                    stat.st_mtime_ns,
+                    stat.st_size,
+                )
+            for note in logged.values():
+                path = root / f"{note.slug}.md"
+                source = document_source(path, self.roots)
+                size = len(note.markdown.encode("utf-8"))
+                found[source] = (path, round(note.mtime * 1e9), size)
+                self._wal_notes[source] = note
+        changed = []
+        for source, (_, mtime_ns, size) in found.items():
+            entry = self.manifest.get(source)
+            if entry is None or entry.mtime_ns != mtime_ns or entry.size != size:
+                changed.append(source)
+        return found, changed
+
+    def _read_wal(self, root: Path) -> dict[str, Note]:
+        """Notes logged under root but not compacted yet (re-read on change)."""
+        key = []
+        try:
+            entries = list(os.scandir(root / ".wal"))
+        except (FileNotFoundError, NotADirectoryError):
+            return {}
+        for entry in entries:
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue  # Sealed log compacted meanwhile
+            key.append((entry.name, stat.st_mtime_ns, stat.st_size))
+        key.sort()
+        cached = self._wal_cache.get(root)
+        if cached is None or cached[0] != key:
+            cached = self._wal_cache[root] = (key, read_wal_notes(root))
+        return cached[1]
+
+    def sync(self) -> SyncReport:
+        """Run one pass: detect changes, update the index and publish it.
+
+        Returns:
+            What changed; ``generation`` is None when nothing was published
+        """
+        start = time.perf_counter()
+        report = SyncReport()
+        with self._lock:
+            found, changed = self.scan()
+            for source in changed:
+                path, mtime_ns, size = found[source]
+                note = self._wal_notes.get(source)
+                try:
+                    if note is None:
+                        digest = file_digest(path)
+                        _, text = extract_text(path)
+                    else:
+                        text = note.markdown  # Exactly what its file will hold
+                        digest = hashlib.blake2b(
+                            text.encode("utf-8"), digest_size=16
+                        ).hexdigest()
+                except FileNotFoundError:
+                    found.pop(source)
+                    continue
+                entry = self.manifest.get(source)
+                self.manifest[source] = self._files[source] = ManifestEntry(
+                    mtime_ns, size, digest
+                )
+                old_ids = self._chunks.chunk_ids(source)
+                if entry is not None and entry.digest == digest:
+                    # Touched but not changed; its rows get the new mtime
+                    self._touch(old_ids)
+                    continue
+                (report.modified if entry else report.added).append(source)
+                chunks = list(chunk_text(text, source, content_defined=True))
+                self._touch([*old_ids, *(chunk.chunk_id for chunk in chunks)])
+                self._updates.append((source, [chunk.text for chunk in chunks]))
+                result = self._chunks.ingest(source, chunks)
+                self._drop(result.removed, report)
+                if result.new:
+                    vectors = self.embedder.embed([chunk.text for chunk in result.new])
+                    for chunk, vector in zip(result.new, vectors):
+                        self._sparse.add(chunk.chunk_id, chunk.text)
+                        self._vectors[chunk.chunk_id] = vector
+                    report.embedded += len(result.new)
+
+            for source in sorted(set(self.manifest) - set(found)):
+                del self.manifest[source]
+                self._files[source] = None
+                self._touch(self._chunks.chunk_ids(source))
+                self._updates.append((source, None))
+                self._drop(self._chunks.remove(source), report)
+                report.deleted.append(source)
+
+            if report.changed or current_generation(self.index_root) is None:
+                report.generation = self._publish()
+        report.seconds = time.perf_counter() - start
+        return report
+
+    def _touch(self, chunk_ids: list[str]) -> None:
+        """Mark chunks whose vector rows the next delta must rewrite.
+
+        Called before the change: whether a chunk is stored at its first
+        touch is whether it has a row in the published generation.
+        """
+        for chunk_id in chunk_ids:
+            if chunk_id not in self._touched:
+                self._touched[chunk_id] = chunk_id in self._chunks
+
+    def _drop(self, chunk_ids: list[str], report: SyncReport) -> None:
+        """Remove freed chunks from BM25 and the vector table."""
+        for chunk_id in chunk_ids:
+            self._sparse.remove(chunk_id)
+            self._vectors.pop(chunk_id, None)
+        report.removed_chunks += len(chunk_ids)
+
+    def _publish(self) -> int:
+        """Write the pending changes as a new generation and point CURRENT at it.
+
+        The first generation is a full base; later ones are deltas on top of
+        the previous generation, so a pass writes only the chunk lists of the
+        documents it changed and the vector rows of the chunks they touched.
+        Once merge_deltas deltas have piled up, a background merge starts.
+        """
+        self.generation += 1
+        name = f"{_GENERATION_PREFIX}{self.generation:06d}"
+        generation_dir = self.index_root / name
+        self.index_root.mkdir(parents=True, exist_ok=True)
+        if self._chain:
+            self._write_delta(generation_dir)
+            self._chain = [*self._chain, name]
+        else:
+            ids = list(self._vectors)
+            save_hybrid_index(
+                generation_dir,
+                self._chunks,
+                self._sparse,
+                ids,
+                self._stack(ids),
+                generation=self.generation,
+                doc_metadata=_doc_metadata(self.manifest),
+            )
+            _write_manifest(generation_dir, self.generation, [name], self.manifest)
+            self._chain = [name]
+        self._touched, self._updates, self._files = {}, [], {}
+
+        pointer = self.index_root / f"CURRENT.tmp-{os.getpid()}"
+        with open(pointer, "w", encoding="utf-8") as f:
+            f.write(name)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(pointer, self.index_root / "CURRENT")
+        self._prune()
+        if len(self._chain) > self.merge_deltas and not self._merge_lock.locked():
+            self._merger = threading.Thread(
+                target=self.merge, name="index-merge", daemon=True
+            )
+            self._merger.start()
+        return self.generation
+
+    def _stack(self, ids: list[str]) -> np.ndarray:
+        """The vectors of some chunks as one (len(ids), dim) float32 array."""
+        if not ids:
+            return np.empty((0, self.embedder.dim), dtype=np.float32)
+        return np.stack([self._vectors[chunk_id] for chunk_id in ids])
+
+    def _write_delta(self, generation_dir: Path) -> None:
+        """Write the pending changes as a delta on top of the published chain."""
+        ids = [chunk_id for chunk_id in self._touched if chunk_id in self._chunks]
+        sources = {
+            source for chunk_id in ids for source, _ in self._chunks.locations(chunk_id)
+        }
+        delta = {
+            "documents": self._updates,
+            "files": {
+                source: entry.__dict__ if entry is not None else None
+                for source, entry in self._files.items()
+            },
+            "ids": ids,
+            "dead": [chunk_id for chunk_id, had in self._touched.items() if had],
+        }
+        build_dir = generation_dir.with_name(
+            f"{generation_dir.name}.build-{os.getpid()}"
+        )
+        shutil.rmtree(build_dir, ignore_errors=True)
+        build_dir.mkdir(parents=True)
+        (build_dir / "delta.json").write_text(json.dumps(delta), encoding="utf-8")
+        np.save(build_dir / "vectors.npy", self._stack(ids))
+        doc_metadata = _doc_metadata(
+            {source: self.manifest[source] for source in sources}
+        )
+        MetadataIndex.build(chunk_metadata(self._chunks, ids, doc_metadata)).save(
+            build_dir / "metadata"
+        )
+        _write_manifest(build_dir, self.generation, [*self._chain, generation_dir.name])
+        shutil.rmtree(generation_dir, ignore_errors=True)  # Left by a crash
+        os.replace(build_dir, generation_dir)
+
+    def merge(self) -> int | None:
+        """Fold the published generation's deltas into a new base.
+
+        Runs on a background thread once merge_deltas deltas have piled up,
+        reading only published files, so syncs carry on meanwhile. Deltas
+        published in the meantime sit on top of the merged generation, so
+        they stay valid on top of the new base.
+
+        Returns:
+            The merged generation, or None if there was nothing to merge (or a
+            merge was already running)
+        """
+        if not self._merge_lock.acquire(blocking=False):
+            return None
+        try:
+            with self._lock:
+                chain = list(self._chain)
+                if len(chain) < 2:
+                    return None
+                generation = int(chain[-1][len(_GENERATION_PREFIX) :])
+                self._merging = f"{_BASE_PREFIX}{generation:06d}"  # Not pruned
+            base_dir = merge_generation(self.index_root / chain[-1])
+            with self._lock:
+                self._chain = [base_dir.name, *self._chain[len(chain) :]]
+            return generation
+        finally:
+            self._merging = None
+            self._merge_lock.release()
+
+    def _prune(self) -> None:
+        """Delete generations older than the last keep_generations.
+
+        Bases and deltas stay while a kept generation is built on them.
+        """
+
+        def published(prefix: str) -> list[Path]:
+            return sorted(
+                path
+                for path in self.index_root.glob(f"{prefix}*")
+                if path.is_dir() and path.name[len(prefix) :].isdigit()
+            )
+
+        generations = published(_GENERATION_PREFIX)
+        keep = {*self._chain, self._merging}
+        for path in generations[-self.keep_generations :]:
+            try:
+                keep.update(_read_manifest(path)["chain"])
+            except (FileNotFoundError, ValueError):
+                keep.add(path.name)
+        for path in [*generations, *published(_BASE_PREFIX)]:
+            if path.name not in keep:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def run(self, on_sync: Callable[[SyncReport], None] | None = None) -> None:
+        """Sync repeatedly until stop() is called.
+
+        Args:
+            on_sync: Called with the report of every pass that changed something
+        """
+        inotify = None
+        if self.use_inotify:
+            try:
+                inotify = _Inotify()
+            except OSError:
+                inotify = None  # Not Linux, or no inotify: poll only
+        try:
+            while not self._stop.is_set():
+                if inotify is not None:
+                    for root in self.roots:
+                        if root.is_dir():
+                            inotify.watch_tree(root)
+                report = self.sync()
+                if on_sync is not None and report.changed:
+                    on_sync(report)
+                if inotify is not None:
+                    if inotify.wait(self.interval):
+                        time.sleep(0.05)  # Let a burst of writes settle
+                else:
+                    self._stop.wait(self.interval)
+        finally:
+            if inotify is not None:
+                inotify.close()
+
+    def start(self) -> None:
+        """Run the watcher on a daemon thread."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self.run, name="index-watcher", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout: float | None = None) -> None:
+        """Ask the watcher thread to stop and wait for it (and any merge).
+
+        Args:
+            timeout: Maximum seconds to wait for each of the pass and a
+                running merge (None = until they finish)
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        if self._merger is not None:
+            self._merger.join(timeout)
+            self._merger = None
+
+
+class LiveIndex:
+    """Read side of the watched index: always serves a complete generation.
+
+    Each call checks the ``CURRENT`` pointer and, when a newer generation was
+    published, opens it and swaps it in. Searches already running keep the
+    retriever they started with (and its files, which stay readable until
+    the generation is pruned); the replaced retriever is closed once the last
+    of them finishes. Callers that hold on to ``retriever`` themselves must
+    not use it after a newer generation was swapped in.
+    """
+
+    def __init__(
+        self,
+        index_root: Path = RAG_INDEX_DIR,
+        embedder: EmbeddingService | None = None,
+        **options: Any,
+    ) -> None:
+        """Prepare to read generations published under index_root.
+
+        Args:
+            index_root: Directory holding the index generations
+            embedder: Embedding service (default: the shared one)
+            **options: Passed on to HybridRetriever()
+        """
+        self.index_root = Path(index_root)
+        self.embedder = embedder or get_embedding_service()
+        # One cache identity for all generations, so a new one evicts the old
+        options.setdefault("index_id", str(self.index_root.resolve()))
+        self.options = options
+        self._name: str | None = None
+        self._retriever: HybridRetriever | None = None
+        self._searches: dict[HybridRetriever, int] = {}  # Running, per retriever
+        self._lock = threading.Lock()
+
+    @property
+    def retriever(self) -> HybridRetriever | None:
+        """The retriever over the latest generation (None before the first)."""
+        self._refresh()
+        return self._retriever
+
+    def _refresh(self) -> None:
+        """Swap in the generation CURRENT points at, if it is a newer one."""
+        generation_dir = current_generation(self.index_root)
+        if generation_dir is None or generation_dir.name == self._name:
+            return
+        with self._lock:
+            if generation_dir.name == self._name:
+                return
+            try:
+                retriever = open_generation(
+                    generation_dir, self.embedder, **self.options
+                )
+            except FileNotFoundError:
+                return  # Pruned meanwhile; keep the old one
+            old, self._retriever = self._retriever, retriever
+            self._name = generation_dir.name
+            if old is not None and old not in self._searches:
+                old.close()
+
+    def search(self, query: str, k: int = 10) -> list[tuple[str, float]]:
+        """Rank chunks of the latest generation (see HybridRetriever.search)."""
+        self._refresh()
+        with self._lock:
+            # Taken under the lock, so a concurrent swap cannot close it first
+            retriever = self._retriever
+            if retriever is None:
+                return []
+            self._searches[retriever] = self._searches.get(retriever, 0) + 1
+        try:
+            return retriever.search(query, k)
+        finally:
+            with self._lock:
+                self._searches[retriever] -= 1
+                if not self._searches[retriever]:
+                    del self._searches[retriever]
+                    if retriever is not self._retriever:
+                        retriever.close()  # Swapped out while we searched
+
+    def close(self) -> None:
+        """Close the current retriever."""
+        with self._lock:
+            if self._retriever is not None:
+                self._retriever.close()
+            self._retriever, self._name = None, None
+
+
+def main() -> None:
+    """Keep the RAG index in sync with notes/ and data/ from the command line."""
+    parser = argparse.ArgumentParser(description="Incrementally index notes and data")
+    parser.add_argument("--once", action="store_true", help="sync once and exit")
+    args = parser.parse_args()
+
+    def show(report: SyncReport) -> None:
+        print(
+            f"Generation {report.generation}: {len(report.added)} added, "
+            f"{len(report.modified)} modified, {len(report.deleted)} deleted, "
+            f"{report.embedded} chunks embedded in {report.seconds:.2f}s"
+        )
+
+    watcher = IndexWatcher()
+    if args.once:
+        show(watcher.sync())
+        return
+    print(f"Watching {', '.join(map(str, watcher.roots))} -> {watcher.index_root}")
+    try:
+        watcher.run(on_sync=show)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,7 @@ from textual.app import App, ComposeResult
 from textual.containers import ScrollableContainer
 from textual.widgets import Footer, Header, Input
 
+from src.agents.answer_cache import SemanticAnswerCache
 from src.agents.async_agent import AsyncAgent
 from src.client import create_async_client
 from src.config import DEFAULT_MAX_ITERATIONS
@@ -29,7 +30,11 @@ class ResearchAssistantApp(App):
         super().__init__()
         # Create async OpenAI client and async agent
         client = create_async_client()
-        self.agent = AsyncAgent(client=client, max_iterations=DEFAULT_MAX_ITERATIONS)
+        self.agent = AsyncAgent(
+            client=client,
+            max_iterations=DEFAULT_MAX_ITERATIONS,
+            answer_cache=SemanticAnswerCache(),
+        )
 
     def compose(self) -> ComposeResult:
         """Create child widgets for the app."""
@@ -3,6 +3,8 @@
 from unittest.mock import Mock
 
 from src.agents.agent import Agent
+from src.agents.observations import ObservationPolicy
+from src.agents.tools import Tool
 
 
 def test_agent_initializes_with_client():
@@ -12,7 +14,7 @@ def test_agent_initializes_with_client():
 
     assert agent.client == mock_client
     assert agent.max_iterations == 3
-    assert len(agent.tools) == 2  # search_web and save_note
+    assert len(agent.tools) == 3  # search_web, save_note and search_notes
 
 
 def test_agent_builds_system_prompt_with_react_instructions():
@@ -71,7 +73,7 @@ def test_execute_tool_by_name():
     # Execute search_web tool
     result = agent._execute_tool("search_web", "python tutorials")
 
-    assert "MOCK SEARCH RESULTS" in result
+    assert "SEARCH RESULTS" in result
     assert "python tutorials" in result
 
 
@@ -123,7 +125,7 @@ def test_agent_runs_single_iteration():
 
     # Verify result contains observation from tool execution
     assert "Observation:" in result
-    assert "MOCK SEARCH RESULTS" in result
+    assert "SEARCH RESULTS" in result
     assert "python tutorials" in result
 
 
@@ -189,3 +191,35 @@ def test_agent_stops_when_final_answer_provided():
 
     # Only one observation (from first action)
     assert result.count("Observation:") == 1
+
+
+def test_run_compresses_large_observation_in_prompt_only():
+    """Large results are compressed for the LLM but kept whole in the transcript."""
+    mock_client = Mock()
+    action = Mock()
+    action.choices = [Mock(message=Mock(content="Action: big_tool: anything"))]
+    answer = Mock()
+    answer.choices = [Mock(message=Mock(content="Answer: done"))]
+    mock_client.chat.completions.create.side_effect = [action, answer]
+
+    agent = Agent(client=mock_client, max_iterations=3)
+    big_result = "HEAD" + "x" * 10_000 + "TAIL"
+    agent.tools.append(
+        Tool(
+            name="big_tool",
+            description="Returns a large result",
+            function=lambda _: big_result,
+            observation_policy=ObservationPolicy(mode="head_tail", max_chars=500),
+        )
+    )
+
+    transcript = agent.run("Use the big tool")
+
+    assert big_result in transcript
+    second_call_messages = mock_client.chat.completions.create.call_args.kwargs[
+        "messages"
+    ]
+    prompt_observation = second_call_messages[-1]["content"]
+    assert prompt_observation.startswith("Observation: HEAD")
+    assert prompt_observation.endswith("TAIL")
+    assert len(prompt_observation) < 600
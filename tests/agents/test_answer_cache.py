@@ -0,0 +1,200 @@
+"""Tests for the semantic answer cache and its use by AsyncAgent."""
+
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+
+from src.agents.answer_cache import SemanticAnswerCache
+from src.agents.async_agent import AsyncAgent
+from src.agents.tools import Tool
+from src.rag.embeddings import EmbeddingService, HashingBackend
+
+
+@pytest.fixture
+def version():
+    """Mutable corpus version the cache under test depends on."""
+    return {"value": 0}
+
+
+@pytest.fixture
+def cache(version):
+    return SemanticAnswerCache(
+        EmbeddingService(HashingBackend()),
+        similarity=0.8,
+        corpus_version=lambda: version["value"],
+    )
+
+
+def test_similar_queries_hit_and_different_ones_miss(cache):
+    """Rephrasings above the threshold reuse the answer, other queries do not."""
+    cache.store("How does Kafka partitioning work?", transcript="answer")
+
+    exact = cache.lookup("  how does KAFKA partitioning work? ")
+    similar = cache.lookup("How does Kafka partitioning work in practice?")
+    different = cache.lookup("How does Kafka replication work?")
+
+    assert exact.transcript == "answer" and exact.similarity == 1.0
+    assert similar.transcript == "answer" and 0.8 <= similar.similarity < 1.0
+    assert different is None
+    assert (cache.hits, cache.misses) == (2, 1)
+
+
+@pytest.mark.parametrize(
+    "stored, asked",
+    [
+        (
+            "What is the best way to parallelize a Python data processing "
+            "pipeline with many small tasks for CPU bound work?",
+            "What is the best way to parallelize a Python data processing "
+            "pipeline with many small tasks for IO bound work?",
+        ),
+        (
+            "Summarize the main findings of the survey on retrieval augmented "
+            "generation for question answering published in 2021",
+            "Summarize the main findings of the survey on retrieval augmented "
+            "generation for question answering published in 2023",
+        ),
+    ],
+)
+def test_default_cache_only_reuses_identical_queries(version, stored, asked):
+    """Word-overlap embeddings cannot tell these apart, so they must miss."""
+    embedder = EmbeddingService(HashingBackend())
+    assert embedder.embed_query(stored) @ embedder.embed_query(asked) > 0.92
+    cache = SemanticAnswerCache(embedder, corpus_version=lambda: version["value"])
+    cache.store(stored, transcript="answer")
+
+    assert cache.lookup(asked) is None
+    assert cache.lookup(stored.upper()).transcript == "answer"
+
+
+def test_entries_expire_after_ttl(cache):
+    """Entries older than the TTL are not returned."""
+    cache.store("What is Raft?", transcript="answer")
+    cache.ttl = 0.0
+
+    assert cache.lookup("What is Raft?") is None
+    assert len(cache) == 0
+
+
+def test_least_recently_used_entry_is_evicted(version):
+    """Beyond max_entries the entry used longest ago goes first."""
+    cache = SemanticAnswerCache(
+        EmbeddingService(HashingBackend()),
+        max_entries=2,
+        corpus_version=lambda: version["value"],
+    )
+    cache.store("first question", transcript="1")
+    cache.store("second question", transcript="2")
+    cache.lookup("first question")  # Now the most recently used
+
+    cache.store("third question", transcript="3")
+
+    assert cache.lookup("second question") is None
+    assert cache.lookup("first question").transcript == "1"
+    assert cache.lookup("third question").transcript == "3"
+
+
+def test_corpus_change_invalidates_everything(cache, version):
+    """A new corpus version clears answers computed from the old data."""
+    cache.store("What is Raft?", transcript="answer")
+    version["value"] += 1
+
+    assert cache.lookup("What is Raft?") is None
+
+
+def test_lookup_can_require_streamed_events(cache):
+    """An entry stored by run() does not satisfy a streaming lookup."""
+    cache.store("What is Raft?", transcript="answer")
+
+    assert cache.lookup("What is Raft?", require="events") is None
+    assert cache.lookup("What is Raft?", require="transcript") is not None
+
+
+def _answer_response(text: str) -> Mock:
+    response = Mock()
+    response.choices = [Mock()]
+    response.choices[0].message.content = text
+    return response
+
+
+@pytest.mark.asyncio
+async def test_agent_run_reuses_cached_answer(cache):
+    """A near-duplicate query is answered without calling the LLM again."""
+    client = AsyncMock()
+    client.chat.completions.create.return_value = _answer_response("Answer: 42")
+    agent = AsyncAgent(client=client, max_iterations=3, answer_cache=cache)
+
+    first = await agent.run("What is the answer to everything?")
+    second = await agent.run("what is the answer to everything")
+
+    assert first == second
+    assert client.chat.completions.create.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_agent_does_not_cache_runs_with_side_effects(cache):
+    """Runs that saved a note are not served from the cache."""
+    client = AsyncMock()
+    client.chat.completions.create.return_value = _answer_response(
+        "Thought: save it\nAction: save_note: title: Raft\nLeader election"
+    )
+    agent = AsyncAgent(client=client, max_iterations=1, answer_cache=cache)
+
+    await agent.run("Remember Raft")
+    await agent.run("Remember Raft")
+
+    assert client.chat.completions.create.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_agent_does_not_cache_unfinished_runs(cache):
+    """A run that hit max_iterations without an Answer: is not reused."""
+    client = AsyncMock()
+    client.chat.completions.create.return_value = _answer_response(
+        "Thought: look it up\nAction: search_web: raft"
+    )
+    agent = AsyncAgent(client=client, max_iterations=1, answer_cache=cache)
+
+    await agent.run("What is Raft?")
+    await agent.run("What is Raft?")
+
+    assert client.chat.completions.create.call_count == 2
+    assert len(cache) == 0
+
+
+@pytest.mark.asyncio
+async def test_agent_does_not_cache_runs_that_observed_errors(cache):
+    """A tool or sandbox error observed during the run is never replayed."""
+    client = AsyncMock()
+    client.chat.completions.create.side_effect = [
+        _answer_response("Thought: look it up\nAction: flaky: raft"),
+        _answer_response("Answer: unknown"),
+    ] * 2
+    agent = AsyncAgent(client=client, max_iterations=3, answer_cache=cache)
+    agent.tools.append(Tool("flaky", "Fails", lambda _: "Error: flaky timed out"))
+
+    await agent.run("What is Raft?")
+    await agent.run("What is Raft?")
+
+    assert client.chat.completions.create.call_count == 4
+    assert len(cache) == 0
+
+
+@pytest.mark.asyncio
+async def test_agent_restreams_cached_events(cache):
+    """A cached streaming answer is replayed with cached metadata."""
+    client = AsyncMock()
+
+    async def stream():
+        yield Mock(choices=[Mock(delta=Mock(content="Answer: "))])
+        yield Mock(choices=[Mock(delta=Mock(content="42"))])
+
+    client.chat.completions.create.side_effect = lambda **kwargs: stream()
+    agent = AsyncAgent(client=client, max_iterations=3, answer_cache=cache)
+
+    live = [event async for event in agent.run_streaming("The answer?")]
+    replayed = [event async for event in agent.run_streaming("the answer?")]
+
+    assert [e.content for e in replayed] == [e.content for e in live]
+    assert all(e.metadata["cached"] for e in replayed)
+    assert client.chat.completions.create.call_count == 1
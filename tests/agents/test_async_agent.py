@@ -44,7 +44,7 @@ async def test_async_agent_run_returns_conversation():
 
     # Verify result contains observation from tool execution
     assert "Observation:" in result
-    assert "MOCK SEARCH RESULTS" in result
+    assert "SEARCH RESULTS" in result
     assert "python tutorials" in result
 
 
@@ -114,7 +114,7 @@ async def test_async_agent_streaming_yields_observation_event():
     # Verify observation content
     obs_event = observation_events[0]
     assert "Observation:" in obs_event.content
-    assert "MOCK SEARCH RESULTS" in obs_event.content
+    assert "SEARCH RESULTS" in obs_event.content
 
 
 @pytest.mark.asyncio
@@ -47,7 +47,7 @@ def test_end_to_end_react_workflow():
     # Verify: Check the complete output contains all ReAct components
     assert "Thought: I need to search for Python programming." in result
     assert "Action: search_web: Python programming" in result
-    assert "Observation: MOCK SEARCH RESULTS for 'Python programming'" in result
+    assert "Observation: SEARCH RESULTS for 'Python programming'" in result
     assert "Thought: I have the information I need." in result
     assert "Answer: Python is a popular programming language." in result
 
@@ -99,11 +99,11 @@ def test_end_to_end_multi_action_workflow():
 
     # Verify: Both tools were used
     assert "Action: search_web: AI agents" in result
-    assert "Observation: MOCK SEARCH RESULTS for 'AI agents'" in result
+    assert "Observation: SEARCH RESULTS for 'AI agents'" in result
     assert "Action: save_note:" in result
-    # Note: save_note returns the full input in its message
+    # Note: a single-line input is used entirely as the note title
     assert (
-        "MOCK SAVE: Note 'AI Agents Summary | AI agents are autonomous systems.' saved successfully"  # noqa: E501
+        "Note 'AI Agents Summary | AI agents are autonomous systems.' saved to notes/"
         in result
     )
     assert (
@@ -0,0 +1,72 @@
+"""Tests for observation compression policies."""
+
+from src.agents.observations import ObservationPolicy, compress_observation
+
+
+def test_short_results_are_unchanged():
+    """Results within budget pass through every mode untouched."""
+    for mode in ("full", "head_tail", "digest", "summary"):
+        policy = ObservationPolicy(mode=mode, max_chars=100)
+        assert compress_observation("short result", policy, query="x") == (
+            "short result"
+        )
+
+
+def test_full_mode_never_truncates():
+    """The full policy sends large results unchanged."""
+    result = "x" * 1000
+
+    assert compress_observation(result, ObservationPolicy("full", 10), "") == result
+
+
+def test_head_tail_keeps_both_ends_within_budget():
+    """head_tail keeps the start and end and reports what was dropped."""
+    result = "START" + "m" * 1000 + "END"
+
+    compressed = compress_observation(result, ObservationPolicy("head_tail", 200), "")
+
+    assert compressed.startswith("START")
+    assert compressed.endswith("END")
+    assert "characters omitted" in compressed
+    assert len(compressed) <= 200
+    kept = len(compressed) - len(compressed.split("\n")[1]) - 2
+    assert f"[... {len(result) - kept} characters omitted ...]" in compressed
+
+
+def test_digest_collapses_duplicate_lines():
+    """Repeated lines are kept once with a repeat count."""
+    result = "\n".join(["WARN disk almost full"] * 50 + ["ERROR disk full"])
+
+    compressed = compress_observation(result, ObservationPolicy("digest", 100), "")
+
+    assert compressed == "WARN disk almost full [x50]\nERROR disk full"
+
+
+def test_summary_keeps_query_relevant_sentences_in_order():
+    """Extractive summaries favour sentences that mention the query."""
+    filler = " ".join(f"Unrelated sentence number {i}." for i in range(40))
+    result = f"Python asyncio runs coroutines. {filler} Asyncio uses an event loop."
+
+    compressed = compress_observation(
+        result, ObservationPolicy("summary", 120), query="asyncio event loop"
+    )
+
+    lines = compressed.splitlines()
+    assert lines[0] == "Python asyncio runs coroutines."
+    assert "Asyncio uses an event loop." in lines
+    assert "less relevant sentences omitted" in compressed
+    assert len(compressed) < len(result)
+
+
+def test_summary_falls_back_to_head_tail_for_long_sentences():
+    """A result whose sentences all exceed the budget is still shown in part."""
+    result = "Asyncio " + "word " * 300 + "end."
+
+    compressed = compress_observation(
+        result, ObservationPolicy("summary", 120), query="asyncio"
+    )
+
+    assert compressed.startswith("Asyncio word")
+    assert compressed.endswith("end.")
+    assert "characters omitted" in compressed
+    assert len(compressed) <= 120
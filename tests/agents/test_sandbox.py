@@ -0,0 +1,192 @@
+"""Tests for the process-pool tool sandbox."""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+from src.agents import sandbox as sandbox_module
+from src.agents.sandbox import (
+    ToolSandbox,
+    ToolSandboxError,
+    ToolTimeoutError,
+    run_tool,
+    run_tool_async,
+)
+from src.agents.tools import Tool
+
+# Tool functions must be module-level so they can be pickled into workers
+
+
+def echo_upper(text: str) -> str:
+    return text.upper()
+
+
+def report_pid(text: str) -> str:
+    return str(os.getpid())
+
+
+def sleep_forever(text: str) -> str:
+    time.sleep(60)
+    return "never"
+
+
+def repeat(text: str) -> str:
+    return text * 100
+
+
+def allocate(text: str) -> str:
+    block = bytearray(int(text) * 1024 * 1024)
+    return str(len(block))
+
+
+def raise_error(text: str) -> str:
+    raise RuntimeError(f"bad input {text}")
+
+
+def crash(text: str) -> str:
+    os._exit(3)
+
+
+def sleep_briefly(text: str) -> str:
+    time.sleep(float(text))
+    return "done"
+
+
+@pytest.fixture(scope="module")
+def sandbox():
+    """A small sandbox shared by the tests in this module."""
+    box = ToolSandbox(
+        workers=1,
+        timeout=10,
+        memory_limit_mb=512,
+        max_tasks_per_worker=100,
+        max_input_bytes=64,
+        max_output_bytes=64,
+    )
+    yield box
+    box.close()
+
+
+def test_runs_function_in_worker_process(sandbox):
+    """Isolated calls execute in a different process."""
+    assert sandbox.run(echo_upper, "hello") == "HELLO"
+    assert sandbox.run(report_pid, "") != str(os.getpid())
+
+
+def test_timeout_kills_and_replaces_worker(sandbox):
+    """A runaway call times out and the pool keeps serving."""
+    start = time.monotonic()
+    with pytest.raises(ToolTimeoutError):
+        sandbox.run(sleep_forever, "", timeout=0.5)
+
+    assert time.monotonic() - start < 5
+    assert sandbox.run(echo_upper, "still alive") == "STILL ALIVE"
+
+
+def test_timeout_covers_waiting_for_a_free_worker(sandbox):
+    """Time spent queued for the busy worker counts against the same timeout."""
+    busy = threading.Thread(target=sandbox.run, args=(sleep_briefly, "1.5"))
+    busy.start()
+    time.sleep(0.2)  # Let the first call take the only worker
+
+    start = time.monotonic()
+    with pytest.raises(ToolTimeoutError):
+        sandbox.run(sleep_forever, "", timeout=2.0)
+    busy.join()
+
+    # Queued ~1.3s, then only the remaining ~0.7s for the call itself
+    assert time.monotonic() - start < 2.8
+
+
+def test_tool_exception_is_reported(sandbox):
+    """Exceptions inside the tool become ToolSandboxError messages."""
+    with pytest.raises(ToolSandboxError, match="RuntimeError: bad input x"):
+        sandbox.run(raise_error, "x")
+
+
+def test_worker_crash_is_reported_and_replaced(sandbox):
+    """A worker that dies mid-call is replaced."""
+    with pytest.raises(ToolSandboxError, match="exit code 3"):
+        sandbox.run(crash, "")
+
+    assert sandbox.run(echo_upper, "ok") == "OK"
+
+
+def test_input_and_output_size_limits(sandbox):
+    """Oversized inputs and outputs are rejected."""
+    with pytest.raises(ToolSandboxError, match="input of 100 bytes"):
+        sandbox.run(echo_upper, "x" * 100)
+    with pytest.raises(ToolSandboxError, match="output of"):
+        sandbox.run(repeat, "x")
+
+
+@pytest.mark.skipif(sys.platform != "linux", reason="RLIMIT_AS enforced on Linux")
+def test_memory_limit_stops_allocation(sandbox):
+    """Allocating past the worker memory cap fails without hurting the agent."""
+    with pytest.raises(ToolSandboxError, match="MemoryError"):
+        sandbox.run(allocate, "2048")
+
+    assert sandbox.run(echo_upper, "ok") == "OK"
+
+
+def test_rejects_unpicklable_function(sandbox):
+    """Lambdas cannot be sent to workers."""
+    with pytest.raises(ToolSandboxError, match="module-level"):
+        sandbox.run(lambda text: text, "x")
+
+
+def test_workers_are_recycled_after_max_tasks():
+    """Workers are replaced after serving max_tasks_per_worker calls."""
+    box = ToolSandbox(workers=1, max_tasks_per_worker=2)
+    try:
+        first = box.run(report_pid, "")
+        assert box.run(report_pid, "") == first
+        assert box.run(report_pid, "") != first
+    finally:
+        box.close()
+
+
+def test_run_tool_returns_error_observation(sandbox, monkeypatch):
+    """Sandbox failures become an error string the agent can observe."""
+    monkeypatch.setattr(sandbox_module, "_default_sandbox", sandbox)
+    tool = Tool(
+        name="slow", description="", function=sleep_forever, isolated=True, timeout=0.5
+    )
+
+    result = run_tool(tool, "")
+
+    assert result.startswith("Error: slow failed in sandbox")
+    assert "timed out" in result
+
+
+def test_run_tool_keeps_plain_tools_in_process():
+    """Tools not marked isolated run directly."""
+    tool = Tool(name="plain", description="", function=lambda text: text * 2)
+
+    assert run_tool(tool, "ab") == "abab"
+
+
+async def test_isolated_tool_does_not_block_event_loop(sandbox, monkeypatch):
+    """Other coroutines keep running while an isolated tool is busy."""
+    monkeypatch.setattr(sandbox_module, "_default_sandbox", sandbox)
+    tool = Tool(
+        name="slow", description="", function=sleep_forever, isolated=True, timeout=1
+    )
+    ticks = 0
+
+    async def ticker() -> None:
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0.05)
+
+    ticker_task = asyncio.create_task(ticker())
+    result = await run_tool_async(tool, "")
+    ticker_task.cancel()
+
+    assert "timed out" in result
+    assert ticks >= 10
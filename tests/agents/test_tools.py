@@ -1,11 +1,16 @@
 """Tests for placeholder tool implementations."""
 
+import threading
+
+from src.agents import tools
 from src.agents.tools import (
     Tool,
     get_all_tools,
     get_save_note_tool,
+    get_search_notes_tool,
     get_search_web_tool,
 )
+from src.rag import corpus
 
 
 def test_placeholder():
@@ -21,32 +26,96 @@ def test_tool_has_name_and_description():
     assert callable(tool.function)
 
 
-def test_search_web_tool_returns_mock_results():
-    """search_web tool returns placeholder search results."""
+def test_search_web_tool_reports_empty_corpus():
+    """search_web tool says so when the local corpus has no matches."""
     tool = get_search_web_tool()
     result = tool.function("python tutorials")
 
-    assert "MOCK SEARCH RESULTS" in result
-    assert "python tutorials" in result
+    assert "SEARCH RESULTS for 'python tutorials'" in result
+    assert "No matching documents" in result
     assert tool.name == "search_web"
     assert "search" in tool.description.lower()
 
 
+def test_search_web_tool_returns_corpus_snippets(isolated_corpus):
+    """search_web tool ranks local documents and highlights matches."""
+    (isolated_corpus / "asyncio.md").write_text(
+        "# Asyncio Guide\n\nPython tutorials on event loops."
+    )
+    (isolated_corpus / "garden.txt").write_text("Tomatoes need sun.")
+
+    result = get_search_web_tool().function("python tutorials")
+
+    assert "1. Asyncio Guide (data/asyncio.md)" in result
+    assert "**Python** **tutorials**" in result
+    assert "garden" not in result
+
+
+def test_search_web_tool_builds_index_in_background(isolated_corpus, monkeypatch):
+    """The corpus is indexed off the tool call; searches answer meanwhile."""
+    (isolated_corpus / "asyncio.md").write_text("# Asyncio Guide\n\nEvent loops.")
+    release = threading.Event()
+    build = corpus.build_corpus_index
+
+    def slow_build(root, index_dir):
+        release.wait(10)
+        return build(root, index_dir, workers=1)
+
+    monkeypatch.setattr(corpus, "build_corpus_index", slow_build)
+    monkeypatch.setattr(tools, "CORPUS_INDEX_WAIT_SECONDS", 0.01)
+    tool = get_search_web_tool()
+
+    assert "still being indexed" in tool.function("event loops")
+    release.set()
+    monkeypatch.setattr(tools, "CORPUS_INDEX_WAIT_SECONDS", 10.0)
+    assert "1. Asyncio Guide (data/asyncio.md)" in tool.function("event loops")
+
+
 def test_save_note_tool_returns_confirmation():
     """save_note tool returns confirmation message."""
     tool = get_save_note_tool()
     result = tool.function("title: test\ncontent: hello")
 
-    assert "MOCK SAVE" in result
-    assert "test" in result
+    assert "Note 'test' saved to notes/test.md" in result
     assert tool.name == "save_note"
 
 
+def test_save_note_tool_persists_note(isolated_note_store):
+    """save_note tool writes the note body to the note store."""
+    tool = get_save_note_tool()
+    tool.function("title: Python Basics\nPython is a programming language")
+
+    note = isolated_note_store.get("Python Basics")
+    assert note is not None
+    assert note.slug == "python-basics"
+    assert note.content == "Python is a programming language"
+
+
+def test_search_notes_finds_saved_note():
+    """search_notes returns notes saved through save_note."""
+    get_save_note_tool().function("title: Asyncio\nEvent loops schedule coroutines")
+    get_save_note_tool().function("title: Gardening\nTomatoes need sun")
+
+    result = get_search_notes_tool().function("coroutines")
+
+    assert "Asyncio" in result
+    assert "notes/asyncio.md" in result
+    assert "Gardening" not in result
+
+
+def test_search_notes_reports_no_matches():
+    """search_notes says so when nothing matches."""
+    result = get_search_notes_tool().function("nonexistent")
+
+    assert "No notes found" in result
+
+
 def test_get_all_tools_returns_list():
     """get_all_tools returns list of available tools."""
     tools = get_all_tools()
 
-    assert len(tools) == 2
+    assert len(tools) == 3
     tool_names = [t.name for t in tools]
     assert "search_web" in tool_names
     assert "save_note" in tool_names
+    assert "search_notes" in tool_names
@@ -6,6 +6,9 @@ from datetime import datetime
 
 import pytest
 
+from src.notes import store as note_store
+from src.rag import corpus, embeddings, retriever
+
 # Configure logging for API call tracking
 logging.basicConfig(
     level=logging.INFO,
@@ -91,3 +94,45 @@ def api_call_logger():
             f.write(f"{timestamp}|{test_name}|{model}\n")
 
     return log_api_call
+
+
+@pytest.fixture(autouse=True)
+def isolated_note_store(tmp_path, monkeypatch):
+    """Redirect save_note to a temporary note store for every test.
+
+    Without this, tests exercising the save_note tool would write into the
+    repository's real notes/ directory.
+    """
+    store = note_store.NoteStore(tmp_path / "notes")
+    monkeypatch.setattr(note_store, "_default_store", store)
+    yield store
+    store.close()
+
+
+@pytest.fixture(autouse=True)
+def isolated_corpus(tmp_path, monkeypatch):
+    """Point search_web at an empty temporary corpus for every test.
+
+    Tests that need documents can write files into the returned directory;
+    the index is built in the background once search_web is set up.
+    """
+    corpus_dir = tmp_path / "data"
+    corpus_dir.mkdir()
+    monkeypatch.setattr(corpus, "CORPUS_DIR", corpus_dir)
+    monkeypatch.setattr(corpus, "CORPUS_INDEX_DIR", corpus_dir / ".index")
+    monkeypatch.setattr(corpus, "_default_index", None)
+    monkeypatch.setattr(corpus, "_default_build", None)
+    return corpus_dir
+
+
+@pytest.fixture(autouse=True)
+def isolated_embedding_cache(tmp_path, monkeypatch):
+    """Keep the shared embedding service's disk cache in a temporary directory."""
+    monkeypatch.setattr(embeddings, "EMBEDDING_CACHE_DIR", tmp_path / "embeddings")
+    monkeypatch.setattr(embeddings, "_default_service", None)
+
+
+@pytest.fixture(autouse=True)
+def isolated_retrieval_cache(monkeypatch):
+    """Give every test a fresh process-wide retrieval result cache."""
+    monkeypatch.setattr(retriever, "_default_cache", None)
@@ -0,0 +1,236 @@
+"""Tests for the filesystem MCP server."""
+
+import base64
+import os
+import time
+
+import pytest
+from fastmcp import Client
+from fastmcp.exceptions import ToolError
+
+from src.mcp_servers.filesystem_server import Filesystem, create_server
+
+
+@pytest.fixture
+def tree(tmp_path):
+    """An empty directory (tmp_path itself holds the isolated data/ and notes/)."""
+    root = tmp_path / "tree"
+    root.mkdir()
+    return root
+
+
+def _age(path, seconds: float = 60.0) -> None:
+    """Move a path's mtime into the past so its listing is cacheable."""
+    past = time.time() - seconds
+    os.utime(path, (past, past))
+
+
+def test_paths_outside_root_are_refused(tmp_path):
+    """Relative escapes and symlinks leaving the root are rejected."""
+    root = tmp_path / "root"
+    root.mkdir()
+    (tmp_path / "secret.txt").write_text("secret")
+    (root / "link.txt").symlink_to(tmp_path / "secret.txt")
+    fs = Filesystem(root)
+
+    for path in ("../secret.txt", "link.txt", "/etc/passwd"):
+        with pytest.raises(PermissionError):
+            fs.read_file(path)
+    assert fs.stat(".")["type"] == "directory"
+
+
+def test_read_file_returns_bounded_pieces_with_cursor(tree):
+    """Large ranges come back in pieces that split on UTF-8 boundaries."""
+    text = "héllo wörld " * 50
+    (tree / "a.txt").write_text(text, encoding="utf-8")
+    (tree / "b.bin").write_bytes(bytes(range(256)))
+    (tree / "empty").write_bytes(b"")
+    fs = Filesystem(tree, max_read_bytes=64)
+
+    pieces, offset = [], 0
+    while offset is not None:
+        piece = fs.read_file("a.txt", offset)
+        assert piece["length"] <= 64 and piece["encoding"] == "utf-8"
+        pieces.append(piece["content"])
+        offset = piece["next_offset"]
+    assert "".join(pieces) == text
+
+    ranged = fs.read_file("a.txt", offset=7, length=5)
+    assert ranged["content"] == "wörl" and ranged["next_offset"] is None
+    binary = fs.read_file("b.bin", 200, 20)
+    assert binary["encoding"] == "base64"
+    assert base64.b64decode(binary["content"]) == bytes(range(200, 220))
+    assert fs.read_file("empty")["content"] == ""
+    with pytest.raises(IsADirectoryError):
+        fs.read_file(".")
+
+
+def test_read_lines_seeks_through_line_index(tree):
+    """Line ranges are exact across checkpoints and continue past the byte cap."""
+    lines = [f"line {i}" for i in range(1, 1001)]
+    (tree / "log.txt").write_text("\n".join(lines))
+    fs = Filesystem(tree, max_read_bytes=100, line_index_every=7)
+
+    result = fs.read_lines("log.txt", 500, 502)
+    assert result["content"] == "line 500\nline 501\nline 502\n"
+    assert result["total_lines"] == 1000 and result["next_line"] is None
+
+    capped = fs.read_lines("log.txt", 995)
+    assert capped["content"].splitlines() == lines[994:]
+    assert capped["content"][-1] == "0"  # No trailing newline in the file
+    long = fs.read_lines("log.txt", 10)
+    assert long["next_line"] == long["end_line"] + 1
+    assert long["content"].splitlines() == lines[9 : long["end_line"]]
+    assert len(long["content"]) <= 100
+    assert fs.read_lines("log.txt", 2000)["content"] == ""
+
+    (tree / "log.txt").write_text("only\nthree\nlines\n")
+    assert fs.read_lines("log.txt", 3)["content"] == "lines\n"
+    (tree / "wide.txt").write_text("x" * 250 + "\nshort\n")
+    wide = fs.read_lines("wide.txt")
+    assert wide["truncated"] and len(wide["content"]) == 100
+    assert wide["next_line"] == 2
+
+
+def test_list_directory_pages_and_invalidates_on_mtime(tree):
+    """Listings are paged, served from cache, and refreshed after a change."""
+    for i in range(5):
+        (tree / f"f{i}.txt").write_text("x" * i)
+    (tree / "sub").mkdir()
+    _age(tree)
+    fs = Filesystem(tree)
+
+    first = fs.list_directory(".", limit=4)
+    assert [e["name"] for e in first["entries"]] == [
+        "f0.txt",
+        "f1.txt",
+        "f2.txt",
+        "f3.txt",
+    ]
+    assert first["total"] == 6 and first["next_offset"] == 4
+    rest = fs.list_directory(".", offset=4, limit=4)
+    assert [(e["name"], e["type"]) for e in rest["entries"]] == [
+        ("f4.txt", "file"),
+        ("sub", "directory"),
+    ]
+    assert rest["next_offset"] is None
+    assert (fs.listing_misses, fs.listing_hits) == (1, 1)
+
+    (tree / "f0.txt").write_text("resized")  # Same listing, fresh size
+    assert fs.list_directory(".", limit=1)["entries"][0]["size"] == 7
+    (tree / "new.txt").write_text("")
+    assert fs.list_directory(".")["total"] == 7
+    assert fs.listing_misses == 2
+
+
+def test_search_ranks_and_pages_matches(tree):
+    """Matches carry file, line and text; files rank by hits, name and depth."""
+    (tree / "pkg").mkdir()
+    (tree / "pkg" / "a.py").write_text("import os\n\ndef Foo():\n    foo()\n")
+    (tree / "notes.md").write_text("foo foo\nbar\n")
+    (tree / "foo.txt").write_text("nothing\nfoo\n")
+    fs = Filesystem(tree, search_workers=1)
+
+    found = fs.search("foo", ignore_case=True)
+    assert [(m["path"], m["line"]) for m in found["matches"]] == [
+        ("foo.txt", 2),  # Name match
+        ("pkg/a.py", 3),  # Two matching lines
+        ("pkg/a.py", 4),
+        ("notes.md", 1),
+    ]
+    assert found["matches"][2]["text"] == "    foo()"
+    assert found["total"] == 4 and found["next_offset"] is None
+    assert not found["truncated"] and found["files_searched"] == 3
+
+    pages, offset = [], 0
+    while offset is not None:
+        page = fs.search("foo", ignore_case=True, offset=offset, limit=3)
+        pages += page["matches"]
+        offset = page["next_offset"]
+    assert pages == found["matches"]
+    assert fs.search("foo", glob="*.py")["matches"][0]["line"] == 4
+    capped = fs.search("o", scan_limit=2)
+    assert capped["truncated"] and capped["total"] == 2
+    assert fs.search("^$", path="pkg/a.py")["matches"][0]["line"] == 2
+    with pytest.raises(ValueError):
+        fs.search("(")
+
+
+def test_search_skips_binary_ignored_and_linked_files(tree):
+    """Binary files, .gitignore'd paths, .git and symlinks are not searched."""
+    (tree / ".gitignore").write_text(
+        "# build output\nbuild/\n*.log\n!keep.log\n/top.txt\n"
+    )
+    for name in ("a.txt", "top.txt", "x.log", "keep.log"):
+        (tree / name).write_text("needle\n")
+    for directory in ("build", ".git", "sub"):
+        (tree / directory).mkdir()
+        (tree / directory / "b.txt").write_text("needle\n")
+    (tree / "sub" / "top.txt").write_text("needle\n")  # Anchored rule only at root
+    (tree / "sub" / ".gitignore").write_text("b.txt\n")
+    (tree / "blob.bin").write_bytes(b"needle\0\1\2")
+    (tree / "link.txt").symlink_to(tree / "a.txt")
+    fs = Filesystem(tree, search_workers=1)
+
+    found = fs.search("needle")
+    assert sorted(m["path"] for m in found["matches"]) == [
+        "a.txt",
+        "keep.log",
+        "sub/top.txt",
+    ]
+    assert found["files_skipped"] == 1  # blob.bin
+    assert [m["path"] for m in fs.search("needle", path="sub")["matches"]] == [
+        "sub/top.txt"
+    ]
+
+
+def test_search_in_worker_processes_stops_early(tree):
+    """The process pool finds the same matches and stops at the scan limit."""
+    for i in range(300):
+        (tree / f"f{i:03}.txt").write_text(f"line\nvalue {i}\n" * 3)
+    fs = Filesystem(tree, search_workers=2)
+    try:
+        inline = Filesystem(tree, search_workers=1).search(r"value 1\d\b", limit=100)
+        parallel = fs.search(r"value 1\d\b", limit=100)
+        assert parallel == inline and parallel["total"] == 30
+
+        early = fs.search("value", scan_limit=30)
+        assert early["truncated"] and early["total"] == 30
+        assert early["files_searched"] < 300
+    finally:
+        fs.close()
+
+
+def test_trigram_index_skips_files_without_the_literal(tree):
+    """Indexed files lacking the pattern's literal text are not read again."""
+    for i in range(10):
+        (tree / f"f{i}.txt").write_text(f"common text\nunique{i} Marker\n")
+    (tree / "data.bin").write_bytes(b"\0unique3")
+    fs = Filesystem(tree, search_workers=1, trigram_index=True)
+
+    first = fs.search("common")
+    assert first["total"] == 10 and first["files_searched"] == 11
+    second = fs.search(r"unique3\s+marker", ignore_case=True)
+    assert [m["path"] for m in second["matches"]] == ["f3.txt"]
+    assert second["files_searched"] == 1 and second["files_skipped"] == 10
+
+    (tree / "f5.txt").write_text("now unique3 marker too\n")
+    (tree / "f6.txt").unlink()
+    third = fs.search(r"unique3\s+marker", ignore_case=True)
+    assert [m["path"] for m in third["matches"]] == ["f3.txt", "f5.txt"]
+    assert third["files_searched"] == 2
+    assert fs.search("unique3|common")["files_skipped"] == 1  # Only data.bin
+
+
+async def test_server_exposes_tools(tree):
+    """The tools are callable over MCP and surface errors as tool errors."""
+    (tree / "a.txt").write_text("one\ntwo\n")
+    async with Client(create_server(Filesystem(tree))) as client:
+        names = {tool.name for tool in await client.list_tools()}
+        assert names == {"read_file", "read_lines", "list_directory", "stat", "search"}
+        result = await client.call_tool(
+            "read_lines", {"path": "a.txt", "start_line": 2}
+        )
+        assert result.data["content"] == "two\n"
+        with pytest.raises(ToolError):
+            await client.call_tool("read_file", {"path": "../outside"})
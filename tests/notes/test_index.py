@@ -0,0 +1,154 @@
+"""Tests for the incremental note search index."""
+
+import os
+import threading
+
+from src.notes.index import NoteIndex, get_note_index
+from src.notes.store import Note, NoteStore
+from src.rag.sparse import BM25Index
+
+
+def _note(slug: str, content: str, mtime: float = 1.0) -> Note:
+    return Note(slug=slug, title=slug, content=content, mtime=mtime)
+
+
+def test_update_indexes_new_note(tmp_path):
+    """New notes become searchable."""
+    index = NoteIndex(tmp_path / ".index")
+
+    assert index.update(_note("asyncio", "event loops and coroutines")) is True
+    assert index.search("coroutines", k=5)[0][0] == "asyncio"
+
+
+def test_update_skips_unchanged_mtime_and_hash(tmp_path):
+    """Unchanged notes are not re-indexed, even if only the mtime moved."""
+    index = NoteIndex(tmp_path / ".index")
+    index.update(_note("n", "same text", mtime=1.0))
+
+    assert index.update(_note("n", "same text", mtime=1.0)) is False
+    assert index.update(_note("n", "same text", mtime=2.0)) is False
+    assert index.update(_note("n", "edited text", mtime=3.0)) is True
+    assert index.search("edited", k=1)[0][0] == "n"
+    assert index.search("same", k=1) == []
+
+
+def test_sync_removes_deleted_notes(tmp_path):
+    """Notes missing from the store are dropped from the index."""
+    store = NoteStore(tmp_path)
+    store.save("Keep", "kept note")
+    store.save("Drop", "dropped note")
+    store.compact()
+    index = NoteIndex(tmp_path / ".index")
+    index.sync(store)
+
+    (tmp_path / "drop.md").unlink()
+
+    assert index.sync(store) == 1
+    assert [slug for slug, _ in index.search("note", k=5)] == ["keep"]
+    store.close()
+
+
+def test_index_persists_and_catches_up_incrementally(tmp_path):
+    """A reloaded index only re-indexes notes changed while it was offline."""
+    store = NoteStore(tmp_path)
+    store.save("One", "first note")
+    store.save("Two", "second note")
+    path = tmp_path / ".index"
+    index = NoteIndex(path)
+    index.sync(store)
+
+    store.save("Two", "second note rewritten")
+    reloaded = NoteIndex(path)
+
+    assert len(reloaded) == 2
+    assert reloaded.sync(store) == 1
+    assert reloaded.search("rewritten", k=1)[0][0] == "two"
+    store.close()
+
+
+def test_sync_reads_only_notes_whose_mtime_moved(tmp_path, monkeypatch):
+    """Catch-up stats every note file but only reads the changed ones."""
+    store = NoteStore(tmp_path)
+    for i in range(5):
+        store.save(f"Note {i}", f"body {i}")
+    store.compact()
+    path = tmp_path / ".index"
+    NoteIndex(path).sync(store)
+    (tmp_path / "note-3.md").write_text("# Note 3\n\nbody three rewritten")
+    os.utime(tmp_path / "note-3.md", (2e9, 2e9))
+
+    read = []
+    read_note_file = store._read_note_file
+    monkeypatch.setattr(
+        store, "_read_note_file", lambda p: read.append(p.name) or read_note_file(p)
+    )
+    reloaded = NoteIndex(path)
+
+    assert reloaded.sync(store) == 1
+    assert read == ["note-3.md"]
+    assert reloaded.search("rewritten", k=1)[0][0] == "note-3"
+    store.close()
+
+
+def test_flush_writes_segments_off_the_save_path(tmp_path, monkeypatch):
+    """A full buffer is written by a background thread, not by update()."""
+    index = NoteIndex(tmp_path / ".index", flush_every=2)
+    started, release = threading.Event(), threading.Event()
+    write_segment = index._write_segment
+
+    def slow_write(*args):
+        started.set()
+        release.wait(5)
+        return write_segment(*args)
+
+    monkeypatch.setattr(index, "_write_segment", slow_write)
+    index.update(_note("a", "alpha"))
+    index.update(_note("b", "beta"))
+    assert started.wait(5)
+
+    # Saves and searches proceed while the segment is being written
+    assert index.update(_note("a", "alpha rewritten", mtime=2.0)) is True
+    assert [slug for slug, _ in index.search("alpha", k=5)] == ["a"]
+    release.set()
+    index.close()
+
+    reloaded = NoteIndex(tmp_path / ".index")
+    assert len(reloaded) == 1
+    assert reloaded.search("beta", k=5)[0][0] == "b"
+
+
+def test_segments_merge_and_keep_exact_scores(tmp_path):
+    """Merged segments drop replaced notes and score like one in-memory index."""
+    index = NoteIndex(tmp_path / ".index", flush_every=1, max_segments=2)
+    expected = BM25Index()
+    texts = {
+        "a": "vector search with hnsw graphs",
+        "b": "bm25 ranks by term rarity",
+        "c": "hnsw graphs trade memory for recall",
+        "b2": "search quality and recall",
+    }
+    for i, (slug, text) in enumerate(texts.items()):
+        index.update(_note(slug, text, mtime=float(i)))
+        index.flush()
+        expected.add(slug, f"{slug}\n{text}")
+    index.update(_note("a", "rewritten note", mtime=9.0))
+    expected.add("a", "a\nrewritten note")
+    index.flush()
+
+    segments = sorted(p.name for p in (tmp_path / ".index").glob("seg-*"))
+    assert len(segments) <= 2
+    reloaded = NoteIndex(tmp_path / ".index")
+    for query in ["hnsw recall", "search", "rewritten bm25"]:
+        got = reloaded.search(query, k=5)
+        want = expected.search(query, k=5)
+        assert [slug for slug, _ in got] == [slug for slug, _ in want]
+        for (_, score), (_, want_score) in zip(got, want):
+            assert abs(score - want_score) < 1e-4
+
+
+def test_default_index_follows_store_saves(isolated_note_store):
+    """The shared index is updated as soon as a note is saved."""
+    index = get_note_index()
+    isolated_note_store.save("Live", "indexed on write")
+
+    assert index.search("indexed", k=1)[0][0] == "live"
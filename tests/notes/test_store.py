@@ -0,0 +1,194 @@
+"""Tests for the WAL-backed note store."""
+
+import threading
+
+import pytest
+
+from src.notes.store import (
+    Note,
+    NoteStore,
+    NoteStoreError,
+    _encode_record,
+    read_wal_notes,
+    slugify,
+)
+
+
+def test_slugify_normalizes_title():
+    """Titles become lowercase, dash-separated slugs."""
+    assert slugify("Python Basics: Part 1") == "python-basics-part-1"
+    assert slugify("") == "untitled"
+    assert slugify("!!!") == "untitled"
+
+
+def test_save_and_get_roundtrip(tmp_path):
+    """A saved note can be read back before compaction."""
+    store = NoteStore(tmp_path)
+    store.save("Python Basics", "Python is a language")
+
+    note = store.get("Python Basics")
+    assert note is not None
+    assert note.title == "Python Basics"
+    assert note.content == "Python is a language"
+    store.close()
+
+
+def test_save_overwrites_same_title(tmp_path):
+    """Saving the same title twice keeps only the latest content."""
+    store = NoteStore(tmp_path)
+    store.save("Topic", "first")
+    store.save("Topic", "second")
+
+    assert store.get("Topic").content == "second"
+    assert len(list(store.iter_notes())) == 1
+    store.close()
+
+
+def test_compact_writes_note_files_and_empties_wal(tmp_path):
+    """Compaction folds WAL records into one Markdown file per note."""
+    store = NoteStore(tmp_path)
+    store.save("Alpha", "a")
+    store.save("Beta", "b")
+
+    assert store.compact() == 2
+    assert (tmp_path / "alpha.md").read_text() == "# Alpha\n\na"
+    assert (tmp_path / "beta.md").exists()
+    assert (tmp_path / ".wal" / "active.log").stat().st_size == 0
+    assert store.get("Beta").content == "b"
+    store.close()
+
+
+def test_compact_keeps_notes_not_in_sealed_log(tmp_path):
+    """A note still queued for the next log stays readable after compaction."""
+    store = NoteStore(tmp_path)
+    store.save("Topic", "compacted")
+    queued = Note(slug="topic", title="Topic", content="queued", mtime=1.0)
+    with store._cond:
+        # Simulate a writer whose record was queued but not yet flushed
+        store._pending.append(_encode_record(queued))
+        store._wal_notes[queued.slug] = queued
+
+    assert store.compact() == 1
+    assert (tmp_path / "topic.md").read_text() == "# Topic\n\ncompacted"
+    assert store.get("Topic").content == "queued"
+    store.close()
+
+
+def test_compaction_triggers_at_threshold(tmp_path):
+    """Writes past the threshold compact automatically."""
+    store = NoteStore(tmp_path, compact_threshold=256)
+    for i in range(10):
+        store.save(f"Note {i}", "x" * 50)
+
+    assert len(list(tmp_path.glob("*.md"))) > 0
+    assert len(list(store.iter_notes())) == 10
+    store.close()
+
+
+def test_recovery_replays_uncompacted_writes(tmp_path):
+    """Notes still in the WAL survive a crash (no close/compaction)."""
+    store = NoteStore(tmp_path)
+    store.save("Survivor", "still here")
+    # Simulate a crash: drop the store without closing it
+
+    reopened = NoteStore(tmp_path)
+    assert reopened.get("Survivor").content == "still here"
+    reopened.close()
+
+
+def test_recovery_truncates_torn_record(tmp_path):
+    """A partially written final record is discarded on recovery."""
+    store = NoteStore(tmp_path)
+    store.save("Good", "intact")
+    wal = tmp_path / ".wal" / "active.log"
+    good_size = wal.stat().st_size
+    with open(wal, "ab") as f:
+        f.write(b"\x40\x00\x00\x00garbage")
+
+    reopened = NoteStore(tmp_path)
+    assert reopened.get("Good").content == "intact"
+    assert wal.stat().st_size == good_size
+    reopened.save("After", "appended cleanly")
+    reopened.close()
+
+    assert NoteStore(tmp_path).get("After").content == "appended cleanly"
+
+
+def test_recovery_finishes_interrupted_compaction(tmp_path):
+    """A sealed log left by a crash mid-compaction is folded on open."""
+    store = NoteStore(tmp_path)
+    store.save("Sealed", "from sealed log")
+    wal_dir = tmp_path / ".wal"
+    (wal_dir / "active.log").rename(wal_dir / "sealed-00000000000000000001.log")
+
+    reopened = NoteStore(tmp_path)
+    assert (tmp_path / "sealed.md").exists()
+    assert not list(wal_dir.glob("sealed-*.log"))
+    assert reopened.get("Sealed").content == "from sealed log"
+    reopened.close()
+
+
+def test_read_wal_notes_sees_uncompacted_notes_only(tmp_path):
+    """Other processes can read logged notes without opening the store."""
+    store = NoteStore(tmp_path)
+    store.save("Old", "compacted")
+    store.close()
+    wal_dir = tmp_path / ".wal"
+    (wal_dir / "sealed-00000000000000000001.log").write_bytes(
+        _encode_record(Note("draft", "Draft", "first", 1.0))
+    )
+    (wal_dir / "active.log").write_bytes(
+        _encode_record(Note("draft", "Draft", "second", 2.0))
+        + _encode_record(Note("newer", "Newer", "after the rotation", 3.0))
+    )
+
+    notes = read_wal_notes(tmp_path)
+
+    assert sorted(notes) == ["draft", "newer"]  # The active log wins
+    assert notes["draft"].markdown == "# Draft\n\nsecond"
+    assert read_wal_notes(tmp_path / "missing") == {}
+
+
+def test_concurrent_saves_are_all_durable(tmp_path):
+    """Many threads saving at once lose no notes."""
+    store = NoteStore(tmp_path, compact_threshold=4096)
+
+    def writer(worker: int) -> None:
+        for i in range(25):
+            store.save(f"worker {worker} note {i}", f"body {worker}-{i}")
+
+    threads = [threading.Thread(target=writer, args=(w,)) for w in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    store.close()
+
+    reopened = NoteStore(tmp_path)
+    assert len(list(reopened.iter_notes())) == 200
+    assert reopened.get("worker 7 note 24").content == "body 7-24"
+
+
+def test_listener_called_after_save(tmp_path):
+    """Listeners receive each note once it is durable."""
+    store = NoteStore(tmp_path)
+    seen = []
+    store.add_listener(seen.append)
+    store.save("Heard", "content")
+
+    assert [n.slug for n in seen] == ["heard"]
+    store.close()
+
+
+def test_failed_fsync_makes_store_unavailable(tmp_path, monkeypatch):
+    """After a failed fsync the store refuses further writes."""
+    store = NoteStore(tmp_path)
+
+    def broken_fsync(fd):
+        raise OSError("disk gone")
+
+    monkeypatch.setattr("src.notes.store.os.fsync", broken_fsync)
+    with pytest.raises(NoteStoreError):
+        store.save("Lost", "never durable")
+    with pytest.raises(NoteStoreError):
+        store.save("Also lost", "store is poisoned")
@@ -0,0 +1,101 @@
+"""Tests for the ChromaDB-backed retriever."""
+
+import numpy as np
+import pytest
+
+pytest.importorskip("chromadb")
+
+from src.rag.chroma_store import ChromaRetriever, get_chroma_client  # noqa: E402
+from src.rag.chunking import Chunk  # noqa: E402
+from src.rag.embeddings import EmbeddingService, HashingBackend  # noqa: E402
+from src.rag.retriever import (  # noqa: E402
+    ExactRetriever,
+    HybridRetriever,
+    build_vector_index,
+)
+
+
+def _unit_vectors(count: int, dim: int, seed: int = 0) -> np.ndarray:
+    vectors = np.random.default_rng(seed).standard_normal((count, dim))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def test_matches_exact_retriever(tmp_path):
+    """Batched Chroma search agrees with the exact NumPy store."""
+    vectors = _unit_vectors(300, 16)
+    ids = [f"chunk-{i}" for i in range(300)]
+    chroma = ChromaRetriever.build(tmp_path / "chroma", ids, vectors, batch_size=64)
+    exact = build_vector_index(tmp_path / "exact", ids, vectors)
+    queries = _unit_vectors(4, 16, seed=1)
+
+    results = chroma.search_batch(queries, k=5)
+
+    assert len(chroma) == 300
+    for found, expected in zip(results, exact.search_batch(queries, k=5)):
+        assert [chunk_id for chunk_id, _ in found] == [c for c, _ in expected]
+        assert found[0][1] == pytest.approx(expected[0][1], abs=1e-2)
+
+
+def test_metadata_filter_is_pushed_down(tmp_path):
+    """Only rows matching the where clause are returned, even for large k."""
+    vectors = _unit_vectors(50, 8)
+    ids = [f"chunk-{i}" for i in range(50)]
+    metadatas = [{"source": "notes" if i % 5 == 0 else "data"} for i in range(50)]
+    chroma = ChromaRetriever.build(tmp_path / "chroma", ids, vectors, metadatas)
+
+    found = chroma.search(vectors[3], k=20, where={"source": "notes"})
+
+    assert len(found) == 10
+    assert all(int(chunk_id.split("-")[1]) % 5 == 0 for chunk_id, _ in found)
+
+
+def test_upsert_delete_and_client_reuse(tmp_path):
+    """Upserts replace vectors, deletes remove them, and clients are shared."""
+    vectors = _unit_vectors(10, 8)
+    chroma = ChromaRetriever.build(tmp_path / "chroma", list("abcdefghij"), vectors)
+
+    chroma.upsert(["a"], vectors[9:10])
+    chroma.delete(["j", "missing"])
+
+    assert len(chroma) == 9
+    assert chroma.search(vectors[9], k=1)[0][0] == "a"
+    assert ChromaRetriever(tmp_path / "chroma").client is chroma.client
+    assert get_chroma_client(tmp_path / "chroma") is chroma.client
+
+
+def test_rows_persist_and_filter_hybrid_search(tmp_path):
+    """Row numbers survive reopening and serve filtered hybrid retrieval."""
+    texts = {
+        "a.md": ["Kafka partitions order messages.", "Consumers poll Kafka topics."],
+        "b.md": ["Kafka brokers replicate logs.", "Python asyncio event loops."],
+    }
+    chunks = [
+        Chunk(text=text, source=source, index=i, start=0, end=len(text), tokens=0)
+        for source, parts in texts.items()
+        for i, text in enumerate(parts)
+    ]
+    embedder = EmbeddingService(HashingBackend(dim=64))
+    HybridRetriever.build(tmp_path / "hybrid", chunks, embedder, cache=None).close()
+    exact = ExactRetriever(tmp_path / "hybrid" / "dense")
+    count = len(exact)
+    ids = [exact.chunk_id(row) for row in range(count)]
+    vectors = exact.vectors(np.arange(count))
+    ChromaRetriever.build(tmp_path / "chroma", ids, vectors)
+
+    chroma = ChromaRetriever(tmp_path / "chroma")
+    assert [chroma.chunk_id(row) for row in range(count)] == ids
+    assert [c for c, _ in chroma.search(vectors[2], k=4, rows=np.array([1, 2]))] == [
+        ids[2],
+        ids[1],
+    ]
+    hybrid = HybridRetriever.open(
+        tmp_path / "hybrid", embedder, dense=chroma, cache=None
+    )
+    found = hybrid.search("kafka", k=2, where={"source": "b.md"})
+    assert [hybrid.chunks.get(c) for c, _ in found][
+        0
+    ] == "Kafka brokers replicate logs."
+    assert {c for c, _ in found} <= set(hybrid.chunks.chunk_ids("b.md"))
+    chroma.delete([ids[2]])
+    assert chroma.search(vectors[2], k=4, rows=np.array([2])) == []
+    hybrid.close()
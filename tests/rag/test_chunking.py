@@ -0,0 +1,242 @@
+"""Tests for streaming, structure-aware chunking."""
+
+import json
+import random
+
+from src.rag.chunking import (
+    ChunkStore,
+    chunk_file,
+    chunk_text,
+    count_tokens,
+    iter_blocks,
+    iter_cdc_boundaries,
+)
+
+
+def test_count_tokens_counts_words_and_punctuation():
+    """Words and punctuation marks each count as one token."""
+    assert count_tokens("Hello, world!") == 4
+    assert count_tokens("") == 0
+
+
+def test_iter_blocks_recognizes_structure():
+    """Headings, paragraphs and code fences become separate blocks."""
+    text = b"# Title\n\nFirst line\nsecond line\n\n```\ncode\n\nmore code\n```\nTail\n"
+
+    blocks = list(iter_blocks(text, max_block_bytes=1000))
+
+    assert [b.kind for b in blocks] == ["heading", "paragraph", "code", "paragraph"]
+    assert blocks[1].text == "First line\nsecond line\n"
+    assert blocks[2].text == "```\ncode\n\nmore code\n```\n"
+
+
+def test_iter_blocks_caps_oversized_lines_on_utf8_boundaries():
+    """A single huge line is sliced without breaking multi-byte characters."""
+    text = ("é" * 1000).encode("utf-8")
+
+    blocks = list(iter_blocks(text, max_block_bytes=101))
+
+    assert all(b.end - b.start <= 101 for b in blocks)
+    assert "".join(b.text for b in blocks) == "é" * 1000
+
+
+def test_chunks_respect_target_size():
+    """Paragraphs are packed into chunks near the token target."""
+    text = "\n\n".join(f"Paragraph {i} has some words in it." for i in range(50))
+
+    chunks = list(chunk_text(text, target_tokens=40, overlap_tokens=0))
+
+    assert len(chunks) > 5
+    assert all(c.tokens <= 40 for c in chunks)
+    assert [c.index for c in chunks] == list(range(len(chunks)))
+
+
+def test_chunks_overlap_with_previous_chunk():
+    """Trailing blocks of one chunk start the next one."""
+    text = "\n\n".join(f"Sentence number {i}." for i in range(20))
+
+    chunks = list(chunk_text(text, target_tokens=20, overlap_tokens=5))
+
+    for previous, current in zip(chunks, chunks[1:]):
+        last_block = previous.text.split("\n\n")[-1]
+        assert current.text.startswith(last_block.strip())
+
+
+def test_heading_starts_new_chunk_and_is_recorded():
+    """A heading after a half-full chunk opens a new chunk with that heading."""
+    text = "# Intro\n\n" + "word " * 30 + "\n\n# Details\n\nMore text here.\n"
+
+    chunks = list(chunk_text(text, target_tokens=50, overlap_tokens=10))
+
+    assert [c.heading for c in chunks] == ["Intro", "Details"]
+    assert chunks[1].text.startswith("# Details")
+
+
+def test_code_fence_is_not_split_at_blank_lines():
+    """Blank lines inside a fence do not end the block."""
+    text = "Intro.\n\n```python\ndef f():\n\n    return 1\n```\n"
+
+    chunks = list(chunk_text(text, target_tokens=100))
+
+    assert len(chunks) == 1
+    assert "def f():\n\n    return 1" in chunks[0].text
+
+
+def test_chunk_file_matches_chunk_text(tmp_path):
+    """Memory-mapped chunking gives the same chunks as in-memory chunking."""
+    text = "# Doc\n\n" + "\n\n".join(f"Line {i} of the document." for i in range(200))
+    path = tmp_path / "doc.md"
+    path.write_text(text)
+
+    from_file = [(c.text, c.start, c.end) for c in chunk_file(path, 64, 8)]
+    from_text = [(c.text, c.start, c.end) for c in chunk_text(text, "", 64, 8)]
+
+    assert from_file == from_text
+    assert list(chunk_file(tmp_path / "doc.md"))[0].source == str(path)
+
+
+def test_chunk_file_handles_empty_file(tmp_path):
+    """Empty files yield no chunks."""
+    path = tmp_path / "empty.txt"
+    path.write_text("")
+
+    assert list(chunk_file(path)) == []
+
+
+def test_offsets_point_into_source_bytes():
+    """Chunk offsets slice the original document bytes."""
+    text = "Alpha paragraph.\n\nBeta paragraph.\n\nGamma paragraph.\n"
+    data = text.encode("utf-8")
+
+    for chunk in chunk_text(text, target_tokens=4, overlap_tokens=0):
+        assert data[chunk.start : chunk.end].decode("utf-8") == chunk.text
+
+
+def _document(paragraphs: int, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    words = "alpha beta gamma delta epsilon zeta eta theta iota kappa".split()
+    return [" ".join(rng.choices(words, k=60)) for _ in range(paragraphs)]
+
+
+def test_content_defined_chunks_cover_document_within_size_limits():
+    """CDC chunks tile the document exactly and respect min/max sizes."""
+    for seed in range(100):
+        rng = random.Random(seed)
+        # Trailing whitespace lets the last boundary snap to the very end
+        text = "\n\n".join(_document(rng.randint(1, 60), seed))
+        text += " " * rng.randint(0, 40)
+        for target in (16, 64, 256):
+            chunks = list(chunk_text(text, target_tokens=target, content_defined=True))
+
+            assert "".join(c.text for c in chunks) == text, (seed, target)
+            assert [c.index for c in chunks] == list(range(len(chunks)))
+            if target == 64:
+                assert all(64 <= c.end - c.start <= 1024 for c in chunks[:-1])
+
+
+def test_content_defined_chunks_survive_an_edit():
+    """Editing one paragraph only changes the chunks around it."""
+    paragraphs = _document(200)
+    before = list(chunk_text("\n\n".join(paragraphs), content_defined=True))
+    paragraphs[100] = "A completely rewritten paragraph."
+    after = list(chunk_text("\n\n".join(paragraphs), content_defined=True))
+
+    old_ids = {c.chunk_id for c in before}
+    changed = [c for c in after if c.chunk_id not in old_ids]
+
+    assert len(after) > 20
+    assert 1 <= len(changed) <= 3
+
+
+def test_cdc_boundaries_force_cuts_in_hashless_runs():
+    """Content with no hash boundaries is still cut at max_bytes."""
+    boundaries = list(iter_cdc_boundaries(b"a" * 10_000, 100, 256, 1000))
+
+    assert boundaries[-1] == 10_000
+    assert all(b - a <= 1000 for a, b in zip([0, *boundaries], boundaries))
+
+
+def test_chunk_store_reports_only_new_chunks_on_reingest():
+    """Re-ingesting an edited document returns just the changed chunks."""
+    store = ChunkStore()
+    paragraphs = _document(200)
+    text = "\n\n".join(paragraphs)
+    first = store.ingest("doc", chunk_text(text, content_defined=True))
+    paragraphs[50] = "Edited."
+    second = store.ingest(
+        "doc", chunk_text("\n\n".join(paragraphs), content_defined=True)
+    )
+
+    assert len(first.new) + first.reused == len(
+        list(chunk_text(text, content_defined=True))
+    )
+    assert 1 <= len(second.new) <= 3
+    assert second.reused == len(store.chunk_ids("doc")) - len(second.new)
+    assert 1 <= len(second.removed) <= 3
+    assert all(chunk_id not in store for chunk_id in second.removed)
+    assert all(store.get(c.chunk_id) == c.text for c in second.new)
+
+
+def test_chunk_store_deduplicates_across_documents():
+    """Identical chunks in two documents are stored once."""
+    store = ChunkStore()
+    text = "\n\n".join(_document(50))
+    store.ingest("a", chunk_text(text, content_defined=True))
+    result = store.ingest("b", chunk_text(text, content_defined=True))
+
+    assert result.new == []
+    assert store.dedup_ratio == 0.5
+    ids = store.chunk_ids("b")
+    assert store.remove("a") == []
+    assert store.remove("b") == ids
+    assert len(store) == 0
+
+
+def test_chunk_store_round_trips_through_dict():
+    """to_dict/from_dict preserve chunks, documents and reference counts."""
+    store = ChunkStore()
+    store.ingest("a", chunk_text("shared text", content_defined=True))
+    store.ingest("b", chunk_text("shared text", content_defined=True))
+
+    restored = ChunkStore.from_dict(json.loads(json.dumps(store.to_dict())))
+
+    assert restored.chunk_ids("a") == store.chunk_ids("a")
+    assert restored.remove("a") == []
+    assert restored.remove("b") == store.chunk_ids("b")
+
+
+def test_chunk_store_locations_follow_edits():
+    """Once built, the locations map is updated in place by ingest and remove."""
+    store = ChunkStore()
+    text = "\n\n".join(_document(60))
+    store.ingest("a", chunk_text(text, content_defined=True))
+    store.ingest("b", chunk_text(text, content_defined=True))
+    first = store.chunk_ids("a")[0]
+    assert [source for source, _ in store.locations(first)] == ["a", "b"]
+
+    store.ingest("a", chunk_text("Rewritten.\n\n" + text, content_defined=True))
+    store.remove("b")
+
+    rebuilt = ChunkStore.from_dict(store.to_dict())
+    for chunk_id in {*store.chunk_ids("a"), first}:
+        assert sorted(store.locations(chunk_id)) == sorted(rebuilt.locations(chunk_id))
+    assert store.locations(store.chunk_ids("a")[0]) == [("a", 0)]
+
+
+def test_chunk_store_merges_near_duplicates():
+    """Similar chunks reference the stored copy; freeing it forgets its signature."""
+    page = " ".join(f"word{i}" for i in range(150))
+    store = ChunkStore(near_duplicates=0.8)
+    store.ingest("a", chunk_text(page + " Retrieved 2024-01-01."))
+    result = store.ingest("b", chunk_text(page + " Retrieved 2024-02-01."))
+    other = store.ingest("c", chunk_text("Something else entirely, written anew."))
+
+    assert result.new == [] and result.reused == result.merged == 1
+    assert store.chunk_ids("b") == store.chunk_ids("a")
+    assert len(other.new) == 1 and other.merged == 0
+    assert ChunkStore().ingest("b", chunk_text(page)).merged == 0
+
+    restored = ChunkStore.from_dict(store.to_dict(), near_duplicates=0.8)
+    assert restored.ingest("d", chunk_text(page)).merged == 1
+    assert store.remove("a") == [] and len(store.remove("b")) == 1
+    assert store.ingest("b", chunk_text(page)).new != []
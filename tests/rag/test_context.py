@@ -0,0 +1,86 @@
+"""Tests for MMR context packing and merging of adjacent chunks."""
+
+import numpy as np
+
+from src.rag.chunking import ChunkStore, chunk_text
+from src.rag.context import format_context, merge_adjacent, mmr_select, pack_context
+from src.rag.embeddings import EmbeddingService, HashingBackend
+from src.rag.retriever import HybridRetriever
+
+
+def test_mmr_prefers_diverse_chunks():
+    """A near-duplicate of the top chunk loses to a different relevant chunk."""
+    query = np.array([1.0, 0.0, 0.0])
+    vectors = np.array(
+        [
+            [0.9, 0.3, 0.0],
+            [0.85, 0.3, 0.1],  # Near-duplicate of the first, slightly less relevant
+            [0.8, 0.0, 0.6],
+        ]
+    )
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    picked = mmr_select(
+        query,
+        vectors,
+        [10, 10, 10],
+        budget=20,
+        mmr_lambda=0.5,
+        duplicate_similarity=1.0,
+    )
+
+    assert picked == [0, 2]
+
+
+def test_mmr_respects_token_budget_and_drops_duplicates():
+    """Chunks that do not fit are skipped; exact duplicates are never picked."""
+    query = np.array([1.0, 0.0])
+    vectors = np.array([[1.0, 0.0], [1.0, 0.0], [0.6, 0.8], [0.0, 1.0]])
+
+    picked = mmr_select(query, vectors, [50, 50, 80, 10], budget=70)
+
+    assert picked == [0, 3]
+
+
+def test_merge_adjacent_joins_neighbours_and_removes_overlap():
+    """Consecutive chunks of one document become one passage without repeats."""
+    store = ChunkStore()
+    text = "\n\n".join(f"Paragraph {i} talks about topic {i}." for i in range(12))
+    chunks = list(chunk_text(text, "doc.md", target_tokens=16, overlap_tokens=8))
+    store.ingest("doc.md", chunks)
+    assert any(a.end > b.start for a, b in zip(chunks, chunks[1:]))  # Overlapping
+
+    ids = [chunks[2].chunk_id, chunks[5].chunk_id, chunks[1].chunk_id]
+    passages = merge_adjacent(ids, [0.9, 0.5, 0.7], store)
+
+    assert [p.chunk_ids for p in passages] == [
+        [chunks[1].chunk_id, chunks[2].chunk_id],
+        [chunks[5].chunk_id],
+    ]
+    merged = passages[0].text
+    assert merged.count("Paragraph 2 ") == 1
+    assert "Paragraph 1 " in merged and merged.index("Paragraph 1 ") < merged.index(
+        "Paragraph 2 "
+    )
+    assert passages[0].relevance == 0.9
+
+
+def test_pack_context_fits_budget(tmp_path):
+    """Packed passages stay within the budget and lead with the best match."""
+    text = "\n\n".join(
+        [f"Filler paragraph number {i} about gardening and soil." for i in range(30)]
+        + ["The deploy script needs DEPLOY_TOKEN set in the environment."]
+    )
+    chunks = list(chunk_text(text, "notes.md", target_tokens=20, overlap_tokens=0))
+    embedder = EmbeddingService(HashingBackend(dim=128))
+    retriever = HybridRetriever.build(tmp_path / "idx", chunks, embedder)
+
+    passages = pack_context(
+        "DEPLOY_TOKEN deploy script", retriever, embedder, token_budget=60
+    )
+    rendered = format_context(passages)
+
+    assert sum(p.tokens for p in passages) <= 60
+    assert "DEPLOY_TOKEN" in passages[0].text
+    assert rendered.startswith("[1] notes.md\n")
+    retriever.close()
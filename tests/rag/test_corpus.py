@@ -0,0 +1,176 @@
+"""Tests for the offline corpus search engine."""
+
+import numpy as np
+import pytest
+
+from src.rag import corpus
+from src.rag.corpus import (
+    CorpusIndex,
+    build_corpus_index,
+    corpus_manifest,
+    extract_text,
+    get_corpus_index,
+    iter_corpus_files,
+    make_snippet,
+    merge_indexes,
+)
+
+
+@pytest.fixture
+def corpus_dir(tmp_path):
+    """A small corpus with one document of each supported type."""
+    root = tmp_path / "data"
+    (root / "web").mkdir(parents=True)
+    (root / "web" / "rag.html").write_text(
+        "<html><head><title>RAG Overview</title><style>p {}</style></head>"
+        "<body><p>Retrieval augmented generation grounds answers.</p>"
+        "<script>var retrieval = 1;</script></body></html>"
+    )
+    (root / "bm25.md").write_text(
+        "# BM25 Notes\n\nBM25 ranks documents by term frequency and rarity."
+    )
+    (root / "errors.txt").write_text("ERR_CONN_RESET means the peer reset it.")
+    (root / "image.png").write_bytes(b"\x89PNG")
+    (root / ".hidden.md").write_text("retrieval secrets")
+    return root
+
+
+def test_extract_text_strips_html_markup(corpus_dir):
+    """HTML yields its title and visible text, without scripts or styles."""
+    title, text = extract_text(corpus_dir / "web" / "rag.html")
+
+    assert title == "RAG Overview"
+    assert "Retrieval augmented generation" in text
+    assert "var retrieval" not in text
+    assert "p {}" not in text
+
+
+def test_extract_text_uses_markdown_heading(corpus_dir):
+    """Markdown documents are titled by their first heading."""
+    assert extract_text(corpus_dir / "bm25.md")[0] == "BM25 Notes"
+    assert extract_text(corpus_dir / "errors.txt")[0] == "errors"
+
+
+def test_iter_corpus_files_skips_unsupported_and_hidden(corpus_dir):
+    """Only supported, non-hidden files are indexed."""
+    names = [p.name for p in iter_corpus_files(corpus_dir)]
+
+    assert names == ["bm25.md", "errors.txt", "rag.html"]
+
+
+def test_search_ranks_and_highlights(corpus_dir, tmp_path):
+    """Search returns the matching document with highlighted terms."""
+    index = build_corpus_index(corpus_dir, corpus_dir / ".index", workers=1)
+
+    results = index.search("retrieval generation", k=5)
+
+    assert [r.path for r in results] == ["web/rag.html"]
+    assert results[0].title == "RAG Overview"
+    assert "**Retrieval** augmented **generation**" in results[0].snippet
+
+
+def test_search_matches_exact_identifiers(corpus_dir):
+    """Identifiers with underscores are matched as single terms."""
+    index = build_corpus_index(corpus_dir, corpus_dir / ".index", workers=1)
+
+    assert index.search("err_conn_reset")[0].path == "errors.txt"
+    assert index.search("unknownterm") == []
+
+
+def test_spilled_segments_merge_to_same_ranking(corpus_dir):
+    """Forcing many small segments gives the same results as one block."""
+    single = build_corpus_index(corpus_dir, corpus_dir / ".one", workers=1)
+    spilled = build_corpus_index(
+        corpus_dir, corpus_dir / ".many", workers=1, block_postings=1
+    )
+
+    for query in ["bm25 ranks", "retrieval", "peer reset"]:
+        assert spilled.rank(query, 5) == single.rank(query, 5)
+
+
+def test_parallel_build_matches_serial_build(corpus_dir):
+    """Process-pool parsing assigns the same document IDs as serial parsing."""
+    serial = build_corpus_index(corpus_dir, corpus_dir / ".serial", workers=1)
+    parallel = build_corpus_index(corpus_dir, corpus_dir / ".parallel", workers=2)
+
+    assert parallel.n_docs == serial.n_docs == 3
+    assert parallel.rank("documents ranks", 3) == serial.rank("documents ranks", 3)
+
+
+def test_reopened_index_is_memory_mapped(corpus_dir):
+    """An index can be reopened from disk without rebuilding."""
+    build_corpus_index(corpus_dir, corpus_dir / ".index", workers=1)
+
+    reopened = CorpusIndex(corpus_dir / ".index")
+
+    assert reopened.n_docs == 3
+    assert reopened.search("bm25")[0].path == "bm25.md"
+
+
+def test_merge_drops_deleted_documents(corpus_dir, tmp_path):
+    """Merging renumbers the surviving documents and keeps their postings."""
+    index = build_corpus_index(corpus_dir, tmp_path / "full", workers=1)
+    deleted = np.array([index.doc_path(i) == "errors.txt" for i in range(3)])
+    (corpus_dir / "errors.txt").unlink()
+    rebuilt = build_corpus_index(corpus_dir, tmp_path / "rebuilt", workers=1)
+
+    merged = merge_indexes(tmp_path / "merged", corpus_dir, [(index, deleted)])
+    doubled = merge_indexes(
+        tmp_path / "doubled", corpus_dir, [(index, deleted), (index, ~deleted)]
+    )
+
+    assert [merged.doc_path(i) for i in range(2)] == ["bm25.md", "web/rag.html"]
+    assert merged.total_length == rebuilt.total_length
+    for query in ["bm25 ranks", "retrieval", "peer reset"]:
+        assert merged.rank(query, 5) == rebuilt.rank(query, 5)
+    assert doubled.n_docs == 3
+    assert doubled.doc_path(doubled.rank("err_conn_reset", 1)[0][0]) == "errors.txt"
+
+
+def test_index_stores_root_relative_to_itself(corpus_dir, tmp_path):
+    """A corpus moved together with its index still resolves its documents."""
+    build_corpus_index(corpus_dir, corpus_dir / ".index", workers=1)
+    moved = corpus_dir.rename(tmp_path / "moved")
+
+    reopened = CorpusIndex(moved / ".index")
+
+    assert reopened.root == moved
+    assert reopened.search("bm25")[0].title == "BM25 Notes"
+
+
+def test_stale_index_answers_while_it_is_rebuilt(isolated_corpus):
+    """An index older than the corpus is served, then replaced in the background."""
+    (isolated_corpus / "old.md").write_text("# Old\n\nlegacy document")
+    build_corpus_index(isolated_corpus, isolated_corpus / ".index", workers=1)
+    assert get_corpus_index(timeout=None).corpus == corpus_manifest(
+        isolated_corpus, isolated_corpus / ".index"
+    )
+    corpus._default_index = None
+    (isolated_corpus / "new.md").write_text("# New\n\nfresh document")
+
+    stale = get_corpus_index()
+    assert stale is not None
+    assert [r.path for r in stale.search("document")] == ["old.md"]
+    corpus._builder.submit(lambda: None).result(timeout=10)  # Rebuild finished
+
+    fresh = get_corpus_index()
+    assert fresh is not stale
+    assert sorted(r.path for r in fresh.search("document")) == ["new.md", "old.md"]
+
+
+def test_empty_corpus_returns_no_results(tmp_path):
+    """An empty corpus builds a valid, empty index."""
+    (tmp_path / "empty").mkdir()
+    index = build_corpus_index(tmp_path / "empty", tmp_path / ".index", workers=1)
+
+    assert index.search("anything") == []
+
+
+def test_make_snippet_prefers_window_with_most_terms():
+    """The snippet is centred on the densest cluster of query terms."""
+    text = "alpha " + "filler " * 100 + "alpha beta gamma " + "filler " * 100
+
+    snippet = make_snippet(text, {"alpha", "beta", "gamma"}, width=60)
+
+    assert "**alpha** **beta** **gamma**" in snippet
+    assert snippet.startswith("...")
@@ -0,0 +1,53 @@
+"""Tests for MinHash/LSH near-duplicate detection."""
+
+import numpy as np
+import pytest
+
+from src.rag.dedup import NearDuplicateIndex, lsh_bands, shingle_hashes
+
+
+def _text(seed: int, words: int = 200) -> str:
+    rng = np.random.default_rng(seed)
+    return " ".join(f"w{i}" for i in rng.integers(0, 5000, words))
+
+
+def test_signatures_estimate_jaccard_similarity():
+    """Equal signature entries track the true Jaccard similarity of shingles."""
+    index = NearDuplicateIndex(permutations=256)
+    base = _text(0).split()
+    edited = base[:150] + _text(1, 50).split()
+    a, b = index.signatures([" ".join(base), " ".join(edited)])
+    left, right = (
+        set(shingle_hashes(" ".join(base))),
+        set(shingle_hashes(" ".join(edited))),
+    )
+
+    assert np.mean(a == b) == pytest.approx(
+        len(left & right) / len(left | right), abs=0.08
+    )
+    assert shingle_hashes("Hello, WORLD again").tolist() == (
+        shingle_hashes("hello world again").tolist()
+    )
+    assert len(shingle_hashes("")) == len(shingle_hashes("two words")) == 1
+
+
+def test_find_returns_near_duplicates_only():
+    """Lightly edited copies are found; unrelated texts and removed keys are not."""
+    index = NearDuplicateIndex(threshold=0.8)
+    texts = [_text(seed) for seed in range(50)]
+    for i, signature in enumerate(index.signatures(texts)):
+        index.add(f"c{i}", signature)
+    copy = texts[7].replace(texts[7].split()[100], "changed") + " footer 2024"
+    other = _text(99)
+
+    found, missing = index.signatures([copy, other])
+    assert index.find(found) == "c7" and index.find(missing) is None
+    index.remove("c7")
+    assert index.find(found) is None and "c7" not in index and len(index) == 49
+
+
+def test_band_layout_follows_the_threshold():
+    """Higher thresholds get fewer, longer bands."""
+    bands, rows = lsh_bands(0.8, 128)
+    assert bands * rows <= 128
+    assert lsh_bands(0.9, 128)[1] > rows > lsh_bands(0.5, 128)[1]
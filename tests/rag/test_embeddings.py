@@ -0,0 +1,159 @@
+"""Tests for batched embedding and the on-disk embedding cache."""
+
+import numpy as np
+import pytest
+
+from src.rag.chunking import content_hash
+from src.rag.embeddings import (
+    EmbeddingCache,
+    EmbeddingService,
+    HashingBackend,
+    get_embedding_service,
+    iter_batches,
+)
+
+
+class CountingBackend(HashingBackend):
+    """Hashing backend that records every batch it is asked to embed."""
+
+    def __init__(self, dim: int = 64) -> None:
+        super().__init__(dim)
+        self.batches: list[list[str]] = []
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        self.batches.append(list(texts))
+        return super().embed(texts)
+
+
+def test_hashing_backend_is_deterministic_and_normalized():
+    """Same text gives the same unit vector; related texts are closer."""
+    backend = HashingBackend(dim=256)
+
+    a, b, c, empty = backend.embed(
+        [
+            "python asyncio event loop",
+            "the python asyncio event loop",
+            "chocolate cake recipe",
+            "",
+        ]
+    )
+
+    assert np.allclose(backend.embed(["python asyncio event loop"])[0], a)
+    assert np.isclose(np.linalg.norm(a), 1.0)
+    assert a @ b > a @ c
+    assert not empty.any()
+
+
+def test_iter_batches_bounds_count_and_tokens():
+    """Batches never exceed the count or token limits (except oversized texts)."""
+    texts = ["one two three"] * 5 + ["word " * 50] + ["x"]
+
+    batches = list(iter_batches(texts, max_size=2, max_tokens=6))
+
+    assert [i for batch in batches for i in batch] == list(range(len(texts)))
+    assert all(len(batch) <= 2 for batch in batches)
+    assert [5] in batches
+
+
+def test_service_embeds_each_distinct_text_once(tmp_path):
+    """Duplicates and previously cached texts never reach the backend."""
+    backend = CountingBackend()
+    cache = EmbeddingCache(tmp_path, backend.model_id, backend.dim)
+    service = EmbeddingService(backend, cache, batch_size=2)
+
+    first = service.embed(["a b", "c d", "a b", "e f"])
+    second = service.embed(["e f", "g h"])
+
+    assert [len(batch) for batch in backend.batches] == [2, 1, 1]
+    assert np.allclose(first[0], first[2])
+    assert np.allclose(second[0], first[3])
+    assert (service.hits, service.misses) == (1, 4)
+
+
+def test_embed_queries_batches_and_reuses_recent_queries(tmp_path):
+    """Queries are embedded in batches, once each, and kept off the disk cache."""
+    backend = CountingBackend()
+    cache = EmbeddingCache(tmp_path, backend.model_id, backend.dim)
+    service = EmbeddingService(backend, cache, batch_size=2, query_cache_entries=2)
+
+    vectors = service.embed_queries(["q1", "q2", "q1", "q3"])
+    again = service.embed_queries(["q3", "q1"])
+
+    assert backend.batches == [["q1", "q2"], ["q3"], ["q1"]]
+    assert np.allclose(vectors[0], vectors[2])
+    assert np.allclose(again[0], vectors[3])
+    assert np.allclose(service.embed_query("q3"), vectors[3])
+    assert len(cache) == 0
+
+
+def test_cache_persists_across_instances(tmp_path):
+    """A reopened cache serves vectors written by an earlier process."""
+    backend = CountingBackend()
+    vectors = EmbeddingService(
+        backend, EmbeddingCache(tmp_path, backend.model_id, backend.dim)
+    ).embed(["alpha", "beta"])
+
+    reopened = CountingBackend()
+    service = EmbeddingService(
+        reopened, EmbeddingCache(tmp_path, reopened.model_id, reopened.dim)
+    )
+
+    assert np.array_equal(service.embed(["beta", "alpha"]), vectors[::-1])
+    assert reopened.batches == []
+
+
+def test_cache_trims_torn_tail(tmp_path):
+    """A partially written vector row is dropped when the cache is reopened."""
+    backend = HashingBackend(dim=8)
+    cache = EmbeddingCache(tmp_path, backend.model_id, backend.dim)
+    EmbeddingService(backend, cache).embed(["alpha", "beta"])
+    with open(cache.path / "vectors.f32", "ab") as f:
+        f.write(b"\x00" * 5)
+    with open(cache.path / "keys.bin", "ab") as f:
+        f.write(b"\x01" * 16)
+
+    reopened = EmbeddingCache(tmp_path, backend.model_id, backend.dim)
+
+    assert len(reopened) == 2
+    assert (cache.path / "vectors.f32").stat().st_size == 2 * 8 * 4
+
+
+def test_cache_shared_by_two_writers_keeps_rows_aligned(tmp_path):
+    """A writer indexes rows another process appended before adding its own."""
+    backend = HashingBackend(dim=8)
+    first = EmbeddingCache(tmp_path, backend.model_id, backend.dim)
+    second = EmbeddingCache(tmp_path, backend.model_id, backend.dim)
+    EmbeddingService(backend, first).embed(["alpha", "beta"])
+    EmbeddingService(backend, second).embed(["beta", "gamma"])
+    EmbeddingService(backend, first).embed(["delta"])
+
+    texts = ["alpha", "beta", "gamma", "delta"]
+    keys = [content_hash(text) for text in texts]
+    expected = backend.embed(texts)
+    found, vectors = second.lookup(keys[:3])
+    assert found.all()
+    np.testing.assert_array_equal(vectors, expected[:3])
+
+    reopened = EmbeddingCache(tmp_path, backend.model_id, backend.dim)
+    assert len(reopened) == 4
+    np.testing.assert_array_equal(reopened.lookup(keys)[1], expected)
+
+
+def test_cache_is_separate_per_model(tmp_path):
+    """Vectors are only reused for the same model ID."""
+    small, large = HashingBackend(dim=8), HashingBackend(dim=16)
+    EmbeddingService(small, EmbeddingCache(tmp_path, small.model_id, 8)).embed(["x"])
+
+    other = EmbeddingCache(tmp_path, large.model_id, 16)
+
+    assert len(other) == 0
+    with pytest.raises(ValueError, match="Cache is for model"):
+        EmbeddingService(small, other)
+
+
+def test_default_service_uses_hashing_backend():
+    """The shared service works offline out of the box."""
+    service = get_embedding_service()
+
+    assert service is get_embedding_service()
+    assert service.embed(["hello world"]).shape == (1, service.dim)
@@ -0,0 +1,76 @@
+"""Tests for the pipelined ingestion of a corpus into the hybrid index."""
+
+import pytest
+
+from src.rag.embeddings import EmbeddingService, HashingBackend
+from src.rag.ingest import ingest_corpus
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    root = tmp_path / "docs"
+    (root / "sub").mkdir(parents=True)
+    for i in range(40):
+        (root / f"doc{i}.md").write_text(f"# Topic {i}\n\nUnique term token{i}.\n")
+    (root / "sub" / "copy.md").write_text("# Topic 3\n\nUnique term token3.\n")
+    (root / ".hidden.md").write_text("never indexed\n")
+    return root
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_ingest_indexes_every_document(tmp_path, corpus, workers):
+    """All documents are searchable, duplicates are embedded once."""
+    embedder = EmbeddingService(HashingBackend(dim=64))
+
+    retriever, report = ingest_corpus(
+        [corpus], tmp_path / "index", embedder, workers=workers, write_chunks=8
+    )
+
+    assert report.documents == 41 and report.chunks == 41
+    assert report.embedded == 40  # sub/copy.md repeats doc3.md
+    assert report.merged == 0 and report.dedup_ratio == pytest.approx(1 / 41)
+    assert len(retriever.sparse) == 40 and len(retriever.dense) == 40
+    top_id, _ = retriever.search("token17", k=1)[0]
+    assert "token17" in retriever.chunks.get(top_id)
+    assert "docs/sub/copy.md" in retriever.chunks.sources()
+    assert set(report.utilization) == {"parse", "embed", "write"}
+    assert report.docs_per_second > 0
+    retriever.close()
+
+
+def test_ingest_merges_near_duplicate_pages(tmp_path):
+    """Mirrored pages that differ in a footer are embedded once."""
+    root = tmp_path / "docs"
+    root.mkdir()
+    body = " ".join(f"term{i}" for i in range(120))
+    for i in range(5):
+        (root / f"mirror{i}.md").write_text(f"{body}\n\nMirrored from site{i}.\n")
+    (root / "own.md").write_text("A page of its own about vector search.\n")
+    embedder = EmbeddingService(HashingBackend(dim=64))
+
+    retriever, report = ingest_corpus([root], tmp_path / "index", embedder, workers=1)
+    exact, exact_report = ingest_corpus(
+        [root], tmp_path / "exact", embedder, workers=1, near_duplicates=None
+    )
+
+    assert report.chunks == exact_report.chunks == 6
+    assert report.embedded == 2 and report.merged == 4
+    assert report.dedup_ratio == pytest.approx(4 / 6)
+    assert exact_report.embedded == 6 and exact_report.merged == 0
+    assert len(retriever.dense) == 2 and len(retriever.chunks.sources()) == 6
+    retriever.close()
+    exact.close()
+
+
+def test_ingest_propagates_stage_errors(tmp_path, corpus):
+    """A failure in the embedding stage surfaces in the caller."""
+
+    class BrokenBackend(HashingBackend):
+        def embed(self, texts):
+            raise RuntimeError("model unavailable")
+
+    embedder = EmbeddingService(BrokenBackend(dim=64))
+
+    with pytest.raises(RuntimeError, match="model unavailable"):
+        ingest_corpus([corpus], tmp_path / "index", embedder, workers=1)
+    assert not (tmp_path / "index").exists()
@@ -0,0 +1,59 @@
+"""Tests for per-field metadata indexes used to pre-filter retrieval."""
+
+import numpy as np
+import pytest
+
+from src.rag.metadata import MetadataIndex
+
+
+@pytest.fixture
+def index():
+    """Five rows with a categorical, a multi-valued and a numeric field."""
+    return MetadataIndex.build(
+        [
+            {"source": "a.md", "tag": ["raft", "kafka"], "mtime": 10},
+            {"source": "b.md", "tag": "raft", "mtime": 20.5},
+            {"source": "a.md", "mtime": 30},
+            {"source": ["b.md", "c.md"], "tag": [], "mtime": 40},
+            {"source": "c.md", "tag": "kafka"},
+        ]
+    )
+
+
+def test_equality_any_of_and_ranges(index):
+    """Each condition kind selects the matching rows in row order."""
+    assert index.rows({"source": "a.md"}).tolist() == [0, 2]
+    assert index.rows({"source": ["c.md", "a.md"]}).tolist() == [0, 2, 3, 4]
+    assert index.rows({"tag": "kafka"}).tolist() == [0, 4]
+    assert index.rows({"mtime": {"gte": 20.5, "lt": 40}}).tolist() == [1, 2]
+    assert index.rows({"mtime": {"gt": 20.5}}).tolist() == [2, 3]
+    assert index.rows({"mtime": [10, 40]}).tolist() == [0, 3]
+    assert index.rows({}).tolist() == [0, 1, 2, 3, 4]
+
+
+def test_conditions_are_intersected(index):
+    """Fields are ANDed; unknown fields and values match nothing."""
+    assert index.rows({"source": "b.md", "mtime": {"lte": 30}}).tolist() == [1]
+    assert index.rows({"tag": "raft", "source": "c.md"}).tolist() == []
+    assert index.rows({"author": "x"}).tolist() == []
+    assert index.rows({"source": "missing.md"}).tolist() == []
+
+
+def test_invalid_conditions_raise(index):
+    """Ranges need a numeric field and known operators."""
+    with pytest.raises(ValueError):
+        index.rows({"source": {"gte": "a"}})
+    with pytest.raises(ValueError):
+        index.rows({"mtime": {"after": 3}})
+
+
+def test_round_trips_through_directory(tmp_path, index):
+    """A saved index reopens memory-mapped with identical answers."""
+    index.save(tmp_path / "metadata")
+    loaded = MetadataIndex.open(tmp_path / "metadata")
+
+    assert loaded.count == 5
+    assert sorted(loaded.fields) == ["mtime", "source", "tag"]
+    for filters in [{"source": "a.md"}, {"mtime": {"lt": 35}}, {"tag": "kafka"}]:
+        assert np.array_equal(loaded.rows(filters), index.rows(filters))
+    assert loaded.rows({}).tolist() == list(range(5))
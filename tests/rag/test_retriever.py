@@ -0,0 +1,389 @@
+"""Tests for exact vector retrieval over memory-mapped, quantized matrices."""
+
+import numpy as np
+import pytest
+
+from src.rag.chunking import Chunk
+from src.rag.embeddings import EmbeddingService, HashingBackend
+from src.rag.retriever import (
+    ExactRetriever,
+    HybridRetriever,
+    IVFPQIndex,
+    Reranker,
+    RetrievalCache,
+    build_vector_index,
+    quantize,
+    reciprocal_rank_fusion,
+    weighted_score_fusion,
+)
+
+
+def _unit_vectors(count: int, dim: int, seed: int = 0) -> np.ndarray:
+    vectors = np.random.default_rng(seed).standard_normal((count, dim))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+@pytest.mark.parametrize("dtype", ["float16", "int8"])
+def test_exact_search_matches_brute_force(tmp_path, dtype):
+    """Top-k results agree with a float32 brute-force ranking."""
+    vectors = _unit_vectors(1000, 32)
+    ids = [f"chunk-{i}" for i in range(1000)]
+    queries = _unit_vectors(5, 32, seed=1)
+    retriever = build_vector_index(tmp_path / "vec", ids, vectors, dtype=dtype)
+    retriever.block_rows = 128  # Exercise merging across blocks
+
+    results = retriever.search_batch(queries, k=10)
+
+    for query, result in zip(queries, results):
+        expected = np.argsort(-(vectors @ query))[:10]
+        found = [int(chunk_id.split("-")[1]) for chunk_id, _ in result]
+        assert len(set(found) & set(expected.tolist())) >= 9
+        scores = [score for _, score in result]
+        assert scores == sorted(scores, reverse=True)
+        assert abs(scores[0] - float(vectors[expected[0]] @ query)) < 0.02
+
+
+def test_search_returns_ids_and_handles_small_indexes(tmp_path):
+    """Single queries work and k larger than the index is clamped."""
+    vectors = np.eye(3, dtype=np.float32)
+    retriever = build_vector_index(tmp_path / "vec", ["a", "b", "c"], vectors)
+
+    result = retriever.search(np.array([0.0, 1.0, 0.0]), k=10)
+
+    assert [chunk_id for chunk_id, _ in result][0] == "b"
+    assert len(result) == 3
+    assert retriever.search(np.array([0.0, 1.0, 0.0]), k=0) == []
+
+
+def test_index_is_memory_mapped_and_reopens(tmp_path):
+    """Reopening an index maps the matrix instead of loading it."""
+    build_vector_index(tmp_path / "vec", ["x", "y"], _unit_vectors(2, 8), dtype="int8")
+
+    retriever = ExactRetriever(tmp_path / "vec")
+
+    assert isinstance(retriever._vectors, np.memmap)
+    assert retriever._vectors.dtype == np.int8
+    assert len(retriever) == 2
+    assert retriever.chunk_id(1) == "y"
+
+
+def test_empty_index(tmp_path):
+    """An index without vectors opens and returns no results."""
+    retriever = build_vector_index(
+        tmp_path / "vec", [], np.empty((0, 4), dtype=np.float32)
+    )
+
+    assert retriever.search(np.ones(4), k=5) == []
+
+
+def test_int8_quantization_error_is_small():
+    """Dequantized int8 vectors stay close to the originals."""
+    vectors = _unit_vectors(100, 64)
+
+    quantized, scales = quantize(vectors, "int8")
+
+    assert quantized.dtype == np.int8
+    assert np.abs(quantized * scales[:, None] - vectors).max() < 0.01
+
+
+@pytest.fixture(scope="module")
+def ann_data():
+    """Clustered unit vectors, queries and their exact top-10 rows."""
+    rng = np.random.default_rng(0)
+    centres = rng.standard_normal((20, 32))
+    vectors = centres[rng.integers(0, 20, 3000)] + 0.5 * rng.standard_normal((3000, 32))
+    vectors = (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(
+        np.float32
+    )
+    queries = vectors[:20] + 0.05 * rng.standard_normal((20, 32)).astype(np.float32)
+    truth = np.argsort(-(queries @ vectors.T), axis=1)[:, :10]
+    ids = [f"c{i}" for i in range(len(vectors))]
+    return ids, vectors, queries, truth
+
+
+def _recall(index, queries, truth) -> float:
+    hits = 0
+    for query, expected in zip(queries, truth):
+        found = {int(chunk_id[1:]) for chunk_id, _ in index.search(query, 10)}
+        hits += len(found & set(expected.tolist()))
+    return hits / truth.size
+
+
+def test_ann_recall_improves_with_nprobe(ann_data):
+    """Scanning more cells finds more of the exact neighbours."""
+    ids, vectors, queries, truth = ann_data
+    index = IVFPQIndex.build(ids, vectors, nlist=32, iterations=5)
+
+    index.nprobe = 1
+    narrow = _recall(index, queries, truth)
+    index.nprobe = 32
+    wide = _recall(index, queries, truth)
+
+    assert wide >= 0.95
+    assert wide >= narrow
+
+
+def test_ann_inserts_and_tombstone_deletes(ann_data):
+    """Inserted vectors are searchable at once; deleted ones never come back."""
+    ids, vectors, queries, _ = ann_data
+    index = IVFPQIndex.build(ids, vectors, nlist=16, iterations=5)
+    index.nprobe = 16
+    top = index.search(queries[0], 1)[0][0]
+
+    assert index.delete([top, "unknown"]) == 1
+    assert top not in {chunk_id for chunk_id, _ in index.search(queries[0], 10)}
+    assert len(index) == len(ids) - 1
+
+    index.insert(["fresh"], queries[:1])
+    assert index.search(queries[0], 1)[0][0] == "fresh"
+
+    index.insert(["fresh"], -queries[:1])  # Upsert replaces the old vector
+    assert "fresh" not in {chunk_id for chunk_id, _ in index.search(queries[0], 5)}
+    assert len(index) == len(ids)
+
+
+def test_ann_round_trips_through_single_file(tmp_path, ann_data):
+    """save/load keeps results and parameters and drops tombstoned rows."""
+    ids, vectors, queries, _ = ann_data
+    index = IVFPQIndex.build(ids, vectors, nlist=16, nprobe=4, iterations=5)
+    index.delete(["c0"])
+    path = tmp_path / "ann.idx"
+
+    index.save(path)
+    loaded = IVFPQIndex.load(path)
+
+    assert loaded.nprobe == 4
+    assert len(loaded) == len(ids) - 1
+    assert loaded.search_batch(queries[:3], 5) == index.search_batch(queries[:3], 5)
+    loaded.insert(["new"], queries[:1])
+    assert loaded.search(queries[0], 1)[0][0] == "new"
+
+
+def test_ann_rejects_bad_pq_groups(ann_data):
+    """The number of PQ groups must divide the dimension."""
+    ids, vectors, _, _ = ann_data
+
+    with pytest.raises(ValueError, match="must divide"):
+        IVFPQIndex.build(ids, vectors, m=5)
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    """IDs ranked well by both lists beat IDs ranked first by only one."""
+    sparse = [("a", 9.0), ("b", 5.0), ("c", 1.0)]
+    dense = [("d", 0.9), ("b", 0.8), ("a", 0.1)]
+
+    fused = reciprocal_rank_fusion([sparse, dense])
+
+    assert {chunk_id for chunk_id, _ in fused[:2]} == {"a", "b"}
+    assert {chunk_id for chunk_id, _ in fused} == {"a", "b", "c", "d"}
+
+
+def test_weighted_score_fusion_normalizes_scores():
+    """Scores are min-max normalized per list before weighting."""
+    sparse = [("a", 30.0), ("b", 10.0)]
+    dense = [("b", 0.9), ("a", 0.5)]
+
+    assert weighted_score_fusion([sparse, dense], [0.8, 0.2])[0][0] == "a"
+    assert weighted_score_fusion([sparse, dense], [0.2, 0.8])[0][0] == "b"
+
+
+@pytest.fixture
+def hybrid_chunks():
+    """Small documents where identifiers and topics differ."""
+    texts = {
+        "errors.md": [
+            "Connection failures raise ERR_CONN_RESET when the peer hangs up.",
+            "Timeouts are retried with exponential backoff.",
+        ],
+        "python.md": [
+            "Python asyncio runs coroutines on an event loop.",
+            "The event loop schedules callbacks and network IO.",
+        ],
+        "copy.md": ["Timeouts are retried with exponential backoff."],
+    }
+    return [
+        Chunk(text=text, source=source, index=i, start=0, end=len(text), tokens=0)
+        for source, parts in texts.items()
+        for i, text in enumerate(parts)
+    ]
+
+
+@pytest.mark.parametrize("ann", [False, True])
+def test_hybrid_build_indexes_both_sides_once(tmp_path, hybrid_chunks, ann):
+    """One pass fills BM25, vectors and chunk store; duplicates are shared."""
+    embedder = EmbeddingService(HashingBackend(dim=64))
+    retriever = HybridRetriever.build(
+        tmp_path / "hybrid", hybrid_chunks, embedder, ann=ann
+    )
+
+    assert len(retriever.sparse) == 4
+    assert len(retriever.chunks) == 4
+    assert retriever.chunks.dedup_ratio == pytest.approx(0.2)
+
+    top = retriever.search("ERR_CONN_RESET", k=1)[0][0]
+    assert "ERR_CONN_RESET" in retriever.chunks.get(top)
+    top = retriever.search("asyncio event loop coroutines", k=1)[0][0]
+    assert "asyncio" in retriever.chunks.get(top)
+    retriever.close()
+
+
+def test_hybrid_reopens_and_batches(tmp_path, hybrid_chunks):
+    """A reopened index gives the same results; batches match single queries."""
+    embedder = EmbeddingService(HashingBackend(dim=64))
+    built = HybridRetriever.build(tmp_path / "hybrid", hybrid_chunks, embedder)
+    reopened = HybridRetriever.open(tmp_path / "hybrid", embedder, fusion="weighted")
+    queries = ["event loop", "backoff retries", "nothing matches zzz"]
+
+    batch = built.search_batch(queries, k=3)
+
+    assert batch == [built.search(query, k=3) for query in queries]
+    assert reopened.fusion == "weighted"
+    assert reopened.search("event loop", k=1)[0][0] == batch[0][0][0]
+    built.close()
+    reopened.close()
+
+
+def test_retrieval_cache_drops_older_generations():
+    """Seeing a newer generation of an index evicts that index's old entries."""
+    cache = RetrievalCache()
+    old = RetrievalCache.key("idx", 1, "Event  Loop", 3)
+    other = RetrievalCache.key("other", 1, "event loop", 3)
+    cache.put(old, [("a", 1.0)])
+    cache.put(other, [("b", 1.0)])
+
+    assert cache.get(RetrievalCache.key("idx", 1, "event loop", 3)) == [("a", 1.0)]
+    assert cache.get(RetrievalCache.key("idx", 2, "event loop", 3)) is None
+    cache.put(old, [("stale", 1.0)])  # Finished on the replaced index
+
+    assert len(cache) == 1 and cache.get(other) == [("b", 1.0)]
+
+
+def test_retrieval_cache_is_bounded_by_memory():
+    """Least recently used entries are evicted to stay under max_bytes."""
+    cache = RetrievalCache(max_bytes=2000)
+    results = [(f"chunk-{i:04d}", 1.0) for i in range(5)]
+    for i in range(10):
+        cache.put(RetrievalCache.key("idx", 0, f"query {i}", 5), results)
+
+    assert 0 < cache.size_bytes <= 2000
+    assert cache.get(RetrievalCache.key("idx", 0, "query 9", 5)) == results
+    assert cache.get(RetrievalCache.key("idx", 0, "query 0", 5)) is None
+
+
+def test_hybrid_search_uses_cache_until_rebuilt(tmp_path, hybrid_chunks):
+    """Repeated searches hit the cache; a rebuild bumps the generation."""
+    embedder = EmbeddingService(HashingBackend(dim=64))
+    first = HybridRetriever.build(tmp_path / "hybrid", hybrid_chunks, embedder)
+    results = first.search("event loop", k=2)
+
+    assert first.search("  EVENT loop ", k=2) == results
+    assert first.cache.hits == 1
+
+    rebuilt = HybridRetriever.build(tmp_path / "hybrid", hybrid_chunks[:1], embedder)
+    assert rebuilt.generation == first.generation + 1
+    assert len(rebuilt.search("event loop", k=2)) == 1
+    assert first.cache is rebuilt.cache and first.cache.hits == 1
+    first.close()
+    rebuilt.close()
+
+
+@pytest.mark.parametrize("ann", [False, True])
+def test_filters_restrict_rows_before_scoring(ann_data, tmp_path, ann):
+    """Filtered searches return the exact best k among the allowed rows."""
+    ids, vectors, queries, _ = ann_data
+    allowed = np.arange(0, len(ids), 7)  # Far more selective than top-10
+    if ann:
+        index = IVFPQIndex.build(ids, vectors, nlist=32, nprobe=2, iterations=5)
+    else:
+        index = build_vector_index(tmp_path / "dense", ids, vectors)
+        index.block_rows = 64
+    truth = allowed[np.argsort(-(queries @ vectors[allowed].T), axis=1)[:, :10]]
+
+    hits = 0
+    for query, expected in zip(queries, truth):
+        found = [int(chunk_id[1:]) for chunk_id, _ in index.search(query, 10, allowed)]
+        assert len(found) == 10 and set(found) <= set(allowed.tolist())
+        hits += len(set(found) & set(expected.tolist()))
+
+    assert hits / truth.size >= (0.9 if ann else 1.0)
+    assert index.search(queries[0], 10, allowed[:3])[0][0] in {
+        f"c{row}" for row in allowed[:3]
+    }
+
+
+@pytest.mark.parametrize("ann", [False, True])
+def test_hybrid_where_filters_both_sides(tmp_path, hybrid_chunks, ann):
+    """Only chunks of matching documents are returned, on both rankings."""
+    embedder = EmbeddingService(HashingBackend(dim=64))
+    retriever = HybridRetriever.build(
+        tmp_path / "hybrid",
+        hybrid_chunks,
+        embedder,
+        ann=ann,
+        doc_metadata={"errors.md": {"mtime": 100}, "copy.md": {"mtime": 300}},
+    )
+
+    top = retriever.search("ERR_CONN_RESET", k=4, where={"source": "python.md"})
+    assert {chunk_id for chunk_id, _ in top} == set(
+        retriever.chunks.chunk_ids("python.md")
+    )
+    # The shared chunk matches through either of its documents
+    recent = retriever.search("backoff", k=4, where={"mtime": {"gte": 200}})
+    assert [retriever.chunks.get(c) for c, _ in recent] == [
+        "Timeouts are retried with exponential backoff."
+    ]
+    assert retriever.search("event loop", where={"source": "nope.md"}) == []
+    retriever.close()
+
+
+def test_reranker_features_and_score_cache():
+    """Adjacent terms in a heading outrank scattered ones; scores are cached."""
+    embedder = EmbeddingService(HashingBackend(dim=256))
+    texts = {
+        "scattered": "Connection pools keep sockets open. A reset of the pool "
+        "happens at startup. Retry logic lives elsewhere, far from the connection.",
+        "heading": "# Connection reset retry\n\nA connection reset is retried.",
+        "unrelated": "Backoff and jitter spread load over time.",
+    }
+    reranker = Reranker(embedder, weights={"proximity": 1.0, "field": 1.0})
+    query = "Connection  reset retry"
+    ranking = [("unrelated", 3.0), ("scattered", 2.0), ("heading", 1.0)]
+
+    features = reranker.features(
+        [query.lower()],
+        embedder.embed_query(query)[None, :],
+        list(texts.values()),
+        np.array([[0, 0], [0, 1], [0, 2]]),
+    )
+    assert features["coverage"].tolist() == [1.0, 1.0, 0.0]
+    assert features["proximity"] == pytest.approx([3 / 14, 1.0, 0.0])
+    assert features["field"].tolist() == [0.0, 1.0, 0.0]
+
+    reranked = reranker.rerank([query], [ranking], texts.get)[0]
+    assert [c for c, _ in reranked] == ["heading", "scattered", "unrelated"]
+    assert reranked[0][1] == pytest.approx(2.0)
+    assert reranker.misses == 3 and reranker.hits == 0
+    assert reranker.rerank(["connection reset retry"], [ranking], texts.get) == [
+        reranked
+    ]
+    assert reranker.hits == 3
+    with pytest.raises(ValueError, match="Unknown rerank features"):
+        Reranker(embedder, weights={"bm25": 1.0})
+
+
+def test_hybrid_reranks_fused_candidates(tmp_path, hybrid_chunks):
+    """The rerank stage reorders the fused candidates and is part of the cache key."""
+    embedder = EmbeddingService(HashingBackend(dim=64))
+    plain = HybridRetriever.build(tmp_path / "hybrid", hybrid_chunks, embedder)
+    reranker = Reranker(embedder, candidates=4)
+    reranked = HybridRetriever.open(tmp_path / "hybrid", embedder, reranker=reranker)
+    queries = ["event loop callbacks", "backoff retries", "nothing matches zzz"]
+
+    results = reranked.search_batch(queries, k=2)
+    top = plain.search_batch(queries, k=4)
+    expected = reranker.rerank(queries, top, plain.chunks.get)
+
+    assert results == [ranking[:2] for ranking in expected]
+    assert "loop schedules callbacks" in reranked.chunks.get(results[0][0][0])
+    plain.close()
+    reranked.close()
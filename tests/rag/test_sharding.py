@@ -0,0 +1,180 @@
+"""Tests for sharded exact search served by worker processes."""
+
+import os
+import signal
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from src.rag.chunking import Chunk
+from src.rag.embeddings import EmbeddingService, HashingBackend
+from src.rag.retriever import HybridRetriever, RetrievalCache, build_vector_index
+from src.rag.sharding import (
+    ShardedRetriever,
+    build_sharded_index,
+    open_sharded,
+    shard_hybrid_index,
+)
+
+
+@pytest.fixture(scope="module")
+def data():
+    """Unit vectors, their IDs and queries."""
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((900, 16))
+    vectors = (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(
+        np.float32
+    )
+    ids = [f"c{i}" for i in range(len(vectors))]
+    return ids, vectors, vectors[:8] + 0.1
+
+
+@pytest.mark.parametrize("shared", [False, True])
+def test_scatter_gather_matches_a_single_index(tmp_path, data, shared):
+    """Merged per-shard top-k equals the top-k of one unsharded index."""
+    ids, vectors, queries = data
+    build_sharded_index(tmp_path / "shards", ids, vectors, shards=3)
+    single = build_vector_index(tmp_path / "single", ids, vectors)
+    sharded = ShardedRetriever(tmp_path / "shards", shared_memory=shared)
+    try:
+        assert sharded.shards == 3 and len(sharded) == len(ids)
+        assert sharded.search_batch(queries, 10) == single.search_batch(queries, 10)
+        rows = np.arange(5, len(ids), 11)  # Spread over every shard
+        assert sharded.search_batch(queries, 5, rows) == single.search_batch(
+            queries, 5, rows
+        )
+        assert sharded.search(queries[0], 3, np.array([1, 2])) == single.search(
+            queries[0], 3, np.array([1, 2])
+        )
+        assert sharded.missed == []
+    finally:
+        sharded.close()
+
+
+def test_slow_shard_times_out_and_dead_worker_restarts(tmp_path, data):
+    """A stalled shard is skipped after the timeout; a killed one is restarted."""
+    ids, vectors, queries = data
+    build_sharded_index(tmp_path / "shards", ids, vectors, shards=2)
+    sharded = ShardedRetriever(tmp_path / "shards", timeout=0.5)
+    try:
+        full = sharded.search(queries[0], 20)
+        process = sharded._workers[1][0]
+        os.kill(process.pid, signal.SIGSTOP)
+        partial = sharded.search(queries[0], 20)
+        os.kill(process.pid, signal.SIGCONT)
+
+        assert sharded.missed == [1] and sharded.timeouts == [0, 1]
+        assert all(int(chunk_id[1:]) < 450 for chunk_id, _ in partial)
+        sharded.timeout = 30
+        assert sharded.search(queries[0], 20) == full  # Late reply discarded
+
+        process.kill()
+        process.join()
+        assert sharded.search(queries[0], 20) == full
+    finally:
+        sharded.close()
+
+
+def test_worker_dying_mid_query_is_missed_not_fatal(tmp_path, data, monkeypatch):
+    """A shard whose worker dies after or before the send is left out."""
+    ids, vectors, queries = data
+    build_sharded_index(tmp_path / "shards", ids, vectors, shards=2)
+    sharded = ShardedRetriever(tmp_path / "shards", timeout=30)
+    try:
+        full = sharded.search(queries[0], 20)
+        process = sharded._workers[1][0]
+        os.kill(process.pid, signal.SIGSTOP)  # Takes the request, never answers
+        killer = threading.Timer(0.2, os.kill, (process.pid, signal.SIGKILL))
+        killer.start()
+        start = time.monotonic()
+        partial = sharded.search(queries[0], 20)
+        killer.join()
+
+        assert time.monotonic() - start < 10  # Not the 30 s timeout
+        assert sharded.missed == [1] and sharded.timeouts == [0, 0]
+        assert all(int(chunk_id[1:]) < 450 for chunk_id, _ in partial)
+        assert sharded.search(queries[0], 20) == full  # Restarted
+
+        # Dies between the liveness check and the send
+        process, conn = sharded._workers[1]
+        process.kill()
+        process.join()
+        connection = sharded._connection
+        monkeypatch.setattr(
+            sharded, "_connection", lambda shard: conn if shard else connection(0)
+        )
+        sharded.search(queries[0], 20)
+        assert sharded.missed == [1]
+        monkeypatch.undo()
+        assert sharded.search(queries[0], 20) == full
+    finally:
+        sharded.close()
+
+
+def test_hybrid_retriever_serves_dense_side_from_shards(tmp_path):
+    """open_sharded returns the same fused results as the unsharded index."""
+    embedder = EmbeddingService(HashingBackend(dim=64))
+    chunks = [
+        Chunk(text=text, source=f"doc{i}.md", index=0, start=0, end=1, tokens=0)
+        for i, text in enumerate(
+            [
+                "Raft elects a leader with randomized timeouts.",
+                "Kafka partitions are replicated across brokers.",
+                "The event loop schedules callbacks and network IO.",
+                "Consistent hashing spreads keys over shards.",
+            ]
+        )
+    ]
+    built = HybridRetriever.build(tmp_path / "hybrid", chunks, embedder, cache=None)
+    shard_hybrid_index(tmp_path / "hybrid", shards=2)
+    sharded = open_sharded(tmp_path / "hybrid", embedder, cache=None)
+    try:
+        for query in ["leader election", "kafka brokers", "hash keys to shards"]:
+            assert sharded.search(query, k=3) == built.search(query, k=3)
+        assert sharded.search("kafka", k=2, where={"source": "doc1.md"}) == (
+            built.search("kafka", k=2, where={"source": "doc1.md"})
+        )
+    finally:
+        built.close()
+        sharded.close()
+
+
+def test_results_missing_a_shard_are_not_cached(tmp_path):
+    """A result built while a shard timed out is served once, never cached."""
+    embedder = EmbeddingService(HashingBackend(dim=64))
+    chunks = [
+        Chunk(text=text, source=f"doc{i}.md", index=0, start=0, end=1, tokens=0)
+        for i, text in enumerate(
+            [
+                "Raft elects a leader with randomized timeouts.",
+                "Kafka partitions are replicated across brokers.",
+                "The event loop schedules callbacks and network IO.",
+                "Consistent hashing spreads keys over shards.",
+            ]
+        )
+    ]
+    HybridRetriever.build(tmp_path / "hybrid", chunks, embedder, cache=None).close()
+    shard_hybrid_index(tmp_path / "hybrid", shards=2)
+    cache = RetrievalCache()
+    sharded = open_sharded(tmp_path / "hybrid", embedder, cache=cache)
+    assert isinstance(sharded.dense, ShardedRetriever)
+    try:
+        sharded.search("warm up the workers", k=4)
+        process = sharded.dense._workers[1][0]
+        sharded.dense.timeout = 0.5
+        os.kill(process.pid, signal.SIGSTOP)
+        try:
+            partial = sharded.search("hash keys to shards", k=4)
+        finally:
+            os.kill(process.pid, signal.SIGCONT)
+        assert sharded.dense.missed == [1]
+
+        sharded.dense.timeout = 30
+        full = sharded.search("hash keys to shards", k=4)
+        assert sharded.dense.missed == [] and full != partial
+        assert sharded.search("hash keys to shards", k=4) == full
+        assert cache.hits == 1
+    finally:
+        sharded.close()
@@ -0,0 +1,126 @@
+"""Tests for single-file, memory-mapped snapshots of the hybrid index."""
+
+import numpy as np
+import pytest
+
+from src.rag.chunking import Chunk
+from src.rag.embeddings import EmbeddingService, HashingBackend
+from src.rag.retriever import HybridRetriever, IVFPQIndex
+from src.rag.snapshot import FrozenBM25Index, open_snapshot, save_snapshot
+from src.rag.sparse import BM25Index
+
+QUERIES = ["ERR_CONN_RESET", "event loop", "backoff retries", "nothing zzz"]
+
+
+@pytest.fixture
+def embedder():
+    return EmbeddingService(HashingBackend(dim=64))
+
+
+@pytest.fixture
+def chunks():
+    """Three documents sharing one chunk."""
+    texts = {
+        "errors.md": [
+            "Connection failures raise ERR_CONN_RESET when the peer hangs up.",
+            "Timeouts are retried with exponential backoff.",
+        ],
+        "python.md": [
+            "Python asyncio runs coroutines on an event loop.",
+            "The event loop schedules callbacks and network IO.",
+        ],
+        "copy.md": ["Timeouts are retried with exponential backoff."],
+    }
+    return [
+        Chunk(text=text, source=source, index=i, start=0, end=len(text), tokens=0)
+        for source, parts in texts.items()
+        for i, text in enumerate(parts)
+    ]
+
+
+def _same_results(left, right):
+    assert [[c for c, _ in r] for r in left] == [[c for c, _ in r] for r in right]
+    for a, b in zip(left, right):
+        assert [s for _, s in a] == pytest.approx([s for _, s in b])
+
+
+@pytest.mark.parametrize("ann", [False, True])
+def test_snapshot_answers_like_the_directory_index(tmp_path, embedder, chunks, ann):
+    """Searches, filters and chunk lookups match the index it was taken from."""
+    built = HybridRetriever.build(
+        tmp_path / "hybrid",
+        chunks,
+        embedder,
+        ann=ann,
+        doc_metadata={"errors.md": {"mtime": 100.0}},
+        cache=None,
+    )
+    save_snapshot(tmp_path / "index.snapshot", built)
+    snapshot = open_snapshot(tmp_path / "index.snapshot", embedder, cache=None)
+
+    assert isinstance(snapshot.dense, IVFPQIndex) == ann
+    assert snapshot.generation == built.generation
+    _same_results(snapshot.search_batch(QUERIES, k=3), built.search_batch(QUERIES, k=3))
+    where = {"mtime": {"gte": 50}}
+    _same_results(
+        snapshot.search_batch(QUERIES, k=3, where=where),
+        built.search_batch(QUERIES, k=3, where=where),
+    )
+
+    chunk_id = built.chunks.chunk_ids("copy.md")[0]
+    assert chunk_id in snapshot.chunks and "missing" not in snapshot.chunks
+    assert snapshot.chunks.get(chunk_id) == built.chunks.get(chunk_id)
+    assert snapshot.chunks.locations(chunk_id) == built.chunks.locations(chunk_id)
+    assert snapshot.chunks.chunk_ids("errors.md") == built.chunks.chunk_ids("errors.md")
+    assert sorted(snapshot.chunks.sources()) == sorted(built.chunks.sources())
+    assert snapshot.chunks.dedup_ratio == pytest.approx(built.chunks.dedup_ratio)
+    with pytest.raises(TypeError):
+        save_snapshot(tmp_path / "again.snapshot", snapshot)
+    built.close()
+    snapshot.close()
+
+
+def test_frozen_bm25_scores_like_bm25(tmp_path):
+    """Vectorized scoring over CSR postings reproduces BM25Index."""
+    index = BM25Index()
+    rng = np.random.default_rng(0)
+    words = [f"w{i}" for i in range(50)]
+    for doc in range(200):
+        index.add(f"d{doc}", " ".join(rng.choice(words, size=rng.integers(5, 40))))
+    header, arrays = FrozenBM25Index.to_arrays(index)
+    frozen = FrozenBM25Index(header, arrays)
+
+    assert len(frozen) == 200 and "d7" in frozen
+    for query in ["w1 w2", "w3 w3 w40", "w49", "unknown"]:
+        expected = index.search(query, k=10)
+        found = frozen.search(query, k=10)
+        assert [s for _, s in found] == pytest.approx([s for _, s in expected])
+    allowed = frozen.search("w1", k=5, allowed=lambda d: d.endswith("0"))
+    assert allowed and all(d.endswith("0") for d, _ in allowed)
+
+
+def test_open_maps_arrays_and_rejects_damaged_files(tmp_path, embedder, chunks):
+    """Opening maps instead of reading; corruption and truncation are caught."""
+    built = HybridRetriever.build(tmp_path / "hybrid", chunks, embedder, cache=None)
+    path = tmp_path / "index.snapshot"
+    save_snapshot(path, built)
+    built.close()
+
+    snapshot = open_snapshot(path, embedder, verify=True, cache=None)
+    assert isinstance(snapshot.dense.to_arrays()["vectors"], np.memmap)
+    snapshot.close()
+
+    data = bytearray(path.read_bytes())
+    data[-100] ^= 0xFF
+    path.write_bytes(bytes(data))
+    open_snapshot(path, embedder, cache=None).close()  # Unverified open is O(1)
+    with pytest.raises(ValueError, match="checksum"):
+        open_snapshot(path, embedder, verify=True)
+
+    path.write_bytes(bytes(data[: len(data) // 2]))
+    with pytest.raises(ValueError, match="truncated"):
+        open_snapshot(path, embedder)
+
+    IVFPQIndex.build([f"c{i}" for i in range(300)], np.eye(300, 8)).save(path)
+    with pytest.raises(ValueError, match="not a RAG index snapshot"):
+        open_snapshot(path, embedder)
@@ -0,0 +1,56 @@
+"""Tests for the BM25 inverted index."""
+
+from src.rag.sparse import BM25Index, tokenize
+
+
+def test_tokenize_lowercases_and_keeps_identifiers():
+    """Tokens are lowercase words; underscores stay inside identifiers."""
+    assert tokenize("ERR_CONN_RESET in Python") == ["err_conn_reset", "in", "python"]
+
+
+def test_search_ranks_matching_document_first():
+    """Documents containing more query terms score higher."""
+    index = BM25Index()
+    index.add("a", "python asyncio event loop")
+    index.add("b", "python packaging with uv")
+    index.add("c", "gardening tips for tomatoes")
+
+    results = index.search("python asyncio", k=3)
+
+    assert [doc_id for doc_id, _ in results] == ["a", "b"]
+    assert results[0][1] > results[1][1]
+
+
+def test_rare_terms_weigh_more_than_common_terms():
+    """IDF boosts documents matching rare query terms."""
+    index = BM25Index()
+    for i in range(5):
+        index.add(f"common{i}", "python guide")
+    index.add("rare", "python zeromq guide")
+
+    assert index.search("python zeromq", k=1)[0][0] == "rare"
+
+
+def test_add_replaces_and_remove_deletes():
+    """Re-adding a document replaces it; removing drops it from results."""
+    index = BM25Index()
+    index.add("doc", "old words")
+    index.add("doc", "new words")
+
+    assert index.search("old") == []
+    assert index.search("new")[0][0] == "doc"
+    assert index.remove("doc") is True
+    assert index.remove("doc") is False
+    assert len(index) == 0
+    assert index.search("new") == []
+
+
+def test_serialization_roundtrip():
+    """from_dict(to_dict()) reproduces the same rankings."""
+    index = BM25Index()
+    index.add("a", "vector search with numpy")
+    index.add("b", "keyword search with bm25")
+
+    restored = BM25Index.from_dict(index.to_dict())
+
+    assert restored.search("bm25 search") == index.search("bm25 search")
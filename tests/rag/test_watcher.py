@@ -0,0 +1,234 @@
+"""Tests for the incremental indexing watcher."""
+
+import json
+import os
+
+import numpy as np
+import pytest
+
+from src.notes.store import NoteStore
+from src.rag.embeddings import EmbeddingService, HashingBackend
+from src.rag.retriever import HybridRetriever
+from src.rag.watcher import (
+    IndexWatcher,
+    LiveIndex,
+    current_generation,
+    open_generation,
+)
+
+
+@pytest.fixture
+def embedder():
+    return EmbeddingService(HashingBackend(dim=64))
+
+
+@pytest.fixture
+def docs(tmp_path):
+    notes = tmp_path / "watched" / "notes"
+    data = tmp_path / "watched" / "data"
+    notes.mkdir(parents=True)
+    data.mkdir()
+    (notes / "kafka.md").write_text("# Kafka\n\nKafka partitions are ordered logs.\n")
+    (data / "raft.txt").write_text("Raft elects a leader with randomized timeouts.\n")
+    return notes, data
+
+
+def _watcher(tmp_path, docs, embedder, **options):
+    return IndexWatcher(
+        list(docs), tmp_path / "index", embedder, use_inotify=False, **options
+    )
+
+
+def test_first_sync_indexes_everything(tmp_path, docs, embedder):
+    """All documents are added and a searchable generation is published."""
+    report = _watcher(tmp_path, docs, embedder).sync()
+
+    assert sorted(report.added) == ["data/raft.txt", "notes/kafka.md"]
+    assert report.generation == 1
+    live = LiveIndex(tmp_path / "index", embedder)
+    top_id, _ = live.search("leader election timeouts", k=1)[0]
+    assert "Raft" in live.retriever.chunks.get(top_id)
+
+
+def test_only_changed_documents_are_reindexed(tmp_path, docs, embedder):
+    """Unchanged files are skipped; touched-but-identical files are not re-indexed."""
+    notes, data = docs
+    watcher = _watcher(tmp_path, docs, embedder)
+    watcher.sync()
+
+    assert not watcher.sync().changed  # Nothing changed: no new generation
+
+    stat = (data / "raft.txt").stat()
+    os.utime(data / "raft.txt", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    report = watcher.sync()
+    assert not report.changed and report.generation is None
+
+    (notes / "kafka.md").write_text("# Kafka\n\nConsumer groups share partitions.\n")
+    report = watcher.sync()
+    assert report.modified == ["notes/kafka.md"] and not report.added
+    assert report.embedded == 1 and report.removed_chunks == 1
+
+
+def test_deleted_documents_leave_the_index(tmp_path, docs, embedder):
+    """Removing a file removes its chunks from both BM25 and the vectors."""
+    _, data = docs
+    watcher = _watcher(tmp_path, docs, embedder)
+    watcher.sync()
+    (data / "raft.txt").unlink()
+
+    report = watcher.sync()
+
+    assert report.deleted == ["data/raft.txt"]
+    live = LiveIndex(tmp_path / "index", embedder)
+    assert len(live.retriever.sparse) == 1
+    assert len(live.retriever.dense) == 1
+
+
+def test_restart_resumes_from_manifest(tmp_path, docs, embedder):
+    """A new watcher restores the last generation and only indexes new files."""
+    notes, _ = docs
+    _watcher(tmp_path, docs, embedder).sync()
+    (notes / "paxos.md").write_text("Paxos reaches consensus with quorums.\n")
+
+    report = _watcher(tmp_path, docs, embedder).sync()
+
+    assert report.added == ["notes/paxos.md"] and not report.modified
+    assert report.generation == 2
+
+
+def test_readers_keep_a_complete_generation(tmp_path, docs, embedder):
+    """A reader switches generations only when a new one is fully published."""
+    notes, _ = docs
+    watcher = _watcher(tmp_path, docs, embedder, keep_generations=2)
+    watcher.sync()
+    live = LiveIndex(tmp_path / "index", embedder)
+    before = live.retriever
+
+    (notes / "paxos.md").write_text("Paxos reaches consensus with quorums.\n")
+    watcher.sync()
+    (notes / "zab.md").write_text("Zab orders broadcasts in ZooKeeper.\n")
+    watcher.sync()
+
+    assert live.retriever is not before
+    assert len(live.retriever.chunks) == 4
+    generations = sorted(p.name for p in (tmp_path / "index").glob("gen-*"))
+    # Both kept generations are deltas on top of the first one
+    assert generations == ["gen-000001", "gen-000002", "gen-000003"]
+    assert current_generation(tmp_path / "index").name == "gen-000003"
+
+
+def test_sync_publishes_only_a_delta(tmp_path, docs, embedder):
+    """A pass writes the rows of the chunks it touched, tombstoning old ones."""
+    notes, data = docs
+    (data / "paxos.md").write_text("# Paxos\n\nPaxos reaches consensus.\n")
+    watcher = _watcher(tmp_path, docs, embedder)
+    watcher.sync()
+    (notes / "kafka.md").write_text("# Kafka\n\nConsumer groups share partitions.\n")
+
+    watcher.sync()
+
+    delta_dir = tmp_path / "index" / "gen-000002"
+    assert not (delta_dir / "chunks.json").exists()
+    delta = json.loads((delta_dir / "delta.json").read_text())
+    assert [source for source, _ in delta["documents"]] == ["notes/kafka.md"]
+    assert len(delta["ids"]) == len(delta["dead"]) == 1
+    assert np.load(delta_dir / "vectors.npy").shape == (1, 64)
+    live = LiveIndex(tmp_path / "index", embedder)
+    retriever = live.retriever
+    assert len(retriever.dense) == len(retriever.chunks) == 3
+    assert len(retriever.metadata.rows({})) == 3  # The dead row is skipped
+    found = retriever.search_batch(
+        ["partitions"], k=5, where={"source": "notes/kafka.md"}
+    )
+    assert [retriever.chunks.get(chunk_id) for chunk_id, _ in found[0]] == [
+        "# Kafka\n\nConsumer groups share partitions.\n"
+    ]
+    live.close()
+
+
+def test_merge_folds_deltas_into_a_base(tmp_path, docs, embedder):
+    """Deltas are merged in the background; later ones build on the new base."""
+    notes, _ = docs
+    watcher = _watcher(tmp_path, docs, embedder, keep_generations=1, merge_deltas=2)
+    watcher.sync()
+    for name in ["paxos", "zab"]:
+        (notes / f"{name}.md").write_text(f"{name} replicates a log.\n")
+        watcher.sync()
+    watcher.stop()  # Waits for the merge started by the third pass
+    layered = open_generation(tmp_path / "index" / "gen-000003", embedder)
+    merged = HybridRetriever.open(tmp_path / "index" / "base-000003", embedder)
+    assert merged.chunks.to_dict() == layered.chunks.to_dict()
+    ranked = [
+        [chunk_id for chunk_id, _ in r.search("zab log", k=4)]
+        for r in (merged, layered)
+    ]
+    assert ranked[0] == ranked[1]
+
+    (notes / "kafka.md").unlink()
+    watcher.sync()
+    watcher.sync()  # Nothing changed: no new generation
+    (notes / "raft.md").write_text("Raft elects a leader.\n")
+    watcher.sync()
+
+    index = tmp_path / "index"
+    assert sorted(p.name for p in index.iterdir()) == [
+        "CURRENT",
+        "base-000003",
+        "gen-000004",
+        "gen-000005",
+    ]
+    restarted = _watcher(tmp_path, docs, embedder)
+    assert restarted.generation == 5 and not restarted.sync().changed
+    assert len(LiveIndex(index, embedder).retriever.chunks) == 4
+
+
+def test_notes_only_in_the_wal_are_indexed(tmp_path, docs, embedder):
+    """Saved notes are searchable before compaction writes their files."""
+    notes, _ = docs
+    store = NoteStore(notes, compact_threshold=1 << 30)
+    store.save("Paxos", "Paxos reaches consensus with quorums.")
+    watcher = _watcher(tmp_path, docs, embedder)
+
+    report = watcher.sync()
+
+    assert not (notes / "paxos.md").exists()
+    assert "notes/paxos.md" in report.added
+    live = LiveIndex(tmp_path / "index", embedder)
+    top_id, _ = live.search("paxos quorums consensus", k=1)[0]
+    assert "Paxos" in live.retriever.chunks.get(top_id)
+
+    store.close()  # Compacts the note into paxos.md with the same text
+    assert (notes / "paxos.md").exists()
+    assert not watcher.sync().changed
+    live.close()
+
+
+def test_replaced_retriever_closes_after_running_searches(tmp_path, docs, embedder):
+    """A search finishes on its generation, which is closed once it is done."""
+    notes, _ = docs
+    watcher = _watcher(tmp_path, docs, embedder)
+    watcher.sync()
+    live = LiveIndex(tmp_path / "index", embedder)
+    old = live.retriever
+    closed = []
+    search, close = old.search, old.close
+
+    def search_during_publish(query, k):
+        (notes / "paxos.md").write_text("Paxos reaches consensus with quorums.\n")
+        watcher.sync()
+        assert live.retriever is not old and not closed  # Swapped, still open
+        return search(query, k)
+
+    old.search = search_during_publish
+    old.close = lambda: (closed.append(old), close())
+    assert live.search("kafka partitions", k=1)
+    assert closed == [old]
+
+    newer = live.retriever
+    close_newer = newer.close
+    newer.close = lambda: (closed.append(newer), close_newer())
+    (notes / "zab.md").write_text("Zab orders broadcasts in ZooKeeper.\n")
+    watcher.sync()
+    assert live.search("zookeeper broadcasts", k=1)
+    assert closed == [old, newer]  # No search running: closed on the swap
+    live.close()